@@ -1,8 +1,8 @@
 import streamlit as st
-import pandas as pd
 from datetime import date, datetime
 from database.crud import crud
-from utils.helpers import format_currency, show_success_message, show_error_message
+from database.schema import in_period
+from utils.helpers import format_currency, show_success_message, show_error_message, date_column_config
 
 def show_accounting():
     st.title("🧮 المحاسبة اليومية")
@@ -89,6 +89,7 @@ def manage_payments():
         if not payments_df.empty:
             st.dataframe(
                 payments_df,
+                column_config=date_column_config(payments_df),
                 use_container_width=True,
                 hide_index=True
             )
@@ -122,6 +123,7 @@ def manage_expenses():
         if not expenses_df.empty:
             st.dataframe(
                 expenses_df,
+                column_config=date_column_config(expenses_df),
                 use_container_width=True,
                 hide_index=True
             )
@@ -161,19 +163,9 @@ def show_account_statements():
         payments_df = crud.get_all_payments()
         expenses_df = crud.get_all_expenses()
         
-        if not payments_df.empty:
-            payments_df['payment_date'] = pd.to_datetime(payments_df['payment_date']).dt.date
-            filtered_payments = payments_df[
-                (payments_df['payment_date'] >= start_date) & 
-                (payments_df['payment_date'] <= end_date)
-            ]
-        
-        if not expenses_df.empty:
-            expenses_df['expense_date'] = pd.to_datetime(expenses_df['expense_date']).dt.date
-            filtered_expenses = expenses_df[
-                (expenses_df['expense_date'] >= start_date) & 
-                (expenses_df['expense_date'] <= end_date)
-            ]
+        # أعمدة التاريخ datetime64 من وقت القراءة
+        filtered_payments = payments_df[in_period(payments_df['payment_date'], start_date, end_date)]
+        filtered_expenses = expenses_df[in_period(expenses_df['expense_date'], start_date, end_date)]
         
         # حساب الإجماليات
         total_revenue = filtered_payments['amount'].sum() if not filtered_payments.empty else 0
@@ -194,11 +186,13 @@ def show_account_statements():
         
         if not filtered_payments.empty:
             st.write("### الإيرادات")
-            st.dataframe(filtered_payments, use_container_width=True)
+            st.dataframe(filtered_payments, use_container_width=True,
+                         column_config=date_column_config(filtered_payments))
         
         if not filtered_expenses.empty:
             st.write("### المصروفات")
-            st.dataframe(filtered_expenses, use_container_width=True)
+            st.dataframe(filtered_expenses, use_container_width=True,
+                         column_config=date_column_config(filtered_expenses))
     
     except Exception as e:
         show_error_message(f"خطأ في إنشاء الكشف: {str(e)}")
@@ -1,3 +1,4 @@
+import re
 import streamlit as st
 import pandas as pd
 from datetime import datetime, date, timedelta
@@ -5,6 +6,20 @@ import plotly.express as px
 import plotly.graph_objects as go
 from database.crud import crud
 from database.models import db
+from database.recurrence import FREQUENCIES, MAX_OCCURRENCES
+from database.notifications import notification_engine
+from database.scheduler import scheduler
+import query_stats
+import reports
+import styles
+from components.data_grid import DataGrid
+from components.dev_overlay import DevOverlay
+from components.jobs_panel import JobsPanel
+from components.notifications import NotificationCenter
+from components.patient_selector import PatientSelector
+from payments import render_doctor_earnings
+from utils.tracing import tracer
+from utils.helpers import date_column_config
 
 # ========================
 # صفحة التهيئة الأساسية
@@ -27,479 +42,35 @@ def init_database():
 
 init_database()
 
-# ========================
-# الأنماط المخصصة (CSS)
-# ========================
-def load_custom_css():
-    st.markdown("""
-    <style>
-        /* تحسين الخط العربي والإنجليزي */
-        @import url('https://fonts.googleapis.com/css2?family=Cairo:wght@300;400;500;600;700;800;900&display=swap');
-        @import url('https://fonts.googleapis.com/css2?family=Inter:wght@300;400;500;600;700&display=swap');
-
-        html, body, [class*="css"] {
-            font-family: 'Cairo', 'Inter', sans-serif;
-            font-size: 16px;
-            font-weight: 400;
-            line-height: 1.7;
-        }
-
-        /* تحسين حجم الخط للعناوين */
-        h1 {
-            font-size: 2.5rem !important;
-            font-weight: 700 !important;
-            letter-spacing: 0.5px;
-            margin-bottom: 1rem !important;
-        }
-
-        h2 {
-            font-size: 2rem !important;
-            font-weight: 600 !important;
-            letter-spacing: 0.3px;
-            margin-bottom: 0.8rem !important;
-        }
-
-        h3 {
-            font-size: 1.5rem !important;
-            font-weight: 600 !important;
-            margin-bottom: 0.6rem !important;
-        }
-
-        h4, h5, h6 {
-            font-weight: 500 !important;
-            margin-bottom: 0.5rem !important;
-        }
-
-        /* تحسين النصوص */
-        p, span, div {
-            font-weight: 400;
-            line-height: 1.7;
-        }
-
-        /* ألوان دلالية محسنة */
-        :root {
-            --success-color: #28a745;
-            --warning-color: #ffc107;
-            --danger-color: #dc3545;
-            --info-color: #17a2b8;
-            --secondary-color: #6c757d;
-            --light-bg: #f8f9fa;
-            --dark-text: #212529;
-        }
-        
-        /* البطاقات المحسنة */
-        .metric-card {
-            background: linear-gradient(135deg, #667eea 0%, #764ba2 100%);
-            padding: 25px;
-            border-radius: 16px;
-            color: white;
-            box-shadow: 0 8px 25px rgba(0,0,0,0.15);
-            text-align: center;
-            margin: 15px 0;
-            transition: all 0.3s ease;
-            border: 1px solid rgba(255,255,255,0.1);
-            backdrop-filter: blur(10px);
-        }
-
-        .metric-card:hover {
-            transform: translateY(-8px) scale(1.02);
-            box-shadow: 0 12px 35px rgba(0,0,0,0.2);
-        }
-
-        .metric-card.success {
-            background: linear-gradient(135deg, var(--success-color) 0%, #20c997 100%);
-        }
-
-        .metric-card.warning {
-            background: linear-gradient(135deg, var(--warning-color) 0%, #fd7e14 100%);
-        }
-
-        .metric-card.info {
-            background: linear-gradient(135deg, var(--info-color) 0%, #0dcaf0 100%);
-        }
-
-        .metric-card.danger {
-            background: linear-gradient(135deg, var(--danger-color) 0%, #fd7e14 100%);
-        }
-        
-        .metric-value {
-            font-size: 2.5rem;
-            font-weight: 700;
-            margin: 10px 0;
-        }
-        
-        .metric-label {
-            font-size: 1rem;
-            opacity: 0.9;
-        }
-        
-        /* الشريط الجانبي - تصميم طبي حديث */
-        [data-testid="stSidebar"] {
-            background: linear-gradient(180deg, #4facfe 0%, #00f2fe 100%);
-            box-shadow: 0 8px 32px rgba(79, 172, 254, 0.3);
-            border-radius: 0 20px 20px 0;
-            border-right: 3px solid rgba(255, 255, 255, 0.2);
-        }
-
-        [data-testid="stSidebar"] * {
-            color: white;
-        }
-
-        /* أزرار القائمة الجانبية - تصميم حديث */
-        [data-testid="stSidebar"] button {
-            color: white !important;
-            background: rgba(255, 255, 255, 0.1) !important;
-            border: 1px solid rgba(255, 255, 255, 0.2) !important;
-            border-radius: 12px !important;
-            margin: 4px 8px !important;
-            padding: 12px 16px !important;
-            font-weight: 600 !important;
-            font-size: 14px !important;
-            transition: all 0.3s ease !important;
-            backdrop-filter: blur(10px) !important;
-            box-shadow: 0 4px 15px rgba(0, 0, 0, 0.1) !important;
-        }
-
-        [data-testid="stSidebar"] button:hover {
-            background: rgba(255, 255, 255, 0.2) !important;
-            transform: translateY(-2px) !important;
-            box-shadow: 0 6px 20px rgba(0, 0, 0, 0.15) !important;
-            border-color: rgba(255, 255, 255, 0.4) !important;
-        }
-
-        [data-testid="stSidebar"] button:active,
-        [data-testid="stSidebar"] button:focus {
-            background: rgba(255, 255, 255, 0.3) !important;
-            transform: translateY(0px) !important;
-            box-shadow: 0 2px 10px rgba(0, 0, 0, 0.2) !important;
-        }
-
-        /* تحسين النص في الأزرار */
-        [data-testid="stSidebar"] button span {
-            color: white !important;
-            font-weight: 600 !important;
-        }
-
-        /* عنوان الشريط الجانبي */
-        [data-testid="stSidebar"] h1 {
-            color: white !important;
-            text-shadow: 0 2px 4px rgba(0, 0, 0, 0.3) !important;
-            font-weight: 700 !important;
-        }
-
-        /* النصوص الجانبية */
-        [data-testid="stSidebar"] p {
-            color: rgba(255, 255, 255, 0.9) !important;
-            font-weight: 500 !important;
-        }
-
-        /* عناوين الأقسام */
-        [data-testid="stSidebar"] h3 {
-            color: white !important;
-            border-bottom: 2px solid rgba(255, 255, 255, 0.3) !important;
-            padding-bottom: 8px !important;
-            margin-bottom: 16px !important;
-            font-weight: 600 !important;
-        }
-
-        /* خطوط الفصل */
-        [data-testid="stSidebar"] hr {
-            border-color: rgba(255, 255, 255, 0.3) !important;
-            margin: 20px 0 !important;
-        }
-        
-        /* الأزرار المحسنة */
-        .stButton>button {
-            border-radius: 12px;
-            font-weight: 600;
-            transition: all 0.3s ease;
-            border: none;
-            padding: 12px 24px;
-            font-size: 14px;
-            letter-spacing: 0.5px;
-        }
-
-        .stButton>button:hover {
-            transform: translateY(-3px);
-            box-shadow: 0 8px 20px rgba(0,0,0,0.25);
-        }
-
-        .stButton>button:active {
-            transform: translateY(-1px);
-        }
-
-        /* الجداول المحسنة */
-        .dataframe {
-            border-radius: 12px;
-            overflow: hidden;
-            box-shadow: 0 4px 15px rgba(0,0,0,0.08);
-            border: 1px solid #e9ecef;
-        }
-
-        .dataframe th {
-            background: linear-gradient(135deg, #f8f9fa 0%, #e9ecef 100%);
-            font-weight: 600;
-            color: var(--dark-text);
-            padding: 15px;
-            border-bottom: 2px solid #dee2e6;
-        }
-
-        .dataframe td {
-            padding: 12px 15px;
-            border-bottom: 1px solid #f1f3f4;
-        }
-
-        .dataframe tr:nth-child(even) {
-            background-color: #f8f9fa;
-        }
-
-        .dataframe tr:hover {
-            background-color: #e3f2fd;
-            transition: background-color 0.2s ease;
-        }
-
-        /* العنوان الرئيسي المحسن */
-        .main-header {
-            background: linear-gradient(135deg, #667eea 0%, #764ba2 100%);
-            padding: 40px 30px;
-            border-radius: 20px;
-            color: white;
-            text-align: center;
-            margin-bottom: 40px;
-            box-shadow: 0 10px 30px rgba(0,0,0,0.15);
-            position: relative;
-            overflow: hidden;
-        }
-
-        .main-header::before {
-            content: '';
-            position: absolute;
-            top: 0;
-            left: 0;
-            right: 0;
-            bottom: 0;
-            background: url('data:image/svg+xml,<svg xmlns="http://www.w3.org/2000/svg" viewBox="0 0 100 100"><defs><pattern id="grain" width="100" height="100" patternUnits="userSpaceOnUse"><circle cx="25" cy="25" r="1" fill="rgba(255,255,255,0.1)"/><circle cx="75" cy="75" r="1" fill="rgba(255,255,255,0.1)"/><circle cx="50" cy="10" r="0.5" fill="rgba(255,255,255,0.1)"/></pattern></defs><rect width="100" height="100" fill="url(%23grain)"/></svg>');
-            opacity: 0.1;
-        }
-
-        .main-header h1 {
-            position: relative;
-            z-index: 1;
-            margin: 0;
-        }
-
-        /* بطاقة إحصائية محسنة */
-        .stat-box {
-            background: white;
-            padding: 25px;
-            border-radius: 16px;
-            box-shadow: 0 6px 20px rgba(0,0,0,0.08);
-            border-right: 5px solid #667eea;
-            transition: all 0.3s ease;
-            border: 1px solid #f1f3f4;
-        }
-
-        .stat-box:hover {
-            transform: translateY(-3px);
-            box-shadow: 0 10px 30px rgba(0,0,0,0.12);
-        }
-        
-        /* دعم RTL للعربية */
-        .rtl {
-            direction: rtl;
-            text-align: right;
-        }
-        
-        /* التنبيهات المحسنة */
-        .alert-box {
-            padding: 20px;
-            border-radius: 12px;
-            margin: 15px 0;
-            border-left: 5px solid;
-            box-shadow: 0 4px 12px rgba(0,0,0,0.08);
-            transition: all 0.3s ease;
-            position: relative;
-            overflow: hidden;
-        }
-
-        .alert-box::before {
-            content: '';
-            position: absolute;
-            top: 0;
-            left: 0;
-            width: 4px;
-            height: 100%;
-            background: inherit;
-        }
-
-        .alert-box:hover {
-            transform: translateY(-2px);
-            box-shadow: 0 6px 18px rgba(0,0,0,0.12);
-        }
-
-        .alert-success {
-            background: linear-gradient(135deg, #d4edda 0%, #c3e6cb 100%);
-            border-color: var(--success-color);
-            color: #155724;
-        }
-
-        .alert-warning {
-            background: linear-gradient(135deg, #fff3cd 0%, #ffeaa7 100%);
-            border-color: var(--warning-color);
-            color: #856404;
-        }
-
-        .alert-danger {
-            background: linear-gradient(135deg, #f8d7da 0%, #f5c6cb 100%);
-            border-color: var(--danger-color);
-            color: #721c24;
-        }
-
-        .alert-info {
-            background: linear-gradient(135deg, #d1ecf1 0%, #bee5eb 100%);
-            border-color: var(--info-color);
-            color: #0c5460;
-        }
-        
-        /* تحسين المدخلات والنماذج */
-        .stTextInput>div>div>input,
-        .stSelectbox>div>div>select,
-        .stTextArea>div>div>textarea,
-        .stNumberInput>div>div>input {
-            border-radius: 10px;
-            border: 2px solid #e0e0e0;
-            padding: 12px 16px;
-            font-size: 14px;
-            transition: all 0.3s ease;
-            background: white;
-            box-shadow: 0 2px 4px rgba(0,0,0,0.04);
-        }
-
-        .stTextInput>div>div>input:focus,
-        .stSelectbox>div>div>select:focus,
-        .stTextArea>div>div>textarea:focus,
-        .stNumberInput>div>div>input:focus {
-            border-color: #667eea;
-            box-shadow: 0 0 0 0.2rem rgba(102, 126, 234, 0.25), 0 4px 12px rgba(102, 126, 234, 0.15);
-            transform: translateY(-1px);
-        }
-
-        /* تحسين التخطيط باستخدام CSS Grid */
-        .grid-container {
-            display: grid;
-            grid-template-columns: repeat(auto-fit, minmax(300px, 1fr));
-            gap: 20px;
-            margin: 20px 0;
-        }
-
-        .grid-item {
-            background: white;
-            padding: 20px;
-            border-radius: 12px;
-            box-shadow: 0 4px 15px rgba(0,0,0,0.08);
-            border: 1px solid #f1f3f4;
-            transition: all 0.3s ease;
-        }
-
-        .grid-item:hover {
-            transform: translateY(-3px);
-            box-shadow: 0 8px 25px rgba(0,0,0,0.12);
-        }
-
-        /* تحسين الرسوم البيانية */
-        .plotly-graph-div {
-            border-radius: 12px;
-            box-shadow: 0 4px 15px rgba(0,0,0,0.08);
-            border: 1px solid #f1f3f4;
-            overflow: hidden;
-        }
-
-        /* أزرار الإجراءات في الجداول */
-        .action-buttons {
-            display: flex;
-            gap: 8px;
-            justify-content: center;
-        }
-
-        .action-btn {
-            padding: 6px 12px;
-            border-radius: 6px;
-            font-size: 12px;
-            font-weight: 500;
-            text-decoration: none;
-            border: none;
-            cursor: pointer;
-            transition: all 0.2s ease;
-        }
-
-        .action-btn.edit {
-            background: #28a745;
-            color: white;
-        }
-
-        .action-btn.edit:hover {
-            background: #218838;
-            transform: translateY(-1px);
-        }
-
-        .action-btn.delete {
-            background: #dc3545;
-            color: white;
-        }
-
-        .action-btn.delete:hover {
-            background: #c82333;
-            transform: translateY(-1px);
-        }
-
-        /* رسائل التأكيد */
-        .confirmation-dialog {
-            background: white;
-            padding: 25px;
-            border-radius: 12px;
-            box-shadow: 0 10px 30px rgba(0,0,0,0.2);
-            border: 1px solid #dee2e6;
-            max-width: 400px;
-            margin: 20px auto;
-        }
+@st.cache_resource
+def start_notification_engine():
+    """محرك الإشعارات يعمل في الخلفية مرة واحدة لكل عملية"""
+    interval = int(crud.get_setting('notification_interval_minutes') or 60)
+    notification_engine.start(interval * 60)
+    return notification_engine
 
-        .confirmation-dialog h3 {
-            color: var(--dark-text);
-            margin-bottom: 15px;
-        }
+start_notification_engine()
 
-        .confirmation-dialog p {
-            color: var(--secondary-color);
-            margin-bottom: 20px;
-        }
+@st.cache_resource
+def start_scheduler():
+    """المهام الليلية (نسخ احتياطي، فهارس، تحقق...) - تعمل في عملية واحدة فقط عبر قفل القاعدة"""
+    scheduler.start()
+    return scheduler
 
-        /* تحسين التنقل */
-        .nav-tabs {
-            display: flex;
-            border-bottom: 2px solid #e9ecef;
-            margin-bottom: 20px;
-        }
+start_scheduler()
 
-        .nav-tab {
-            padding: 12px 24px;
-            background: transparent;
-            border: none;
-            border-bottom: 3px solid transparent;
-            font-weight: 500;
-            color: var(--secondary-color);
-            cursor: pointer;
-            transition: all 0.3s ease;
-        }
+# تتبع زمن إعادة التشغيل في وضع المطور (?dev=1)
+DevOverlay.begin()
 
-        .nav-tab.active,
-        .nav-tab:hover {
-            color: #667eea;
-            border-bottom-color: #667eea;
-        }
-    </style>
-    """, unsafe_allow_html=True)
+# ========================
+# الأنماط المخصصة (CSS)
+# ========================
+def load_custom_css():
+    # الأنماط تُبنى مرة واحدة لكل عملية وتُقدم كملف ثابت (styles.py)
+    styles.load_custom_css()
 
-load_custom_css()
+with tracer.span("css"):
+    load_custom_css()
 
 # ========================
 # الشريط الجانبي - التنقل
@@ -528,7 +99,8 @@ def render_sidebar():
             "💸 المصروفات": "expenses",
             "📊 التقارير": "reports",
             "⚙️ الإعدادات": "settings",
-            "📝 سجل الأنشطة": "activity_log"
+            "📝 سجل الأنشطة": "activity_log",
+            "⏱️ أداء الاستعلامات": "query_stats"
         }
 
         if 'current_page' not in st.session_state:
@@ -561,13 +133,22 @@ def render_sidebar():
 
         st.markdown("---")
 
+        NotificationCenter.render()
+
+        st.markdown("---")
+
+        JobsPanel.render()
+
+        st.markdown("---")
+
         # نسخة احتياطية سريعة
         if st.button("💾 نسخة احتياطية", use_container_width=True):
             backup_path = db.backup_database()
             if backup_path:
                 st.success(f"✅ تم إنشاء نسخة احتياطية")
 
-render_sidebar()
+with tracer.span("sidebar"):
+    render_sidebar()
 
 # ========================
 # الصفحة الرئيسية - لوحة المعلومات
@@ -734,7 +315,7 @@ def render_dashboard():
 def render_appointments():
     st.markdown("### 📅 إدارة المواعيد")
     
-    tab1, tab2, tab3, tab4 = st.tabs(["📋 جميع المواعيد", "➕ موعد جديد", "🔍 بحث", "📊 جدول الأطباء"])
+    tab1, tab2, tab3, tab4, tab5 = tracer.tabs(["📋 جميع المواعيد", "➕ موعد جديد", "🔍 بحث", "📊 جدول الأطباء", "🔁 مواعيد متكررة"])
     
     with tab1:
         appointments = crud.get_all_appointments()
@@ -770,6 +351,7 @@ def render_appointments():
             st.dataframe(
                 filtered_appointments[['id', 'patient_name', 'doctor_name', 'treatment_name', 
                                       'appointment_date', 'appointment_time', 'status', 'total_cost']],
+                column_config=date_column_config(filtered_appointments),
                 use_container_width=True,
                 hide_index=True
             )
@@ -795,41 +377,46 @@ def render_appointments():
     with tab2:
         st.markdown("#### إضافة موعد جديد")
         
-        patients = crud.get_all_patients()
-        doctors = crud.get_all_doctors()
-        treatments = crud.get_all_treatments()
+        # قوائم مرجعية صغيرة مخزنة، والمريض بالبحث بدلاً من تحميل كل المرضى
+        doctors = crud.get_doctor_options()
+        treatments = crud.get_treatment_options()
         
-        if patients.empty or doctors.empty:
+        if not doctors:
             st.warning("يجب إضافة مرضى وأطباء أولاً")
         else:
             col1, col2 = st.columns(2)
             
             with col1:
-                patient_id = st.selectbox(
-                    "المريض*",
-                    patients['id'].tolist(),
-                    format_func=lambda x: patients[patients['id'] == x]['name'].iloc[0]
-                )
+                patient_id = PatientSelector.render(key="appointment_patient")
                 
                 treatment_id = st.selectbox(
                     "العلاج*",
-                    treatments['id'].tolist(),
-                    format_func=lambda x: treatments[treatments['id'] == x]['name'].iloc[0]
-                ) if not treatments.empty else None
+                    list(treatments),
+                    format_func=lambda x: treatments[x]['name']
+                ) if treatments else None
                 
                 appointment_date = st.date_input("تاريخ الموعد*", min_value=date.today())
             
             with col2:
                 doctor_id = st.selectbox(
                     "الطبيب*",
-                    doctors['id'].tolist(),
-                    format_func=lambda x: doctors[doctors['id'] == x]['name'].iloc[0]
+                    list(doctors),
+                    format_func=doctors.get
                 )
                 
                 appointment_time = st.time_input("وقت الموعد*")
                 
+                load = crud.get_doctor_day_load(doctor_id, appointment_date)
+                if load['capacity_minutes']:
+                    st.caption(
+                        f"📅 {load['appointments']} موعد محجوز - متاح {load['free_minutes']} "
+                        f"من {load['capacity_minutes']} دقيقة ({load['occupancy']:.0%} إشغال)"
+                    )
+                else:
+                    st.caption("📅 هذا اليوم خارج أيام العمل")
+                
                 if treatment_id:
-                    total_cost = treatments[treatments['id'] == treatment_id]['base_price'].iloc[0]
+                    total_cost = treatments[treatment_id]['base_price']
                     total_cost = st.number_input("التكلفة الإجمالية*", value=float(total_cost), min_value=0.0, step=10.0)
                 else:
                     total_cost = st.number_input("التكلفة الإجمالية*", min_value=0.0, step=10.0)
@@ -837,6 +424,9 @@ def render_appointments():
             notes = st.text_area("ملاحظات")
             
             if st.button("حجز الموعد", type="primary", use_container_width=True):
+                if patient_id is None:
+                    st.warning("الرجاء اختيار المريض")
+                    st.stop()
                 try:
                     crud.create_appointment(
                         patient_id,
@@ -870,6 +460,28 @@ def render_appointments():
                 st.info("لا توجد مواعيد في هذا التاريخ")
     
     with tab4:
+        st.markdown("#### إشغال الأطباء")
+        
+        col1, col2 = st.columns(2)
+        with col1:
+            heatmap_start = st.date_input("من تاريخ", value=date.today(), key="occupancy_start")
+        with col2:
+            heatmap_days = st.selectbox("عدد الأيام", [7, 14, 30, 60], index=2, key="occupancy_days")
+        
+        occupancy = crud.get_doctors_occupancy(heatmap_start, heatmap_days)
+        if not occupancy.empty:
+            fig = px.imshow(
+                occupancy * 100,
+                color_continuous_scale='RdYlGn_r',
+                zmin=0,
+                zmax=100,
+                aspect='auto',
+                labels={'x': 'التاريخ', 'y': 'الطبيب', 'color': 'الإشغال %'}
+            )
+            fig.update_layout(height=max(250, 40 * len(occupancy) + 120))
+            st.plotly_chart(fig, use_container_width=True)
+            st.caption("الأيام الفارغة أيام عطلة حسب ساعات العمل في الإعدادات")
+        
         st.markdown("#### جدول مواعيد الأطباء")
         
         doctors = crud.get_all_doctors()
@@ -892,6 +504,106 @@ def render_appointments():
                     st.dataframe(schedule, use_container_width=True, hide_index=True)
                 else:
                     st.info("لا توجد مواعيد لهذا الطبيب في هذا التاريخ")
+    
+    with tab5:
+        render_appointment_series()
+
+def render_appointment_series():
+    """سلاسل المواعيد المتكررة: إنشاء ونقل وإلغاء"""
+    st.markdown("#### سلسلة مواعيد جديدة")
+    
+    doctors = crud.get_doctor_options()
+    treatments = crud.get_treatment_options()
+    
+    if not doctors:
+        st.warning("يجب إضافة مرضى وأطباء أولاً")
+        return
+    
+    col1, col2, col3 = st.columns(3)
+    with col1:
+        patient_id = PatientSelector.render(key="series_patient")
+        doctor_id = st.selectbox(
+            "الطبيب*",
+            list(doctors),
+            format_func=doctors.get,
+            key="series_doctor"
+        )
+        treatment_id = st.selectbox(
+            "العلاج",
+            [None] + list(treatments),
+            format_func=lambda x: "بدون" if x is None else treatments[x]['name'],
+            key="series_treatment"
+        )
+    with col2:
+        start_date = st.date_input("تاريخ أول موعد*", min_value=date.today(), key="series_start")
+        appointment_time = st.time_input("وقت الموعد*", key="series_time")
+        total_cost = st.number_input("تكلفة الجلسة", min_value=0.0, step=10.0, key="series_cost")
+    with col3:
+        frequency = st.selectbox("التكرار", list(FREQUENCIES), index=1, format_func=FREQUENCIES.get, key="series_frequency")
+        interval = st.number_input("كل (فترة)", min_value=1, max_value=12, value=1, key="series_interval")
+        occurrences = st.number_input("عدد المواعيد", min_value=1, max_value=MAX_OCCURRENCES, value=12, key="series_count")
+    
+    notes = st.text_area("ملاحظات", key="series_notes")
+    rule = dict(
+        patient_id=patient_id, doctor_id=doctor_id, treatment_id=treatment_id,
+        start_date=start_date, appointment_time=appointment_time.strftime("%H:%M"),
+        frequency=frequency, interval=int(interval), occurrences=int(occurrences)
+    )
+    
+    col1, col2 = st.columns(2)
+    with col1:
+        if st.button("👁️ معاينة التعارضات", use_container_width=True, disabled=patient_id is None):
+            preview = crud.preview_appointment_series(**rule)
+            conflicts = preview['conflict'].notna().sum()
+            st.dataframe(preview, use_container_width=True, hide_index=True)
+            if conflicts:
+                st.warning(f"⚠️ {conflicts} موعد متعارض سيتم تخطيه")
+    with col2:
+        if st.button("حجز السلسلة", type="primary", use_container_width=True, disabled=patient_id is None):
+            try:
+                result = crud.create_appointment_series(notes=notes, total_cost=total_cost, **rule)
+                st.success(f"✅ تم حجز {result['created']} موعد في السلسلة #{result['series_id']}")
+                if result['conflicts']:
+                    st.warning("تم تخطي: " + "، ".join(f"{day} ({reason})" for day, reason in result['conflicts']))
+            except Exception as e:
+                st.error(f"حدث خطأ: {str(e)}")
+    
+    st.markdown("---")
+    st.markdown("#### السلاسل الحالية")
+    
+    series = crud.get_appointment_series()
+    if series.empty:
+        st.info("لا توجد سلاسل مواعيد")
+        return
+    
+    st.dataframe(series, use_container_width=True, hide_index=True)
+    
+    series_id = st.selectbox(
+        "اختر السلسلة",
+        series['id'].tolist(),
+        format_func=lambda x: f"#{x} - {series.loc[series['id'] == x, 'patient_name'].iloc[0]}",
+        key="series_selected"
+    )
+    
+    col1, col2, col3 = st.columns(3)
+    with col1:
+        new_time = st.time_input("الوقت الجديد", key="series_new_time")
+    with col2:
+        shift_days = st.number_input("إزاحة (أيام)", min_value=-30, max_value=30, value=0, key="series_shift")
+    with col3:
+        st.write("")
+        if st.button("🔄 نقل المواعيد القادمة", use_container_width=True):
+            try:
+                moved = crud.reschedule_series(series_id, new_time.strftime("%H:%M"), int(shift_days))
+                st.success(f"✅ تم نقل {moved} موعد")
+                st.rerun()
+            except Exception as e:
+                st.error(f"حدث خطأ: {str(e)}")
+    
+    if st.button("❌ إلغاء المواعيد القادمة في السلسلة"):
+        cancelled = crud.cancel_series(series_id)
+        st.success(f"✅ تم إلغاء {cancelled} موعد")
+        st.rerun()
 
 # ========================
 # صفحة المرضى
@@ -899,7 +611,7 @@ def render_appointments():
 def render_patients():
     st.markdown("### 👥 إدارة المرضى")
     
-    tab1, tab2, tab3 = st.tabs(["📋 جميع المرضى", "➕ مريض جديد", "📝 سجل مريض"])
+    tab1, tab2, tab3 = tracer.tabs(["📋 جميع المرضى", "➕ مريض جديد", "📝 سجل مريض"])
     
     with tab1:
         patients = crud.get_all_patients()
@@ -992,15 +704,23 @@ def render_patients():
 def render_doctors():
     st.markdown("### 👨‍⚕️ إدارة الأطباء")
     
-    tab1, tab2 = st.tabs(["📋 جميع الأطباء", "➕ طبيب جديد"])
+    tab1, tab2 = tracer.tabs(["📋 جميع الأطباء", "➕ طبيب جديد"])
     
     with tab1:
         doctors = crud.get_all_doctors()
         if not doctors.empty:
-            st.dataframe(
+            DataGrid.render(
+                'doctors',
                 doctors[['id', 'name', 'specialization', 'phone', 'email', 'salary', 'commission_rate']],
-                use_container_width=True,
-                hide_index=True
+                column_config={
+                    'id': st.column_config.NumberColumn('الرقم', disabled=True),
+                    'name': st.column_config.TextColumn('الاسم', required=True),
+                    'specialization': st.column_config.TextColumn('التخصص', required=True),
+                    'phone': st.column_config.TextColumn('الهاتف'),
+                    'email': st.column_config.TextColumn('البريد الإلكتروني'),
+                    'salary': st.column_config.NumberColumn('الراتب', min_value=0.0),
+                    'commission_rate': st.column_config.NumberColumn('العمولة %', min_value=0.0, max_value=100.0)
+                }
             )
         else:
             st.info("لا يوجد أطباء")
@@ -1043,7 +763,7 @@ def render_doctors():
 def render_treatments():
     st.markdown("### 💉 إدارة العلاجات")
     
-    tab1, tab2 = st.tabs(["📋 جميع العلاجات", "➕ علاج جديد"])
+    tab1, tab2, tab3 = tracer.tabs(["📋 جميع العلاجات", "➕ علاج جديد", "🧪 مكونات العلاج"])
     
     with tab1:
         treatments = crud.get_all_treatments()
@@ -1052,18 +772,19 @@ def render_treatments():
             display_cols = ['id', 'name', 'category', 'base_price', 'duration_minutes', 
                           'doctor_percentage', 'clinic_percentage']
             
-            st.dataframe(
-                treatments[display_cols].rename(columns={
-                    'id': 'الرقم',
-                    'name': 'الاسم',
-                    'category': 'الفئة',
-                    'base_price': 'السعر',
-                    'duration_minutes': 'المدة (دقيقة)',
-                    'doctor_percentage': 'نسبة الطبيب %',
-                    'clinic_percentage': 'نسبة العيادة %'
-                }),
-                use_container_width=True,
-                hide_index=True
+            DataGrid.render(
+                'treatments',
+                treatments[display_cols],
+                column_config={
+                    'id': st.column_config.NumberColumn('الرقم', disabled=True),
+                    'name': st.column_config.TextColumn('الاسم', required=True),
+                    'category': st.column_config.TextColumn('الفئة'),
+                    'base_price': st.column_config.NumberColumn('السعر', min_value=0.0),
+                    'duration_minutes': st.column_config.NumberColumn('المدة (دقيقة)', min_value=0),
+                    'doctor_percentage': st.column_config.NumberColumn('نسبة الطبيب %', min_value=0.0, max_value=100.0),
+                    # تُحسب من نسبة الطبيب عند الحفظ
+                    'clinic_percentage': st.column_config.NumberColumn('نسبة العيادة %', disabled=True)
+                }
             )
         else:
             st.info("لا توجد علاجات")
@@ -1124,6 +845,70 @@ def render_treatments():
                     st.error(f"حدث خطأ: {str(e)}")
             else:
                 st.warning("الرجاء ملء الحقول المطلوبة")
+    
+    with tab3:
+        render_treatment_materials()
+
+def render_treatment_materials():
+    """مكونات كل علاج من المخزون، تُصرف تلقائياً عند اكتمال الموعد"""
+    st.markdown("#### مكونات العلاج")
+    
+    treatments = crud.get_all_treatments()
+    inventory = crud.get_all_inventory()
+    if treatments.empty or inventory.empty:
+        st.info("يجب إضافة علاجات وأصناف مخزون أولاً")
+        return
+    
+    treatment_id = st.selectbox(
+        "العلاج",
+        treatments['id'].tolist(),
+        format_func=dict(zip(treatments['id'], treatments['name'])).get,
+        key="bom_treatment"
+    )
+    
+    item_names = dict(zip(inventory['id'], inventory['item_name']))
+    item_ids = {name: item_id for item_id, name in item_names.items()}
+    materials = crud.get_treatment_materials(treatment_id)
+    
+    edited = st.data_editor(
+        pd.DataFrame({
+            'الصنف': materials['inventory_id'].map(item_names),
+            'الكمية': materials['quantity']
+        }),
+        column_config={
+            'الصنف': st.column_config.SelectboxColumn('الصنف', options=list(item_ids), required=True),
+            'الكمية': st.column_config.NumberColumn('الكمية', min_value=1, step=1, required=True)
+        },
+        num_rows="dynamic",
+        use_container_width=True,
+        hide_index=True,
+        key=f"bom_editor_{treatment_id}"
+    )
+    
+    if st.button("💾 حفظ المكونات", type="primary"):
+        rows = edited.dropna()
+        crud.set_treatment_materials(
+            treatment_id,
+            list(zip(rows['الصنف'].map(item_ids), rows['الكمية']))
+        )
+        st.success("✅ تم حفظ مكونات العلاج")
+        st.rerun()
+    
+    st.markdown("---")
+    st.markdown("#### إعادة حساب استخدام المواد للمواعيد السابقة")
+    st.caption("يسجل استخدام المواد للمواعيد المكتملة حسب المكونات الحالية، دون الصرف من الرصيد الحالي")
+    
+    col1, col2, col3 = st.columns(3)
+    with col1:
+        backfill_start = st.date_input("من تاريخ", value=date.today() - timedelta(days=90), key="bom_backfill_start")
+    with col2:
+        backfill_end = st.date_input("إلى تاريخ", value=date.today(), key="bom_backfill_end")
+    with col3:
+        replace = st.checkbox("استبدال السجلات المحسوبة سابقاً", key="bom_backfill_replace")
+    
+    if st.button("🔄 إعادة الحساب"):
+        inserted = crud.backfill_treatment_usage(backfill_start, backfill_end, replace=replace)
+        st.success(f"✅ تم تسجيل {inserted} استخدام")
 
 # ========================
 # صفحة المدفوعات
@@ -1131,7 +916,7 @@ def render_treatments():
 def render_payments():
     st.markdown("### 💰 إدارة المدفوعات")
     
-    tab1, tab2, tab3 = st.tabs(["📋 جميع المدفوعات", "➕ دفعة جديدة", "📊 أرباح الأطباء"])
+    tab1, tab2, tab3 = tracer.tabs(["📋 جميع المدفوعات", "➕ دفعة جديدة", "📊 أرباح الأطباء"])
     
     with tab1:
         payments = crud.get_all_payments()
@@ -1151,7 +936,7 @@ def render_payments():
                 'طريقة الدفع', 'التاريخ', 'الحالة'
             ]
             
-            st.dataframe(display_df, use_container_width=True, hide_index=True)
+            st.dataframe(display_df, column_config=date_column_config(display_df), use_container_width=True, hide_index=True)
             
             # الإحصائيات
             col1, col2, col3 = st.columns(3)
@@ -1172,16 +957,18 @@ def render_payments():
     with tab2:
         st.markdown("#### إضافة دفعة جديدة")
         
-        patients = crud.get_all_patients()
-        appointments = crud.get_all_appointments()
+        patient_id = PatientSelector.render(key="payment_patient")
         
-        if not patients.empty:
-            # اختيار الموعد أولاً (اختياري)
+        if patient_id is not None:
+            # مواعيد المريض المختار غير المسددة فقط، بدلاً من كل مواعيد العيادة
+            appointments = crud.get_open_appointments(patient_id)
+            open_appointments = appointments.set_index('id')
             appointment_id = st.selectbox(
                 "الموعد (اختياري)",
-                [None] + appointments['id'].tolist() if not appointments.empty else [None],
-                format_func=lambda x: "دفعة بدون موعد" if x is None else 
-                    f"موعد #{x} - {appointments[appointments['id']==x]['patient_name'].iloc[0]} - {appointments[appointments['id']==x]['treatment_name'].iloc[0]}"
+                [None] + appointments['id'].tolist(),
+                format_func=lambda x: "دفعة بدون موعد" if x is None else
+                    f"موعد #{x} - {open_appointments.at[x, 'appointment_date']} - {open_appointments.at[x, 'treatment_name']} "
+                    f"(المتبقي {open_appointments.at[x, 'remaining']:,.2f} ج.م)"
             )
             
             col1, col2 = st.columns(2)
@@ -1189,27 +976,14 @@ def render_payments():
             with col1:
                 # إذا تم اختيار موعد، املأ البيانات تلقائياً
                 if appointment_id:
-                    appointment_data = appointments[appointments['id'] == appointment_id].iloc[0]
-                    patient_name = appointment_data['patient_name']
-                    amount = st.number_input("المبلغ (ج.م)*", value=float(appointment_data['total_cost']), min_value=0.0, step=10.0)
+                    appointment_data = open_appointments.loc[appointment_id]
+                    amount = st.number_input("المبلغ (ج.م)*", value=float(appointment_data['remaining']), min_value=0.0, step=10.0)
                     
-                    st.info(f"المريض: {patient_name}")
+                    st.info(f"الطبيب: {appointment_data['doctor_name']} - مدفوع {appointment_data['paid']:,.2f} من {appointment_data['total_cost']:,.2f} ج.م")
                     
-                    # جلب نسب التقسيم من العلاج
-                    treatments = crud.get_all_treatments()
-                    if not treatments.empty:
-                        treatment_name = appointment_data['treatment_name']
-                        treatment_info = treatments[treatments['name'] == treatment_name]
-                        
-                        if not treatment_info.empty:
-                            doctor_pct = treatment_info['doctor_percentage'].iloc[0]
-                            clinic_pct = treatment_info['clinic_percentage'].iloc[0]
-                        else:
-                            doctor_pct = 50.0
-                            clinic_pct = 50.0
-                    else:
-                        doctor_pct = 50.0
-                        clinic_pct = 50.0
+                    # نسب التقسيم من العلاج
+                    doctor_pct = appointment_data['doctor_percentage']
+                    clinic_pct = appointment_data['clinic_percentage']
                     
                     # عرض التقسيم المتوقع
                     st.markdown("---")
@@ -1222,15 +996,7 @@ def render_payments():
                     with col_b:
                         clinic_share = (amount * clinic_pct) / 100
                         st.info(f"🏥 العيادة ({clinic_pct}%): **{clinic_share:,.2f} ج.م**")
-                    
-                    # إيجاد patient_id الحقيقي
-                    patient_id = patients[patients['name'] == patient_name]['id'].iloc[0]
                 else:
-                    patient_id = st.selectbox(
-                        "المريض*",
-                        patients['id'].tolist(),
-                        format_func=lambda x: patients[patients['id'] == x]['name'].iloc[0]
-                    )
                     amount = st.number_input("المبلغ (ج.م)*", min_value=0.0, step=10.0)
                     
                     st.warning("⚠️ دفعة بدون موعد - ستذهب 100% للعيادة")
@@ -1255,54 +1021,10 @@ def render_payments():
                         st.error(f"حدث خطأ: {str(e)}")
                 else:
                     st.warning("الرجاء إدخال مبلغ صحيح")
-        else:
-            st.warning("يجب إضافة مرضى أولاً")
     
     with tab3:
-        st.markdown("#### 💼 أرباح الأطباء")
-        
-        col1, col2 = st.columns(2)
-        with col1:
-            start_date = st.date_input("من تاريخ", value=date.today() - timedelta(days=30), key="doc_earnings_start")
-        with col2:
-            end_date = st.date_input("إلى تاريخ", value=date.today(), key="doc_earnings_end")
-        
-        doctors = crud.get_all_doctors()
-        
-        if not doctors.empty:
-            earnings_data = []
-            
-            for _, doctor in doctors.iterrows():
-                earnings = crud.get_doctor_earnings(
-                    doctor['id'], 
-                    start_date.isoformat(), 
-                    end_date.isoformat()
-                )
-                
-                if not earnings.empty and earnings.iloc[0]['total_earnings'] is not None:
-                    earnings_data.append({
-                        'الطبيب': doctor['name'],
-                        'التخصص': doctor['specialization'],
-                        'عدد المدفوعات': int(earnings.iloc[0]['payment_count'] or 0),
-                        'إجمالي الأرباح': float(earnings.iloc[0]['total_earnings'] or 0),
-                        'متوسط النسبة': float(earnings.iloc[0]['avg_percentage'] or 0)
-                    })
-            
-            if earnings_data:
-                earnings_df = pd.DataFrame(earnings_data)
-                st.dataframe(earnings_df, use_container_width=True, hide_index=True)
-                
-                # رسم بياني
-                fig = px.bar(
-                    earnings_df,
-                    x='الطبيب',
-                    y='إجمالي الأرباح',
-                    color='التخصص',
-                    title='أرباح الأطباء'
-                )
-                st.plotly_chart(fig, use_container_width=True)
-            else:
-                st.info("لا توجد بيانات للفترة المحددة")
+        # كل الأطباء في تجميع واحد (payments.py)
+        render_doctor_earnings()
 
 # سأكمل في الرسالة التالية...
 # ========================
@@ -1311,16 +1033,27 @@ def render_payments():
 def render_inventory():
     st.markdown("### 📦 إدارة المخزون")
     
-    tab1, tab2, tab3, tab4 = st.tabs(["📋 جميع العناصر", "➕ عنصر جديد", "⚠️ مخزون منخفض", "📅 قريب الانتهاء"])
+    tab1, tab2, tab3, tab4, tab5 = tracer.tabs(["📋 جميع العناصر", "➕ عنصر جديد", "⚠️ مخزون منخفض", "📅 قريب الانتهاء", "📥 الدفعات"])
     
     with tab1:
         inventory = crud.get_all_inventory()
         if not inventory.empty:
-            st.dataframe(
+            # الكمية وتاريخ الانتهاء من الدفعات، فلا تُعدل من الجدول
+            DataGrid.render(
+                'inventory',
                 inventory[['id', 'item_name', 'category', 'quantity', 'unit_price', 
                           'min_stock_level', 'supplier_name', 'expiry_date', 'location']],
-                use_container_width=True,
-                hide_index=True
+                column_config={
+                    'id': st.column_config.NumberColumn('الرقم', disabled=True),
+                    'item_name': st.column_config.TextColumn('الصنف', required=True),
+                    'category': st.column_config.TextColumn('التصنيف'),
+                    'quantity': st.column_config.NumberColumn('الكمية', disabled=True),
+                    'unit_price': st.column_config.NumberColumn('سعر الوحدة', min_value=0.0),
+                    'min_stock_level': st.column_config.NumberColumn('الحد الأدنى', min_value=0),
+                    'supplier_name': st.column_config.TextColumn('المورد', disabled=True),
+                    'expiry_date': st.column_config.TextColumn('تاريخ الانتهاء', disabled=True),
+                    'location': st.column_config.TextColumn('الموقع')
+                }
             )
             
             # إحصائيات
@@ -1329,7 +1062,7 @@ def render_inventory():
                 total_items = len(inventory)
                 st.metric("إجمالي الأصناف", total_items)
             with col2:
-                total_value = (inventory['quantity'] * inventory['unit_price']).sum()
+                total_value = inventory['stock_value'].sum()
                 st.metric("قيمة المخزون", f"{total_value:,.0f} ج.م")
             with col3:
                 low_stock_count = len(inventory[inventory['quantity'] <= inventory['min_stock_level']])
@@ -1409,6 +1142,7 @@ def render_inventory():
                 expiring.rename(columns={
                     'item_name': 'الصنف',
                     'category': 'الفئة',
+                    'lot_number': 'الدفعة',
                     'quantity': 'الكمية',
                     'expiry_date': 'تاريخ الانتهاء',
                     'supplier_name': 'المورد',
@@ -1419,6 +1153,67 @@ def render_inventory():
             )
         else:
             st.success("✅ لا توجد أصناف قريبة من الانتهاء")
+    
+    with tab5:
+        st.markdown("#### استلام دفعة")
+        
+        inventory = crud.get_all_inventory()
+        if inventory.empty:
+            st.info("لا توجد عناصر في المخزون")
+        else:
+            suppliers = crud.get_all_suppliers()
+            col1, col2 = st.columns(2)
+            
+            with col1:
+                lot_item_id = st.selectbox(
+                    "الصنف*",
+                    inventory['id'].tolist(),
+                    format_func=dict(zip(inventory['id'], inventory['item_name'])).get,
+                    key="lot_item"
+                )
+                lot_quantity = st.number_input("الكمية*", min_value=1, step=1, key="lot_quantity")
+                lot_cost = st.number_input("تكلفة الوحدة (ج.م)", min_value=0.0, step=1.0, key="lot_cost")
+            
+            with col2:
+                lot_number = st.text_input("رقم الدفعة", placeholder="اختياري", key="lot_number")
+                lot_expiry = st.date_input("تاريخ انتهاء الصلاحية", value=None, min_value=date.today(), key="lot_expiry")
+                lot_supplier = st.selectbox(
+                    "المورد",
+                    [None] + suppliers['id'].tolist(),
+                    format_func=lambda x: "بدون مورد" if x is None else dict(zip(suppliers['id'], suppliers['name']))[x],
+                    key="lot_supplier"
+                )
+            
+            if st.button("استلام الدفعة", type="primary", use_container_width=True):
+                try:
+                    crud.receive_inventory_lot(
+                        lot_item_id, int(lot_quantity), lot_cost,
+                        lot_expiry.isoformat() if lot_expiry else None,
+                        lot_number or None, supplier_id=lot_supplier
+                    )
+                    st.success("✅ تم استلام الدفعة")
+                    st.rerun()
+                except Exception as e:
+                    st.error(f"حدث خطأ: {str(e)}")
+            
+            st.markdown("#### الدفعات المتبقية")
+            lots = crud.get_inventory_lots()
+            if not lots.empty:
+                st.dataframe(
+                    lots.rename(columns={
+                        'item_name': 'الصنف',
+                        'lot_number': 'الدفعة',
+                        'quantity_received': 'المستلم',
+                        'quantity_remaining': 'المتبقي',
+                        'unit_cost': 'تكلفة الوحدة',
+                        'lot_value': 'القيمة',
+                        'expiry_date': 'تاريخ الانتهاء',
+                        'received_date': 'تاريخ الاستلام',
+                        'supplier_name': 'المورد'
+                    }),
+                    use_container_width=True,
+                    hide_index=True
+                )
 
 # ========================
 # صفحة الموردين
@@ -1426,15 +1221,22 @@ def render_inventory():
 def render_suppliers():
     st.markdown("### 🏪 إدارة الموردين")
     
-    tab1, tab2 = st.tabs(["📋 جميع الموردين", "➕ مورد جديد"])
+    tab1, tab2 = tracer.tabs(["📋 جميع الموردين", "➕ مورد جديد"])
     
     with tab1:
         suppliers = crud.get_all_suppliers()
         if not suppliers.empty:
-            st.dataframe(
+            DataGrid.render(
+                'suppliers',
                 suppliers[['id', 'name', 'contact_person', 'phone', 'email', 'payment_terms']],
-                use_container_width=True,
-                hide_index=True
+                column_config={
+                    'id': st.column_config.NumberColumn('الرقم', disabled=True),
+                    'name': st.column_config.TextColumn('اسم الشركة', required=True),
+                    'contact_person': st.column_config.TextColumn('الشخص المسؤول'),
+                    'phone': st.column_config.TextColumn('الهاتف'),
+                    'email': st.column_config.TextColumn('البريد الإلكتروني'),
+                    'payment_terms': st.column_config.TextColumn('شروط الدفع')
+                }
             )
         else:
             st.info("لا يوجد موردين")
@@ -1472,7 +1274,7 @@ def render_suppliers():
 def render_expenses():
     st.markdown("### 💸 إدارة المصروفات")
     
-    tab1, tab2 = st.tabs(["📋 جميع المصروفات", "➕ مصروف جديد"])
+    tab1, tab2 = tracer.tabs(["📋 جميع المصروفات", "➕ مصروف جديد"])
     
     with tab1:
         expenses = crud.get_all_expenses()
@@ -1487,6 +1289,7 @@ def render_expenses():
             st.dataframe(
                 expenses[['id', 'category', 'description', 'amount', 'expense_date', 
                          'payment_method', 'receipt_number']],
+                column_config=date_column_config(expenses),
                 use_container_width=True,
                 hide_index=True
             )
@@ -1538,634 +1341,8 @@ def render_expenses():
 # صفحة التقارير المتقدمة
 # ========================
 def render_reports():
-    st.markdown("""
-        <div class='main-header'>
-            <h1>📊 التقارير والتحليلات المتقدمة</h1>
-            <p>تقارير شاملة عن أداء العيادة</p>
-        </div>
-    """, unsafe_allow_html=True)
-    
-    # اختيار الفترة الزمنية
-    col1, col2, col3 = st.columns([2, 2, 1])
-    
-    with col1:
-        start_date = st.date_input(
-            "📅 من تاريخ", 
-            value=date.today() - timedelta(days=30),
-            key="report_start"
-        )
-    
-    with col2:
-        end_date = st.date_input(
-            "📅 إلى تاريخ", 
-            value=date.today(),
-            key="report_end"
-        )
-    
-    with col3:
-        st.markdown("<br>", unsafe_allow_html=True)
-        period_type = st.selectbox(
-            "التجميع",
-            ["يومي", "شهري", "سنوي"],
-            key="period_type"
-        )
-    
-    # تحويل نوع الفترة
-    group_by_map = {"يومي": "day", "شهري": "month", "سنوي": "year"}
-    group_by = group_by_map[period_type]
-    
-    # التبويبات
-    tab1, tab2, tab3, tab4, tab5, tab6 = st.tabs([
-        "📈 التقرير المالي",
-        "👨‍⚕️ أداء الأطباء", 
-        "💉 العلاجات",
-        "👥 المرضى",
-        "📦 المخزون",
-        "📊 مؤشرات الأداء"
-    ])
-    
-    # ==================== التقرير المالي ====================
-    with tab1:
-        st.markdown("### 💰 الملخص المالي الشامل")
-        
-        # الملخص العام
-        financial_summary = crud.get_financial_summary(
-            start_date.isoformat(),
-            end_date.isoformat()
-        )
-        
-        col1, col2, col3, col4 = st.columns(4)
-        
-        with col1:
-            st.markdown(f"""
-                <div class='metric-card success'>
-                    <div class='metric-label'>💰 إجمالي الإيرادات</div>
-                    <div class='metric-value'>{financial_summary['total_revenue']:,.0f}</div>
-                    <div class='metric-label'>جنيه مصري</div>
-                </div>
-            """, unsafe_allow_html=True)
-        
-        with col2:
-            st.markdown(f"""
-                <div class='metric-card warning'>
-                    <div class='metric-label'>💸 إجمالي المصروفات</div>
-                    <div class='metric-value'>{financial_summary['total_expenses']:,.0f}</div>
-                    <div class='metric-label'>جنيه مصري</div>
-                </div>
-            """, unsafe_allow_html=True)
-        
-        with col3:
-            profit_color = "success" if financial_summary['net_profit'] > 0 else "warning"
-            st.markdown(f"""
-                <div class='metric-card {profit_color}'>
-                    <div class='metric-label'>📊 صافي الربح</div>
-                    <div class='metric-value'>{financial_summary['net_profit']:,.0f}</div>
-                    <div class='metric-label'>جنيه مصري</div>
-                </div>
-            """, unsafe_allow_html=True)
-        
-        with col4:
-            if financial_summary['total_revenue'] > 0:
-                profit_margin = (financial_summary['net_profit'] / financial_summary['total_revenue']) * 100
-            else:
-                profit_margin = 0
-            
-            st.markdown(f"""
-                <div class='metric-card info'>
-                    <div class='metric-label'>📈 هامش الربح</div>
-                    <div class='metric-value'>{profit_margin:.1f}%</div>
-                    <div class='metric-label'>من الإيرادات</div>
-                </div>
-            """, unsafe_allow_html=True)
-        
-        st.markdown("<br>", unsafe_allow_html=True)
-        
-        # الإيرادات حسب الفترة
-        col1, col2 = st.columns(2)
-        
-        with col1:
-            st.markdown(f"#### 📊 الإيرادات ({period_type})")
-            revenue_data = crud.get_revenue_by_period(
-                start_date.isoformat(),
-                end_date.isoformat(),
-                group_by
-            )
-            
-            if not revenue_data.empty:
-                fig = px.line(
-                    revenue_data,
-                    x='period',
-                    y='total_revenue',
-                    markers=True,
-                    labels={'period': 'الفترة', 'total_revenue': 'الإيرادات'}
-                )
-                fig.update_traces(line_color='#38ef7d', line_width=3)
-                fig.update_layout(height=300)
-                st.plotly_chart(fig, use_container_width=True)
-            else:
-                st.info("لا توجد بيانات للفترة المحددة")
-        
-        with col2:
-            st.markdown("#### 💸 المصروفات حسب الفئة")
-            expenses_data = crud.get_expenses_by_category(
-                start_date.isoformat(),
-                end_date.isoformat()
-            )
-            
-            if not expenses_data.empty:
-                fig = px.pie(
-                    expenses_data,
-                    values='total',
-                    names='category',
-                    hole=0.4,
-                    color_discrete_sequence=px.colors.qualitative.Set3
-                )
-                fig.update_layout(height=300)
-                st.plotly_chart(fig, use_container_width=True)
-            else:
-                st.info("لا توجد مصروفات للفترة المحددة")
-        
-        # طرق الدفع
-        st.markdown("#### 💳 طرق الدفع")
-        payment_methods = crud.get_payment_methods_stats(
-            start_date.isoformat(),
-            end_date.isoformat()
-        )
-        
-        if not payment_methods.empty:
-            col1, col2 = st.columns(2)
-            
-            with col1:
-                fig = px.bar(
-                    payment_methods,
-                    x='payment_method',
-                    y='total',
-                    color='payment_method',
-                    labels={'payment_method': 'طريقة الدفع', 'total': 'المبلغ الإجمالي'}
-                )
-                fig.update_layout(showlegend=False, height=300)
-                st.plotly_chart(fig, use_container_width=True)
-            
-            with col2:
-                st.dataframe(
-                    payment_methods.rename(columns={
-                        'payment_method': 'طريقة الدفع',
-                        'count': 'عدد المعاملات',
-                        'total': 'الإجمالي'
-                    }),
-                    use_container_width=True,
-                    hide_index=True
-                )
-        
-        # أرباح العيادة مقابل الأطباء
-        st.markdown("#### 💰 توزيع الأرباح بين العيادة والأطباء")
-        clinic_earnings = crud.get_clinic_earnings(
-            start_date.isoformat(),
-            end_date.isoformat()
-        )
-        
-        if not clinic_earnings.empty:
-            earnings_data = clinic_earnings.iloc[0]
-            
-            col1, col2, col3 = st.columns(3)
-            with col1:
-                st.metric("🏥 أرباح العيادة", f"{earnings_data['total_clinic_earnings']:,.2f} ج.م")
-            with col2:
-                st.metric("👨‍⚕️ أرباح الأطباء", f"{earnings_data['total_doctor_earnings']:,.2f} ج.م")
-            with col3:
-                clinic_percentage = (earnings_data['total_clinic_earnings'] / earnings_data['total_revenue'] * 100) if earnings_data['total_revenue'] > 0 else 0
-                st.metric("📊 نسبة العيادة", f"{clinic_percentage:.1f}%")
-            
-            # رسم بياني
-            distribution_data = pd.DataFrame({
-                'الفئة': ['أرباح العيادة', 'أرباح الأطباء'],
-                'المبلغ': [earnings_data['total_clinic_earnings'], earnings_data['total_doctor_earnings']]
-            })
-            
-            fig = px.pie(
-                distribution_data,
-                values='المبلغ',
-                names='الفئة',
-                hole=0.5,
-                color_discrete_map={'أرباح العيادة': '#4facfe', 'أرباح الأطباء': '#38ef7d'}
-            )
-            st.plotly_chart(fig, use_container_width=True)
-    
-    # ==================== أداء الأطباء ====================
-    with tab2:
-        st.markdown("### 👨‍⚕️ تقرير أداء الأطباء")
-        
-        doctor_performance = crud.get_doctor_performance(
-            start_date.isoformat(),
-            end_date.isoformat()
-        )
-        
-        if not doctor_performance.empty:
-            # عرض الجدول
-            st.dataframe(
-                doctor_performance.rename(columns={
-                    'doctor_name': 'الطبيب',
-                    'specialization': 'التخصص',
-                    'total_appointments': 'إجمالي المواعيد',
-                    'completed_appointments': 'المواعيد المكتملة',
-                    'total_revenue': 'الإيرادات',
-                    'avg_revenue_per_appointment': 'متوسط الإيراد',
-                    'commission_rate': 'نسبة العمولة %',
-                    'total_commission': 'إجمالي العمولة'
-                }).round(2),
-                use_container_width=True,
-                hide_index=True
-            )
-            
-            # رسوم بيانية
-            col1, col2 = st.columns(2)
-            
-            with col1:
-                st.markdown("#### 📊 الإيرادات حسب الطبيب")
-                fig = px.bar(
-                    doctor_performance,
-                    x='doctor_name',
-                    y='total_revenue',
-                    color='doctor_name',
-                    labels={'doctor_name': 'الطبيب', 'total_revenue': 'الإيرادات'}
-                )
-                fig.update_layout(showlegend=False)
-                st.plotly_chart(fig, use_container_width=True)
-            
-            with col2:
-                st.markdown("#### 📈 معدل إتمام المواعيد")
-                doctor_performance['completion_rate'] = (
-                    doctor_performance['completed_appointments'] / 
-                    doctor_performance['total_appointments'] * 100
-                ).round(2)
-                
-                fig = px.bar(
-                    doctor_performance,
-                    x='doctor_name',
-                    y='completion_rate',
-                    color='completion_rate',
-                    color_continuous_scale='Greens',
-                    labels={'doctor_name': 'الطبيب', 'completion_rate': 'معدل الإتمام %'}
-                )
-                fig.update_layout(showlegend=False)
-                st.plotly_chart(fig, use_container_width=True)
-        else:
-            st.info("لا توجد بيانات للفترة المحددة")
-    
-    # ==================== تقرير العلاجات ====================
-    with tab3:
-        st.markdown("### 💉 تقرير العلاجات الأكثر طلباً")
-        
-        treatment_stats = crud.get_treatment_popularity(
-            start_date.isoformat(),
-            end_date.isoformat()
-        )
-        
-        if not treatment_stats.empty:
-            col1, col2 = st.columns(2)
-            
-            with col1:
-                st.markdown("#### 🏆 أكثر العلاجات حجزاً")
-                fig = px.pie(
-                    treatment_stats.head(10),
-                    values='booking_count',
-                    names='treatment_name',
-                    color_discrete_sequence=px.colors.qualitative.Set2
-                )
-                st.plotly_chart(fig, use_container_width=True)
-            
-            with col2:
-                st.markdown("#### 💰 أعلى العلاجات إيراداً")
-                fig = px.bar(
-                    treatment_stats.head(10),
-                    x='treatment_name',
-                    y='total_revenue',
-                    color='category',
-                    labels={'treatment_name': 'العلاج', 'total_revenue': 'الإيرادات'}
-                )
-                st.plotly_chart(fig, use_container_width=True)
-            
-            # الجدول التفصيلي
-            st.markdown("#### 📋 جدول العلاجات التفصيلي")
-            st.dataframe(
-                treatment_stats.rename(columns={
-                    'treatment_name': 'العلاج',
-                    'category': 'الفئة',
-                    'booking_count': 'عدد الحجوزات',
-                    'total_revenue': 'الإيرادات',
-                    'avg_price': 'متوسط السعر'
-                }).round(2),
-                use_container_width=True,
-                hide_index=True
-            )
-        else:
-            st.info("لا توجد بيانات للفترة المحددة")
-    
-    # ==================== تقرير المرضى ====================
-    with tab4:
-        st.markdown("### 👥 تحليلات المرضى")
-        
-        # إحصائيات المرضى
-        patient_stats = crud.get_patient_statistics()
-        
-        col1, col2 = st.columns(2)
-        
-        with col1:
-            st.markdown("#### 👤 توزيع المرضى حسب الجنس")
-            if not patient_stats['gender'].empty:
-                fig = px.pie(
-                    patient_stats['gender'],
-                    values='count',
-                    names='gender',
-                    color_discrete_map={'ذكر': '#4facfe', 'أنثى': '#f093fb'}
-                )
-                st.plotly_chart(fig, use_container_width=True)
-        
-        with col2:
-            st.markdown("#### 📊 توزيع المرضى حسب الفئة العمرية")
-            if not patient_stats['age'].empty:
-                fig = px.bar(
-                    patient_stats['age'],
-                    x='age_group',
-                    y='count',
-                    color='age_group',
-                    labels={'age_group': 'الفئة العمرية', 'count': 'العدد'}
-                )
-                fig.update_layout(showlegend=False)
-                st.plotly_chart(fig, use_container_width=True)
-        
-        # أكثر المرضى زيارة
-        st.markdown("#### 🏆 أكثر المرضى زيارة")
-        top_patients = crud.get_top_patients(
-            start_date.isoformat(),
-            end_date.isoformat(),
-            limit=10
-        )
-        
-        if not top_patients.empty:
-            st.dataframe(
-                top_patients.rename(columns={
-                    'patient_name': 'المريض',
-                    'phone': 'الهاتف',
-                    'visit_count': 'عدد الزيارات',
-                    'total_spent': 'إجمالي الإنفاق',
-                    'last_visit': 'آخر زيارة'
-                }).round(2),
-                use_container_width=True,
-                hide_index=True
-            )
-        else:
-            st.info("لا توجد بيانات")
-        
-        # حالة المواعيد
-        st.markdown("#### 📅 توزيع حالات المواعيد")
-        appointment_status = crud.get_appointment_status_stats(
-            start_date.isoformat(),
-            end_date.isoformat()
-        )
-        
-        if not appointment_status.empty:
-            col1, col2 = st.columns(2)
-            
-            with col1:
-                fig = px.pie(
-                    appointment_status,
-                    values='count',
-                    names='status',
-                    hole=0.4
-                )
-                st.plotly_chart(fig, use_container_width=True)
-            
-            with col2:
-                st.dataframe(
-                    appointment_status.rename(columns={
-                        'status': 'الحالة',
-                        'count': 'العدد',
-                        'total_revenue': 'الإيرادات'
-                    }),
-                    use_container_width=True,
-                    hide_index=True
-                )
-    
-    # ==================== تقرير المخزون ====================
-    with tab5:
-        st.markdown("### 📦 تقرير المخزون")
-        
-        # قيمة المخزون
-        inventory_value = crud.get_inventory_value()
-        
-        if not inventory_value.empty:
-            col1, col2 = st.columns(2)
-            
-            with col1:
-                st.markdown("#### 💰 قيمة المخزون حسب الفئة")
-                fig = px.bar(
-                    inventory_value,
-                    x='category',
-                    y='total_value',
-                    color='category',
-                    labels={'category': 'الفئة', 'total_value': 'القيمة الإجمالية'}
-                )
-                fig.update_layout(showlegend=False)
-                st.plotly_chart(fig, use_container_width=True)
-            
-            with col2:
-                st.markdown("#### 📊 توزيع الكميات")
-                fig = px.pie(
-                    inventory_value,
-                    values='total_quantity',
-                    names='category',
-                    hole=0.4
-                )
-                st.plotly_chart(fig, use_container_width=True)
-            
-            # الجدول التفصيلي
-            total_value = inventory_value['total_value'].sum()
-            st.success(f"💰 إجمالي قيمة المخزون: {total_value:,.2f} جنيه")
-            
-            st.dataframe(
-                inventory_value.rename(columns={
-                    'category': 'الفئة',
-                    'total_value': 'القيمة الإجمالية',
-                    'total_quantity': 'إجمالي الكمية',
-                    'item_count': 'عدد الأصناف'
-                }),
-                use_container_width=True,
-                hide_index=True
-            )
-        
-        # المخزون المنخفض
-        st.markdown("#### ⚠️ تنبيهات المخزون المنخفض")
-        low_stock = crud.get_low_stock_items()
-        
-        if not low_stock.empty:
-            st.warning(f"يوجد {len(low_stock)} عنصر بمخزون منخفض")
-            st.dataframe(
-                low_stock[['item_name', 'category', 'quantity', 'min_stock_level']].rename(columns={
-                    'item_name': 'الصنف',
-                    'category': 'الفئة',
-                    'quantity': 'الكمية الحالية',
-                    'min_stock_level': 'الحد الأدنى'
-                }),
-                use_container_width=True,
-                hide_index=True
-            )
-        else:
-            st.success("✅ جميع الأصناف في المستوى الآمن")
-        
-        # المخزون قريب الانتهاء
-        st.markdown("#### 📅 أصناف قريبة من انتهاء الصلاحية")
-        expiring = crud.get_expiring_inventory(days=60)
-        
-        if not expiring.empty:
-            st.warning(f"يوجد {len(expiring)} صنف ينتهي خلال 60 يوم")
-            st.dataframe(
-                expiring.rename(columns={
-                    'item_name': 'الصنف',
-                    'category': 'الفئة',
-                    'quantity': 'الكمية',
-                    'expiry_date': 'تاريخ الانتهاء',
-                    'supplier_name': 'المورد',
-                    'days_to_expire': 'الأيام المتبقية'
-                }),
-                use_container_width=True,
-                hide_index=True
-            )
-        else:
-            st.success("✅ لا توجد أصناف قريبة من الانتهاء")
-    
-    # ==================== مؤشرات الأداء ====================
-    with tab6:
-        st.markdown("### 📊 مؤشرات الأداء الرئيسية (KPIs)")
-        
-        # الإيرادات اليومية
-        st.markdown("#### 📈 مقارنة الإيرادات اليومية (آخر 30 يوم)")
-        daily_revenue = crud.get_daily_revenue_comparison(days=30)
-        
-        if not daily_revenue.empty:
-            fig = go.Figure()
-            
-            fig.add_trace(go.Scatter(
-                x=daily_revenue['payment_date'],
-                y=daily_revenue['daily_revenue'],
-                mode='lines+markers',
-                name='الإيرادات اليومية',
-                line=dict(color='#38ef7d', width=3),
-                fill='tozeroy'
-            ))
-            
-            fig.update_layout(
-                xaxis_title='التاريخ',
-                yaxis_title='الإيرادات (جنيه)',
-                height=400,
-                hovermode='x unified'
-            )
-            
-            st.plotly_chart(fig, use_container_width=True)
-            
-            # الإحصائيات
-            col1, col2, col3, col4 = st.columns(4)
-            
-            avg_daily = daily_revenue['daily_revenue'].mean()
-            max_daily = daily_revenue['daily_revenue'].max()
-            min_daily = daily_revenue['daily_revenue'].min()
-            total_days = len(daily_revenue)
-            
-            with col1:
-                st.metric("📊 متوسط الإيراد اليومي", f"{avg_daily:,.0f} ج.م")
-            
-            with col2:
-                st.metric("🔝 أعلى إيراد يومي", f"{max_daily:,.0f} ج.م")
-            
-            with col3:
-                st.metric("🔽 أقل إيراد يومي", f"{min_daily:,.0f} ج.م")
-            
-            with col4:
-                st.metric("📅 عدد أيام العمل", f"{total_days} يوم")
-        
-        # المقارنة الشهرية
-        st.markdown("#### 📅 المقارنة الشهرية (آخر 6 شهور)")
-        monthly_comparison = crud.get_monthly_comparison(months=6)
-        
-        if not monthly_comparison.empty:
-            fig = go.Figure()
-            
-            fig.add_trace(go.Bar(
-                x=monthly_comparison['month'],
-                y=monthly_comparison['revenue'],
-                name='الإيرادات',
-                marker_color='#38ef7d'
-            ))
-            
-            fig.add_trace(go.Bar(
-                x=monthly_comparison['month'],
-                y=monthly_comparison['expenses'],
-                name='المصروفات',
-                marker_color='#f5576c'
-            ))
-            
-            fig.add_trace(go.Scatter(
-                x=monthly_comparison['month'],
-                y=monthly_comparison['profit'],
-                name='صافي الربح',
-                line=dict(color='#4facfe', width=3),
-                mode='lines+markers'
-            ))
-            
-            fig.update_layout(
-                barmode='group',
-                xaxis_title='الشهر',
-                yaxis_title='المبلغ (جنيه)',
-                height=400,
-                legend=dict(orientation="h", yanchor="bottom", y=1.02, xanchor="right", x=1)
-            )
-            
-            st.plotly_chart(fig, use_container_width=True)
-        
-        # مؤشرات إضافية
-        st.markdown("---")
-        st.markdown("#### 🎯 مؤشرات الأداء الإضافية")
-        
-        col1, col2, col3 = st.columns(3)
-        
-        # معدل إشغال المواعيد
-        all_appointments = crud.get_all_appointments()
-        if not all_appointments.empty:
-            total_apps = len(all_appointments)
-            completed_apps = len(all_appointments[all_appointments['status'] == 'مكتمل'])
-            completion_rate = (completed_apps / total_apps * 100) if total_apps > 0 else 0
-            
-            with col1:
-                st.metric(
-                    "✅ معدل إتمام المواعيد",
-                    f"{completion_rate:.1f}%",
-                    delta=f"{completed_apps}/{total_apps}"
-                )
-        
-        # متوسط قيمة الموعد
-        if not all_appointments.empty and all_appointments['total_cost'].sum() > 0:
-            avg_appointment_value = all_appointments['total_cost'].mean()
-            
-            with col2:
-                st.metric(
-                    "💰 متوسط قيمة الموعد",
-                    f"{avg_appointment_value:,.0f} ج.م"
-                )
-        
-        # عدد المرضى الجدد
-        patients = crud.get_all_patients()
-        if not patients.empty:
-            recent_patients = len(patients[
-                pd.to_datetime(patients['created_at']) >= 
-                pd.to_datetime(start_date)
-            ])
-            
-            with col3:
-                st.metric(
-                    "👥 مرضى جدد",
-                    f"{recent_patients} مريض",
-                    delta="في الفترة المحددة"
-                )
+    # الأقسام تُحسب عند عرضها فقط وتُعاد بشكل مستقل (reports.py)
+    reports.render()
 
 # ========================
 # صفحة الإعدادات
@@ -2173,7 +1350,7 @@ def render_reports():
 def render_settings():
     st.markdown("### ⚙️ إعدادات النظام")
     
-    tab1, tab2 = st.tabs(["🏥 معلومات العيادة", "💾 النسخ الاحتياطي"])
+    tab1, tab2, tab3, tab4 = tracer.tabs(["🏥 معلومات العيادة", "💾 النسخ الاحتياطي", "🎨 المظهر", "⏰ المهام المجدولة"])
     
     with tab1:
         st.markdown("#### معلومات العيادة")
@@ -2251,6 +1428,139 @@ def render_settings():
             - احفظ النسخة الاحتياطية في مكان آمن
             - يُنصح بإنشاء نسخ احتياطية دورية
             """)
+        
+        st.markdown("---")
+        st.markdown("#### 🛠️ التصدير والصيانة")
+        st.caption("تعمل في الخلفية - تابع تقدمها ونزّل نتائجها من لوحة مهامي في الشريط الجانبي")
+        
+        col1, col2, col3 = st.columns(3)
+        
+        with col1:
+            if st.button("📗 تصدير كامل إلى Excel", use_container_width=True, key="job_full_export"):
+                JobsPanel.submit('full_export')
+        
+        with col2:
+            if st.button("🔍 تقرير سلامة البيانات", use_container_width=True, key="job_validation"):
+                JobsPanel.submit('validation_report', {'mode': 'full'}, key='validation_job')
+        
+        with col3:
+            if st.button("🔧 الترقية الكاملة", use_container_width=True, key="job_migration"):
+                JobsPanel.submit('full_migration', key='migration_job')
+        
+        validation = JobsPanel.track('validation_job')
+        if validation is not None:
+            summary = validation['summary']
+            col1, col2, col3, col4 = st.columns(4)
+            col1.metric("إجمالي المشاكل", summary['total_issues'])
+            col2.metric("عالية", summary['high_severity'])
+            col3.metric("متوسطة", summary['medium_severity'])
+            col4.metric("منخفضة", summary['low_severity'])
+            for issues in (validation['foreign_key_issues'], validation['data_consistency_issues']):
+                if not issues.empty:
+                    st.dataframe(issues, use_container_width=True, hide_index=True)
+        
+        migrated = JobsPanel.track('migration_job')
+        if migrated is not None:
+            if migrated:
+                st.success("✅ تمت الترقية بنجاح")
+            else:
+                st.warning("⚠️ تمت الترقية جزئياً - راجع تقرير سلامة البيانات")
+    
+    with tab3:
+        st.markdown("#### 🎨 مظهر الواجهة")
+        
+        theme = styles.load_theme()
+        
+        col1, col2 = st.columns(2)
+        
+        with col1:
+            primary_color = st.color_picker("اللون الأساسي", value=theme['theme_primary_color'])
+            primary_dark = st.color_picker("اللون الأساسي الداكن", value=theme['theme_primary_dark'])
+            font_family = st.text_input("الخط", value=theme['theme_font_family'])
+        
+        with col2:
+            sidebar_start = st.color_picker("بداية تدرج الشريط الجانبي", value=theme['theme_sidebar_start'])
+            sidebar_end = st.color_picker("نهاية تدرج الشريط الجانبي", value=theme['theme_sidebar_end'])
+            font_size = st.text_input("حجم الخط الأساسي", value=theme['theme_font_size'])
+        
+        css_delivery = st.radio(
+            "طريقة تحميل الأنماط",
+            ["static", "inline"],
+            index=0 if theme['theme_css_delivery'] == 'static' else 1,
+            format_func=lambda x: "ملف ثابت مخزن في المتصفح" if x == 'static' else "مضمنة في الصفحة",
+            horizontal=True
+        )
+        
+        if st.button("💾 حفظ المظهر", type="primary"):
+            crud.update_setting('theme_primary_color', primary_color)
+            crud.update_setting('theme_primary_dark', primary_dark)
+            crud.update_setting('theme_sidebar_start', sidebar_start)
+            crud.update_setting('theme_sidebar_end', sidebar_end)
+            crud.update_setting('theme_font_family', font_family)
+            crud.update_setting('theme_font_size', font_size)
+            crud.update_setting('theme_css_delivery', css_delivery)
+            styles.reload_theme()
+            st.success("✅ تم حفظ المظهر")
+            st.rerun()
+
+    with tab4:
+        st.markdown("#### ⏰ المهام المجدولة")
+        st.caption("تعمل يومياً في موعدها (بتوقيت الخادم). اترك الموعد فارغاً لتعطيل المهمة. "
+                   "المهمة الفائتة تُشغل خلال ست ساعات من موعدها فقط.")
+
+        if scheduler.last_error:
+            st.error(f"❌ آخر خطأ في المجدول: {scheduler.last_error}")
+
+        enabled = st.checkbox(
+            "تشغيل المهام المجدولة",
+            value=crud.get_setting('scheduler_enabled') != '0',
+            key="scheduler_enabled"
+        )
+
+        tasks = crud.get_scheduled_tasks()
+        times = {}
+        for _, task in tasks.iterrows():
+            col1, col2, col3, col4 = st.columns([2, 1, 2, 1])
+            col1.markdown(f"**{task['title']}**")
+            times[task['setting']] = col2.text_input(
+                "الموعد", value=task['time'], placeholder="HH:MM",
+                key=f"schedule_{task['task']}", label_visibility="collapsed"
+            ).strip()
+            if task['last_run']:
+                icon = {'done': '✅', 'failed': '❌'}.get(task['last_status'], '🔄')
+                duration = f" • {task['last_duration_ms'] / 1000:.1f} ث" if pd.notna(task['last_duration_ms']) else ""
+                col3.caption(f"{icon} {task['last_run']}{duration}")
+            else:
+                col3.caption("لم تُشغل بعد")
+            if col4.button("▶️ الآن", key=f"run_task_{task['task']}"):
+                JobsPanel.submit('scheduled_task', {'task': task['task']})
+                st.success(f"✅ بدأت مهمة {task['title']} - تابعها من لوحة مهامي")
+
+        if st.button("💾 حفظ المواعيد", type="primary", key="save_schedule"):
+            invalid = [value for value in times.values() if value and not re.fullmatch(r'([01]?\d|2[0-3]):[0-5]\d', value)]
+            if invalid:
+                st.error(f"❌ مواعيد غير صحيحة: {', '.join(invalid)} - استخدم الصيغة HH:MM")
+            else:
+                crud.update_setting('scheduler_enabled', '1' if enabled else '0')
+                for setting, value in times.items():
+                    crud.update_setting(setting, value)
+                st.success("✅ تم حفظ المواعيد")
+
+        st.markdown("##### سجل التشغيل")
+        runs = crud.get_task_runs(limit=50)
+        if runs.empty:
+            st.info("لا يوجد سجل تشغيل بعد")
+        else:
+            titles = tasks.set_index('task')['title']
+            runs['task'] = runs['task'].map(titles).fillna(runs['task'])
+            st.dataframe(
+                runs[['task', 'status', 'started_at', 'duration_ms', 'message']].rename(columns={
+                    'task': 'المهمة', 'status': 'الحالة', 'started_at': 'البدء',
+                    'duration_ms': 'المدة (ملي ثانية)', 'message': 'النتيجة'
+                }),
+                use_container_width=True,
+                hide_index=True
+            )
 
 # ========================
 # صفحة سجل الأنشطة
@@ -2291,30 +1601,35 @@ def render_activity_log():
 def main():
     page = st.session_state.get('current_page', 'dashboard')
     
-    if page == 'dashboard':
-        render_dashboard()
-    elif page == 'appointments':
-        render_appointments()
-    elif page == 'patients':
-        render_patients()
-    elif page == 'doctors':
-        render_doctors()
-    elif page == 'treatments':
-        render_treatments()
-    elif page == 'payments':
-        render_payments()
-    elif page == 'inventory':
-        render_inventory()
-    elif page == 'suppliers':
-        render_suppliers()
-    elif page == 'expenses':
-        render_expenses()
-    elif page == 'reports':
-        render_reports()
-    elif page == 'settings':
-        render_settings()
-    elif page == 'activity_log':
-        render_activity_log()
+    with tracer.span(page, 'page'):
+        if page == 'dashboard':
+            render_dashboard()
+        elif page == 'appointments':
+            render_appointments()
+        elif page == 'patients':
+            render_patients()
+        elif page == 'doctors':
+            render_doctors()
+        elif page == 'treatments':
+            render_treatments()
+        elif page == 'payments':
+            render_payments()
+        elif page == 'inventory':
+            render_inventory()
+        elif page == 'suppliers':
+            render_suppliers()
+        elif page == 'expenses':
+            render_expenses()
+        elif page == 'reports':
+            render_reports()
+        elif page == 'settings':
+            render_settings()
+        elif page == 'activity_log':
+            render_activity_log()
+        elif page == 'query_stats':
+            query_stats.render()
+    
+    DevOverlay.render()
 
 if __name__ == "__main__":
     main()
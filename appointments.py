@@ -2,6 +2,8 @@ import streamlit as st
 import pandas as pd
 from datetime import date
 from database.crud import crud
+from components.patient_selector import PatientSelector
+from utils.helpers import date_column_config
 
 def render():
     """صفحة إدارة المواعيد"""
@@ -56,6 +58,7 @@ def render_all_appointments():
         st.dataframe(
             filtered_appointments[['id', 'patient_name', 'doctor_name', 'treatment_name', 
                                   'appointment_date', 'appointment_time', 'status', 'total_cost']],
+            column_config=date_column_config(filtered_appointments),
             use_container_width=True,
             hide_index=True
         )
@@ -82,41 +85,37 @@ def render_add_appointment():
     """نموذج إضافة موعد جديد"""
     st.markdown("#### إضافة موعد جديد")
     
-    patients = crud.get_all_patients()
-    doctors = crud.get_all_doctors()
-    treatments = crud.get_all_treatments()
+    # قوائم مرجعية صغيرة مخزنة، والمريض بالبحث بدلاً من تحميل كل المرضى
+    doctors = crud.get_doctor_options()
+    treatments = crud.get_treatment_options()
     
-    if patients.empty or doctors.empty:
+    if not doctors:
         st.warning("يجب إضافة مرضى وأطباء أولاً")
     else:
         col1, col2 = st.columns(2)
         
         with col1:
-            patient_id = st.selectbox(
-                "المريض*",
-                patients['id'].tolist(),
-                format_func=lambda x: patients[patients['id'] == x]['name'].iloc[0]
-            )
+            patient_id = PatientSelector.render(key="appointment_patient")
             
             treatment_id = st.selectbox(
                 "العلاج*",
-                treatments['id'].tolist(),
-                format_func=lambda x: treatments[treatments['id'] == x]['name'].iloc[0]
-            ) if not treatments.empty else None
+                list(treatments),
+                format_func=lambda x: treatments[x]['name']
+            ) if treatments else None
             
             appointment_date = st.date_input("تاريخ الموعد*", min_value=date.today())
         
         with col2:
             doctor_id = st.selectbox(
                 "الطبيب*",
-                doctors['id'].tolist(),
-                format_func=lambda x: doctors[doctors['id'] == x]['name'].iloc[0]
+                list(doctors),
+                format_func=doctors.get
             )
             
             appointment_time = st.time_input("وقت الموعد*")
             
             if treatment_id:
-                total_cost = treatments[treatments['id'] == treatment_id]['base_price'].iloc[0]
+                total_cost = treatments[treatment_id]['base_price']
                 total_cost = st.number_input("التكلفة الإجمالية*", value=float(total_cost), min_value=0.0, step=10.0)
             else:
                 total_cost = st.number_input("التكلفة الإجمالية*", min_value=0.0, step=10.0)
@@ -124,6 +123,9 @@ def render_add_appointment():
         notes = st.text_area("ملاحظات")
         
         if st.button("حجز الموعد", type="primary", use_container_width=True):
+            if patient_id is None:
+                st.warning("الرجاء اختيار المريض")
+                st.stop()
             try:
                 crud.create_appointment(
                     patient_id,
@@ -0,0 +1,17 @@
+"""
+Cura Clinic Benchmark Suite
+حزمة قياس الأداء لنظام إدارة العيادة
+
+Usage:
+    python -m benchmarks --scale 10k
+    python -m benchmarks --scale 100k --compare bench_results/baseline.json
+
+The database package must be pointed at the synthetic database (through
+CURA_DB_PATH) before it is imported, so the submodules import it lazily.
+"""
+
+from .synthetic_data import SCALES, SyntheticClinicGenerator
+from .report import BenchmarkReport, compare_reports
+
+__all__ = ['SCALES', 'SyntheticClinicGenerator', 'BenchmarkReport', 'compare_reports']
+__version__ = '1.0.0'
@@ -0,0 +1,127 @@
+"""
+Command line entry point: python -m benchmarks
+"""
+
+import argparse
+import os
+import sqlite3
+import sys
+
+from .synthetic_data import SCALES, SyntheticClinicGenerator
+from .report import BenchmarkReport, compare_reports
+
+ROOT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(prog='python -m benchmarks', description='Cura clinic benchmark suite')
+    parser.add_argument('--scale', default='10k', choices=sorted(SCALES, key=SCALES.get),
+                        help='number of synthetic appointments')
+    parser.add_argument('--db', help='synthetic database path (default: bench_data/clinic_<scale>.db)')
+    parser.add_argument('--regenerate', action='store_true', help='rebuild the synthetic database')
+    parser.add_argument('--seed', type=int, default=42)
+    parser.add_argument('--doctors', type=int, help='number of synthetic doctors (default: derived from the scale)')
+    parser.add_argument('--repeat', type=int, default=3, help='timed runs per method/page')
+    parser.add_argument('--skip-crud', action='store_true')
+    parser.add_argument('--skip-pages', action='store_true')
+    parser.add_argument('--skip-payload', action='store_true')
+    parser.add_argument('--skip-earnings', action='store_true')
+    parser.add_argument('--skip-reports', action='store_true')
+    parser.add_argument('--skip-records', action='store_true')
+    parser.add_argument('--skip-schema', action='store_true')
+    parser.add_argument('--report-workers', type=int, help='process pool size for batch reports (default: CPU count)')
+    parser.add_argument('--out', default=os.path.join(ROOT_DIR, 'bench_results'), help='output directory')
+    parser.add_argument('--compare', help='baseline JSON report to compare against')
+    return parser.parse_args(argv)
+
+
+def _print_entry(entry):
+    timing = f"{entry['median_ms']:>10.2f} ms" if 'median_ms' in entry else " " * 13
+    print(f"  {entry['status']:<8}{timing}  {entry['name']}")
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    db_path = os.path.abspath(args.db or os.path.join(ROOT_DIR, 'bench_data', f'clinic_{args.scale}.db'))
+    os.makedirs(os.path.dirname(db_path), exist_ok=True)
+
+    if args.regenerate and os.path.exists(db_path):
+        os.remove(db_path)
+    fresh = not os.path.exists(db_path)
+
+    # يجب ضبط المسار قبل استيراد حزمة قاعدة البيانات لأنها تهيئ الاتصال عند الاستيراد
+    os.environ['CURA_DB_PATH'] = db_path
+    sys.path.insert(0, ROOT_DIR)
+    from database.models import db
+    from database.crud import crud
+
+    dataset = {}
+    if fresh:
+        print(f"🏗️  Generating synthetic clinic ({args.scale}) in {db_path} ...")
+        generator = SyntheticClinicGenerator.from_scale(args.scale, seed=args.seed, doctors=args.doctors)
+        conn = sqlite3.connect(db.db_path)
+        dataset = generator.generate(conn, progress=lambda step, counts: print(f"  ✓ {step}: {counts.get(step, 0):,}"))
+        # أرصدة المخزون المولدة تصبح دفعات افتتاحية كما في الترقية
+        db.backfill_inventory_lots(conn.cursor())
+        conn.commit()
+        conn.close()
+        print(f"  {dataset['total_rows']:,} rows in {dataset['seconds']} s")
+    else:
+        print(f"♻️  Reusing synthetic database {db_path}")
+
+    report = BenchmarkReport(args.scale, dataset)
+
+    if not args.skip_crud:
+        print("\n⏱️  CRUD read methods")
+        from .crud_bench import time_crud_reads
+        report.add('crud', time_crud_reads(crud, repeat=args.repeat, progress=_print_entry))
+
+    if not args.skip_pages:
+        from .page_bench import time_app_pages, time_module_pages
+        print("\n⏱️  app.py pages")
+        report.add('app_pages', time_app_pages(repeat=args.repeat, progress=_print_entry))
+        print("\n⏱️  page modules")
+        report.add('module_pages', time_module_pages(repeat=args.repeat, progress=_print_entry))
+
+    if not args.skip_earnings:
+        print("\n💼 doctor earnings")
+        from .earnings_bench import time_doctor_earnings
+        report.add('earnings', time_doctor_earnings(crud, repeat=args.repeat, progress=_print_entry))
+
+    if not args.skip_reports:
+        print("\n🖨️  patient reports")
+        from .report_bench import time_patient_reports
+        report.add('reports', time_patient_reports(crud, workers=args.report_workers, progress=_print_entry))
+
+    if not args.skip_records:
+        print("\n🔬 small reads (pandas vs records)")
+        from .record_bench import time_record_reads
+        report.add('records', time_record_reads(db, repeat=args.repeat, progress=_print_entry))
+
+    if not args.skip_schema:
+        print("\n🧮 typed frames (memory and page groupbys)")
+        from .schema_bench import time_schema_reads
+        report.add('schema', time_schema_reads(crud, repeat=args.repeat, progress=_print_entry))
+
+    if not args.skip_payload:
+        print("\n📦 stylesheet payload")
+        from .payload_bench import measure_css_payload
+        report.add('payload', measure_css_payload(repeat=args.repeat, progress=_print_entry))
+
+    stem = f"bench_{args.scale}_{report.metadata.get('commit') or 'local'}"
+    json_path = report.write_json(os.path.join(args.out, stem + '.json'))
+    md_path = report.write_markdown(os.path.join(args.out, stem + '.md'))
+    print(f"\n📄 {json_path}\n📄 {md_path}")
+
+    if args.compare:
+        comparison = compare_reports(args.compare, report.to_dict())
+        compare_path = os.path.join(args.out, stem + '_compare.md')
+        with open(compare_path, 'w', encoding='utf-8') as f:
+            f.write(comparison)
+        print(f"📄 {compare_path}")
+
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
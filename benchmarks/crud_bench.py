@@ -0,0 +1,99 @@
+"""
+Timing of the public CRUDOperations read methods
+قياس زمن دوال القراءة في طبقة CRUD
+"""
+
+import inspect
+import statistics
+import time
+from datetime import date, timedelta
+
+READ_PREFIXES = ('get_', 'search_')
+
+
+def default_arguments(today=None):
+    """Argument values used to call read methods, keyed by parameter name"""
+    today = today or date.today()
+    return {
+        'start_date': (today - timedelta(days=90)).isoformat(),
+        'end_date': today.isoformat(),
+        'target_date': today.isoformat(),
+        'doctor_id': 1,
+        'patient_id': 1,
+        'treatment_id': 1,
+        'supplier_id': 1,
+        'payment_id': 1,
+        'expense_id': 1,
+        'key': 'clinic_name',
+        'search_term': 'محمد',
+    }
+
+
+def discover_read_methods(crud):
+    """Public read methods of a CRUDOperations instance, sorted by name"""
+    return sorted(
+        name for name, member in inspect.getmembers(crud, inspect.ismethod)
+        if name.startswith(READ_PREFIXES)
+    )
+
+
+def _build_call(method, arguments):
+    """Keyword arguments for ``method``; None when a required value is unknown"""
+    kwargs = {}
+    for name, param in inspect.signature(method).parameters.items():
+        if name in arguments:
+            kwargs[name] = arguments[name]
+        elif param.default is inspect.Parameter.empty:
+            return None
+    return kwargs
+
+
+def _result_size(result):
+    """Rows returned: DataFrame length, dict entries, or 1 for a single row/scalar"""
+    if getattr(result, 'ndim', 0) >= 1:
+        return int(result.shape[0])
+    if isinstance(result, (list, dict)):
+        return len(result)
+    return 1 if result is not None else 0
+
+
+def time_crud_reads(crud, repeat=3, arguments=None, methods=None, progress=None):
+    """Call every read method ``repeat`` times and collect wall-clock timings.
+
+    Returns a list of dicts with ``name``, ``status`` (ok / error / skipped),
+    ``min_ms``, ``median_ms``, ``max_ms`` and ``rows``.
+    """
+    arguments = {**default_arguments(), **(arguments or {})}
+    results = []
+
+    for name in methods or discover_read_methods(crud):
+        method = getattr(crud, name)
+        kwargs = _build_call(method, arguments)
+        entry = {'name': name, 'kind': 'crud'}
+
+        if kwargs is None:
+            entry.update(status='skipped', error='missing argument values')
+            results.append(entry)
+            continue
+
+        timings = []
+        try:
+            for _ in range(repeat):
+                started = time.perf_counter()
+                result = method(**kwargs)
+                timings.append((time.perf_counter() - started) * 1000)
+            entry.update(
+                status='ok',
+                min_ms=round(min(timings), 3),
+                median_ms=round(statistics.median(timings), 3),
+                max_ms=round(max(timings), 3),
+                rows=_result_size(result),
+            )
+        except Exception as e:
+            entry.update(status='error', error=f"{type(e).__name__}: {e}")
+
+        results.append(entry)
+        if progress:
+            progress(entry)
+
+    return results
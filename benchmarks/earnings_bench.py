@@ -0,0 +1,76 @@
+"""
+All-doctor earnings: one query per doctor vs one grouped query
+أرباح الأطباء: استعلام لكل طبيب مقابل تجميع واحد
+"""
+
+import statistics
+import time
+from datetime import date, timedelta
+
+
+def _timed(func, repeat):
+    timings = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        result = func()
+        timings.append((time.perf_counter() - started) * 1000)
+    return result, {
+        'min_ms': round(min(timings), 3),
+        'median_ms': round(statistics.median(timings), 3),
+        'max_ms': round(max(timings), 3),
+    }
+
+
+def time_doctor_earnings(crud, repeat=3, days=90, rollups=True, progress=None):
+    """Time the per-doctor loop the payments page used against ``get_doctors_earnings``.
+
+    The grouped totals are checked against the loop. With ``rollups`` an
+    analytics snapshot is exported (when missing) and the grouped query is
+    timed again, served from the snapshot rollups.
+    """
+    end_date = date.today()
+    start_date = (end_date - timedelta(days=days)).isoformat()
+    end_date = end_date.isoformat()
+    doctors = crud.get_all_doctors()
+
+    def per_doctor():
+        totals = {}
+        for _, doctor in doctors.iterrows():
+            earnings = crud.get_doctor_earnings(doctor['id'], start_date, end_date)
+            if earnings.iloc[0]['total_earnings'] is not None:
+                totals[int(doctor['id'])] = round(float(earnings.iloc[0]['total_earnings']), 2)
+        return totals
+
+    def grouped():
+        earnings = crud.get_doctors_earnings(start_date, end_date)
+        return dict(zip(earnings['doctor_id'].astype(int), earnings['total_earnings'].round(2)))
+
+    def breakdown():
+        return crud.get_doctors_earnings(start_date, end_date, ('treatment', 'month'))
+
+    expected, loop_timing = _timed(per_doctor, repeat)
+    results = [{'name': 'earnings:per_doctor_loop', 'kind': 'earnings', 'status': 'ok',
+                'doctors': len(doctors), **loop_timing}]
+
+    def grouped_entries():
+        source = 'rollup' if crud.get_analytics_snapshot_info() is not None else 'live'
+        entries = []
+        for name, func in (('grouped', grouped), ('breakdown', breakdown)):
+            result, timing = _timed(func, repeat)
+            entry = {'name': f'earnings:{name}_{source}', 'kind': 'earnings', 'status': 'ok',
+                     'doctors': len(doctors), **timing,
+                     'speedup': round(loop_timing['median_ms'] / max(timing['median_ms'], 1e-6), 1)}
+            if func is grouped and result != expected:
+                entry.update(status='error', error='totals differ from the per-doctor loop')
+            entries.append(entry)
+        return entries
+
+    results += grouped_entries()
+    if rollups and crud.get_analytics_snapshot_info() is None:
+        crud.export_analytics_snapshot()
+        results += grouped_entries()
+
+    if progress:
+        for entry in results:
+            progress(entry)
+    return results
@@ -0,0 +1,118 @@
+"""
+Headless timing of the Streamlit page render functions
+قياس زمن عرض الصفحات بدون متصفح
+"""
+
+import logging
+import os
+import statistics
+import time
+
+ROOT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# الصفحات التي يوجهها app.main() عبر current_page
+APP_PAGES = [
+    'dashboard', 'appointments', 'patients', 'doctors', 'treatments', 'payments',
+    'inventory', 'suppliers', 'expenses', 'reports', 'settings', 'activity_log', 'query_stats',
+]
+
+# دوال العرض في وحدات الصفحات المستقلة
+MODULE_PAGES = [
+    ('dashboard', 'render'),
+    ('appointments', 'render'),
+    ('patients', 'render'),
+    ('doctors', 'show_doctors'),
+    ('treatments', 'show_treatments'),
+    ('payments', 'render'),
+    ('inventory', 'render'),
+    ('suppliers', 'render'),
+    ('expenses', 'render'),
+    ('reports', 'render'),
+    ('reports_advanced', 'render'),
+    ('financial_reports', 'show_financial_dashboard'),
+    ('financial_accounts', 'render'),
+    ('accounting', 'show_accounting'),
+    ('settings', 'render'),
+    ('activity_log', 'render'),
+    ('more_pages', 'render'),
+    ('query_stats', 'render'),
+]
+
+MODULE_SCRIPT = """
+import sys
+sys.path.insert(0, {root!r})
+import {module}
+{module}.{function}()
+"""
+
+
+def _quiet_streamlit():
+    # أخطاء الصفحات تُسجل في التقرير، فلا داعي لطباعة كل traceback
+    from streamlit import logger
+    logger.set_log_level(logging.CRITICAL)
+
+
+def _run(app_test, repeat, timeout):
+    timings = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        app_test.run(timeout=timeout)
+        timings.append((time.perf_counter() - started) * 1000)
+    return timings
+
+
+def _entry(name, kind, timings, app_test):
+    entry = {'name': name, 'kind': kind}
+    errors = [str(e.value) for e in app_test.exception]
+    if errors:
+        entry.update(status='error', error=errors[0][:300])
+    else:
+        entry['status'] = 'ok'
+    entry.update(
+        min_ms=round(min(timings), 3),
+        median_ms=round(statistics.median(timings), 3),
+        max_ms=round(max(timings), 3),
+        elements=len(list(app_test.main)) + len(list(app_test.sidebar)),
+    )
+    return entry
+
+
+def time_app_pages(repeat=3, timeout=120, pages=None, progress=None):
+    """Time every page dispatched by ``app.main()``; the first run warms the script"""
+    from streamlit.testing.v1 import AppTest
+
+    _quiet_streamlit()
+    results = []
+    for page in pages or APP_PAGES:
+        try:
+            app_test = AppTest.from_file(os.path.join(ROOT_DIR, 'app.py'), default_timeout=timeout)
+            app_test.session_state['current_page'] = page
+            app_test.run(timeout=timeout)
+            entry = _entry(f"app:{page}", 'page', _run(app_test, repeat, timeout), app_test)
+        except Exception as e:
+            entry = {'name': f"app:{page}", 'kind': 'page', 'status': 'error', 'error': f"{type(e).__name__}: {e}"}
+        results.append(entry)
+        if progress:
+            progress(entry)
+    return results
+
+
+def time_module_pages(repeat=3, timeout=120, pages=None, progress=None):
+    """Time the render function of every standalone page module"""
+    from streamlit.testing.v1 import AppTest
+
+    _quiet_streamlit()
+    results = []
+    for module, function in pages or MODULE_PAGES:
+        name = f"{module}.{function}"
+        try:
+            script = MODULE_SCRIPT.format(root=ROOT_DIR, module=module, function=function)
+            app_test = AppTest.from_string(script, default_timeout=timeout)
+            app_test.run(timeout=timeout)
+            entry = _entry(name, 'page', _run(app_test, repeat, timeout), app_test)
+        except Exception as e:
+            entry = {'name': name, 'kind': 'page', 'status': 'error', 'error': f"{type(e).__name__}: {e}"}
+        results.append(entry)
+        if progress:
+            progress(entry)
+    return results
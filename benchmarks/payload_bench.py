@@ -0,0 +1,73 @@
+"""
+Per-rerun payload of the theme stylesheet
+حجم الأنماط المرسلة في كل إعادة تشغيل
+"""
+
+import statistics
+import time
+
+
+def _timed(func, repeat):
+    timings = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        func()
+        timings.append((time.perf_counter() - started) * 1000)
+    return {
+        'min_ms': round(min(timings), 3),
+        'median_ms': round(statistics.median(timings), 3),
+        'max_ms': round(max(timings), 3),
+    }
+
+
+def measure_css_payload(reruns=20, repeat=3, progress=None):
+    """Bytes sent for the stylesheet per rerun (inline <style> vs static <link>).
+
+    ``bytes_per_session`` adds the one-time download of the static file to
+    ``reruns`` reruns, which is what a user browsing the app actually pays.
+    """
+    import styles
+
+    def cold_build():
+        styles.build_css.cache_clear()
+        styles.get_theme_css()
+
+    results = [
+        {'name': 'css:build_cold', 'kind': 'payload', 'status': 'ok', **_timed(cold_build, repeat)},
+        {'name': 'css:build_cached', 'kind': 'payload', 'status': 'ok', **_timed(styles.get_theme_css, repeat)},
+    ]
+
+    css, _ = styles.get_theme_css()
+    css_bytes = len(css.encode('utf-8'))
+    payloads = {}
+    for delivery in ('inline', 'static'):
+        entry = {'name': f'css:{delivery}', 'kind': 'payload'}
+        markup = styles.css_markup(delivery)
+        if delivery == 'static' and not markup.startswith('<link'):
+            entry.update(status='skipped', error='server.enableStaticServing is off')
+            results.append(entry)
+            continue
+        per_rerun = len(markup.encode('utf-8'))
+        one_time = css_bytes if delivery == 'static' else 0
+        payloads[delivery] = one_time + per_rerun * reruns
+        entry.update(
+            status='ok',
+            bytes_per_rerun=per_rerun,
+            one_time_bytes=one_time,
+            bytes_per_session=payloads[delivery],
+            reruns=reruns,
+        )
+        results.append(entry)
+
+    if len(payloads) == 2:
+        results.append({
+            'name': 'css:reduction',
+            'kind': 'payload',
+            'status': 'ok',
+            'bytes_saved_per_session': payloads['inline'] - payloads['static'],
+            'reduction_pct': round((1 - payloads['static'] / payloads['inline']) * 100, 1),
+        })
+    if progress:
+        for entry in results:
+            progress(entry)
+    return results
@@ -0,0 +1,78 @@
+"""
+Per-call overhead of small reads: pandas DataFrames vs the record helpers
+كلفة القراءات الصغيرة: DataFrame مقابل السجلات والقيم المفردة
+"""
+
+import statistics
+import time
+from datetime import date
+
+
+def time_record_reads(db, calls=2000, repeat=3, progress=None):
+    """Microseconds per call for scalar, single-row and 20-row reads.
+
+    Each shape is read the old way (``pd.read_sql_query`` then ``.iloc``),
+    with the helpers in ``database.records`` and with a bare cursor, all on
+    one open connection so only the per-call overhead is compared.
+    """
+    import pandas as pd
+    from database.records import Treatment, columns, fetch_many, fetch_record, fetch_scalar
+
+    conn = db.get_connection()
+    try:
+        treatment_id = fetch_scalar(conn, "SELECT MIN(id) FROM treatments")
+        # عدّ مفهرس (مواعيد اليوم): زمن الاستعلام نفسه صغير فتظهر كلفة الاستدعاء
+        count_sql = "SELECT COUNT(*) as count FROM appointments WHERE appointment_date = ?"
+        today = date.today().isoformat()
+        row_sql = f"SELECT {', '.join(columns(Treatment))} FROM treatments WHERE id = ?"
+        many_sql = f"SELECT {', '.join(columns(Treatment))} FROM treatments ORDER BY id LIMIT 20"
+
+        shapes = {
+            'scalar': {
+                'pandas': lambda: pd.read_sql_query(count_sql, conn, params=(today,)).iloc[0]['count'],
+                'records': lambda: fetch_scalar(conn, count_sql, (today,)),
+                'cursor': lambda: conn.cursor().execute(count_sql, (today,)).fetchone()[0],
+            },
+            'one_row': {
+                'pandas': lambda: pd.read_sql_query(row_sql, conn, params=(treatment_id,)).iloc[0]['name'],
+                'records': lambda: fetch_record(conn, Treatment, treatment_id).name,
+                'cursor': lambda: conn.cursor().execute(row_sql, (treatment_id,)).fetchone()[1],
+            },
+            'rows_20': {
+                'pandas': lambda: pd.read_sql_query(many_sql, conn)['name'].tolist(),
+                'records': lambda: [row.name for row in fetch_many(conn, many_sql, record=Treatment)],
+                'cursor': lambda: [row[1] for row in conn.cursor().execute(many_sql).fetchall()],
+            },
+        }
+
+        results = []
+        for shape, variants in shapes.items():
+            expected = variants['pandas']()
+            baseline = None
+            for variant, func in variants.items():
+                timings = []
+                for _ in range(repeat):
+                    started = time.perf_counter()
+                    for _ in range(calls):
+                        func()
+                    timings.append((time.perf_counter() - started) * 1000)
+                median_ms = statistics.median(timings)
+                entry = {
+                    'name': f'records:{shape}_{variant}', 'kind': 'records', 'status': 'ok', 'calls': calls,
+                    'median_ms': round(median_ms, 3),
+                    'us_per_call': round(median_ms * 1000 / calls, 2),
+                }
+                if baseline is None:
+                    baseline = median_ms
+                else:
+                    entry['speedup'] = round(baseline / max(median_ms, 1e-6), 1)
+                if func() != expected:
+                    entry.update(status='error', error='result differs from the pandas read')
+                results.append(entry)
+    finally:
+        conn.close()
+
+    if progress:
+        for entry in results:
+            progress(entry)
+    return results
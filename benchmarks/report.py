@@ -0,0 +1,136 @@
+"""
+Benchmark report: JSON/Markdown output and comparison between commits
+تقرير القياس ومقارنته بين الإصدارات
+"""
+
+import json
+import os
+import platform
+import subprocess
+from datetime import datetime
+
+
+def _git_commit():
+    try:
+        return subprocess.run(
+            ['git', 'rev-parse', '--short', 'HEAD'],
+            capture_output=True, text=True, check=True,
+            cwd=os.path.dirname(os.path.dirname(os.path.abspath(__file__))),
+        ).stdout.strip()
+    except Exception:
+        return None
+
+
+class BenchmarkReport:
+    """Collects benchmark results for one run and serializes them"""
+
+    def __init__(self, scale, dataset=None):
+        self.metadata = {
+            'scale': scale,
+            'commit': _git_commit(),
+            'created_at': datetime.now().isoformat(timespec='seconds'),
+            'python': platform.python_version(),
+            'platform': platform.platform(),
+        }
+        try:
+            import pandas
+            self.metadata['pandas'] = pandas.__version__
+        except ImportError:
+            pass
+        self.dataset = dataset or {}
+        self.sections = {}
+
+    def add(self, section, results):
+        """Append a list of result dicts (each with a unique ``name``) to a section"""
+        self.sections.setdefault(section, []).extend(results)
+
+    def to_dict(self):
+        return {'metadata': self.metadata, 'dataset': self.dataset, 'sections': self.sections}
+
+    def write_json(self, path):
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        with open(path, 'w', encoding='utf-8') as f:
+            json.dump(self.to_dict(), f, ensure_ascii=False, indent=2)
+        return path
+
+    def to_markdown(self):
+        lines = [
+            f"# Cura benchmark — scale {self.metadata['scale']}",
+            "",
+            f"- commit: `{self.metadata.get('commit') or 'unknown'}`",
+            f"- created: {self.metadata['created_at']}",
+            f"- python {self.metadata['python']}, pandas {self.metadata.get('pandas', 'n/a')}",
+        ]
+        if self.dataset:
+            lines.append(f"- dataset: {self.dataset.get('total_rows', 0):,} rows "
+                         f"(generated in {self.dataset.get('seconds', 0)} s)")
+        for section, results in self.sections.items():
+            lines += ["", f"## {section}", ""]
+            lines += _results_table(results)
+        return "\n".join(lines) + "\n"
+
+    def write_markdown(self, path):
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        with open(path, 'w', encoding='utf-8') as f:
+            f.write(self.to_markdown())
+        return path
+
+
+def _results_table(results):
+    extra_keys = []
+    for r in results:
+        for key in r:
+            if key not in ('name', 'kind', 'status', 'error', 'min_ms', 'median_ms', 'max_ms') and key not in extra_keys:
+                extra_keys.append(key)
+    header = ['name', 'status', 'median ms', 'min ms', 'max ms'] + extra_keys
+    lines = ["| " + " | ".join(header) + " |", "|" + "---|" * len(header)]
+    for r in results:
+        cells = [
+            f"`{r['name']}`", r.get('status', ''),
+            _fmt(r.get('median_ms')), _fmt(r.get('min_ms')), _fmt(r.get('max_ms')),
+        ] + [_fmt(r.get(key)) for key in extra_keys]
+        lines.append("| " + " | ".join(cells) + " |")
+        if r.get('error'):
+            lines.append(f"| ↳ {r['error'][:150]} |" + " |" * (len(header) - 1))
+    return lines
+
+
+def _fmt(value):
+    if value is None:
+        return ""
+    if isinstance(value, float):
+        return f"{value:,.2f}"
+    return str(value)
+
+
+def compare_reports(baseline, current, threshold=0.10):
+    """Markdown table comparing median timings of two JSON reports (paths or dicts).
+
+    Entries slower or faster than ``threshold`` (relative) are flagged.
+    """
+    if isinstance(baseline, str):
+        with open(baseline, encoding='utf-8') as f:
+            baseline = json.load(f)
+    if isinstance(current, str):
+        with open(current, encoding='utf-8') as f:
+            current = json.load(f)
+
+    lines = [
+        f"# Benchmark comparison: `{baseline['metadata'].get('commit')}` → `{current['metadata'].get('commit')}`",
+        "",
+        "| section | name | baseline ms | current ms | change |",
+        "|---|---|---|---|---|",
+    ]
+    for section, results in current['sections'].items():
+        previous = {r['name']: r for r in baseline['sections'].get(section, [])}
+        for r in results:
+            old = previous.get(r['name'], {}).get('median_ms')
+            new = r.get('median_ms')
+            if old is None or new is None:
+                change = "new" if old is None and new is not None else "n/a"
+            else:
+                ratio = (new - old) / old if old else 0.0
+                flag = " 🔴" if ratio > threshold else (" 🟢" if ratio < -threshold else "")
+                change = f"{ratio:+.1%}{flag}"
+            lines.append(f"| {section} | `{r['name']}` | {_fmt(old)} | {_fmt(new)} | {change} |")
+    return "\n".join(lines) + "\n"
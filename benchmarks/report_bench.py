@@ -0,0 +1,62 @@
+"""
+Patient report throughput: one report at a time vs the batch renderer
+معدل توليد تقارير المرضى: تقرير بتقرير مقابل التوليد المجمع
+"""
+
+import os
+import shutil
+import tempfile
+import time
+
+
+def time_patient_reports(crud, limit=1000, workers=None, progress=None):
+    """Reports per second for the interactive path and for ``render_batch``.
+
+    The interactive path fetches each patient through the patient 360
+    service and renders it with ``generate_html_report``. The batch path
+    writes one HTML file per patient, in this process and in a process pool.
+    """
+    from report_generator import PatientReportGenerator, render_batch
+    from database.patient360 import patient_360
+
+    patient_ids = crud.get_all_patients()['id'].head(limit).tolist()
+    workers = workers or os.cpu_count() or 1
+    directory = tempfile.mkdtemp(prefix='cura_reports_')
+    results = []
+
+    try:
+        patient_360.invalidate()
+        started = time.perf_counter()
+        for patient_id in patient_ids:
+            report = crud.get_patient_detailed_report(patient_id)
+            PatientReportGenerator.generate_html_report(
+                report['patient'], report['appointments'], report['payments'], report['treatments']
+            )
+        seconds = time.perf_counter() - started
+        results.append(_entry('reports:one_by_one', len(patient_ids), seconds))
+
+        for name, pool in (('reports:batch_inline', 1), (f'reports:batch_pool_{workers}', workers)):
+            result = render_batch(patient_ids, os.path.join(directory, name.split(':')[1]), workers=pool)
+            entry = _entry(name, result['reports'], result['seconds'])
+            if result['reports'] != len(patient_ids):
+                entry.update(status='error', error=f"{result['reports']} of {len(patient_ids)} reports written")
+            results.append(entry)
+    finally:
+        shutil.rmtree(directory, ignore_errors=True)
+
+    baseline = results[0]['reports_per_second']
+    for entry in results[1:]:
+        entry['speedup'] = round(entry['reports_per_second'] / baseline, 1) if baseline else None
+
+    if progress:
+        for entry in results:
+            progress(entry)
+    return results
+
+
+def _entry(name, reports, seconds):
+    return {
+        'name': name, 'kind': 'reports', 'status': 'ok', 'reports': reports,
+        'median_ms': round(seconds * 1000, 3),
+        'reports_per_second': round(reports / seconds, 1) if seconds else None,
+    }
@@ -0,0 +1,161 @@
+"""
+Typed result frames: memory per 100k rows and the downstream groupbys of the report pages
+الأنواع المضغوطة: الذاكرة لكل 100 ألف صف وزمن التجميعات في صفحات التقارير
+"""
+
+import statistics
+import time
+from datetime import date, timedelta
+
+ROWS = 100_000
+
+
+def _timed(func, repeat):
+    timings = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        result = func()
+        timings.append((time.perf_counter() - started) * 1000)
+    return result, round(statistics.median(timings), 3)
+
+
+def _untyped(df):
+    """The frame as ``pd.read_sql_query`` returned it before the schema: text dates and object columns"""
+    import pandas as pd
+
+    raw = df.copy()
+    for column in raw.columns:
+        series = raw[column]
+        if isinstance(series.dtype, pd.CategoricalDtype):
+            raw[column] = pd.Series(series.astype(object).tolist(), index=raw.index, dtype=object)
+        elif pd.api.types.is_datetime64_any_dtype(series):
+            raw[column] = pd.Series(series.dt.strftime('%Y-%m-%d').tolist(), index=raw.index, dtype=object)
+    return raw
+
+
+def _normalized(result):
+    # مقارنة النتيجتين بغض النظر عن نوع الفهرس (نص/فئوي/تاريخ)
+    return {str(key)[:10]: round(float(value), 2) for key, value in result.items() if value}
+
+
+def time_schema_reads(crud, repeat=5, days=365, progress=None):
+    """Memory of the raw vs typed frames and old vs new timings of the page groupbys.
+
+    The raw frames are rebuilt from the typed ones (object text and ISO date
+    strings, as ``read_sql_query`` returns them). The "old" patterns re-parse
+    the date column and compare ``datetime.date`` objects like the pages did;
+    the "new" ones use ``in_period`` and ``observed=True`` groupbys on the
+    typed frames. Every pair is checked to give the same totals.
+    """
+    import pandas as pd
+    from database.schema import apply_schema, in_period
+
+    end_date = date.today()
+    start_date = end_date - timedelta(days=days)
+    typed = {
+        'appointments': crud.get_all_appointments(),
+        'payments': crud.get_all_payments(),
+        'expenses': crud.get_all_expenses(),
+    }
+    raw = {name: _untyped(df) for name, df in typed.items()}
+    doctor_names = typed['appointments']['doctor_name'].dropna().unique().tolist()
+
+    results = []
+
+    # الذاكرة لكل 100 ألف صف
+    for name, df in typed.items():
+        if df.empty:
+            continue
+        raw_bytes = raw[name].memory_usage(deep=True).sum() * ROWS / len(df)
+        typed_bytes = df.memory_usage(deep=True).sum() * ROWS / len(df)
+        results.append({
+            'name': f'schema:memory_{name}', 'kind': 'schema', 'status': 'ok', 'rows': len(df),
+            'raw_mb_per_100k': round(raw_bytes / 2 ** 20, 2),
+            'typed_mb_per_100k': round(typed_bytes / 2 ** 20, 2),
+            'reduction': round(raw_bytes / max(typed_bytes, 1), 1),
+        })
+
+    # كلفة التحويل نفسها (مرة واحدة عند القراءة، ثم تخدمها ذاكرة crud المؤقتة)
+    for name in typed:
+        _, median_ms = _timed(lambda: apply_schema(raw[name].copy(), name), repeat)
+        results.append({'name': f'schema:convert_{name}', 'kind': 'schema', 'status': 'ok',
+                        'rows': len(raw[name]), 'median_ms': median_ms})
+
+    def old_period(df, column):
+        df = df.copy()
+        df[column] = pd.to_datetime(df[column]).dt.date
+        return df[(df[column] >= start_date) & (df[column] <= end_date)]
+
+    def new_period(df, column):
+        return df[in_period(df[column], start_date, end_date)]
+
+    appointments, payments, expenses = raw['appointments'], raw['payments'], raw['expenses']
+    typed_appointments, typed_payments, typed_expenses = (
+        typed['appointments'], typed['payments'], typed['expenses']
+    )
+
+    def old_salaries():
+        totals = {}
+        for doctor_name in doctor_names:
+            doctor_appointments = appointments[appointments['doctor_name'] == doctor_name].copy()
+            doctor_appointments['appointment_date'] = pd.to_datetime(doctor_appointments['appointment_date'])
+            monthly = doctor_appointments[
+                (doctor_appointments['appointment_date'].dt.month == end_date.month) &
+                (doctor_appointments['appointment_date'].dt.year == end_date.year)
+            ]
+            totals[doctor_name] = monthly['total_cost'].sum()
+        return totals
+
+    def new_salaries():
+        dates = typed_appointments['appointment_date']
+        monthly = typed_appointments[(dates.dt.month == end_date.month) & (dates.dt.year == end_date.year)]
+        return monthly.groupby('doctor_name', observed=True)['total_cost'].sum()
+
+    def new_value_counts(series):
+        counts = series.value_counts()
+        return counts[counts > 0]
+
+    patterns = {
+        'doctors_performance': (
+            lambda: old_period(appointments, 'appointment_date').groupby('doctor_name')['total_cost'].sum(),
+            lambda: new_period(typed_appointments, 'appointment_date')
+            .groupby('doctor_name', observed=True)['total_cost'].sum(),
+        ),
+        'doctors_salaries': (old_salaries, new_salaries),
+        'treatments_popularity': (
+            lambda: old_period(appointments, 'appointment_date')['treatment_name'].value_counts(),
+            lambda: new_value_counts(new_period(typed_appointments, 'appointment_date')['treatment_name']),
+        ),
+        'treatments_revenue': (
+            lambda: old_period(appointments, 'appointment_date').groupby('treatment_name')['total_cost'].sum(),
+            lambda: new_period(typed_appointments, 'appointment_date')
+            .groupby('treatment_name', observed=True)['total_cost'].sum(),
+        ),
+        'reports_payment_methods': (
+            lambda: old_period(payments, 'payment_date')['payment_method'].value_counts(),
+            lambda: new_value_counts(new_period(typed_payments, 'payment_date')['payment_method']),
+        ),
+        'reports_daily_payments': (
+            lambda: old_period(payments, 'payment_date').groupby('payment_date')['amount'].sum(),
+            lambda: new_period(typed_payments, 'payment_date').groupby('payment_date')['amount'].sum(),
+        ),
+        'reports_expense_categories': (
+            lambda: old_period(expenses, 'expense_date').groupby('category')['amount'].sum(),
+            lambda: new_period(typed_expenses, 'expense_date').groupby('category', observed=True)['amount'].sum(),
+        ),
+    }
+
+    for name, (old, new) in patterns.items():
+        expected, old_ms = _timed(old, repeat)
+        result, new_ms = _timed(new, repeat)
+        results.append({'name': f'schema:{name}_old', 'kind': 'schema', 'status': 'ok', 'median_ms': old_ms})
+        entry = {'name': f'schema:{name}_typed', 'kind': 'schema', 'status': 'ok', 'median_ms': new_ms,
+                 'speedup': round(old_ms / max(new_ms, 1e-6), 1)}
+        if _normalized(result) != _normalized(expected):
+            entry.update(status='error', error='result differs from the untyped pattern')
+        results.append(entry)
+
+    if progress:
+        for entry in results:
+            progress(entry)
+    return results
@@ -0,0 +1,328 @@
+"""
+Synthetic clinic data generator for benchmarks
+مولد بيانات عيادة اصطناعية لقياس الأداء
+"""
+
+import random
+import time
+from datetime import date, timedelta
+
+# عدد المواعيد لكل مستوى قياس
+SCALES = {
+    '1k': 1_000,
+    '10k': 10_000,
+    '100k': 100_000,
+    '1m': 1_000_000,
+}
+
+FIRST_NAMES_MALE = [
+    "محمد", "أحمد", "محمود", "علي", "حسن", "حسين", "عمر", "خالد", "يوسف", "إبراهيم",
+    "مصطفى", "طارق", "كريم", "سامح", "هشام", "وليد", "عادل", "ياسر", "شريف", "عمرو",
+]
+FIRST_NAMES_FEMALE = [
+    "فاطمة", "مريم", "سارة", "منى", "نورا", "هدى", "آية", "ياسمين", "دينا", "ريم",
+    "سلمى", "هبة", "رنا", "إيمان", "أسماء", "شيماء", "نهى", "ليلى", "جميلة", "زينب",
+]
+FAMILY_NAMES = [
+    "عبدالله", "السيد", "حسن", "إبراهيم", "عبدالرحمن", "منصور", "الشريف", "فهمي", "سليمان", "رمضان",
+    "عثمان", "النجار", "الجمال", "زكي", "مراد", "صالح", "البنا", "شاكر", "عزت", "نصار",
+]
+CITIES = ["القاهرة", "الجيزة", "الإسكندرية", "المنصورة", "طنطا", "أسيوط", "الزقازيق", "بورسعيد"]
+SPECIALIZATIONS = [
+    "طب الأسنان العام", "تقويم الأسنان", "جراحة الفم والأسنان", "علاج الجذور",
+    "طب أسنان الأطفال", "تركيبات الأسنان", "أمراض اللثة",
+]
+TREATMENTS = [
+    # (الاسم، السعر، المدة، الفئة، نسبة الطبيب)
+    ("فحص وتنظيف", 200.0, 60, "وقائي", 40.0),
+    ("حشو عادي", 300.0, 45, "علاجي", 50.0),
+    ("حشو عصب", 800.0, 90, "علاجي", 60.0),
+    ("تبييض الأسنان", 1500.0, 120, "تجميلي", 70.0),
+    ("خلع سن", 150.0, 30, "جراحي", 45.0),
+    ("تركيب تقويم", 5000.0, 180, "تجميلي", 65.0),
+    ("أشعة بانوراما", 250.0, 30, "تشخيصي", 30.0),
+    ("تنظيف الجير", 180.0, 45, "وقائي", 40.0),
+    ("زراعة سن", 7000.0, 150, "جراحي", 60.0),
+    ("تركيب تاج", 2500.0, 60, "تركيبات", 55.0),
+    ("متابعة تقويم", 400.0, 30, "تجميلي", 50.0),
+    ("جلسة علاج لثة", 600.0, 60, "علاجي", 50.0),
+]
+INVENTORY_BASE = [
+    ("قفازات طبية", "مستهلكات", 25.0),
+    ("كمامات طبية", "مستهلكات", 15.0),
+    ("حقن تخدير موضعي", "أدوية", 12.0),
+    ("خيوط جراحية", "مستهلكات", 8.0),
+    ("حشو أبيض (كمبوزيت)", "مواد طبية", 150.0),
+    ("مطهر طبي", "مستهلكات", 45.0),
+    ("إبر حقن", "مستهلكات", 0.5),
+    ("قطن طبي", "مستهلكات", 35.0),
+    ("شاش معقم", "مستهلكات", 5.0),
+    ("معجون أسنان طبي", "منتجات", 25.0),
+    ("مادة طبع", "مواد طبية", 90.0),
+    ("أفلام أشعة", "مواد طبية", 18.0),
+]
+EXPENSE_CATEGORIES = [
+    ("رواتب", 20000.0, 60000.0), ("إيجار", 6000.0, 12000.0), ("كهرباء ومياه", 800.0, 2500.0),
+    ("صيانة", 500.0, 5000.0), ("مستلزمات", 1000.0, 8000.0), ("تسويق", 300.0, 3000.0),
+]
+PAYMENT_METHODS = ["نقدي", "نقدي", "نقدي", "بطاقة ائتمان", "تحويل بنكي", "شيك"]
+TIME_SLOTS = [f"{h:02d}:{m:02d}" for h in range(9, 21) for m in (0, 30)]
+
+
+class SyntheticClinicGenerator:
+    """Generate a realistic clinic at a configurable scale using bulk inserts.
+
+    Row counts are derived from the number of appointments so that every scale
+    keeps the same shape: about eight visits per patient, matching payments for
+    completed visits, monthly expenses and inventory usage for half the visits.
+    """
+
+    CHUNK_SIZE = 50_000
+
+    def __init__(self, appointments=10_000, seed=42, history_days=365, future_days=60, doctors=None):
+        self.appointments = int(appointments)
+        self.doctors = doctors
+        self.seed = seed
+        self.history_days = history_days
+        self.future_days = future_days
+        self.rng = random.Random(seed)
+
+    @classmethod
+    def from_scale(cls, scale, **kwargs):
+        """Build a generator from a named scale ('10k', '100k', '1m')"""
+        key = str(scale).lower()
+        if key not in SCALES:
+            raise ValueError(f"Unknown scale '{scale}', expected one of: {', '.join(SCALES)}")
+        return cls(appointments=SCALES[key], **kwargs)
+
+    # ========== الأحجام المشتقة ==========
+    @property
+    def patient_count(self):
+        return max(50, self.appointments // 8)
+
+    @property
+    def doctor_count(self):
+        if self.doctors:
+            return int(self.doctors)
+        return min(50, max(5, self.appointments // 20_000))
+
+    @property
+    def inventory_count(self):
+        return min(400, max(len(INVENTORY_BASE), self.appointments // 2_500))
+
+    def _name(self, gender):
+        first = self.rng.choice(FIRST_NAMES_MALE if gender == "ذكر" else FIRST_NAMES_FEMALE)
+        return f"{first} {self.rng.choice(FIRST_NAMES_MALE)} {self.rng.choice(FAMILY_NAMES)}"
+
+    def _phone(self):
+        return "01" + self.rng.choice("0125") + "".join(self.rng.choice("0123456789") for _ in range(8))
+
+    @staticmethod
+    def _chunks(rows, size):
+        chunk = []
+        for row in rows:
+            chunk.append(row)
+            if len(chunk) >= size:
+                yield chunk
+                chunk = []
+        if chunk:
+            yield chunk
+
+    def _bulk_insert(self, cursor, sql, rows):
+        count = 0
+        for chunk in self._chunks(rows, self.CHUNK_SIZE):
+            cursor.executemany(sql, chunk)
+            count += len(chunk)
+        return count
+
+    @staticmethod
+    def _max_id(cursor, table):
+        cursor.execute(f"SELECT COALESCE(MAX(id), 0) FROM {table}")
+        return cursor.fetchone()[0]
+
+    # ========== التوليد ==========
+    def generate(self, conn, progress=None):
+        """Insert the synthetic clinic into an initialized database connection.
+
+        Returns a dict with the number of rows inserted per table and the
+        elapsed time. ``progress`` is an optional callable(step, counts).
+        """
+        started = time.perf_counter()
+        cursor = conn.cursor()
+        cursor.execute("PRAGMA synchronous = OFF")
+        cursor.execute("PRAGMA journal_mode = MEMORY")
+        cursor.execute("PRAGMA foreign_keys = OFF")
+
+        today = date.today()
+        counts = {}
+
+        def report(step):
+            if progress:
+                progress(step, dict(counts))
+
+        # 1️⃣ أطباء
+        first_doctor = self._max_id(cursor, "doctors") + 1
+        doctors = []
+        for i in range(self.doctor_count):
+            gender = self.rng.choice(["ذكر", "أنثى"])
+            doctors.append((
+                f"د. {self._name(gender)}", self.rng.choice(SPECIALIZATIONS), self._phone(),
+                f"doctor{first_doctor + i}@clinic.com", self.rng.choice(CITIES),
+                (today - timedelta(days=self.rng.randint(90, 3000))).isoformat(),
+                float(self.rng.randrange(10_000, 40_000, 500)), float(self.rng.choice([10, 12, 15, 20])), 1,
+            ))
+        counts['doctors'] = self._bulk_insert(cursor, '''
+            INSERT INTO doctors (name, specialization, phone, email, address, hire_date, salary, commission_rate, is_active)
+            VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)
+        ''', doctors)
+        doctor_ids = list(range(first_doctor, first_doctor + self.doctor_count))
+        report('doctors')
+
+        # 2️⃣ علاجات
+        first_treatment = self._max_id(cursor, "treatments") + 1
+        counts['treatments'] = self._bulk_insert(cursor, '''
+            INSERT INTO treatments (name, description, base_price, duration_minutes, category, doctor_percentage, clinic_percentage, is_active)
+            VALUES (?, ?, ?, ?, ?, ?, ?, 1)
+        ''', [(name, f"{name} - بيانات قياس", price, duration, category, pct, 100.0 - pct)
+              for name, price, duration, category, pct in TREATMENTS])
+        treatments = [(first_treatment + i,) + t for i, t in enumerate(TREATMENTS)]
+        report('treatments')
+
+        # 3️⃣ مرضى
+        first_patient = self._max_id(cursor, "patients") + 1
+
+        def patient_rows():
+            blood_types = ["A+", "A-", "B+", "B-", "O+", "O-", "AB+", "AB-"]
+            for i in range(self.patient_count):
+                gender = self.rng.choice(["ذكر", "أنثى"])
+                birth = today - timedelta(days=self.rng.randint(5 * 365, 80 * 365))
+                yield (
+                    self._name(gender), self._phone(), f"patient{first_patient + i}@mail.com",
+                    f"{self.rng.choice(CITIES)}، شارع {self.rng.randint(1, 200)}", birth.isoformat(), gender,
+                    "لا يوجد", self._phone(), self.rng.choice(blood_types), "لا يوجد", "", 1,
+                )
+
+        counts['patients'] = self._bulk_insert(cursor, '''
+            INSERT INTO patients (name, phone, email, address, date_of_birth, gender, medical_history,
+                                  emergency_contact, blood_type, allergies, notes, is_active)
+            VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+        ''', patient_rows())
+        report('patients')
+
+        # 4️⃣ موردين ومخزون
+        first_supplier = self._max_id(cursor, "suppliers") + 1
+        supplier_count = max(3, self.inventory_count // 20)
+        counts['suppliers'] = self._bulk_insert(cursor, '''
+            INSERT INTO suppliers (name, contact_person, phone, email, address, payment_terms, is_active)
+            VALUES (?, ?, ?, ?, ?, ?, 1)
+        ''', [(f"شركة {self.rng.choice(FAMILY_NAMES)} للمستلزمات الطبية {i + 1}", self._name("ذكر"), self._phone(),
+               f"supplier{first_supplier + i}@medical.com", self.rng.choice(CITIES),
+               self.rng.choice(["نقدي", "آجل 30 يوم", "آجل 60 يوم"])) for i in range(supplier_count)])
+
+        first_item = self._max_id(cursor, "inventory") + 1
+        inventory_rows = []
+        for i in range(self.inventory_count):
+            name, category, price = INVENTORY_BASE[i % len(INVENTORY_BASE)]
+            inventory_rows.append((
+                f"{name} #{i // len(INVENTORY_BASE) + 1}", category, self.rng.randint(0, 500), price,
+                self.rng.choice([10, 20, 30, 50]), first_supplier + self.rng.randrange(supplier_count),
+                (today + timedelta(days=self.rng.randint(-30, 900))).isoformat(),
+                self.rng.choice(["مخزن A", "مخزن B", "مخزن C", "ثلاجة الأدوية"]), f"BENCH{first_item + i:06d}", 1,
+            ))
+        counts['inventory'] = self._bulk_insert(cursor, '''
+            INSERT INTO inventory (item_name, category, quantity, unit_price, min_stock_level, supplier_id,
+                                   expiry_date, location, barcode, is_active)
+            VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+        ''', inventory_rows)
+        report('inventory')
+
+        # 5️⃣ مواعيد - مع الاحتفاظ بما يلزم لتوليد المدفوعات والاستخدامات
+        first_appointment = self._max_id(cursor, "appointments") + 1
+        span = self.history_days + self.future_days
+        completed = []
+
+        def appointment_rows():
+            for i in range(self.appointments):
+                offset = self.rng.randrange(span) - self.history_days
+                appt_date = today + timedelta(days=offset)
+                treatment = self.rng.choice(treatments)
+                if offset < 0:
+                    status = "مكتمل" if self.rng.random() < 0.85 else self.rng.choice(["ملغي", "لم يحضر"])
+                else:
+                    status = self.rng.choice(["مجدول", "مؤكد"])
+                patient_id = first_patient + self.rng.randrange(self.patient_count)
+                if status == "مكتمل":
+                    completed.append((first_appointment + i, patient_id, treatment, appt_date))
+                yield (
+                    patient_id, self.rng.choice(doctor_ids), treatment[0], appt_date.isoformat(),
+                    self.rng.choice(TIME_SLOTS), status, "", treatment[2], 1 if offset < 0 else 0,
+                )
+
+        counts['appointments'] = self._bulk_insert(cursor, '''
+            INSERT INTO appointments (patient_id, doctor_id, treatment_id, appointment_date, appointment_time,
+                                      status, notes, total_cost, reminder_sent)
+            VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)
+        ''', appointment_rows())
+        report('appointments')
+
+        # 6️⃣ مدفوعات للمواعيد المكتملة
+        def payment_rows():
+            for appointment_id, patient_id, treatment, appt_date in completed:
+                if self.rng.random() > 0.9:
+                    continue
+                amount = treatment[2]
+                doctor_pct = treatment[5]
+                yield (
+                    appointment_id, patient_id, amount, self.rng.choice(PAYMENT_METHODS), appt_date.isoformat(),
+                    "مكتمل", amount * doctor_pct / 100, amount * (100 - doctor_pct) / 100, doctor_pct, 100 - doctor_pct, "",
+                )
+
+        counts['payments'] = self._bulk_insert(cursor, '''
+            INSERT INTO payments (appointment_id, patient_id, amount, payment_method, payment_date, status,
+                                  doctor_share, clinic_share, doctor_percentage, clinic_percentage, notes)
+            VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+        ''', payment_rows())
+        report('payments')
+
+        # 7️⃣ استخدام المخزون لنصف المواعيد المكتملة
+        def usage_rows():
+            for appointment_id, _, _, appt_date in completed:
+                if self.rng.random() < 0.5:
+                    yield (first_item + self.rng.randrange(self.inventory_count), appointment_id,
+                           self.rng.randint(1, 3), appt_date.isoformat(), "استخدام - بيانات قياس")
+
+        counts['inventory_usage'] = self._bulk_insert(cursor, '''
+            INSERT INTO inventory_usage (inventory_id, appointment_id, quantity_used, usage_date, notes)
+            VALUES (?, ?, ?, ?, ?)
+        ''', usage_rows())
+        report('inventory_usage')
+
+        # 8️⃣ مصروفات - عدة مصروفات يومياً حسب حجم العيادة
+        per_day = max(1, self.appointments // 5_000)
+
+        def expense_rows():
+            for day in range(self.history_days):
+                expense_date = (today - timedelta(days=day)).isoformat()
+                for _ in range(per_day):
+                    category, low, high = self.rng.choice(EXPENSE_CATEGORIES)
+                    yield (category, f"{category} - بيانات قياس", round(self.rng.uniform(low, high) / 30, 2),
+                           expense_date, self.rng.choice(PAYMENT_METHODS), f"BENCH-{day}", "", "الإدارة", 0)
+
+        counts['expenses'] = self._bulk_insert(cursor, '''
+            INSERT INTO expenses (category, description, amount, expense_date, payment_method, receipt_number,
+                                  notes, approved_by, is_recurring)
+            VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)
+        ''', expense_rows())
+        report('expenses')
+
+        # التحميل الأولي يُتحقق منه بفحص كامل، فلا حاجة لسجل تغييراته
+        cursor.execute("DELETE FROM change_log")
+        conn.commit()
+        cursor.execute("PRAGMA foreign_keys = ON")
+        cursor.execute("ANALYZE")
+
+        return {
+            'counts': counts,
+            'total_rows': sum(counts.values()),
+            'seconds': round(time.perf_counter() - started, 3),
+        }
@@ -1,6 +1,9 @@
 # components/__init__.py
 
+from .data_grid import DataGrid
+from .jobs_panel import JobsPanel
 from .notifications import NotificationCenter
+from .patient_selector import PatientSelector
 from .quick_actions import QuickActions
 
-__all__ = ['NotificationCenter', 'QuickActions']
\ No newline at end of file
+__all__ = ['DataGrid', 'JobsPanel', 'NotificationCenter', 'PatientSelector', 'QuickActions']
\ No newline at end of file
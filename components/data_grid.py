@@ -0,0 +1,39 @@
+# components/data_grid.py
+
+import streamlit as st
+from database.crud import crud
+
+class DataGrid:
+    """جدول قابل للتعديل يحفظ الخلايا المتغيرة فقط"""
+    
+    @staticmethod
+    def render(table, data, column_config=None, key=None):
+        """عرض الجدول وزر الحفظ؛ يعيد الإطار المعدل"""
+        key = key or f"grid_{table}"
+        
+        saved = st.session_state.pop(f"{key}_saved", None)
+        if saved is not None:
+            st.success(f"✅ تم حفظ التعديلات ({saved} سجل)")
+        
+        edited = st.data_editor(
+            data,
+            column_config=column_config,
+            hide_index=True,
+            use_container_width=True,
+            key=key
+        )
+        
+        if st.button("💾 حفظ التعديلات", key=f"{key}_save"):
+            try:
+                updated = crud.save_grid_changes(table, data, edited)
+            except Exception as e:
+                st.error(f"خطأ في حفظ التعديلات: {str(e)}")
+            else:
+                if updated:
+                    # إعادة تحميل الجدول من القاعدة بدلاً من التعديلات المعلقة
+                    st.session_state.pop(key, None)
+                    st.session_state[f"{key}_saved"] = updated
+                    st.rerun()
+                st.info("لا توجد تعديلات للحفظ")
+        
+        return edited
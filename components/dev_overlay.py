@@ -0,0 +1,77 @@
+# components/dev_overlay.py
+
+import streamlit as st
+import pandas as pd
+from utils.tracing import tracer, snapshot_state, widget_changes, export_chrome_trace
+
+MAX_TRACES = 30
+
+class DevOverlay:
+    """لوحة المطور: زمن إعادة التشغيل وعدد استعلامات قاعدة البيانات"""
+
+    @staticmethod
+    def enabled():
+        """وضع المطور يُفعّل بإضافة ?dev=1 إلى الرابط"""
+        if 'dev' in st.query_params:
+            st.session_state['_dev_mode'] = st.query_params.get('dev') == '1'
+        return st.session_state.get('_dev_mode', False)
+
+    @staticmethod
+    def begin():
+        """بدء تتبع إعادة التشغيل الحالية مع تحديد العنصر الذي تسبب بها"""
+        if not DevOverlay.enabled():
+            return None
+
+        previous = st.session_state.get('_trace_widget_state', {})
+        trigger = widget_changes(previous, snapshot_state(st.session_state))
+
+        page = st.session_state.get('current_page', 'dashboard')
+        return tracer.begin_rerun(page, trigger=trigger)
+
+    @staticmethod
+    def render():
+        """إنهاء التتبع وعرض النتائج في الشريط الجانبي"""
+        trace = tracer.end_rerun()
+        if trace is None:
+            return
+
+        # قيم العناصر في نهاية التشغيل تُقارن ببداية التشغيل التالي
+        st.session_state['_trace_widget_state'] = snapshot_state(st.session_state)
+
+        history = st.session_state.setdefault('_rerun_traces', [])
+        history.append(trace)
+        del history[:-MAX_TRACES]
+
+        with st.sidebar.expander("🛠️ أدوات المطور", expanded=True):
+            col1, col2 = st.columns(2)
+            col1.metric("زمن إعادة التشغيل", f"{trace.duration_ms:.0f} ms")
+            col2.metric("استعلامات قاعدة البيانات", trace.db_roundtrips)
+            col1.metric("استدعاءات CRUD", trace.crud_calls)
+            col2.metric("وقت قاعدة البيانات", f"{trace.db_ms:.0f} ms")
+            st.caption(f"المُسبب: {', '.join(map(str, trace.trigger)) or 'تنقل / تحميل أولي'}")
+
+            st.markdown("**توزيع الوقت**")
+            summary = pd.DataFrame(trace.summary())
+            if not summary.empty:
+                st.dataframe(
+                    summary[['path', 'total_ms', 'self_ms', 'db_roundtrips', 'db_ms']],
+                    use_container_width=True,
+                    hide_index=True
+                )
+
+            st.markdown("**إعادات التشغيل الأخيرة**")
+            recent = pd.DataFrame([{
+                'page': t.page,
+                'trigger': ', '.join(map(str, t.trigger)) or '-',
+                'ms': round(t.duration_ms, 1),
+                'queries': t.db_roundtrips,
+            } for t in reversed(history)])
+            st.dataframe(recent, use_container_width=True, hide_index=True)
+
+            st.download_button(
+                "⬇️ تصدير Chrome trace",
+                data=export_chrome_trace(history),
+                file_name="cura_trace.json",
+                mime="application/json",
+                use_container_width=True
+            )
@@ -0,0 +1,112 @@
+# components/jobs_panel.py
+
+import mimetypes
+import uuid
+
+import streamlit as st
+from database.jobs import job_runner, JOB_TYPES, ACTIVE_STATUSES, DONE, FAILED, CANCELLED
+
+# st.fragment يعيد تشغيل اللوحة وحدها كل بضع ثوانٍ (Streamlit >= 1.37)
+fragment = getattr(st, 'fragment', None)
+
+POLL_SECONDS = 2
+
+STATUS_ICONS = {
+    'queued': '⏳',
+    'running': '🔄',
+    DONE: '✅',
+    FAILED: '❌',
+    CANCELLED: '⛔',
+}
+
+class JobsPanel:
+    """لوحة "مهامي": المهام الخلفية للجلسة وتقدمها ونتائجها"""
+
+    LIMIT = 5
+
+    @staticmethod
+    def owner():
+        """معرّف الجلسة الذي تُسجل به مهامها"""
+        return st.session_state.setdefault('job_owner', uuid.uuid4().hex)
+
+    @staticmethod
+    def submit(kind, params=None, key=None):
+        """إرسال مهمة باسم الجلسة؛ يُحفظ معرّفها في session_state[key] إن وُجد"""
+        job_id = job_runner.submit(kind, params, owner=JobsPanel.owner())
+        if key:
+            st.session_state[key] = job_id
+        return job_id
+
+    @staticmethod
+    def track(key):
+        """حالة المهمة المحفوظة في session_state[key]؛ يعيد نتيجتها عند اكتمالها"""
+        job_id = st.session_state.get(key)
+        job = job_runner.status(job_id) if job_id else None
+        if job is None:
+            return None
+
+        if job['status'] in ACTIVE_STATUSES:
+            st.info(f"⏳ {job['message'] or 'في الانتظار'} - تابع التقدم من لوحة مهامي")
+            return None
+        if job['status'] != DONE:
+            st.session_state.pop(key, None)
+            if job['status'] == FAILED:
+                st.error(f"❌ فشلت المهمة: {job['error']}")
+            else:
+                st.warning("⛔ تم إلغاء المهمة")
+            return None
+        return job_runner.result(job_id)
+
+    @staticmethod
+    def render():
+        """عرض المهام في الشريط الجانبي؛ تُحدّث تلقائياً ما دامت هناك مهام جارية"""
+        st.markdown("### 🗂️ مهامي")
+
+        if fragment is not None and job_runner.has_active(JobsPanel.owner()):
+            _live_jobs()
+        else:
+            _jobs_list()
+
+
+def _jobs_list():
+    """قائمة المهام؛ تعيد True إذا كانت بينها مهام جارية"""
+    jobs = job_runner.jobs_for(JobsPanel.owner(), limit=JobsPanel.LIMIT)
+    if not jobs:
+        st.caption("لا توجد مهام")
+        return False
+
+    active = False
+    for job in jobs:
+        title = JOB_TYPES.get(job['kind'], {}).get('title', job['kind'])
+        st.markdown(f"{STATUS_ICONS.get(job['status'], '•')} **{title}**")
+
+        if job['status'] in ACTIVE_STATUSES:
+            active = True
+            st.progress(job['progress'] or 0.0, text=job['message'] or 'في الانتظار')
+            if st.button("إلغاء", key=f"job_cancel_{job['id']}"):
+                job_runner.cancel(job['id'])
+                st.rerun()
+        elif job['status'] == DONE and job['result_name']:
+            # النتيجة تُقرأ من القرص عند الضغط على الزر فقط
+            st.download_button(
+                f"📥 {job['result_name']}",
+                data=lambda job_id=job['id']: job_runner.result(job_id).data,
+                file_name=job['result_name'],
+                mime=mimetypes.guess_type(job['result_name'])[0],
+                on_click='ignore',
+                key=f"job_download_{job['id']}"
+            )
+        elif job['status'] == FAILED:
+            st.caption(f"⚠️ {job['error']}")
+        else:
+            st.caption(f"{job['finished_at'] or job['created_at']}")
+    return active
+
+
+def _poll_jobs():
+    if not _jobs_list():
+        # انتهت كل المهام: إعادة تشغيل الصفحة لتعرض نتائجها
+        st.rerun()
+
+
+_live_jobs = fragment(run_every=POLL_SECONDS)(_poll_jobs) if fragment is not None else _jobs_list
@@ -11,10 +11,10 @@ class NotificationCenter:
         """عرض الإشعارات في الشريط الجانبي"""
         st.markdown("### 🔔 الإشعارات")
         
-        notifications = crud.get_unread_notifications(limit=5)
+        unread_count = crud.get_unread_notifications_count()
         
-        if not notifications.empty:
-            unread_count = len(notifications)
+        if unread_count:
+            notifications = crud.get_unread_notifications(limit=5)
             st.warning(f"⚠️ لديك {unread_count} إشعار جديد")
             
             for _, notif in notifications.iterrows():
@@ -33,6 +33,10 @@ class NotificationCenter:
                     if st.button("✅ تحديد كمقروء", key=f"notif_{notif['id']}"):
                         crud.mark_notification_as_read(notif['id'])
                         st.rerun()
+            
+            if unread_count > 1 and st.button("✔️ تحديد الكل كمقروء", key="notif_read_all", use_container_width=True):
+                crud.mark_all_notifications_as_read()
+                st.rerun()
         else:
             st.success("✅ لا توجد إشعارات جديدة")
     
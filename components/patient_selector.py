@@ -0,0 +1,32 @@
+# components/patient_selector.py
+
+import streamlit as st
+from database.crud import crud
+
+class PatientSelector:
+    """اختيار مريض بالبحث في قاعدة البيانات بدلاً من تحميل كل المرضى في القائمة"""
+
+    @staticmethod
+    def render(label="المريض*", key="patient_select"):
+        """مربع بحث وقائمة بأقرب النتائج؛ يعيد رقم المريض المختار (None إذا لم يوجد)"""
+        query = st.text_input(
+            f"🔍 بحث عن {label.rstrip('*')}",
+            key=f"{key}_query",
+            placeholder="الاسم أو رقم الهاتف أو رقم المريض"
+        )
+        options = crud.get_patient_options(query)
+
+        # الاختيار السابق يبقى ظاهراً إذا لم يعد ضمن نتائج البحث
+        selected = st.session_state.get(key)
+        if selected is not None and selected not in options:
+            selected_label = crud.get_patient_label(selected)
+            if selected_label is None or query:
+                st.session_state.pop(key)
+            else:
+                options = {selected: selected_label, **options}
+
+        if not options:
+            st.caption("لا يوجد مرضى مطابقون للبحث")
+            return None
+
+        return st.selectbox(label, list(options), format_func=options.get, key=key)
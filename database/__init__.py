@@ -5,6 +5,7 @@ Cura Clinic Database Module
 
 from .models import db, Database
 from .crud import crud, CRUDOperations
+from .profiler import profiler, QueryProfiler
 
-__all__ = ['db', 'Database', 'crud', 'CRUDOperations']
+__all__ = ['db', 'Database', 'crud', 'CRUDOperations', 'profiler', 'QueryProfiler']
 __version__ = '1.0.0'
@@ -0,0 +1,318 @@
+"""
+Analytics Snapshot for Cura Clinic App
+Exports denormalized fact tables to month-partitioned Parquet for heavy reports
+"""
+
+import json
+import os
+import shutil
+import threading
+import time
+from datetime import date, datetime, timedelta
+
+import pandas as pd
+import pyarrow as pa
+import pyarrow.compute as pc
+import pyarrow.dataset as ds
+import pyarrow.parquet as pq
+
+from .models import db
+from .versions import table_versions
+
+# عمر المريض عند الزيارة بالسنوات
+AGE_AT = "CAST((julianday({column}) - julianday(p.date_of_birth)) / 365.25 AS INTEGER)"
+
+MONTH_PARTITIONING = ds.partitioning(pa.schema([('month', pa.string())]), flavor='hive')
+
+# الجداول التي تقرأ منها استعلامات الحقائق: أي كتابة فيها بعد التصدير تجعل اللقطة قديمة
+SOURCE_TABLES = ('appointments', 'payments', 'expenses', 'patients', 'doctors', 'treatments')
+
+# كل جدول حقائق: استعلام غير مُطبَّع بمكان لشرط التاريخ، وعمود التاريخ، ومخطط الأعمدة
+FACT_TABLES = {
+    'appointments': {
+        'date_column': 'appointment_date',
+        'sql': f"""
+            SELECT a.id, a.appointment_date, a.appointment_time, a.status,
+                   COALESCE(a.total_cost, 0) AS total_cost,
+                   a.patient_id, p.gender AS patient_gender, {AGE_AT.format(column='a.appointment_date')} AS patient_age,
+                   a.doctor_id, d.name AS doctor_name, d.specialization,
+                   a.treatment_id, t.name AS treatment_name, t.category AS treatment_category,
+                   t.duration_minutes, a.series_id
+            FROM appointments a
+            LEFT JOIN patients p ON a.patient_id = p.id
+            LEFT JOIN doctors d ON a.doctor_id = d.id
+            LEFT JOIN treatments t ON a.treatment_id = t.id
+            {{where}}
+        """,
+        'schema': pa.schema([
+            ('id', pa.int64()), ('appointment_date', pa.date32()), ('appointment_time', pa.string()),
+            ('status', pa.string()), ('total_cost', pa.float64()),
+            ('patient_id', pa.int64()), ('patient_gender', pa.string()), ('patient_age', pa.int32()),
+            ('doctor_id', pa.int64()), ('doctor_name', pa.string()), ('specialization', pa.string()),
+            ('treatment_id', pa.int64()), ('treatment_name', pa.string()), ('treatment_category', pa.string()),
+            ('duration_minutes', pa.int32()), ('series_id', pa.int64()),
+        ]),
+    },
+    'payments': {
+        'date_column': 'payment_date',
+        'sql': f"""
+            SELECT pay.id, pay.payment_date, pay.amount, pay.payment_method, pay.status,
+                   COALESCE(pay.doctor_share, 0) AS doctor_share, COALESCE(pay.clinic_share, 0) AS clinic_share,
+                   pay.doctor_percentage, pay.patient_id, p.gender AS patient_gender,
+                   {AGE_AT.format(column='pay.payment_date')} AS patient_age,
+                   pay.appointment_id, a.doctor_id, d.name AS doctor_name,
+                   a.treatment_id, t.name AS treatment_name, t.category AS treatment_category
+            FROM payments pay
+            LEFT JOIN patients p ON pay.patient_id = p.id
+            LEFT JOIN appointments a ON pay.appointment_id = a.id
+            LEFT JOIN doctors d ON a.doctor_id = d.id
+            LEFT JOIN treatments t ON a.treatment_id = t.id
+            {{where}}
+        """,
+        'schema': pa.schema([
+            ('id', pa.int64()), ('payment_date', pa.date32()), ('amount', pa.float64()),
+            ('payment_method', pa.string()), ('status', pa.string()),
+            ('doctor_share', pa.float64()), ('clinic_share', pa.float64()), ('doctor_percentage', pa.float64()),
+            ('patient_id', pa.int64()), ('patient_gender', pa.string()), ('patient_age', pa.int32()),
+            ('appointment_id', pa.int64()), ('doctor_id', pa.int64()), ('doctor_name', pa.string()),
+            ('treatment_id', pa.int64()), ('treatment_name', pa.string()), ('treatment_category', pa.string()),
+        ]),
+    },
+    'expenses': {
+        'date_column': 'expense_date',
+        'sql': """
+            SELECT e.id, e.expense_date, e.category, e.amount, e.payment_method, e.is_recurring
+            FROM expenses e
+            {where}
+        """,
+        'schema': pa.schema([
+            ('id', pa.int64()), ('expense_date', pa.date32()), ('category', pa.string()),
+            ('amount', pa.float64()), ('payment_method', pa.string()), ('is_recurring', pa.bool_()),
+        ]),
+    },
+}
+
+
+class AnalyticsSnapshot:
+    """Columnar copy of the appointment, payment and expense facts.
+
+    ``export()`` reads every fact table inside one read transaction, so the
+    three tables agree with each other, and writes them as Parquet files
+    partitioned by month (``<fact>/month=YYYY-MM/``). Each export goes to a
+    new version directory and ``manifest.json`` is replaced atomically, so
+    readers never see a half-written snapshot.
+
+    ``read()`` serves dates before the snapshot day from Parquet, with the
+    month partitions pruned and the date filter pushed down to row groups,
+    and only the remaining tail from the live database. The manifest records
+    the ``table_versions`` of the source tables; once any of them changes,
+    a backdated payment or a renamed doctor included, the snapshot is no
+    longer ``current()`` and every read goes to the live database until the
+    next export.
+    """
+
+    CHUNK_ROWS = 50000
+    KEEP_VERSIONS = 1
+
+    def __init__(self, database=None, directory=None):
+        self.db = database or db
+        self._directory = directory
+        self._lock = threading.Lock()
+        self._manifest = None   # (mtime, manifest)
+
+    @property
+    def directory(self):
+        if self._directory:
+            return self._directory
+        # بجوار ملف قاعدة البيانات: clinic.db -> clinic_analytics/
+        return os.environ.get('CURA_ANALYTICS_DIR') or os.path.splitext(os.path.abspath(self.db.db_path))[0] + '_analytics'
+
+    @property
+    def manifest_path(self):
+        return os.path.join(self.directory, 'manifest.json')
+
+    # ========== التصدير ==========
+    def export(self):
+        """Write a new snapshot of all fact tables; returns its manifest"""
+        with self._lock:
+            started = time.perf_counter()
+            now = datetime.now()
+            version = now.strftime('%Y%m%dT%H%M%S%f')
+            target = os.path.join(self.directory, version)
+            os.makedirs(target, exist_ok=True)
+
+            # الإصدارات تُقرأ قبل البيانات: كتابة أثناء التصدير تجعل اللقطة قديمة لا ناقصة
+            versions = table_versions.current(*SOURCE_TABLES)
+            conn = self.db.get_connection()
+            try:
+                # معاملة قراءة واحدة: الجداول الثلاثة من نفس اللحظة
+                conn.execute("BEGIN")
+                rows = {name: self._export_fact(conn, name, os.path.join(target, name)) for name in FACT_TABLES}
+                conn.rollback()
+            except Exception:
+                conn.close()
+                shutil.rmtree(target, ignore_errors=True)
+                raise
+            conn.close()
+
+            manifest = {
+                'version': version,
+                'as_of': now.date().isoformat(),
+                'created_at': now.isoformat(timespec='seconds'),
+                'table_versions': dict(zip(SOURCE_TABLES, versions)),
+                'rows': rows,
+                'seconds': round(time.perf_counter() - started, 3),
+            }
+            temporary = self.manifest_path + '.tmp'
+            with open(temporary, 'w', encoding='utf-8') as handle:
+                json.dump(manifest, handle, ensure_ascii=False, indent=2)
+            os.replace(temporary, self.manifest_path)
+            self._manifest = None
+            self._remove_old_versions(version)
+            return manifest
+
+    def _export_fact(self, conn, name, path):
+        fact = FACT_TABLES[name]
+        query = fact['sql'].format(where='') + f" ORDER BY {fact['date_column']}"
+        tables = [
+            self._with_month(name, self._to_arrow(name, chunk))
+            for chunk in pd.read_sql_query(query, conn, chunksize=self.CHUNK_ROWS)
+        ]
+        rows = sum(table.num_rows for table in tables)
+        if not rows:
+            return 0
+        ds.write_dataset(
+            pa.concat_tables(tables), path, format='parquet', partitioning=MONTH_PARTITIONING,
+            existing_data_behavior='overwrite_or_ignore',
+            file_options=ds.ParquetFileFormat().make_write_options(compression='zstd'),
+        )
+        return rows
+
+    def _remove_old_versions(self, current):
+        versions = sorted(
+            entry for entry in os.listdir(self.directory)
+            if entry != current and os.path.isdir(os.path.join(self.directory, entry))
+        )
+        # القراءات الجارية قد تستخدم النسخة السابقة
+        for entry in versions[:max(len(versions) - self.KEEP_VERSIONS, 0)]:
+            shutil.rmtree(os.path.join(self.directory, entry), ignore_errors=True)
+
+    @staticmethod
+    def _to_arrow(name, frame):
+        schema = FACT_TABLES[name]['schema']
+        frame = frame.copy()
+        date_column = FACT_TABLES[name]['date_column']
+        frame[date_column] = pd.to_datetime(frame[date_column], errors='coerce').dt.date
+        return pa.Table.from_pandas(frame[schema.names], schema=schema, preserve_index=False, safe=False)
+
+    @staticmethod
+    def _with_month(name, table):
+        return table.append_column('month', pc.strftime(table[FACT_TABLES[name]['date_column']], '%Y-%m'))
+
+    # ========== القراءة ==========
+    def info(self):
+        """The current manifest (None before the first export)"""
+        try:
+            mtime = os.path.getmtime(self.manifest_path)
+        except OSError:
+            return None
+        if self._manifest is None or self._manifest[0] != mtime:
+            with open(self.manifest_path, encoding='utf-8') as handle:
+                self._manifest = (mtime, json.load(handle))
+        return dict(self._manifest[1])
+
+    def available(self):
+        return self.info() is not None
+
+    def current(self, manifest=None):
+        """Whether no source table changed since the export of ``manifest``"""
+        manifest = manifest or self.info()
+        if manifest is None:
+            return False
+        # لقطة من قبل تسجيل الإصدارات لا يُعرف ما تغيّر بعدها
+        exported = manifest.get('table_versions') or {}
+        return tuple(exported.get(table) for table in SOURCE_TABLES) == table_versions.current(*SOURCE_TABLES)
+
+    def read(self, name, start_date=None, end_date=None, columns=None, filters=None):
+        """Rows of fact table ``name`` dated ``start_date``..``end_date``.
+
+        ``columns`` limits the columns read (``'month'`` is also available);
+        ``filters`` are extra ``(column, op, value)`` conditions in the
+        pyarrow/pandas filter format, applied in Parquet and in the live
+        tail alike. Dates are returned as ``datetime64``. A snapshot that is
+        not ``current()`` is ignored.
+        """
+        start = as_date(start_date)
+        end = as_date(end_date)
+        manifest = self.info()
+        if manifest is not None and not self.current(manifest):
+            manifest = None
+
+        parts = []
+        live_start = start
+        if manifest is not None:
+            as_of = date.fromisoformat(manifest['as_of'])
+            if start is None or start < as_of:
+                before = min(end + timedelta(days=1), as_of) if end else as_of
+                parts.append(self._read_snapshot(manifest, name, start, before, columns, filters))
+            live_start = max(start, as_of) if start else as_of
+        if not parts or end is None or live_start <= end:
+            parts.append(self._read_live(name, live_start, end, columns, filters))
+
+        table = pa.concat_tables(parts) if len(parts) > 1 else parts[0]
+        return table.to_pandas(date_as_object=False)
+
+    def _read_snapshot(self, manifest, name, start, before, columns, filters):
+        """Snapshot rows with start <= date < before"""
+        date_column = FACT_TABLES[name]['date_column']
+        path = os.path.join(self.directory, manifest['version'], name)
+        schema = FACT_TABLES[name]['schema'].append(pa.field('month', pa.string()))
+        if not os.path.isdir(path):
+            return schema.empty_table().select(columns or schema.names)
+
+        # شرط الشهر يستبعد ملفات الأقسام كاملة، وشرط التاريخ يستبعد مجموعات الصفوف
+        expression = (ds.field(date_column) < before) & (ds.field('month') <= before.strftime('%Y-%m'))
+        if start:
+            expression &= (ds.field(date_column) >= start) & (ds.field('month') >= start.strftime('%Y-%m'))
+        if filters:
+            expression &= pq.filters_to_expression(filters)
+        dataset = ds.dataset(path, schema=schema, format='parquet', partitioning=MONTH_PARTITIONING)
+        return dataset.to_table(columns=columns or schema.names, filter=expression)
+
+    def _read_live(self, name, start, end, columns, filters):
+        """Rows still missing from the snapshot, read with the same query"""
+        fact = FACT_TABLES[name]
+        conditions, params = [], []
+        if start:
+            conditions.append(f"{fact['date_column']} >= ?")
+            params.append(start.isoformat())
+        if end:
+            conditions.append(f"{fact['date_column']} <= ?")
+            params.append(end.isoformat())
+        where = ('WHERE ' + ' AND '.join(conditions)) if conditions else ''
+
+        conn = self.db.get_connection()
+        try:
+            frame = pd.read_sql_query(fact['sql'].format(where=where), conn, params=params)
+        finally:
+            conn.close()
+        table = self._with_month(name, self._to_arrow(name, frame))
+        if filters:
+            table = table.filter(pq.filters_to_expression(filters))
+        return table.select(columns or table.column_names)
+
+
+def as_date(value):
+    if value is None or isinstance(value, date):
+        return value
+    return date.fromisoformat(str(value)[:10])
+
+
+# لقطة مشتركة بين الجلسات
+analytics_snapshot = AnalyticsSnapshot()
+
+
+if __name__ == '__main__':
+    # للتشغيل الليلي (cron / Task Scheduler): python -m database.analytics
+    result = analytics_snapshot.export()
+    print(f"✅ تم تصدير لقطة التحليلات {result['version']}: {result['rows']} في {result['seconds']} ثانية")
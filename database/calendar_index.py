@@ -0,0 +1,302 @@
+"""
+Calendar Index for Cura Clinic App
+In-memory booked minutes per doctor and day, kept current from change_log
+"""
+
+import re
+import threading
+from collections import namedtuple
+from datetime import date, timedelta
+
+import numpy as np
+import pandas as pd
+
+from .models import db
+
+# مدة الموعد عند عدم تحديد مدة للعلاج
+DEFAULT_DURATION_MINUTES = 30
+
+CANCELLED_STATUS = 'ملغي'
+
+# وقت الموعد (HH:MM) بالدقائق من منتصف الليل داخل SQL
+TIME_MINUTES = "(CAST(substr({column}, 1, 2) AS INTEGER) * 60 + CAST(substr({column}, 4, 2) AS INTEGER))"
+
+# weekday() في بايثون: الاثنين = 0
+ARABIC_WEEKDAYS = {
+    'الاثنين': 0, 'الإثنين': 0,
+    'الثلاثاء': 1,
+    'الأربعاء': 2, 'الاربعاء': 2,
+    'الخميس': 3,
+    'الجمعة': 4,
+    'السبت': 5,
+    'الأحد': 6, 'الاحد': 6,
+}
+
+_DAY_PATTERN = re.compile('|'.join(sorted(ARABIC_WEEKDAYS, key=len, reverse=True)))
+_HOUR_PATTERN = re.compile(r'(\d{1,2})(?::(\d{2}))?\s*(صباحاً|صباحا|مساءً|مساءا|مساء|ص|م)?')
+
+WorkingHours = namedtuple('WorkingHours', ['weekdays', 'open_minute', 'close_minute'])
+
+# السبت - الخميس: 9 صباحاً - 9 مساءً
+DEFAULT_WORKING_HOURS = WorkingHours(frozenset({5, 6, 0, 1, 2, 3}), 9 * 60, 21 * 60)
+
+
+def parse_working_hours(text):
+    """Parse the free-text ``working_hours`` setting.
+
+    Understands a day range or list ("السبت - الخميس") followed by an hour
+    range in 12-hour Arabic ("9 صباحاً - 9 مساءً") or 24-hour ("09:00-21:00")
+    form. Whatever part cannot be read falls back to the default.
+    """
+    if not text:
+        return DEFAULT_WORKING_HOURS
+
+    days = [ARABIC_WEEKDAYS[name] for name in _DAY_PATTERN.findall(text)]
+    if len(days) == 2 and re.search(r'-|إلى|الى', text.split(':')[0]):
+        first, last = days
+        weekdays = frozenset((first + offset) % 7 for offset in range((last - first) % 7 + 1))
+    elif days:
+        weekdays = frozenset(days)
+    else:
+        weekdays = DEFAULT_WORKING_HOURS.weekdays
+
+    hours = []
+    for hour, minute, period in _HOUR_PATTERN.findall(_DAY_PATTERN.sub(' ', text)):
+        hour = int(hour) % 24
+        if period.startswith('م') and hour < 12:
+            hour += 12
+        hours.append(hour * 60 + int(minute or 0))
+    if len(hours) >= 2 and hours[1] > hours[0]:
+        open_minute, close_minute = hours[0], hours[1]
+    else:
+        open_minute, close_minute = DEFAULT_WORKING_HOURS.open_minute, DEFAULT_WORKING_HOURS.close_minute
+
+    return WorkingHours(weekdays, open_minute, close_minute)
+
+
+class CalendarIndex:
+    """Booked minutes and appointment counts per (doctor, day).
+
+    Covers a rolling window around today. The first query loads the window
+    with one indexed scan; later queries only re-read the appointments listed
+    in ``change_log`` since the last refresh. A change to treatments (their
+    durations), a new day or a gap in the change log rebuilds the window.
+    Days before the window are answered with a live grouped query.
+    """
+
+    PAST_DAYS = 7
+    HORIZON_DAYS = 180
+
+    BOOKINGS_SQL = f"""
+        SELECT a.id, a.doctor_id, a.appointment_date,
+               COALESCE(t.duration_minutes, {DEFAULT_DURATION_MINUTES}) AS minutes
+        FROM appointments a
+        LEFT JOIN treatments t ON a.treatment_id = t.id
+        WHERE a.appointment_date BETWEEN :first AND :last
+        AND a.status != '{CANCELLED_STATUS}'
+    """
+
+    LIVE_CELLS_SQL = f"""
+        SELECT a.doctor_id, a.appointment_date,
+               SUM(COALESCE(t.duration_minutes, {DEFAULT_DURATION_MINUTES})), COUNT(*)
+        FROM appointments a
+        LEFT JOIN treatments t ON a.treatment_id = t.id
+        WHERE a.appointment_date BETWEEN :first AND :last
+        AND a.status != '{CANCELLED_STATUS}'
+        GROUP BY a.doctor_id, a.appointment_date
+    """
+
+    def __init__(self, database=None):
+        self.db = database or db
+        self._lock = threading.RLock()
+        self._reset()
+
+    def _reset(self):
+        self._bookings = {}   # appointment id -> (doctor_id, date, minutes)
+        self._cells = {}      # (doctor_id, date) -> [booked minutes, appointments]
+        self._window = None   # (first, last) ISO dates
+        self._watermark = None
+        self._doctors = None
+        self.working_hours = DEFAULT_WORKING_HOURS
+
+    def invalidate(self):
+        """Drop everything; the next query rebuilds from the database"""
+        with self._lock:
+            self._reset()
+
+    # ========== التحديث ==========
+    def refresh(self, until=None):
+        """Bring the index up to date; ``until`` extends the window end"""
+        with self._lock:
+            conn = self.db.get_connection()
+            try:
+                self._refresh(conn, until)
+            finally:
+                conn.close()
+
+    def _refresh(self, conn, until):
+        cursor = conn.cursor()
+        first = (date.today() - timedelta(days=self.PAST_DAYS)).isoformat()
+        last = max((date.today() + timedelta(days=self.HORIZON_DAYS)).isoformat(), until or '')
+
+        row = cursor.execute("SELECT value FROM settings WHERE key = 'working_hours'").fetchone()
+        self.working_hours = parse_working_hours(row[0] if row else None)
+
+        low, high = cursor.execute("SELECT MIN(id), COALESCE(MAX(id), 0) FROM change_log").fetchone()
+        if self._window is None or self._window[0] != first or self._window[1] < last:
+            self._rebuild(cursor, first, last, high)
+            return
+        if high <= self._watermark:
+            return
+        if low is not None and low > self._watermark + 1:
+            # حُذفت تغييرات لم نقرأها بعد
+            self._rebuild(cursor, first, last, high)
+            return
+
+        window = {'low': self._watermark, 'high': high}
+        changed_tables = {
+            name for (name,) in cursor.execute(
+                "SELECT DISTINCT table_name FROM change_log WHERE id > :low AND id <= :high", window
+            )
+        }
+        if 'treatments' in changed_tables:
+            self._rebuild(cursor, first, last, high)
+            return
+        if 'doctors' in changed_tables:
+            self._doctors = None
+        if 'appointments' in changed_tables:
+            self._apply_changes(cursor, window)
+        self._watermark = high
+
+    def _rebuild(self, cursor, first, last, high):
+        self._bookings = {}
+        self._cells = {}
+        self._doctors = None
+        cursor.execute(self.BOOKINGS_SQL, {'first': first, 'last': last})
+        for appointment_id, doctor_id, day, minutes in cursor.fetchall():
+            self._add(appointment_id, doctor_id, day, minutes)
+        self._window = (first, last)
+        self._watermark = high
+
+    def _apply_changes(self, cursor, window):
+        changed = """
+            SELECT record_id FROM change_log
+            WHERE table_name = 'appointments' AND id > :low AND id <= :high
+        """
+        # إزالة الحجز القديم ثم إعادة قراءة الحالي (المحذوف والملغي لا يعودان)
+        for (appointment_id,) in cursor.execute(changed, window).fetchall():
+            self._remove(appointment_id)
+        cursor.execute(
+            self.BOOKINGS_SQL + f" AND a.id IN ({changed})",
+            {'first': self._window[0], 'last': self._window[1], **window}
+        )
+        for appointment_id, doctor_id, day, minutes in cursor.fetchall():
+            self._add(appointment_id, doctor_id, day, minutes)
+
+    def _add(self, appointment_id, doctor_id, day, minutes):
+        minutes = int(minutes or DEFAULT_DURATION_MINUTES)
+        self._bookings[appointment_id] = (doctor_id, day, minutes)
+        cell = self._cells.setdefault((doctor_id, day), [0, 0])
+        cell[0] += minutes
+        cell[1] += 1
+
+    def _remove(self, appointment_id):
+        booking = self._bookings.pop(appointment_id, None)
+        if booking is None:
+            return
+        doctor_id, day, minutes = booking
+        cell = self._cells[(doctor_id, day)]
+        cell[0] -= minutes
+        cell[1] -= 1
+        if cell[1] == 0:
+            del self._cells[(doctor_id, day)]
+
+    def _cells_between(self, first, last):
+        """{(doctor_id, date): (booked minutes, appointments)} for ISO dates first..last"""
+        with self._lock:
+            window_first = self._window[0]
+            cells = {key: tuple(cell) for key, cell in self._cells.items() if first <= key[1] <= last}
+        if first < window_first:
+            # الأيام السابقة للنافذة: تجميع مباشر من قاعدة البيانات
+            live_last = min(last, (date.fromisoformat(window_first) - timedelta(days=1)).isoformat())
+            conn = self.db.get_connection()
+            try:
+                cursor = conn.cursor()
+                cursor.execute(self.LIVE_CELLS_SQL, {'first': first, 'last': live_last})
+                for doctor_id, day, minutes, count in cursor.fetchall():
+                    cells[(doctor_id, day)] = (int(minutes), count)
+            finally:
+                conn.close()
+        return cells
+
+    def _active_doctors(self):
+        if self._doctors is None:
+            conn = self.db.get_connection()
+            try:
+                self._doctors = conn.execute(
+                    "SELECT id, name FROM doctors WHERE is_active = 1 ORDER BY name"
+                ).fetchall()
+            finally:
+                conn.close()
+        return self._doctors
+
+    # ========== الاستعلام ==========
+    def capacity_minutes(self, day):
+        """Working minutes on ``day`` (0 on closed days)"""
+        hours = self.working_hours
+        if day.weekday() not in hours.weekdays:
+            return 0
+        return hours.close_minute - hours.open_minute
+
+    def day_load(self, doctor_id, day):
+        """Booked/free minutes and appointment count of one doctor on one day"""
+        self.refresh(until=day.isoformat())
+        cells = self._cells_between(day.isoformat(), day.isoformat())
+        booked, count = cells.get((doctor_id, day.isoformat()), (0, 0))
+        capacity = self.capacity_minutes(day)
+        return {
+            'booked_minutes': booked,
+            'capacity_minutes': capacity,
+            'free_minutes': max(capacity - booked, 0),
+            'appointments': count,
+            'occupancy': booked / capacity if capacity else None,
+        }
+
+    def occupancy(self, start=None, days=30, value='occupancy'):
+        """Doctors x days matrix for the ``days`` days from ``start``.
+
+        ``value`` is ``'occupancy'`` (booked / working minutes, NaN on closed
+        days), ``'booked_minutes'`` or ``'appointments'``. Rows are active
+        doctors by name, columns ISO dates.
+        """
+        start = start or date.today()
+        dates = [(start + timedelta(days=offset)).isoformat() for offset in range(days)]
+        self.refresh(until=dates[-1])
+        cells = self._cells_between(dates[0], dates[-1])
+
+        with self._lock:
+            doctors = self._active_doctors()
+        rows = {doctor_id: position for position, (doctor_id, _) in enumerate(doctors)}
+        columns = {day: position for position, day in enumerate(dates)}
+        booked = np.zeros((len(doctors), days))
+        counts = np.zeros((len(doctors), days), dtype=int)
+        for (doctor_id, day), (minutes, count) in cells.items():
+            row, column = rows.get(doctor_id), columns.get(day)
+            if row is not None and column is not None:
+                booked[row, column] = minutes
+                counts[row, column] = count
+
+        if value == 'appointments':
+            matrix = counts
+        elif value == 'booked_minutes':
+            matrix = booked
+        else:
+            capacity = np.array([self.capacity_minutes(date.fromisoformat(day)) for day in dates], dtype=float)
+            capacity[capacity == 0] = np.nan
+            matrix = booked / capacity
+
+        return pd.DataFrame(matrix, index=[name for _, name in doctors], columns=dates)
+
+
+# فهرس مشترك بين الجلسات
+calendar_index = CalendarIndex()
@@ -2,6 +2,20 @@ import sqlite3
 import pandas as pd
 from datetime import datetime, date, timedelta
 from .models import db
+from .calendar_index import calendar_index, parse_working_hours, DEFAULT_DURATION_MINUTES, TIME_MINUTES
+from .recurrence import occurrence_dates, FREQUENCIES
+from .notifications import notification_engine
+from .forecasting import inventory_forecaster
+from .analytics import analytics_snapshot
+from .cube import analytics_cube, GRAINS
+from .grid import GRID_TABLES, grid_updates
+from .patient360 import patient_360
+from .scheduler import scheduler, TASKS
+from .reference import reference_data
+from .schema import apply_schema
+from .records import Doctor, Patient, Treatment, Appointment, Payment, Supplier, Expense, fetch_scalar, fetch_one, fetch_record
+from .profiler import profiler
+from .versions import versioned
 
 class CRUDOperations:
     def __init__(self):
@@ -27,6 +41,7 @@ class CRUDOperations:
         conn.close()
         return doctor_id
     
+    @versioned('doctors')
     def get_all_doctors(self, active_only=True):
         """الحصول على جميع الأطباء"""
         conn = self.db.get_connection()
@@ -39,11 +54,9 @@ class CRUDOperations:
         return df
     
     def get_doctor_by_id(self, doctor_id):
-        """الحصول على طبيب بواسطة ID"""
+        """الحصول على طبيب بواسطة ID (Doctor أو None)"""
         conn = self.db.get_connection()
-        cursor = conn.cursor()
-        cursor.execute("SELECT * FROM doctors WHERE id = ?", (doctor_id,))
-        result = cursor.fetchone()
+        result = fetch_record(conn, Doctor, doctor_id)
         conn.close()
         return result
     
@@ -96,6 +109,7 @@ class CRUDOperations:
         conn.close()
         return patient_id
     
+    @versioned('patients')
     def get_all_patients(self, active_only=True):
         """الحصول على جميع المرضى"""
         conn = self.db.get_connection()
@@ -105,14 +119,12 @@ class CRUDOperations:
         query += " ORDER BY name"
         df = pd.read_sql_query(query, conn)
         conn.close()
-        return df
+        return apply_schema(df, 'patients')
     
     def get_patient_by_id(self, patient_id):
-        """الحصول على مريض بواسطة ID"""
+        """الحصول على مريض بواسطة ID (Patient أو None)"""
         conn = self.db.get_connection()
-        cursor = conn.cursor()
-        cursor.execute("SELECT * FROM patients WHERE id = ?", (patient_id,))
-        result = cursor.fetchone()
+        result = fetch_record(conn, Patient, patient_id)
         conn.close()
         return result
     
@@ -218,6 +230,7 @@ class CRUDOperations:
         conn.close()
         return treatment_id
     
+    @versioned('treatments')
     def get_all_treatments(self, active_only=True):
         """الحصول على جميع العلاجات"""
         conn = self.db.get_connection()
@@ -230,11 +243,9 @@ class CRUDOperations:
         return df
     
     def get_treatment_by_id(self, treatment_id):
-        """الحصول على علاج بواسطة ID"""
+        """الحصول على علاج بواسطة ID (Treatment أو None)"""
         conn = self.db.get_connection()
-        cursor = conn.cursor()
-        cursor.execute("SELECT * FROM treatments WHERE id = ?", (treatment_id,))
-        result = cursor.fetchone()
+        result = fetch_record(conn, Treatment, treatment_id)
         conn.close()
         return result
     
@@ -268,6 +279,120 @@ class CRUDOperations:
         conn.commit()
         conn.close()
     
+    # ========== مكونات العلاجات ==========
+    def get_treatment_materials(self, treatment_id=None):
+        """أصناف المخزون المستخدمة في كل علاج وكمياتها"""
+        conn = self.db.get_connection()
+        query = '''
+            SELECT 
+                tm.id,
+                tm.treatment_id,
+                t.name as treatment_name,
+                tm.inventory_id,
+                i.item_name,
+                tm.quantity
+            FROM treatment_materials tm
+            JOIN treatments t ON tm.treatment_id = t.id
+            JOIN inventory i ON tm.inventory_id = i.id
+        '''
+        params = ()
+        if treatment_id is not None:
+            query += " WHERE tm.treatment_id = ?"
+            params = (treatment_id,)
+        query += " ORDER BY t.name, i.item_name"
+        df = pd.read_sql_query(query, conn, params=params)
+        conn.close()
+        return df
+    
+    def set_treatment_materials(self, treatment_id, materials):
+        """استبدال مكونات علاج بقائمة (inventory_id, quantity)"""
+        conn = self.db.get_connection()
+        cursor = conn.cursor()
+        cursor.execute("DELETE FROM treatment_materials WHERE treatment_id = ?", (treatment_id,))
+        cursor.executemany(
+            "INSERT INTO treatment_materials (treatment_id, inventory_id, quantity) VALUES (?, ?, ?)",
+            [(treatment_id, int(inventory_id), int(quantity)) for inventory_id, quantity in materials if quantity > 0]
+        )
+        
+        self.log_activity(conn, "تحديث مكونات علاج", "treatments", treatment_id,
+                         f"تم تحديد {len(materials)} صنف لمكونات العلاج")
+        
+        conn.commit()
+        conn.close()
+    
+    def _deduct_treatment_materials(self, cursor, appointment_id):
+        """صرف مكونات علاج الموعد من المخزون (مرة واحدة لكل موعد)
+
+        يُصرف المتوفر فقط إذا لم تكفِ الدفعات، ويُسجل النقص في ملاحظات الاستخدام.
+        """
+        cursor.execute("SELECT COALESCE(MAX(id), 0) FROM inventory_usage")
+        last_id = cursor.fetchone()[0]
+        cursor.execute('''
+            INSERT OR IGNORE INTO inventory_usage (inventory_id, appointment_id, quantity_used, usage_date, notes, source)
+            SELECT tm.inventory_id, a.id, tm.quantity, ?, 'صرف تلقائي - مكونات العلاج', 'bom'
+            FROM appointments a
+            JOIN treatment_materials tm ON tm.treatment_id = a.treatment_id
+            WHERE a.id = ?
+        ''', (date.today().isoformat(), appointment_id))
+        
+        cursor.execute(
+            "SELECT id, inventory_id, quantity_used FROM inventory_usage WHERE appointment_id = ? AND source = 'bom' AND id > ?",
+            (appointment_id, last_id)
+        )
+        shortages = []
+        for usage_id, inventory_id, quantity in cursor.fetchall():
+            allocations = self._consume_lots(cursor, inventory_id, quantity, usage_id, allow_partial=True)
+            missing = quantity - sum(take for _, _, take in allocations)
+            if missing:
+                shortages.append((usage_id, missing))
+        cursor.executemany(
+            "UPDATE inventory_usage SET notes = notes || ' - نقص في المخزون: ' || ? WHERE id = ?",
+            ((missing, usage_id) for usage_id, missing in shortages)
+        )
+        return shortages
+    
+    def backfill_treatment_usage(self, start_date=None, end_date=None, replace=False):
+        """إعادة حساب استخدام المواد للمواعيد المكتملة السابقة من مكونات العلاجات
+
+        سجل استخدام فقط لبيانات التوقعات والتقارير، بدون صرف من الدفعات الحالية.
+        replace=True يحذف أولاً سجلات الفترة المحسوبة سابقاً (غير المصروفة من دفعات)
+        ليعكس أي تعديل في المكونات. تُرجع عدد السجلات المضافة.
+        """
+        window = {
+            'start': start_date.isoformat() if start_date else '0000-01-01',
+            'end': end_date.isoformat() if end_date else '9999-12-31',
+        }
+        conn = self.db.get_connection()
+        cursor = conn.cursor()
+        try:
+            if replace:
+                cursor.execute('''
+                    DELETE FROM inventory_usage
+                    WHERE source = 'bom'
+                    AND usage_date BETWEEN :start AND :end
+                    AND id NOT IN (SELECT usage_id FROM inventory_usage_lots WHERE usage_id IS NOT NULL)
+                ''', window)
+            
+            cursor.execute('''
+                INSERT OR IGNORE INTO inventory_usage (inventory_id, appointment_id, quantity_used, usage_date, notes, source)
+                SELECT tm.inventory_id, a.id, tm.quantity, a.appointment_date, 'مكونات العلاج - سجل سابق', 'bom'
+                FROM appointments a
+                JOIN treatment_materials tm ON tm.treatment_id = a.treatment_id
+                WHERE a.status = 'مكتمل'
+                AND a.appointment_date BETWEEN :start AND :end
+            ''', window)
+            inserted = cursor.rowcount
+            
+            self.log_activity(conn, "إعادة حساب استخدام المواد", "inventory_usage", None,
+                             f"تم تسجيل {inserted} استخدام من {window['start']} إلى {window['end']}")
+            conn.commit()
+        except Exception:
+            conn.rollback()
+            raise
+        finally:
+            conn.close()
+        return inserted
+    
     # ========== عمليات المواعيد ==========
     def create_appointment(self, patient_id, doctor_id, treatment_id, appointment_date, 
                           appointment_time, notes="", total_cost=0.0):
@@ -290,6 +415,7 @@ class CRUDOperations:
         conn.close()
         return appointment_id
     
+    @versioned('appointments', 'patients', 'doctors', 'treatments')
     def get_all_appointments(self):
         """الحصول على جميع المواعيد مع تفاصيل المريض والطبيب والعلاج"""
         conn = self.db.get_connection()
@@ -316,7 +442,7 @@ class CRUDOperations:
         '''
         df = pd.read_sql_query(query, conn)
         conn.close()
-        return df
+        return apply_schema(df, 'appointments')
     
     def get_appointments_by_date(self, target_date):
         """الحصول على مواعيد يوم محدد"""
@@ -372,16 +498,32 @@ class CRUDOperations:
         conn.close()
         return df
     
+    def get_appointment_by_id(self, appointment_id):
+        """الحصول على موعد بواسطة ID (Appointment أو None)"""
+        conn = self.db.get_connection()
+        result = fetch_record(conn, Appointment, appointment_id)
+        conn.close()
+        return result
+    
     def update_appointment_status(self, appointment_id, status):
-        """تحديث حالة الموعد"""
+        """تحديث حالة الموعد (الاكتمال يصرف مكونات العلاج في نفس المعاملة)"""
         conn = self.db.get_connection()
         cursor = conn.cursor()
-        cursor.execute("UPDATE appointments SET status = ? WHERE id = ?", (status, appointment_id))
         
-        self.log_activity(conn, "تحديث موعد", "appointments", appointment_id, f"تم تغيير الحالة إلى: {status}")
-        
-        conn.commit()
-        conn.close()
+        try:
+            cursor.execute("UPDATE appointments SET status = ? WHERE id = ?", (status, appointment_id))
+            
+            self.log_activity(conn, "تحديث موعد", "appointments", appointment_id, f"تم تغيير الحالة إلى: {status}")
+            
+            if status == 'مكتمل':
+                self._deduct_treatment_materials(cursor, appointment_id)
+            
+            conn.commit()
+        except Exception:
+            conn.rollback()
+            raise
+        finally:
+            conn.close()
     
     def delete_appointment(self, appointment_id):
         """حذف موعد"""
@@ -422,6 +564,218 @@ class CRUDOperations:
         conn.close()
         return df
     
+    # ========== سلاسل المواعيد المتكررة ==========
+    # تعارض موعد قائم (للطبيب أو المريض) مع أيام temp.series_dates في نفس الوقت
+    SERIES_CONFLICTS_SQL = f'''
+        SELECT DISTINCT s.appointment_date,
+               CASE WHEN a.doctor_id = :doctor_id THEN 'الطبيب مشغول' ELSE 'المريض لديه موعد' END as reason,
+               a.appointment_time as existing_time
+        FROM temp.series_dates s
+        JOIN appointments a ON a.appointment_date = s.appointment_date
+        LEFT JOIN treatments t ON a.treatment_id = t.id
+        WHERE (a.doctor_id = :doctor_id OR a.patient_id = :patient_id)
+        AND a.status != 'ملغي'
+        AND (:series_id IS NULL OR a.series_id IS NOT :series_id)
+        AND {TIME_MINUTES.format(column='a.appointment_time')} < :start_minute + :duration
+        AND :start_minute < {TIME_MINUTES.format(column='a.appointment_time')} + COALESCE(t.duration_minutes, {DEFAULT_DURATION_MINUTES})
+        ORDER BY s.appointment_date
+    '''
+
+    def _series_conflicts(self, cursor, doctor_id, patient_id, treatment_id, appointment_time, series_id=None):
+        """تعارضات أيام temp.series_dates مع المواعيد القائمة وأيام العطلة"""
+        cursor.execute("SELECT duration_minutes FROM treatments WHERE id = ?", (treatment_id,))
+        row = cursor.fetchone()
+        hour, minute = (int(part) for part in appointment_time.split(':')[:2])
+        params = {
+            'doctor_id': doctor_id,
+            'patient_id': patient_id,
+            'series_id': series_id,
+            'start_minute': hour * 60 + minute,
+            'duration': (row[0] if row and row[0] else DEFAULT_DURATION_MINUTES),
+        }
+        conflicts = [(day, reason) for day, reason, _ in cursor.execute(self.SERIES_CONFLICTS_SQL, params).fetchall()]
+
+        cursor.execute("SELECT value FROM settings WHERE key = 'working_hours'")
+        row = cursor.fetchone()
+        working_days = parse_working_hours(row[0] if row else None).weekdays
+        busy = {day for day, _ in conflicts}
+        for (day,) in cursor.execute("SELECT appointment_date FROM temp.series_dates").fetchall():
+            if date.fromisoformat(day).weekday() not in working_days and day not in busy:
+                conflicts.append((day, 'يوم عطلة'))
+
+        return sorted(conflicts)
+
+    def _load_series_dates(self, cursor, dates=None, select_sql=None, params=()):
+        cursor.execute("CREATE TEMP TABLE IF NOT EXISTS series_dates (appointment_date TEXT PRIMARY KEY)")
+        cursor.execute("DELETE FROM temp.series_dates")
+        if select_sql:
+            cursor.execute("INSERT OR IGNORE INTO temp.series_dates (appointment_date) " + select_sql, params)
+        else:
+            cursor.executemany(
+                "INSERT OR IGNORE INTO temp.series_dates (appointment_date) VALUES (?)",
+                ((day.isoformat(),) for day in dates)
+            )
+
+    def preview_appointment_series(self, patient_id, doctor_id, treatment_id, start_date, appointment_time,
+                                   frequency='weekly', interval=1, occurrences=None, until_date=None):
+        """معاينة أيام السلسلة مع التعارضات قبل الحجز"""
+        dates = occurrence_dates(start_date, frequency, interval, occurrences, until_date)
+        conn = self.db.get_connection()
+        try:
+            cursor = conn.cursor()
+            self._load_series_dates(cursor, dates)
+            conflicts = dict(self._series_conflicts(cursor, doctor_id, patient_id, treatment_id, appointment_time))
+        finally:
+            conn.close()
+        return pd.DataFrame({
+            'appointment_date': [day.isoformat() for day in dates],
+            'conflict': [conflicts.get(day.isoformat()) for day in dates],
+        })
+
+    def create_appointment_series(self, patient_id, doctor_id, treatment_id, start_date, appointment_time,
+                                  frequency='weekly', interval=1, occurrences=None, until_date=None,
+                                  notes="", total_cost=0.0, skip_conflicts=True):
+        """إنشاء سلسلة مواعيد متكررة وحجز كل مواعيدها في معاملة واحدة
+
+        الأيام المتعارضة تُتخطى، أو تُلغى العملية كلها إذا كان skip_conflicts=False.
+        تُرجع رقم السلسلة وعدد المواعيد المحجوزة وقائمة التعارضات.
+        """
+        dates = occurrence_dates(start_date, frequency, interval, occurrences, until_date)
+        conn = self.db.get_connection()
+        try:
+            cursor = conn.cursor()
+            self._load_series_dates(cursor, dates)
+            conflicts = self._series_conflicts(cursor, doctor_id, patient_id, treatment_id, appointment_time)
+            if conflicts and not skip_conflicts:
+                raise ValueError(f"تعارض في {len(conflicts)} موعد: " + "، ".join(day for day, _ in conflicts))
+
+            cursor.execute('''
+                INSERT INTO appointment_series (patient_id, doctor_id, treatment_id, start_date, appointment_time,
+                                                frequency, interval, occurrences, until_date, total_cost, notes)
+                VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+            ''', (patient_id, doctor_id, treatment_id, start_date.isoformat(), appointment_time, frequency,
+                  interval, occurrences, until_date.isoformat() if until_date else None, total_cost, notes))
+            series_id = cursor.lastrowid
+
+            cursor.executemany("DELETE FROM temp.series_dates WHERE appointment_date = ?",
+                               ((day,) for day, _ in conflicts))
+            cursor.execute('''
+                INSERT INTO appointments (patient_id, doctor_id, treatment_id, appointment_date,
+                                          appointment_time, notes, total_cost, series_id)
+                SELECT ?, ?, ?, appointment_date, ?, ?, ?, ?
+                FROM temp.series_dates
+                ORDER BY appointment_date
+            ''', (patient_id, doctor_id, treatment_id, appointment_time, notes, total_cost, series_id))
+            created = cursor.rowcount
+
+            self.log_activity(conn, "إضافة سلسلة مواعيد", "appointment_series", series_id,
+                             f"تم حجز {created} موعد ({FREQUENCIES[frequency]}) بدءاً من {start_date.isoformat()} الساعة {appointment_time}")
+            conn.commit()
+        except Exception:
+            conn.rollback()
+            raise
+        finally:
+            conn.close()
+
+        return {'series_id': series_id, 'created': created, 'conflicts': conflicts}
+
+    def get_appointment_series(self):
+        """جميع السلاسل مع عدد المواعيد القادمة في كل منها"""
+        conn = self.db.get_connection()
+        df = pd.read_sql_query('''
+            SELECT
+                s.id,
+                p.name as patient_name,
+                d.name as doctor_name,
+                t.name as treatment_name,
+                s.frequency,
+                s.interval,
+                s.start_date,
+                s.appointment_time,
+                s.status,
+                COUNT(a.id) as total_appointments,
+                SUM(CASE WHEN a.appointment_date >= ? AND a.status IN ('مجدول', 'مؤكد') THEN 1 ELSE 0 END) as upcoming,
+                MAX(a.appointment_date) as last_date
+            FROM appointment_series s
+            LEFT JOIN patients p ON s.patient_id = p.id
+            LEFT JOIN doctors d ON s.doctor_id = d.id
+            LEFT JOIN treatments t ON s.treatment_id = t.id
+            LEFT JOIN appointments a ON a.series_id = s.id
+            GROUP BY s.id
+            ORDER BY s.created_at DESC, s.id DESC
+        ''', conn, params=(date.today().isoformat(),))
+        conn.close()
+        return df
+
+    def reschedule_series(self, series_id, new_time=None, shift_days=0, from_date=None):
+        """نقل المواعيد القادمة في السلسلة (وقت جديد و/أو إزاحة بالأيام) بتحديث واحد
+
+        تُرفض العملية كلها إذا تعارض أي موعد منقول مع حجز آخر.
+        """
+        from_date = (from_date or date.today()).isoformat()
+        shift = f"{int(shift_days):+d} days"
+        scope = '''
+            FROM appointments
+            WHERE series_id = ? AND appointment_date >= ? AND status IN ('مجدول', 'مؤكد')
+        '''
+        conn = self.db.get_connection()
+        try:
+            cursor = conn.cursor()
+            cursor.execute("SELECT patient_id, doctor_id, treatment_id, appointment_time FROM appointment_series WHERE id = ?",
+                           (series_id,))
+            series = cursor.fetchone()
+            if series is None:
+                raise ValueError(f"السلسلة {series_id} غير موجودة")
+            patient_id, doctor_id, treatment_id, series_time = series
+            new_time = new_time or series_time
+
+            self._load_series_dates(cursor, select_sql="SELECT date(appointment_date, ?) " + scope,
+                                    params=(shift, series_id, from_date))
+            conflicts = self._series_conflicts(cursor, doctor_id, patient_id, treatment_id, new_time, series_id)
+            if conflicts:
+                raise ValueError(f"تعارض في {len(conflicts)} موعد: " + "، ".join(day for day, _ in conflicts))
+
+            cursor.execute('''
+                UPDATE appointments
+                SET appointment_date = date(appointment_date, ?), appointment_time = ?
+                WHERE id IN (SELECT id ''' + scope + ')',
+                (shift, new_time, series_id, from_date))
+            moved = cursor.rowcount
+            cursor.execute("UPDATE appointment_series SET appointment_time = ? WHERE id = ?", (new_time, series_id))
+
+            self.log_activity(conn, "تعديل سلسلة مواعيد", "appointment_series", series_id,
+                             f"تم نقل {moved} موعد إلى الساعة {new_time} بإزاحة {int(shift_days)} يوم")
+            conn.commit()
+        except Exception:
+            conn.rollback()
+            raise
+        finally:
+            conn.close()
+        return moved
+
+    def cancel_series(self, series_id, from_date=None):
+        """إلغاء المواعيد القادمة في السلسلة بتحديث واحد"""
+        from_date = (from_date or date.today()).isoformat()
+        conn = self.db.get_connection()
+        try:
+            cursor = conn.cursor()
+            cursor.execute('''
+                UPDATE appointments SET status = 'ملغي'
+                WHERE series_id = ? AND appointment_date >= ? AND status IN ('مجدول', 'مؤكد')
+            ''', (series_id, from_date))
+            cancelled = cursor.rowcount
+            cursor.execute("UPDATE appointment_series SET status = 'ملغي' WHERE id = ?", (series_id,))
+
+            self.log_activity(conn, "إلغاء سلسلة مواعيد", "appointment_series", series_id,
+                             f"تم إلغاء {cancelled} موعد من {from_date}")
+            conn.commit()
+        except Exception:
+            conn.rollback()
+            raise
+        finally:
+            conn.close()
+        return cancelled
+
     # ========== عمليات المدفوعات ==========
     def create_payment(self, appointment_id, patient_id, amount, payment_method, payment_date, notes=""):
         """إضافة دفعة جديدة مع حساب تقسيم الطبيب والعيادة تلقائياً"""
@@ -478,7 +832,39 @@ class CRUDOperations:
         conn.commit()
         conn.close()
         return payment_id
-    
+
+    def get_open_appointments(self, patient_id):
+        """مواعيد المريض غير الملغاة التي لم تُسدد تكلفتها بالكامل (لنموذج الدفعة)"""
+        conn = self.db.get_connection()
+        query = '''
+            SELECT
+                a.id,
+                a.appointment_date,
+                d.name as doctor_name,
+                t.name as treatment_name,
+                a.total_cost,
+                COALESCE(paid.amount, 0) as paid,
+                a.total_cost - COALESCE(paid.amount, 0) as remaining,
+                COALESCE(t.doctor_percentage, 50.0) as doctor_percentage,
+                COALESCE(t.clinic_percentage, 50.0) as clinic_percentage
+            FROM appointments a
+            LEFT JOIN doctors d ON a.doctor_id = d.id
+            LEFT JOIN treatments t ON a.treatment_id = t.id
+            LEFT JOIN (
+                SELECT appointment_id, SUM(amount) as amount
+                FROM payments
+                WHERE appointment_id IN (SELECT id FROM appointments WHERE patient_id = ?)
+                GROUP BY appointment_id
+            ) paid ON paid.appointment_id = a.id
+            WHERE a.patient_id = ? AND a.status != 'ملغي'
+            AND a.total_cost > COALESCE(paid.amount, 0)
+            ORDER BY a.appointment_date DESC
+        '''
+        df = pd.read_sql_query(query, conn, params=(patient_id, patient_id))
+        conn.close()
+        return df
+
+    @versioned('payments', 'patients')
     def get_all_payments(self):
         """الحصول على جميع المدفوعات مع تفاصيل التقسيم"""
         conn = self.db.get_connection()
@@ -502,7 +888,14 @@ class CRUDOperations:
         '''
         df = pd.read_sql_query(query, conn)
         conn.close()
-        return df
+        return apply_schema(df, 'payments')
+    
+    def get_payment_by_id(self, payment_id):
+        """الحصول على دفعة بواسطة ID (Payment أو None)"""
+        conn = self.db.get_connection()
+        result = fetch_record(conn, Payment, payment_id)
+        conn.close()
+        return result
     
     def update_payment_status(self, payment_id, status):
         """تحديث حالة الدفع"""
@@ -527,9 +920,27 @@ class CRUDOperations:
         conn.close()
     
     # ========== عمليات المخزون ==========
+    # ترتيب صرف الدفعات حسب سياسة inventory_consumption_policy
+    LOT_ORDER = {
+        'fefo': "expiry_date IS NULL, expiry_date, received_date, id",
+        'fifo': "received_date, id",
+    }
+    
+    # توزيع كمية على الدفعات بالترتيب: كل دفعة تعطي ما يكمل المطلوب بعد ما قبلها
+    LOT_ALLOCATION_SQL = '''
+        SELECT id, unit_cost, MIN(quantity_remaining, :quantity - (running - quantity_remaining)) as take
+        FROM (
+            SELECT id, unit_cost, quantity_remaining,
+                   SUM(quantity_remaining) OVER (ORDER BY {order} ROWS UNBOUNDED PRECEDING) as running
+            FROM inventory_lots
+            WHERE inventory_id = :inventory_id AND quantity_remaining > 0
+        )
+        WHERE running - quantity_remaining < :quantity
+    '''
+    
     def create_inventory_item(self, item_name, category, quantity, unit_price, min_stock_level, 
                              supplier_id=None, expiry_date=None, location="", barcode=""):
-        """إضافة عنصر مخزون جديد"""
+        """إضافة عنصر مخزون جديد (الكمية الأولى تُسجل كدفعة)"""
         conn = self.db.get_connection()
         cursor = conn.cursor()
         
@@ -541,6 +952,9 @@ class CRUDOperations:
               supplier_id, expiry_date, location, barcode))
         
         item_id = cursor.lastrowid
+        cursor.execute("INSERT INTO inventory_on_hand (inventory_id, quantity) VALUES (?, 0)", (item_id,))
+        if quantity > 0:
+            self._receive_lot(cursor, item_id, quantity, unit_price, expiry_date, supplier_id=supplier_id)
         
         self.log_activity(conn, "إضافة مخزون", "inventory", item_id, 
                          f"تم إضافة صنف: {item_name} - الكمية: {quantity}")
@@ -549,15 +963,19 @@ class CRUDOperations:
         conn.close()
         return item_id
     
+    @versioned('inventory', 'suppliers', 'inventory_on_hand')
     def get_all_inventory(self, active_only=True):
-        """الحصول على جميع عناصر المخزون"""
+        """الحصول على جميع عناصر المخزون مع قيمة الرصيد"""
         conn = self.db.get_connection()
         query = '''
             SELECT 
                 i.*,
-                s.name as supplier_name
+                s.name as supplier_name,
+                COALESCE(oh.stock_value, 0) as stock_value,
+                COALESCE(oh.lot_count, 0) as lot_count
             FROM inventory i
             LEFT JOIN suppliers s ON i.supplier_id = s.id
+            LEFT JOIN inventory_on_hand oh ON oh.inventory_id = i.id
         '''
         if active_only:
             query += " WHERE i.is_active = 1"
@@ -568,54 +986,194 @@ class CRUDOperations:
         return df
     
     def get_low_stock_items(self):
-        """الحصول على العناصر قليلة المخزون"""
+        """الحصول على العناصر قليلة المخزون (من الرصيد المحسوب مسبقاً)"""
         conn = self.db.get_connection()
         query = '''
-            SELECT * FROM inventory 
-            WHERE quantity <= min_stock_level 
-            AND is_active = 1
-            ORDER BY quantity
+            SELECT 
+                i.*,
+                oh.quantity as on_hand,
+                oh.stock_value,
+                s.name as supplier_name
+            FROM inventory_on_hand oh
+            JOIN inventory i ON oh.inventory_id = i.id
+            LEFT JOIN suppliers s ON i.supplier_id = s.id
+            WHERE oh.quantity <= i.min_stock_level 
+            AND i.is_active = 1
+            ORDER BY oh.quantity
         '''
         df = pd.read_sql_query(query, conn)
         conn.close()
         return df
     
-    def update_inventory_quantity(self, item_id, quantity, operation="set"):
-        """تحديث كمية المخزون"""
+    def get_stock_on_hand(self):
+        """رصيد وقيمة كل صنف وأقرب تاريخ انتهاء"""
+        conn = self.db.get_connection()
+        df = pd.read_sql_query('''
+            SELECT 
+                i.id,
+                i.item_name,
+                i.category,
+                oh.quantity,
+                oh.stock_value,
+                oh.next_expiry,
+                oh.lot_count,
+                i.min_stock_level
+            FROM inventory_on_hand oh
+            JOIN inventory i ON oh.inventory_id = i.id
+            WHERE i.is_active = 1
+            ORDER BY i.item_name
+        ''', conn)
+        conn.close()
+        return df
+    
+    def receive_inventory_lot(self, inventory_id, quantity, unit_cost, expiry_date=None,
+                              lot_number=None, received_date=None, supplier_id=None):
+        """استلام دفعة جديدة بكميتها وتكلفتها وتاريخ انتهائها"""
+        if quantity <= 0:
+            raise ValueError("كمية الدفعة يجب أن تكون أكبر من صفر")
         conn = self.db.get_connection()
         cursor = conn.cursor()
+        lot_id = self._receive_lot(cursor, inventory_id, quantity, unit_cost, expiry_date,
+                                   lot_number, received_date, supplier_id)
         
-        if operation == "set":
-            cursor.execute("UPDATE inventory SET quantity = ? WHERE id = ?", (quantity, item_id))
-        elif operation == "add":
-            cursor.execute("UPDATE inventory SET quantity = quantity + ? WHERE id = ?", (quantity, item_id))
-        elif operation == "subtract":
-            cursor.execute("UPDATE inventory SET quantity = quantity - ? WHERE id = ?", (quantity, item_id))
-        
-        self.log_activity(conn, "تحديث مخزون", "inventory", item_id, 
-                         f"تم تحديث الكمية - العملية: {operation}, القيمة: {quantity}")
+        self.log_activity(conn, "استلام دفعة", "inventory_lots", lot_id,
+                         f"تم استلام {quantity} من الصنف {inventory_id} بتكلفة {unit_cost}")
         
         conn.commit()
         conn.close()
+        return lot_id
+    
+    def _receive_lot(self, cursor, inventory_id, quantity, unit_cost, expiry_date=None,
+                     lot_number=None, received_date=None, supplier_id=None):
+        cursor.execute('''
+            INSERT INTO inventory_lots (inventory_id, lot_number, quantity_received, quantity_remaining,
+                                        unit_cost, expiry_date, received_date, supplier_id)
+            VALUES (?, ?, ?, ?, ?, ?, ?, ?)
+        ''', (inventory_id, lot_number, quantity, quantity, unit_cost, expiry_date,
+              received_date or date.today().isoformat(), supplier_id))
+        return cursor.lastrowid
+    
+    def _consume_lots(self, cursor, inventory_id, quantity, usage_id=None, allow_partial=False):
+        """صرف كمية من الدفعات حسب السياسة
+
+        ترفع ValueError إذا لم تكفِ الدفعات، إلا مع allow_partial فيُصرف المتوفر فقط.
+        """
+        cursor.execute("SELECT value FROM settings WHERE key = 'inventory_consumption_policy'")
+        row = cursor.fetchone()
+        order = self.LOT_ORDER.get(row[0] if row else 'fefo', self.LOT_ORDER['fefo'])
+        
+        cursor.execute(self.LOT_ALLOCATION_SQL.format(order=order),
+                       {'inventory_id': inventory_id, 'quantity': quantity})
+        allocations = cursor.fetchall()
+        available = sum(take for _, _, take in allocations)
+        if available < quantity and not allow_partial:
+            raise ValueError(f"الكمية المتوفرة ({available}) أقل من المطلوبة ({quantity})")
+        
+        cursor.executemany(
+            "UPDATE inventory_lots SET quantity_remaining = quantity_remaining - ? WHERE id = ?",
+            ((take, lot_id) for lot_id, _, take in allocations)
+        )
+        cursor.executemany(
+            "INSERT INTO inventory_usage_lots (usage_id, lot_id, quantity, unit_cost) VALUES (?, ?, ?, ?)",
+            ((usage_id, lot_id, take, unit_cost) for lot_id, unit_cost, take in allocations)
+        )
+        return allocations
+    
+    def _adjust_stock(self, cursor, item_id, delta):
+        if delta > 0:
+            cursor.execute("SELECT unit_price, supplier_id FROM inventory WHERE id = ?", (item_id,))
+            unit_price, supplier_id = cursor.fetchone()
+            self._receive_lot(cursor, item_id, delta, unit_price, lot_number='تسوية', supplier_id=supplier_id)
+        elif delta < 0:
+            self._consume_lots(cursor, item_id, -delta)
+    
+    def get_inventory_lots(self, inventory_id=None, include_empty=False):
+        """دفعات المخزون (المتبقية فقط افتراضياً)"""
+        conn = self.db.get_connection()
+        query = '''
+            SELECT 
+                l.id,
+                i.item_name,
+                l.lot_number,
+                l.quantity_received,
+                l.quantity_remaining,
+                l.unit_cost,
+                l.quantity_remaining * COALESCE(l.unit_cost, 0) as lot_value,
+                l.expiry_date,
+                l.received_date,
+                s.name as supplier_name
+            FROM inventory_lots l
+            JOIN inventory i ON l.inventory_id = i.id
+            LEFT JOIN suppliers s ON l.supplier_id = s.id
+            WHERE 1 = 1
+        '''
+        params = []
+        if inventory_id is not None:
+            query += " AND l.inventory_id = ?"
+            params.append(inventory_id)
+        if not include_empty:
+            query += " AND l.quantity_remaining > 0"
+        query += " ORDER BY i.item_name, l.expiry_date IS NULL, l.expiry_date, l.received_date"
+        
+        df = pd.read_sql_query(query, conn, params=params)
+        conn.close()
+        return df
+    
+    def update_inventory_quantity(self, item_id, quantity, operation="set"):
+        """تحديث كمية المخزون (الزيادة دفعة تسوية، والنقص صرف من الدفعات)"""
+        conn = self.db.get_connection()
+        cursor = conn.cursor()
+        
+        try:
+            if operation == "set":
+                cursor.execute("SELECT quantity FROM inventory_on_hand WHERE inventory_id = ?", (item_id,))
+                row = cursor.fetchone()
+                self._adjust_stock(cursor, item_id, quantity - (row[0] if row else 0))
+            elif operation == "add":
+                self._adjust_stock(cursor, item_id, quantity)
+            elif operation == "subtract":
+                self._adjust_stock(cursor, item_id, -quantity)
+            
+            self.log_activity(conn, "تحديث مخزون", "inventory", item_id, 
+                             f"تم تحديث الكمية - العملية: {operation}, القيمة: {quantity}")
+            
+            conn.commit()
+        except Exception:
+            conn.rollback()
+            raise
+        finally:
+            conn.close()
     
     def update_inventory_item(self, item_id, item_name, category, quantity, unit_price, 
                              min_stock_level, supplier_id, expiry_date, location, barcode):
-        """تحديث عنصر مخزون"""
+        """تحديث عنصر مخزون
+
+        تغيير الكمية يُسجل كتسوية على الدفعات. تاريخ الانتهاء يخص الدفعات، فلا يُعدل من هنا.
+        """
         conn = self.db.get_connection()
         cursor = conn.cursor()
         
-        cursor.execute('''
-            UPDATE inventory 
-            SET item_name=?, category=?, quantity=?, unit_price=?, min_stock_level=?, 
-                supplier_id=?, expiry_date=?, location=?, barcode=?
-            WHERE id=?
-        ''', (item_name, category, quantity, unit_price, min_stock_level, 
-              supplier_id, expiry_date, location, barcode, item_id))
-        
-        self.log_activity(conn, "تحديث مخزون", "inventory", item_id, f"تم تحديث صنف: {item_name}")
-        
-        conn.commit()
-        conn.close()
+        try:
+            cursor.execute('''
+                UPDATE inventory 
+                SET item_name=?, category=?, unit_price=?, min_stock_level=?, 
+                    supplier_id=?, location=?, barcode=?
+                WHERE id=?
+            ''', (item_name, category, unit_price, min_stock_level, 
+                  supplier_id, location, barcode, item_id))
+            
+            cursor.execute("SELECT quantity FROM inventory_on_hand WHERE inventory_id = ?", (item_id,))
+            row = cursor.fetchone()
+            self._adjust_stock(cursor, item_id, quantity - (row[0] if row else 0))
+            
+            self.log_activity(conn, "تحديث مخزون", "inventory", item_id, f"تم تحديث صنف: {item_name}")
+            
+            conn.commit()
+        except Exception:
+            conn.rollback()
+            raise
+        finally:
+            conn.close()
     
     def delete_inventory_item(self, item_id):
         """حذف عنصر مخزون"""
@@ -629,29 +1187,45 @@ class CRUDOperations:
         conn.close()
     
     def add_inventory_usage(self, inventory_id, appointment_id, quantity_used, usage_date, notes=""):
-        """تسجيل استخدام مخزون"""
+        """تسجيل استخدام مخزون (يُصرف من الدفعات FEFO أو FIFO)"""
         conn = self.db.get_connection()
         cursor = conn.cursor()
         
-        cursor.execute('''
-            INSERT INTO inventory_usage (inventory_id, appointment_id, quantity_used, usage_date, notes)
-            VALUES (?, ?, ?, ?, ?)
-        ''', (inventory_id, appointment_id, quantity_used, usage_date, notes))
-        
-        # تحديث الكمية
-        cursor.execute('''
-            UPDATE inventory SET quantity = quantity - ? WHERE id = ?
-        ''', (quantity_used, inventory_id))
-        
-        usage_id = cursor.lastrowid
-        
-        self.log_activity(conn, "استخدام مخزون", "inventory_usage", usage_id, 
-                         f"تم استخدام {quantity_used} من الصنف {inventory_id}")
-        
-        conn.commit()
-        conn.close()
+        try:
+            cursor.execute('''
+                INSERT INTO inventory_usage (inventory_id, appointment_id, quantity_used, usage_date, notes)
+                VALUES (?, ?, ?, ?, ?)
+            ''', (inventory_id, appointment_id, quantity_used, usage_date, notes))
+            
+            usage_id = cursor.lastrowid
+            
+            # الصرف من الدفعات يحدّث الرصيد والكمية عبر المشغلات
+            self._consume_lots(cursor, inventory_id, quantity_used, usage_id)
+            
+            self.log_activity(conn, "استخدام مخزون", "inventory_usage", usage_id, 
+                             f"تم استخدام {quantity_used} من الصنف {inventory_id}")
+            
+            conn.commit()
+        except Exception:
+            conn.rollback()
+            raise
+        finally:
+            conn.close()
         return usage_id
     
+    # ========== توقعات المخزون ==========
+    def get_inventory_forecast(self, refresh=False):
+        """الاستهلاك اليومي المتوقع وأيام التغطية لكل صنف (يُحسب مرة يومياً)"""
+        return inventory_forecaster.forecast(refresh=refresh)
+    
+    def get_reorder_suggestions(self, refresh=False):
+        """الأصناف التي بلغت نقطة إعادة الطلب مع الكمية المقترحة"""
+        return inventory_forecaster.reorder_suggestions(refresh=refresh)
+    
+    def get_reorder_by_supplier(self, refresh=False):
+        """إجمالي الطلبيات المقترحة لكل مورد"""
+        return inventory_forecaster.suggestions_by_supplier(refresh=refresh)
+    
     # ========== عمليات الموردين ==========
     def create_supplier(self, name, contact_person, phone, email, address, payment_terms):
         """إضافة مورد جديد"""
@@ -671,6 +1245,7 @@ class CRUDOperations:
         conn.close()
         return supplier_id
     
+    @versioned('suppliers')
     def get_all_suppliers(self, active_only=True):
         """الحصول على جميع الموردين"""
         conn = self.db.get_connection()
@@ -683,11 +1258,9 @@ class CRUDOperations:
         return df
     
     def get_supplier_by_id(self, supplier_id):
-        """الحصول على مورد بواسطة ID"""
+        """الحصول على مورد بواسطة ID (Supplier أو None)"""
         conn = self.db.get_connection()
-        cursor = conn.cursor()
-        cursor.execute("SELECT * FROM suppliers WHERE id = ?", (supplier_id,))
-        result = cursor.fetchone()
+        result = fetch_record(conn, Supplier, supplier_id)
         conn.close()
         return result
     
@@ -741,19 +1314,18 @@ class CRUDOperations:
         conn.close()
         return expense_id
     
+    @versioned('expenses')
     def get_all_expenses(self):
         """الحصول على جميع المصروفات"""
         conn = self.db.get_connection()
         df = pd.read_sql_query("SELECT * FROM expenses ORDER BY expense_date DESC", conn)
         conn.close()
-        return df
+        return apply_schema(df, 'expenses')
     
     def get_expense_by_id(self, expense_id):
-        """الحصول على مصروف بواسطة ID"""
+        """الحصول على مصروف بواسطة ID (Expense أو None)"""
         conn = self.db.get_connection()
-        cursor = conn.cursor()
-        cursor.execute("SELECT * FROM expenses WHERE id = ?", (expense_id,))
-        result = cursor.fetchone()
+        result = fetch_record(conn, Expense, expense_id)
         conn.close()
         return result
     
@@ -792,18 +1364,17 @@ class CRUDOperations:
         """الحصول على ملخص مالي"""
         conn = self.db.get_connection()
         
-        # إجمالي المدفوعات
-        payments_query = "SELECT COALESCE(SUM(amount), 0) as total_payments FROM payments"
+        # إجمالي المدفوعات والمصروفات (قيمة واحدة لكل منهما دون DataFrame)
+        payments_query = "SELECT COALESCE(SUM(amount), 0) FROM payments"
+        expenses_query = "SELECT COALESCE(SUM(amount), 0) FROM expenses"
+        params = ()
         if start_date and end_date:
-            payments_query += f" WHERE payment_date BETWEEN '{start_date}' AND '{end_date}'"
+            payments_query += " WHERE payment_date BETWEEN ? AND ?"
+            expenses_query += " WHERE expense_date BETWEEN ? AND ?"
+            params = (str(start_date), str(end_date))
         
-        # إجمالي المصروفات
-        expenses_query = "SELECT COALESCE(SUM(amount), 0) as total_expenses FROM expenses"
-        if start_date and end_date:
-            expenses_query += f" WHERE expense_date BETWEEN '{start_date}' AND '{end_date}'"
-        
-        total_payments = pd.read_sql_query(payments_query, conn).iloc[0]['total_payments']
-        total_expenses = pd.read_sql_query(expenses_query, conn).iloc[0]['total_expenses']
+        total_payments = fetch_scalar(conn, payments_query, params, 0)
+        total_expenses = fetch_scalar(conn, expenses_query, params, 0)
         
         conn.close()
         
@@ -817,102 +1388,61 @@ class CRUDOperations:
         """عدد المواعيد اليومية"""
         conn = self.db.get_connection()
         today = date.today().isoformat()
-        query = "SELECT COUNT(*) as count FROM appointments WHERE appointment_date = ?"
-        result = pd.read_sql_query(query, conn, params=(today,))
+        count = fetch_scalar(conn, "SELECT COUNT(*) FROM appointments WHERE appointment_date = ?", (today,), 0)
         conn.close()
-        return result.iloc[0]['count'] if not result.empty else 0
+        return count
     
     # ========== تقارير متقدمة ==========
     
     def get_revenue_by_period(self, start_date, end_date, group_by='day'):
         """الإيرادات حسب الفترة الزمنية"""
-        conn = self.db.get_connection()
-        
-        if group_by == 'day':
-            date_format = '%Y-%m-%d'
-        elif group_by == 'month':
-            date_format = '%Y-%m'
-        elif group_by == 'year':
-            date_format = '%Y'
-        else:
-            date_format = '%Y-%m-%d'
-        
-        query = f'''
-            SELECT 
-                strftime('{date_format}', payment_date) as period,
-                SUM(amount) as total_revenue,
-                COUNT(*) as payment_count
-            FROM payments
-            WHERE payment_date BETWEEN ? AND ?
-            GROUP BY period
-            ORDER BY period
-        '''
-        
-        df = pd.read_sql_query(query, conn, params=(start_date, end_date))
-        conn.close()
-        return df
+        df = analytics_cube.query('payments', measures=['revenue', 'count'], grain=group_by if group_by in GRAINS else 'day',
+                                  start_date=start_date, end_date=end_date)
+        return df.rename(columns={'revenue': 'total_revenue', 'count': 'payment_count'})
     
     def get_expenses_by_category(self, start_date, end_date):
         """المصروفات حسب الفئة"""
-        conn = self.db.get_connection()
-        query = '''
-            SELECT 
-                category,
-                SUM(amount) as total,
-                COUNT(*) as count
-            FROM expenses
-            WHERE expense_date BETWEEN ? AND ?
-            GROUP BY category
-            ORDER BY total DESC
-        '''
-        df = pd.read_sql_query(query, conn, params=(start_date, end_date))
-        conn.close()
-        return df
+        df = analytics_cube.query('expenses', ['category'], ['amount', 'count'], start_date=start_date, end_date=end_date)
+        return df.rename(columns={'amount': 'total'}).sort_values('total', ascending=False, ignore_index=True)
     
     def get_doctor_performance(self, start_date, end_date):
-        """أداء الأطباء"""
-        conn = self.db.get_connection()
-        query = '''
-            SELECT 
-                d.name as doctor_name,
-                d.specialization,
-                COUNT(a.id) as total_appointments,
-                SUM(CASE WHEN a.status = 'مكتمل' THEN 1 ELSE 0 END) as completed_appointments,
-                COALESCE(SUM(a.total_cost), 0) as total_revenue,
-                COALESCE(AVG(a.total_cost), 0) as avg_revenue_per_appointment,
-                d.commission_rate,
-                COALESCE((SUM(a.total_cost) * d.commission_rate / 100), 0) as total_commission
-            FROM doctors d
-            LEFT JOIN appointments a ON d.id = a.doctor_id 
-                AND a.appointment_date BETWEEN ? AND ?
-            WHERE d.is_active = 1
-            GROUP BY d.id, d.name, d.specialization, d.commission_rate
-            ORDER BY total_revenue DESC
-        '''
-        df = pd.read_sql_query(query, conn, params=(start_date, end_date))
-        conn.close()
-        return df
+        """أداء الأطباء (كل الأطباء النشطين حتى بدون مواعيد)"""
+        conn = self.db.get_connection()
+        doctors = pd.read_sql_query(
+            "SELECT id, name as doctor_name, specialization, commission_rate FROM doctors WHERE is_active = 1", conn
+        )
+        conn.close()
+        
+        stats = analytics_cube.query('appointments', ['doctor'], ['count', 'completed', 'revenue', 'avg_revenue'],
+                                     start_date=start_date, end_date=end_date)
+        df = doctors.merge(stats.drop(columns='doctor_name'), left_on='id', right_on='doctor_id', how='left')
+        df[['count', 'completed', 'revenue', 'avg_revenue']] = df[['count', 'completed', 'revenue', 'avg_revenue']].fillna(0)
+        df = df.rename(columns={
+            'count': 'total_appointments',
+            'completed': 'completed_appointments',
+            'revenue': 'total_revenue',
+            'avg_revenue': 'avg_revenue_per_appointment'
+        })
+        df[['total_appointments', 'completed_appointments']] = df[['total_appointments', 'completed_appointments']].astype(int)
+        df['total_commission'] = df['total_revenue'] * df['commission_rate'].fillna(0) / 100
+        return df[[
+            'doctor_name', 'specialization', 'total_appointments', 'completed_appointments', 'total_revenue',
+            'avg_revenue_per_appointment', 'commission_rate', 'total_commission'
+        ]].sort_values('total_revenue', ascending=False, ignore_index=True)
     
     def get_treatment_popularity(self, start_date, end_date):
         """العلاجات الأكثر طلباً"""
-        conn = self.db.get_connection()
-        query = '''
-            SELECT 
-                t.name as treatment_name,
-                t.category,
-                COUNT(a.id) as booking_count,
-                COALESCE(SUM(a.total_cost), 0) as total_revenue,
-                COALESCE(AVG(a.total_cost), 0) as avg_price
-            FROM treatments t
-            LEFT JOIN appointments a ON t.id = a.treatment_id
-            WHERE a.appointment_date BETWEEN ? AND ?
-            GROUP BY t.id, t.name, t.category
-            HAVING booking_count > 0
-            ORDER BY booking_count DESC
-        '''
-        df = pd.read_sql_query(query, conn, params=(start_date, end_date))
-        conn.close()
-        return df
+        df = analytics_cube.query('appointments', ['treatment', 'category'], ['count', 'revenue', 'avg_revenue'],
+                                  start_date=start_date, end_date=end_date)
+        df = df[df['treatment_id'].notna()].rename(columns={
+            'treatment_category': 'category',
+            'count': 'booking_count',
+            'revenue': 'total_revenue',
+            'avg_revenue': 'avg_price'
+        })
+        return df[['treatment_name', 'category', 'booking_count', 'total_revenue', 'avg_price']].sort_values(
+            'booking_count', ascending=False, ignore_index=True
+        )
     
     def get_patient_statistics(self):
         """إحصائيات المرضى"""
@@ -965,33 +1495,22 @@ class CRUDOperations:
     
     def get_payment_methods_stats(self, start_date, end_date):
         """إحصائيات طرق الدفع"""
-        conn = self.db.get_connection()
-        query = '''
-            SELECT 
-                payment_method,
-                COUNT(*) as count,
-                SUM(amount) as total
-            FROM payments
-            WHERE payment_date BETWEEN ? AND ?
-            GROUP BY payment_method
-            ORDER BY total DESC
-        '''
-        df = pd.read_sql_query(query, conn, params=(start_date, end_date))
-        conn.close()
-        return df
+        df = analytics_cube.query('payments', ['payment_method'], ['count', 'revenue'], start_date=start_date, end_date=end_date)
+        return df.rename(columns={'revenue': 'total'}).sort_values('total', ascending=False, ignore_index=True)
     
     def get_inventory_value(self):
-        """قيمة المخزون الإجمالية"""
+        """قيمة المخزون الإجمالية بتكلفة الدفعات المتبقية"""
         conn = self.db.get_connection()
         query = '''
             SELECT 
-                category,
-                SUM(quantity * unit_price) as total_value,
-                SUM(quantity) as total_quantity,
+                i.category,
+                SUM(oh.stock_value) as total_value,
+                SUM(oh.quantity) as total_quantity,
                 COUNT(*) as item_count
-            FROM inventory
-            WHERE is_active = 1
-            GROUP BY category
+            FROM inventory_on_hand oh
+            JOIN inventory i ON oh.inventory_id = i.id
+            WHERE i.is_active = 1
+            GROUP BY i.category
             ORDER BY total_value DESC
         '''
         df = pd.read_sql_query(query, conn)
@@ -1039,61 +1558,43 @@ class CRUDOperations:
         return df
     
     def get_expiring_inventory(self, days=60):
-        """المخزون قريب الانتهاء"""
+        """الدفعات قريبة الانتهاء (نطاق على فهرس تاريخ الانتهاء)"""
         conn = self.db.get_connection()
         query = '''
             SELECT 
                 i.item_name,
                 i.category,
-                i.quantity,
-                i.expiry_date,
+                l.lot_number,
+                l.quantity_remaining as quantity,
+                l.expiry_date,
                 s.name as supplier_name,
-                CAST((julianday(i.expiry_date) - julianday('now')) AS INTEGER) as days_to_expire
-            FROM inventory i
-            LEFT JOIN suppliers s ON i.supplier_id = s.id
-            WHERE i.expiry_date IS NOT NULL
+                CAST((julianday(l.expiry_date) - julianday('now')) AS INTEGER) as days_to_expire
+            FROM inventory_lots l
+            JOIN inventory i ON l.inventory_id = i.id
+            LEFT JOIN suppliers s ON l.supplier_id = s.id
+            WHERE l.quantity_remaining > 0
+            AND l.expiry_date IS NOT NULL
+            AND l.expiry_date <= date('now', ?)
             AND i.is_active = 1
-            AND julianday(i.expiry_date) - julianday('now') <= ?
-            ORDER BY days_to_expire
+            ORDER BY l.expiry_date
         '''
-        df = pd.read_sql_query(query, conn, params=(days,))
+        df = pd.read_sql_query(query, conn, params=(f"+{int(days)} days",))
         conn.close()
         return df
     
     def get_monthly_comparison(self, months=6):
         """مقارنة شهرية للإيرادات والمصروفات"""
-        conn = self.db.get_connection()
-        
-        # الإيرادات الشهرية
-        revenue_query = '''
-            SELECT 
-                strftime('%Y-%m', payment_date) as month,
-                SUM(amount) as revenue
-            FROM payments
-            WHERE payment_date >= date('now', ?)
-            GROUP BY month
-            ORDER BY month
-        '''
-        
-        # المصروفات الشهرية
-        expenses_query = '''
-            SELECT 
-                strftime('%Y-%m', expense_date) as month,
-                SUM(amount) as expenses
-            FROM expenses
-            WHERE expense_date >= date('now', ?)
-            GROUP BY month
-            ORDER BY month
-        '''
-        
-        revenue_df = pd.read_sql_query(revenue_query, conn, params=(f'-{months} months',))
-        expenses_df = pd.read_sql_query(expenses_query, conn, params=(f'-{months} months',))
+        start_date = (pd.Timestamp.today() - pd.DateOffset(months=months)).date()
+        revenue = analytics_cube.query('payments', measures=['revenue'], grain='month', start_date=start_date)
+        expenses = analytics_cube.query('expenses', measures=['amount'], grain='month', start_date=start_date)
         
         # دمج البيانات
-        result = pd.merge(revenue_df, expenses_df, on='month', how='outer').fillna(0)
+        result = pd.merge(
+            revenue.rename(columns={'period': 'month'}),
+            expenses.rename(columns={'period': 'month', 'amount': 'expenses'}),
+            on='month', how='outer'
+        ).fillna(0)
         result['profit'] = result['revenue'] - result['expenses']
-        
-        conn.close()
         return result
     
     def get_doctor_schedule(self, doctor_id, target_date):
@@ -1140,6 +1641,27 @@ class CRUDOperations:
         conn.close()
         return df
     
+    def get_patient_detailed_report(self, patient_id):
+        """تقرير المريض الشامل (بيانات، زيارات، مدفوعات، علاجات، أطباء) من ذاكرة مؤقتة"""
+        return patient_360.report(patient_id)
+    
+    def get_patient_financial_summary(self, patient_id):
+        """الملخص المالي للمريض"""
+        return patient_360.report(patient_id)['financial_stats']
+    
+    def get_doctor_patient_ids(self, doctor_id, month=None):
+        """معرفات مرضى الطبيب (في شهر محدد YYYY-MM اختيارياً) لتقارير نهاية الشهر"""
+        conn = self.db.get_connection()
+        query = "SELECT DISTINCT patient_id FROM appointments WHERE doctor_id = ?"
+        params = [doctor_id]
+        if month:
+            query += " AND appointment_date BETWEEN ? AND ?"
+            params.extend([f"{month}-01", f"{month}-31"])
+        query += " ORDER BY patient_id"
+        patient_ids = [row[0] for row in conn.execute(query, params).fetchall()]
+        conn.close()
+        return patient_ids
+    
     def get_doctor_earnings(self, doctor_id, start_date, end_date):
         """حساب أرباح طبيب محدد"""
         conn = self.db.get_connection()
@@ -1157,6 +1679,43 @@ class CRUDOperations:
         conn.close()
         return df
     
+    def get_doctors_earnings(self, start_date, end_date, breakdown=()):
+        """أرباح كل الأطباء في الفترة بتجميع واحد (بدلاً من استعلام لكل طبيب)
+        
+        breakdown: تفصيل إضافي 'treatment' و/أو 'month'
+        """
+        unknown = set(breakdown) - {'treatment', 'month'}
+        if unknown:
+            raise ValueError(f"تفصيل غير معروف: {', '.join(unknown)}")
+        
+        dimensions = ['doctor'] + (['treatment'] if 'treatment' in breakdown else [])
+        # المكعب لا يقرأ من اللقطة إلا إذا لم تتغير جداولها بعد التصدير، فالدفعات المسجلة
+        # بتاريخ سابق وتصحيحات حصة الطبيب تدخل في الأرباح فوراً
+        earnings = analytics_cube.query(
+            'payments', dimensions, ['count', 'doctor_share', 'avg_percentage'],
+            grain='month' if 'month' in breakdown else None,
+            start_date=start_date, end_date=end_date
+        )
+        
+        conn = self.db.get_connection()
+        doctors = pd.read_sql_query("SELECT id as doctor_id, specialization FROM doctors WHERE is_active = 1", conn)
+        conn.close()
+        
+        # المدفوعات غير المرتبطة بموعد ليس لها طبيب
+        df = earnings.dropna(subset=['doctor_id']).astype({'doctor_id': int}).merge(doctors, on='doctor_id')
+        df = df.rename(columns={
+            'period': 'month',
+            'count': 'payment_count',
+            'doctor_share': 'total_earnings'
+        })
+        columns = ['doctor_id', 'doctor_name', 'specialization']
+        columns += ['month'] if 'month' in breakdown else []
+        columns += ['treatment_id', 'treatment_name'] if 'treatment' in breakdown else []
+        df = df[columns + ['payment_count', 'total_earnings', 'avg_percentage']]
+        if breakdown:
+            return df.sort_values(['doctor_name'] + columns[3:], ignore_index=True)
+        return df.sort_values('total_earnings', ascending=False, ignore_index=True)
+    
     def get_clinic_earnings(self, start_date, end_date):
         """حساب أرباح العيادة"""
         conn = self.db.get_connection()
@@ -1172,9 +1731,38 @@ class CRUDOperations:
         df = pd.read_sql_query(query, conn, params=(start_date, end_date))
         conn.close()
         return df
-    
+
+    def get_comprehensive_financial_report(self, start_date, end_date):
+        """التقرير المالي الشامل: أرباح العيادة والتدفق النقدي اليومي والتراكمي"""
+        clinic_earnings = self.get_clinic_earnings(start_date, end_date).iloc[0].fillna(0).to_dict()
+
+        conn = self.db.get_connection()
+        query = '''
+            SELECT date,
+                   SUM(CASE WHEN type = 'revenue' THEN amount ELSE 0 END) as revenue,
+                   SUM(CASE WHEN type = 'expense' THEN amount ELSE 0 END) as expense
+            FROM (
+                SELECT payment_date as date, amount, 'revenue' as type
+                FROM payments WHERE payment_date BETWEEN ? AND ?
+                UNION ALL
+                SELECT expense_date as date, amount, 'expense' as type
+                FROM expenses WHERE expense_date BETWEEN ? AND ?
+            )
+            GROUP BY date
+            ORDER BY date
+        '''
+        cash_flow = pd.read_sql_query(query, conn, params=(start_date, end_date, start_date, end_date))
+        conn.close()
+
+        cash_flow['net_flow'] = cash_flow['revenue'] - cash_flow['expense']
+        cash_flow['cumulative'] = cash_flow['net_flow'].cumsum()
+        return {
+            'clinic_earnings': clinic_earnings,
+            'cash_flow': cash_flow
+        }
+
     def get_payment_details_by_id(self, payment_id):
-        """الحصول على تفاصيل دفعة محددة"""
+        """الحصول على تفاصيل دفعة محددة (قاموس بأسماء الأعمدة أو None)"""
         conn = self.db.get_connection()
         query = '''
             SELECT 
@@ -1189,13 +1777,135 @@ class CRUDOperations:
             LEFT JOIN treatments t ON a.treatment_id = t.id
             WHERE pay.id = ?
         '''
-        cursor = conn.cursor()
-        cursor.execute(query, (payment_id,))
-        result = cursor.fetchone()
+        result = fetch_one(conn, query, (payment_id,))
         conn.close()
         return result
     
+    # ========== البيانات المرجعية للنماذج ==========
+    def get_doctor_options(self):
+        """{id: الاسم} للأطباء النشطين - مخزنة حتى يتغير جدول الأطباء"""
+        return reference_data.doctors()
+
+    def get_treatment_options(self):
+        """{id: {الاسم، السعر، النسب}} للعلاجات النشطة - مخزنة حتى يتغير جدول العلاجات"""
+        return reference_data.treatments()
+
+    def get_patient_options(self, query='', limit=None):
+        """{id: الاسم - الهاتف} لأقرب المرضى للبحث (من الفهارس، بحد أقصى limit)"""
+        return reference_data.search_patients(query, limit)
+
+    def get_patient_label(self, patient_id):
+        """الاسم - الهاتف لمريض واحد"""
+        return reference_data.patient_label(patient_id)
+
+    # ========== تقويم المواعيد ==========
+    def get_doctors_occupancy(self, start_date=None, days=30, value='occupancy'):
+        """مصفوفة إشغال الأطباء (طبيب × يوم) من فهرس التقويم"""
+        return calendar_index.occupancy(_as_date(start_date), days, value)
+    
+    def get_doctor_day_load(self, doctor_id, target_date):
+        """الدقائق المحجوزة والمتاحة لطبيب في يوم محدد"""
+        return calendar_index.day_load(doctor_id, _as_date(target_date))
+
+    # ========== لقطة التحليلات ==========
+    def export_analytics_snapshot(self):
+        """تصدير المواعيد والمدفوعات والمصروفات إلى ملفات Parquet مقسمة بالشهر مع تجميعاتها"""
+        manifest = analytics_snapshot.export()
+        analytics_cube.build_rollups()
+        return manifest
+
+    def get_analytics_snapshot_info(self):
+        """بيانات آخر لقطة (None إذا لم تُصدَّر بعد) و'current': هل لم تتغير البيانات بعدها"""
+        info = analytics_snapshot.info()
+        if info is not None:
+            info['current'] = analytics_snapshot.current(info)
+        return info
+
+    def get_fact_table(self, fact, start_date=None, end_date=None, columns=None, filters=None):
+        """صفوف جدول حقائق في فترة: ما قبل يوم اللقطة من Parquet والباقي من قاعدة البيانات"""
+        return analytics_snapshot.read(fact, start_date, end_date, columns, filters)
+
+    def get_cube(self, fact, dimensions=(), measures=None, grain=None, start_date=None, end_date=None, filters=None):
+        """تجميع جدول حقائق بأي أبعاد ومقاييس (من التجميعات المسبقة أو البيانات الخام)"""
+        return analytics_cube.query(fact, dimensions, measures, grain, start_date, end_date, filters)
+
+    # ========== الإشعارات ==========
+    def create_notification(self, notification_type, title, message, priority='normal', target_date=None, related_id=None, action_link=None):
+        """إضافة إشعار (يُتجاهل إذا وُجد إشعار بنفس النوع والسجل والتاريخ)"""
+        conn = self.db.get_connection()
+        cursor = conn.cursor()
+        cursor.execute('''
+            INSERT OR IGNORE INTO notifications (type, title, message, priority, target_date, related_id, action_link)
+            VALUES (?, ?, ?, ?, ?, ?, ?)
+        ''', (notification_type, title, message, priority, target_date, related_id, action_link))
+        notification_id = cursor.lastrowid if cursor.rowcount else None
+        conn.commit()
+        conn.close()
+        return notification_id
+    
+    def get_unread_notifications(self, limit=10):
+        """الإشعارات غير المقروءة حسب الأولوية (من فهرس غير المقروء)"""
+        conn = self.db.get_connection()
+        df = pd.read_sql_query('''
+            SELECT * FROM notifications WHERE is_read = 0
+            ORDER BY
+                CASE priority
+                    WHEN 'urgent' THEN 1
+                    WHEN 'high' THEN 2
+                    WHEN 'normal' THEN 3
+                    WHEN 'low' THEN 4
+                END, created_at DESC
+            LIMIT ?
+        ''', conn, params=(limit,))
+        conn.close()
+        return df
+    
+    def get_unread_notifications_count(self):
+        """عدد الإشعارات غير المقروءة"""
+        conn = self.db.get_connection()
+        cursor = conn.cursor()
+        cursor.execute("SELECT COUNT(*) FROM notifications WHERE is_read = 0")
+        count = cursor.fetchone()[0]
+        conn.close()
+        return count
+    
+    def get_all_notifications(self, limit=50):
+        """جميع الإشعارات"""
+        conn = self.db.get_connection()
+        df = pd.read_sql_query("SELECT * FROM notifications ORDER BY created_at DESC, id DESC LIMIT ?", conn, params=(limit,))
+        conn.close()
+        return df
+    
+    def mark_notification_as_read(self, notification_id):
+        """تحديد إشعار كمقروء"""
+        conn = self.db.get_connection()
+        cursor = conn.cursor()
+        cursor.execute("UPDATE notifications SET is_read = 1 WHERE id = ?", (notification_id,))
+        conn.commit()
+        conn.close()
+    
+    def mark_all_notifications_as_read(self):
+        """تحديد جميع الإشعارات كمقروءة"""
+        conn = self.db.get_connection()
+        cursor = conn.cursor()
+        cursor.execute("UPDATE notifications SET is_read = 1 WHERE is_read = 0")
+        conn.commit()
+        conn.close()
+    
+    def delete_notification(self, notification_id):
+        """حذف إشعار"""
+        conn = self.db.get_connection()
+        cursor = conn.cursor()
+        cursor.execute("DELETE FROM notifications WHERE id = ?", (notification_id,))
+        conn.commit()
+        conn.close()
+    
+    def generate_daily_notifications(self):
+        """توليد إشعارات اليوم الآن (يعمل تلقائياً في الخلفية أيضاً)"""
+        return notification_engine.run()
+    
     # ========== الإعدادات ==========
+    @versioned('settings', maxsize=128)
     def get_setting(self, key):
         """الحصول على إعداد محدد"""
         conn = self.db.get_connection()
@@ -1216,6 +1926,7 @@ class CRUDOperations:
         conn.commit()
         conn.close()
     
+    @versioned('settings')
     def get_all_settings(self):
         """الحصول على جميع الإعدادات"""
         conn = self.db.get_connection()
@@ -1223,6 +1934,61 @@ class CRUDOperations:
         conn.close()
         return df
     
+    # ========== المهام المجدولة ==========
+    def get_scheduled_tasks(self):
+        """المهام المجدولة ومواعيدها وآخر تشغيل لكل منها"""
+        settings = scheduler.settings()
+        history = scheduler.history(limit=200)
+        last = history.drop_duplicates('task').set_index('task')
+        rows = []
+        for name, task in TASKS.items():
+            run = last.loc[name] if name in last.index else None
+            rows.append({
+                'task': name,
+                'title': task['title'],
+                'setting': task['setting'],
+                'time': settings.get(task['setting']) or '',
+                'last_run': run['started_at'] if run is not None else None,
+                'last_status': run['status'] if run is not None else None,
+                'last_duration_ms': run['duration_ms'] if run is not None else None,
+            })
+        return pd.DataFrame(rows)
+    
+    def get_task_runs(self, limit=50):
+        """سجل تشغيل المهام المجدولة (الأحدث أولاً)"""
+        return scheduler.history(limit)
+    
+    # ========== حفظ الجداول المعدلة ==========
+    def save_grid_changes(self, table, original_df, edited_df):
+        """حفظ تعديلات جدول (data_editor) دفعة واحدة
+        
+        تُكتب الخلايا المتغيرة فقط، في معاملة واحدة مع سجل نشاط واحد.
+        يعيد عدد السجلات المحدثة.
+        """
+        statements, changed_ids = grid_updates(table, original_df, edited_df)
+        if not changed_ids:
+            return 0
+        
+        conn = self.db.get_connection()
+        cursor = conn.cursor()
+        
+        try:
+            for sql, params in statements:
+                cursor.executemany(sql, params)
+            
+            self.log_activity(conn, GRID_TABLES[table]['action'], table, 
+                             changed_ids[0] if len(changed_ids) == 1 else None,
+                             f"تم تحديث {len(changed_ids)} سجل: {', '.join(map(str, changed_ids))}")
+            
+            conn.commit()
+        except Exception:
+            conn.rollback()
+            raise
+        finally:
+            conn.close()
+        
+        return len(changed_ids)
+    
     # ========== سجل الأنشطة ==========
     def log_activity(self, conn, action, table_name, record_id, details, user_name="النظام"):
         """تسجيل نشاط في قاعدة البيانات"""
@@ -1251,43 +2017,92 @@ class CRUDOperations:
         stats = {}
         
         # عدد المرضى النشطين
-        stats['total_patients'] = pd.read_sql_query(
-            "SELECT COUNT(*) as count FROM patients WHERE is_active = 1", conn
-        ).iloc[0]['count']
+        stats['total_patients'] = fetch_scalar(
+            conn, "SELECT COUNT(*) FROM patients WHERE is_active = 1"
+        )
         
         # عدد الأطباء النشطين
-        stats['total_doctors'] = pd.read_sql_query(
-            "SELECT COUNT(*) as count FROM doctors WHERE is_active = 1", conn
-        ).iloc[0]['count']
+        stats['total_doctors'] = fetch_scalar(
+            conn, "SELECT COUNT(*) FROM doctors WHERE is_active = 1"
+        )
         
         # مواعيد اليوم
         today = date.today().isoformat()
-        stats['today_appointments'] = pd.read_sql_query(
-            "SELECT COUNT(*) as count FROM appointments WHERE appointment_date = ?", 
-            conn, params=(today,)
-        ).iloc[0]['count']
+        stats['today_appointments'] = fetch_scalar(
+            conn, "SELECT COUNT(*) FROM appointments WHERE appointment_date = ?", (today,)
+        )
         
         # المواعيد القادمة (7 أيام)
         future_date = (date.today() + timedelta(days=7)).isoformat()
-        stats['upcoming_appointments'] = pd.read_sql_query(
-            "SELECT COUNT(*) as count FROM appointments WHERE appointment_date BETWEEN ? AND ? AND status IN ('مجدول', 'مؤكد')", 
-            conn, params=(today, future_date)
-        ).iloc[0]['count']
+        stats['upcoming_appointments'] = fetch_scalar(
+            conn, "SELECT COUNT(*) FROM appointments WHERE appointment_date BETWEEN ? AND ? AND status IN ('مجدول', 'مؤكد')", (today, future_date)
+        )
         
         # عناصر منخفضة المخزون
-        stats['low_stock_items'] = pd.read_sql_query(
-            "SELECT COUNT(*) as count FROM inventory WHERE quantity <= min_stock_level AND is_active = 1", 
-            conn
-        ).iloc[0]['count']
+        stats['low_stock_items'] = fetch_scalar(
+            conn, "SELECT COUNT(*) FROM inventory_on_hand oh JOIN inventory i ON oh.inventory_id = i.id WHERE oh.quantity <= i.min_stock_level AND i.is_active = 1"
+        )
         
         # أصناف قريبة من الانتهاء (30 يوم)
-        stats['expiring_items'] = pd.read_sql_query(
-            "SELECT COUNT(*) as count FROM inventory WHERE julianday(expiry_date) - julianday('now') <= 30 AND expiry_date IS NOT NULL AND is_active = 1", 
-            conn
-        ).iloc[0]['count']
+        stats['expiring_items'] = fetch_scalar(
+            conn, """SELECT COUNT(DISTINCT l.inventory_id) FROM inventory_lots l JOIN inventory i ON l.inventory_id = i.id
+               WHERE l.quantity_remaining > 0 AND l.expiry_date IS NOT NULL AND l.expiry_date <= date('now', '+30 days') AND i.is_active = 1"""
+        )
         
         conn.close()
         return stats
+    
+    # ========== مراقبة الأداء ==========
+    def get_slow_queries(self, limit=100):
+        """الاستعلامات البطيئة المسجلة"""
+        profiler.flush_slow_queries(timeout=1.0)
+        conn = self.db.get_connection()
+        df = pd.read_sql_query('''
+            SELECT * FROM query_stats
+            ORDER BY created_at DESC, id DESC
+            LIMIT ?
+        ''', conn, params=(limit,))
+        conn.close()
+        return df
+    
+    def get_slow_query_summary(self, limit=20):
+        """ملخص الاستعلامات البطيئة حسب العملية والاستعلام"""
+        profiler.flush_slow_queries(timeout=1.0)
+        conn = self.db.get_connection()
+        df = pd.read_sql_query('''
+            SELECT 
+                operation,
+                sql,
+                COUNT(*) as occurrences,
+                SUM(total_ms) as total_ms,
+                AVG(total_ms) as avg_ms,
+                MAX(total_ms) as max_ms,
+                MAX(created_at) as last_seen
+            FROM query_stats
+            GROUP BY operation, sql
+            ORDER BY total_ms DESC
+            LIMIT ?
+        ''', conn, params=(limit,))
+        conn.close()
+        return df
+    
+    def clear_slow_queries(self):
+        """مسح سجل الاستعلامات البطيئة"""
+        profiler.flush_slow_queries(timeout=1.0)
+        conn = self.db.get_connection()
+        cursor = conn.cursor()
+        cursor.execute("DELETE FROM query_stats")
+        conn.commit()
+        conn.close()
+
+def _as_date(value):
+    """date من نص ISO أو date/datetime/Timestamp (None يبقى None)"""
+    if value is None:
+        return None
+    return date.fromisoformat(str(value)[:10])
+
+# مراقبة زمن كل عملية CRUD وربط الاستعلامات بها
+profiler.instrument(CRUDOperations)
 
 # إنشاء مثيل من عمليات CRUD
 crud = CRUDOperations()
@@ -0,0 +1,409 @@
+"""
+Analytics Cube for Cura Clinic App
+Slices appointment, payment and expense facts by any dimensions and measures
+"""
+
+import os
+import threading
+from collections import OrderedDict
+from datetime import date, timedelta
+
+import numpy as np
+import pandas as pd
+
+from .analytics import FACT_TABLES, analytics_snapshot, as_date
+
+COMPLETED_STATUS = 'مكتمل'
+
+# فئات العمر عند الزيارة
+AGE_BANDS = [0, 13, 18, 30, 45, 60, np.inf]
+AGE_BAND_LABELS = ['0-12', '13-17', '18-29', '30-44', '45-59', '60+']
+
+GRAINS = ('day', 'week', 'month', 'year')
+
+# الأعمدة المشتقة والفترات عند التجميع داخل SQLite (البيانات الحية)
+LIVE_EXPRESSIONS = {
+    'age_band': 'CASE WHEN patient_age < 0 THEN NULL ' + ' '.join(
+        f"WHEN patient_age < {int(upper)} THEN '{label}'"
+        for upper, label in zip(AGE_BANDS[1:-1], AGE_BAND_LABELS)
+    ) + f" WHEN patient_age IS NOT NULL THEN '{AGE_BAND_LABELS[-1]}' END",
+    'completed': f"(status = '{COMPLETED_STATUS}')",
+    'has_percentage': "(doctor_percentage IS NOT NULL)",
+}
+LIVE_PERIODS = {
+    'day': "strftime('%Y-%m-%d', {column})",
+    'week': "date({column}, '-' || ((CAST(strftime('%w', {column}) AS INTEGER) + 6) % 7) || ' days')",
+    'month': "strftime('%Y-%m', {column})",
+    'year': "strftime('%Y', {column})",
+}
+
+_PATIENT_DIMENSIONS = {'gender': ['patient_gender'], 'age_band': ['age_band']}
+
+# أعمدة الأسماء لا يُجمَّع عليها: تُضاف بعد التجميع من جداول الأبعاد الحية (عمود المعرّف، الجدول)
+NAME_COLUMNS = {'doctor_name': ('doctor_id', 'doctors'), 'treatment_name': ('treatment_id', 'treatments')}
+
+# لكل جدول حقائق: الأبعاد (أعمدة المفتاح)، والمقاييس (عمود المصدر)، والتجميعات المسبقة (الدقة، الأبعاد)
+CUBES = {
+    'appointments': {
+        'dimensions': {
+            'doctor': ['doctor_id', 'doctor_name'],
+            'treatment': ['treatment_id', 'treatment_name'],
+            'category': ['treatment_category'],
+            'status': ['status'],
+            **_PATIENT_DIMENSIONS,
+        },
+        'measures': {'revenue': 'total_cost', 'completed': 'completed'},
+        'rollups': [
+            ('month', ('doctor', 'treatment', 'category', 'status', 'gender', 'age_band')),
+            ('day', ('doctor', 'status')),
+        ],
+    },
+    'payments': {
+        'dimensions': {
+            'doctor': ['doctor_id', 'doctor_name'],
+            'treatment': ['treatment_id', 'treatment_name'],
+            'category': ['treatment_category'],
+            'payment_method': ['payment_method'],
+            'status': ['status'],
+            **_PATIENT_DIMENSIONS,
+        },
+        'measures': {'revenue': 'amount', 'doctor_share': 'doctor_share', 'clinic_share': 'clinic_share',
+                     'doctor_percentage': 'doctor_percentage', 'percentage_count': 'has_percentage'},
+        'rollups': [
+            ('month', ('doctor', 'treatment', 'category', 'payment_method', 'status', 'gender', 'age_band')),
+            ('day', ('doctor', 'treatment', 'payment_method')),
+        ],
+    },
+    'expenses': {
+        'dimensions': {
+            'category': ['category'],
+            'payment_method': ['payment_method'],
+        },
+        'measures': {'amount': 'amount'},
+        'rollups': [
+            ('month', ('category', 'payment_method')),
+            ('day', ('category', 'payment_method')),
+        ],
+    },
+}
+
+# مقاييس محسوبة من مقياسين (بسط، مقام) بعد التجميع. متوسط النسبة يُقسم على عدد
+# الدفعات التي لها نسبة فقط، كما يتجاهل AVG في SQL القيم الفارغة
+DERIVED_MEASURES = {'avg_revenue': ('revenue', 'count'), 'avg_percentage': ('doctor_percentage', 'percentage_count')}
+
+
+class AnalyticsCube:
+    """Group-by queries over the analytics facts without hand-written SQL.
+
+    ``query()`` splits the date range at the snapshot day. The history part
+    is answered from the smallest pre-aggregated rollup that has every
+    requested dimension and a fine enough grain, falling back to the raw
+    Parquet facts, and is kept in an LRU cache keyed by snapshot version.
+    The part from the snapshot day on is aggregated from the live tables on
+    every call. Without a snapshot, or once a source table has changed
+    since the export (``AnalyticsSnapshot.current()``), every query is
+    computed from the live tables.
+
+    Rows are grouped by ids only; doctor and treatment names are looked up
+    in the live tables afterwards, so a rename never splits a group.
+    """
+
+    CACHE_SIZE = 256
+
+    def __init__(self, snapshot=None):
+        self.snapshot = snapshot or analytics_snapshot
+        self._lock = threading.Lock()
+        self._rollups = {}              # (version, fact, grain) -> DataFrame
+        self._cache = OrderedDict()     # query key -> history DataFrame
+        self.hits = 0
+        self.misses = 0
+
+    def invalidate(self):
+        with self._lock:
+            self._rollups.clear()
+            self._cache.clear()
+
+    # ========== الاستعلام ==========
+    def query(self, fact, dimensions=(), measures=None, grain=None, start_date=None, end_date=None, filters=None):
+        """Aggregate ``fact`` by ``dimensions`` (and ``grain`` as ``period``).
+
+        ``measures`` defaults to ``count`` plus every measure of the fact and
+        the averages (``avg_revenue``, ``avg_percentage``) it supports.
+        ``filters`` maps a dimension to a value or list of values of its
+        first key column (e.g. ``{'doctor': [1, 2]}``).
+        """
+        spec = self._spec(fact)
+        dimensions = tuple(dimensions)
+        filters = {dimension: _as_tuple(values) for dimension, values in (filters or {}).items()}
+        unknown = [name for name in (*dimensions, *filters) if name not in spec['dimensions']]
+        if unknown:
+            raise ValueError(f"بُعد غير معروف في {fact}: {', '.join(unknown)}")
+        if grain is not None and grain not in GRAINS:
+            raise ValueError(f"دقة زمنية غير معروفة: {grain}")
+        available = ['count', *spec['measures'], *(name for name, (numerator, _) in DERIVED_MEASURES.items()
+                                                    if numerator in spec['measures'])]
+        measures = list(measures or available)
+        unknown = [name for name in measures if name not in available]
+        if unknown:
+            raise ValueError(f"مقياس غير معروف في {fact}: {', '.join(unknown)}")
+
+        start, end = as_date(start_date), as_date(end_date)
+        manifest = self.snapshot.info()
+        if manifest is not None and not self.snapshot.current(manifest):
+            manifest = None
+        parts = []
+        tail_start = start
+        if manifest is not None:
+            as_of = date.fromisoformat(manifest['as_of'])
+            last = as_of - timedelta(days=1)
+            if start is None or start <= last:
+                parts.append(self._history(manifest, fact, dimensions, grain, start,
+                                           min(end, last) if end else last, filters))
+            tail_start = max(start, as_of) if start else as_of
+        if not parts or end is None or tail_start <= end:
+            parts.append(self._aggregate_live(fact, dimensions, grain, tail_start, end, filters))
+
+        keys = self._keys(fact, dimensions, grain)
+        sums = ['count', *spec['measures']]
+        result = pd.concat(parts, ignore_index=True)
+        if keys:
+            result = result.groupby(keys, dropna=False, sort=True)[sums].sum().reset_index()
+        else:
+            result = result[sums].sum().to_frame().T
+        # جزء حي فارغ يُقرأ بأعمدة object
+        result[sums] = result[sums].astype(float)
+        for name, (numerator, denominator) in DERIVED_MEASURES.items():
+            if name in measures:
+                result[name] = (result[numerator] / result[denominator].where(result[denominator] > 0)).fillna(0)
+        result['count'] = result['count'].astype(int)
+        result = self._with_names(fact, result, dimensions)
+        columns = [column for dimension in dimensions for column in spec['dimensions'][dimension]]
+        return result[(['period'] if grain else []) + columns + measures]
+
+    def _history(self, manifest, fact, dimensions, grain, start, end, filters):
+        key = (manifest['version'], fact, dimensions, grain, start, end, tuple(sorted(filters.items())))
+        with self._lock:
+            if key in self._cache:
+                self._cache.move_to_end(key)
+                self.hits += 1
+                return self._cache[key]
+        self.misses += 1
+
+        rollup = self._choose_rollup(manifest, fact, {*dimensions, *filters}, grain, start, end)
+        if rollup is not None:
+            source_grain, frame = rollup
+            if source_grain == 'day':
+                frame = frame[_between(frame['day'], start and pd.Timestamp(start), pd.Timestamp(end))]
+            else:
+                frame = frame[_between(frame['month'], start and start.strftime('%Y-%m'), end.strftime('%Y-%m'))]
+        else:
+            source_grain = 'day'
+            frame = self._prepare(fact, self.snapshot.read(fact, start, end,
+                                                            columns=self._raw_columns(fact, {*dimensions, *filters})))
+        result = self._aggregate(fact, frame, source_grain, dimensions, grain, filters)
+
+        with self._lock:
+            self._cache[key] = result
+            while len(self._cache) > self.CACHE_SIZE:
+                self._cache.popitem(last=False)
+        return result
+
+    def _choose_rollup(self, manifest, fact, needed, grain, start, end):
+        """Smallest rollup that can answer the history range exactly"""
+        last = date.fromisoformat(manifest['as_of']) - timedelta(days=1)
+        month_aligned = ((start is None or start.day == 1)
+                         and (end == last or (end + timedelta(days=1)).day == 1))
+        candidates = []
+        for rollup_grain, rollup_dimensions in CUBES[fact]['rollups']:
+            if not needed <= set(rollup_dimensions):
+                continue
+            if rollup_grain == 'month' and (grain in ('day', 'week') or not month_aligned):
+                continue
+            frame = self.rollup(fact, rollup_grain, manifest)
+            candidates.append((len(frame), rollup_grain, frame))
+        if not candidates:
+            return None
+        _, rollup_grain, frame = min(candidates, key=lambda candidate: candidate[0])
+        return rollup_grain, frame
+
+    # ========== التجميعات المسبقة ==========
+    def rollup(self, fact, grain, manifest=None):
+        """Pre-aggregated history of ``fact`` at ``grain`` (built once per snapshot)"""
+        manifest = manifest or self.snapshot.info()
+        key = (manifest['version'], fact, grain)
+        with self._lock:
+            if key in self._rollups:
+                return self._rollups[key]
+
+        path = os.path.join(self.snapshot.directory, manifest['version'], 'rollups', f'{fact}_{grain}.parquet')
+        columns = ['count', *CUBES[fact]['measures']]
+        frame = pd.read_parquet(path) if os.path.exists(path) else None
+        # تجميع محفوظ قبل إضافة مقياس جديد يُعاد بناؤه
+        if frame is None or not set(columns) <= set(frame.columns):
+            dimensions = dict(CUBES[fact]['rollups'])[grain]
+            last = date.fromisoformat(manifest['as_of']) - timedelta(days=1)
+            raw = self._prepare(fact, self.snapshot.read(fact, end_date=last,
+                                                         columns=self._raw_columns(fact, dimensions)))
+            frame = self._aggregate(fact, raw, 'day', dimensions, grain, {}).rename(columns={'period': grain})
+            if grain == 'day':
+                frame['day'] = pd.to_datetime(frame['day'])
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            frame.to_parquet(path + '.tmp', index=False)
+            os.replace(path + '.tmp', path)
+
+        with self._lock:
+            # إسقاط تجميعات النسخ السابقة
+            for old in [old for old in self._rollups if old[0] != manifest['version']]:
+                del self._rollups[old]
+            self._rollups[key] = frame
+        return frame
+
+    def build_rollups(self):
+        """Build every rollup of the current snapshot ahead of the first query"""
+        manifest = self.snapshot.info()
+        if manifest is None:
+            return 0
+        for fact, spec in CUBES.items():
+            for grain, _ in spec['rollups']:
+                self.rollup(fact, grain, manifest)
+        return sum(len(spec['rollups']) for spec in CUBES.values())
+
+    # ========== التجميع ==========
+    @staticmethod
+    def _spec(fact):
+        if fact not in CUBES:
+            raise ValueError(f"جدول حقائق غير معروف: {fact}")
+        return CUBES[fact]
+
+    @staticmethod
+    def _keys(fact, dimensions, grain):
+        """Group-by columns: the period and every dimension column except names"""
+        columns = [column for dimension in dimensions for column in CUBES[fact]['dimensions'][dimension]
+                   if column not in NAME_COLUMNS]
+        return (['period'] if grain else []) + columns
+
+    def _with_names(self, fact, result, dimensions):
+        """Add the current doctor/treatment names of the grouped ids"""
+        columns = [column for dimension in dimensions for column in CUBES[fact]['dimensions'][dimension]
+                   if column in NAME_COLUMNS]
+        if not columns:
+            return result
+        conn = self.snapshot.db.get_connection()
+        try:
+            for column in columns:
+                id_column, table = NAME_COLUMNS[column]
+                names = dict(conn.execute(f"SELECT id, name FROM {table}").fetchall())
+                result[column] = result[id_column].map(names)
+        finally:
+            conn.close()
+        return result
+
+    @staticmethod
+    def _raw_columns(fact, dimensions):
+        """Fact columns needed for ``dimensions`` and every measure"""
+        spec = CUBES[fact]
+        columns = [FACT_TABLES[fact]['date_column']]
+        columns += [column for dimension in dimensions for column in spec['dimensions'][dimension]
+                    if column not in NAME_COLUMNS]
+        columns += spec['measures'].values()
+        # أعمدة مشتقة في _prepare
+        replacements = {'age_band': 'patient_age', 'completed': 'status', 'has_percentage': 'doctor_percentage'}
+        return list(dict.fromkeys(replacements.get(column, column) for column in columns))
+
+    @staticmethod
+    def _prepare(fact, frame):
+        """Raw fact rows -> day, derived dimensions and one column per measure"""
+        spec = CUBES[fact]
+        frame = frame.copy()
+        frame['day'] = frame[FACT_TABLES[fact]['date_column']]
+        if 'patient_age' in frame:
+            frame['age_band'] = pd.cut(frame['patient_age'], AGE_BANDS, right=False, labels=AGE_BAND_LABELS).astype(object)
+        if fact == 'appointments':
+            frame['completed'] = (frame['status'] == COMPLETED_STATUS).astype(int)
+        if fact == 'payments':
+            frame['has_percentage'] = frame['doctor_percentage'].notna().astype(int)
+        frame['count'] = 1
+        for measure, column in spec['measures'].items():
+            frame[measure] = frame[column].fillna(0)
+        return frame
+
+    def _aggregate(self, fact, frame, source_grain, dimensions, grain, filters):
+        """Group prepared rows or rollup rows (``source_grain``) to the query keys"""
+        spec = CUBES[fact]
+        for dimension, values in filters.items():
+            frame = frame[frame[spec['dimensions'][dimension][0]].isin(values)]
+
+        frame = frame.copy()
+        if grain:
+            frame['period'] = _period(frame[source_grain], source_grain, grain)
+        keys = self._keys(fact, dimensions, grain)
+        sums = ['count', *spec['measures']]
+        if not keys:
+            return frame[sums].sum().to_frame().T
+        return frame.groupby(keys, dropna=False, sort=False)[sums].sum().reset_index()
+
+    def _aggregate_live(self, fact, dimensions, grain, start, end, filters):
+        """The same grouping done by SQLite over the live fact query"""
+        spec = CUBES[fact]
+        date_column = FACT_TABLES[fact]['date_column']
+        conditions, params = [], []
+        if start:
+            conditions.append(f"{date_column} >= ?")
+            params.append(start.isoformat())
+        if end:
+            conditions.append(f"{date_column} <= ?")
+            params.append(end.isoformat())
+        where = ('WHERE ' + ' AND '.join(conditions)) if conditions else ''
+
+        def expression(column):
+            return LIVE_EXPRESSIONS.get(column, column)
+
+        filter_sql = []
+        for dimension, values in filters.items():
+            filter_sql.append(f"{expression(spec['dimensions'][dimension][0])} IN ({', '.join('?' * len(values))})")
+            params.extend(values)
+        keys = self._keys(fact, dimensions, grain)
+        selected = [f"{expression(column)} AS {column}" for column in keys if column != 'period']
+        if grain:
+            selected.insert(0, f"{LIVE_PERIODS[grain].format(column=date_column)} AS period")
+        selected.append("COUNT(*) AS count")
+        selected += [f"SUM(COALESCE({expression(column)}, 0)) AS {measure}" for measure, column in spec['measures'].items()]
+
+        query = f"""
+            SELECT {', '.join(selected)}
+            FROM ({FACT_TABLES[fact]['sql'].format(where=where)}) f
+            {('WHERE ' + ' AND '.join(filter_sql)) if filter_sql else ''}
+            {('GROUP BY ' + ', '.join(keys)) if keys else ''}
+        """
+        conn = self.snapshot.db.get_connection()
+        try:
+            return pd.read_sql_query(query, conn, params=params)
+        finally:
+            conn.close()
+
+
+def _period(values, source_grain, grain):
+    if source_grain == 'month':
+        return values.str[:4] if grain == 'year' else values
+    if grain == 'week':
+        # بداية الأسبوع (الاثنين)
+        values = values - pd.to_timedelta(values.dt.weekday, unit='D')
+        return values.dt.strftime('%Y-%m-%d')
+    return values.dt.strftime({'day': '%Y-%m-%d', 'month': '%Y-%m', 'year': '%Y'}[grain])
+
+
+def _between(values, low, high):
+    mask = values <= high
+    if low is not None:
+        mask &= values >= low
+    return mask
+
+
+def _as_tuple(values):
+    if isinstance(values, (list, tuple, set, pd.Series, np.ndarray)):
+        return tuple(values)
+    return (values,)
+
+
+# مكعب مشترك بين الجلسات
+analytics_cube = AnalyticsCube()
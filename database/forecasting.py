@@ -0,0 +1,217 @@
+"""
+Inventory Forecasting for Cura Clinic App
+Projects daily demand and days-of-cover for every item at once
+"""
+
+import math
+import threading
+from datetime import date, timedelta
+
+import numpy as np
+import pandas as pd
+
+from .models import db
+from .versions import table_versions
+
+# الجداول التي يُبنى منها التوقع: الكتابة في أي منها تُبطل النتيجة المخزنة
+SOURCE_TABLES = ('inventory', 'inventory_lots', 'inventory_usage', 'inventory_on_hand', 'appointments', 'suppliers')
+
+# مستوى الخدمة لمخزون الأمان (95%)
+SERVICE_LEVEL_Z = 1.65
+
+FORECAST_COLUMNS = [
+    'id', 'item_name', 'category', 'supplier_id', 'supplier_name', 'on_hand', 'min_stock_level',
+    'unit_cost', 'daily_demand', 'demand_std', 'days_of_cover', 'stockout_date', 'safety_stock',
+    'reorder_point', 'needs_reorder', 'reorder_qty', 'reorder_cost',
+]
+
+
+class InventoryForecaster:
+    """Days-of-cover and reorder quantities for all inventory items.
+
+    Daily demand per item has two parts. Usage not tied to an appointment
+    is projected at its historical daily rate. Usage tied to appointments
+    is learned per treatment (units per appointment over the history) and
+    applied to the appointments already booked in the horizon; because
+    bookings fill up over time, the historical rate is the floor.
+
+    Everything is computed as item x day and item x treatment matrices in
+    one pass. The result is cached per day and settings, stamped with the
+    source tables' versions so a stock movement from any process shows up
+    on the next call.
+    """
+
+    HISTORY_DAYS = 90
+    HORIZON_DAYS = 30
+
+    def __init__(self, database=None):
+        self.db = database or db
+        self._lock = threading.Lock()
+        self._cache = None   # (key, forecast)
+
+    def invalidate(self):
+        with self._lock:
+            self._cache = None
+
+    def forecast(self, as_of=None, refresh=False):
+        """One row per active item with demand, cover and reorder suggestion"""
+        as_of = as_of or date.today()
+        with self._lock:
+            conn = self.db.get_connection()
+            try:
+                settings = self._load_settings(conn)
+                key = (as_of, settings, table_versions.current(*SOURCE_TABLES))
+                if refresh or self._cache is None or self._cache[0] != key:
+                    self._cache = (key, self._compute(conn, as_of, *settings))
+            finally:
+                conn.close()
+            return self._cache[1].copy()
+
+    def reorder_suggestions(self, as_of=None, refresh=False):
+        """Items at or below their reorder point, most urgent first"""
+        forecast = self.forecast(as_of, refresh)
+        suggestions = forecast[forecast['needs_reorder']]
+        return suggestions.sort_values(['supplier_name', 'days_of_cover'], na_position='last').reset_index(drop=True)
+
+    def suggestions_by_supplier(self, as_of=None, refresh=False):
+        """Reorder totals per supplier"""
+        suggestions = self.reorder_suggestions(as_of, refresh)
+        return (
+            suggestions.groupby('supplier_name', dropna=False)
+            .agg(items=('id', 'count'), reorder_qty=('reorder_qty', 'sum'),
+                 reorder_cost=('reorder_cost', 'sum'), min_days_of_cover=('days_of_cover', 'min'))
+            .reset_index()
+            .sort_values('min_days_of_cover')
+            .reset_index(drop=True)
+        )
+
+    # ========== التحميل ==========
+    @staticmethod
+    def _load_settings(conn):
+        values = dict(conn.execute(
+            "SELECT key, value FROM settings WHERE key IN ('reorder_lead_time_days', 'reorder_cover_days')"
+        ).fetchall())
+        return int(values.get('reorder_lead_time_days') or 7), int(values.get('reorder_cover_days') or 30)
+
+    def _load(self, conn, as_of):
+        history_start = (as_of - timedelta(days=self.HISTORY_DAYS)).isoformat()
+        history_end = (as_of - timedelta(days=1)).isoformat()
+        horizon_end = (as_of + timedelta(days=self.HORIZON_DAYS - 1)).isoformat()
+
+        items = pd.read_sql_query('''
+            SELECT
+                i.id,
+                i.item_name,
+                i.category,
+                i.supplier_id,
+                s.name as supplier_name,
+                COALESCE(oh.quantity, i.quantity) as on_hand,
+                COALESCE(i.min_stock_level, 0) as min_stock_level,
+                COALESCE(
+                    (SELECT l.unit_cost FROM inventory_lots l
+                     WHERE l.inventory_id = i.id ORDER BY l.received_date DESC, l.id DESC LIMIT 1),
+                    i.unit_price, 0
+                ) as unit_cost
+            FROM inventory i
+            LEFT JOIN suppliers s ON i.supplier_id = s.id
+            LEFT JOIN inventory_on_hand oh ON oh.inventory_id = i.id
+            WHERE i.is_active = 1
+            ORDER BY i.id
+        ''', conn)
+
+        usage = pd.read_sql_query('''
+            SELECT iu.inventory_id, iu.usage_date, a.treatment_id, SUM(iu.quantity_used) as quantity
+            FROM inventory_usage iu
+            LEFT JOIN appointments a ON iu.appointment_id = a.id
+            WHERE iu.usage_date BETWEEN ? AND ?
+            GROUP BY iu.inventory_id, iu.usage_date, a.treatment_id
+        ''', conn, params=(history_start, history_end))
+
+        appointment_counts = '''
+            SELECT treatment_id, COUNT(*) as appointments
+            FROM appointments
+            WHERE appointment_date BETWEEN ? AND ?
+            AND treatment_id IS NOT NULL AND status {status}
+            GROUP BY treatment_id
+        '''
+        history = pd.read_sql_query(appointment_counts.format(status="!= 'ملغي'"), conn,
+                                    params=(history_start, history_end))
+        booked = pd.read_sql_query(appointment_counts.format(status="IN ('مجدول', 'مؤكد')"), conn,
+                                   params=(as_of.isoformat(), horizon_end))
+        return items, usage, history, booked
+
+    # ========== الحساب ==========
+    def _compute(self, conn, as_of, lead_time_days, cover_days):
+        items, usage, history, booked = self._load(conn, as_of)
+        if items.empty:
+            return pd.DataFrame(columns=FORECAST_COLUMNS)
+
+        item_index = pd.Index(items['id'])
+        usage = usage[usage['inventory_id'].isin(item_index)]
+        rows = item_index.get_indexer(usage['inventory_id'])
+        quantity = usage['quantity'].to_numpy(dtype=float)
+
+        # الاستهلاك اليومي: صنف x يوم
+        history_start = pd.Timestamp(as_of - timedelta(days=self.HISTORY_DAYS))
+        days = (pd.to_datetime(usage['usage_date']) - history_start).dt.days.to_numpy()
+        daily = np.zeros((len(items), self.HISTORY_DAYS))
+        np.add.at(daily, (rows, days), quantity)
+
+        # الاستهلاك المرتبط بالعلاجات: صنف x علاج
+        treatment_index = pd.Index(
+            pd.concat([history['treatment_id'], booked['treatment_id'], usage['treatment_id'].dropna()])
+            .astype(int).unique()
+        )
+        linked = usage['treatment_id'].notna().to_numpy()
+        per_treatment = np.zeros((len(items), len(treatment_index)))
+        np.add.at(
+            per_treatment,
+            (rows[linked], treatment_index.get_indexer(usage['treatment_id'][linked].astype(int))),
+            quantity[linked]
+        )
+
+        def counts(frame):
+            vector = np.zeros(len(treatment_index))
+            vector[treatment_index.get_indexer(frame['treatment_id'].astype(int))] = frame['appointments']
+            return vector
+
+        history_counts, booked_counts = counts(history), counts(booked)
+        units_per_appointment = np.divide(
+            per_treatment, history_counts, out=np.zeros_like(per_treatment), where=history_counts > 0
+        )
+
+        linked_rate = per_treatment.sum(axis=1) / self.HISTORY_DAYS
+        booked_rate = units_per_appointment @ booked_counts / self.HORIZON_DAYS
+        unlinked_rate = (daily.sum(axis=1) - per_treatment.sum(axis=1)) / self.HISTORY_DAYS
+        demand = unlinked_rate + np.maximum(linked_rate, booked_rate)
+
+        on_hand = items['on_hand'].to_numpy(dtype=float)
+        min_stock = items['min_stock_level'].to_numpy(dtype=float)
+        demand_std = daily.std(axis=1)
+        safety_stock = SERVICE_LEVEL_Z * demand_std * math.sqrt(lead_time_days)
+        reorder_point = np.maximum(demand * lead_time_days + safety_stock, min_stock)
+        days_of_cover = np.divide(on_hand, demand, out=np.full_like(on_hand, np.inf), where=demand > 0)
+
+        needs_reorder = on_hand <= reorder_point
+        target = np.maximum(demand * (lead_time_days + cover_days) + safety_stock, min_stock * 2)
+        reorder_qty = np.where(needs_reorder, np.ceil(np.maximum(target - on_hand, 0)), 0)
+
+        forecast = items.copy()
+        forecast['daily_demand'] = demand.round(3)
+        forecast['demand_std'] = demand_std.round(3)
+        forecast['days_of_cover'] = np.where(np.isfinite(days_of_cover), days_of_cover.round(1), np.nan)
+        # لا تاريخ نفاد إذا كان الرصيد يكفي أكثر من عشر سنوات
+        cover_whole_days = np.where(days_of_cover <= 3650, np.floor(days_of_cover), np.nan)
+        forecast['stockout_date'] = (
+            pd.Timestamp(as_of) + pd.to_timedelta(cover_whole_days, unit='D')
+        ).strftime('%Y-%m-%d')
+        forecast['safety_stock'] = np.ceil(safety_stock)
+        forecast['reorder_point'] = np.ceil(reorder_point)
+        forecast['needs_reorder'] = needs_reorder
+        forecast['reorder_qty'] = reorder_qty.astype(int)
+        forecast['reorder_cost'] = (reorder_qty * items['unit_cost'].to_numpy(dtype=float)).round(2)
+        return forecast[FORECAST_COLUMNS]
+
+
+# حساب مشترك بين الجلسات، يُعاد مرة يومياً
+inventory_forecaster = InventoryForecaster()
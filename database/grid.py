@@ -0,0 +1,86 @@
+"""
+Grid Persistence for Cura Clinic App
+Turns an edited data_editor frame into batched UPDATE statements
+"""
+
+# الأعمدة القابلة للتعديل من الجداول؛ الكمية في المخزون تتغير عبر الدفعات فقط.
+# derived: أعمدة تُحسب من عمود آخر عند تغييره بدلاً من تعديلها مباشرة
+GRID_TABLES = {
+    'doctors': {
+        'columns': ['name', 'specialization', 'phone', 'email', 'address', 'salary', 'commission_rate'],
+        'action': 'تحديث أطباء',
+    },
+    'treatments': {
+        'columns': ['name', 'description', 'base_price', 'duration_minutes', 'category', 'doctor_percentage'],
+        # نسبة العيادة = 100 - نسبة الطبيب كما في نموذج الإضافة (حصص الدفعات تُحسب منهما)
+        'derived': {'clinic_percentage': ('doctor_percentage', lambda doctor: 100.0 - doctor)},
+        'action': 'تحديث علاجات',
+    },
+    'inventory': {
+        'columns': ['item_name', 'category', 'unit_price', 'min_stock_level', 'supplier_id',
+                    'location', 'barcode'],
+        'action': 'تحديث مخزون',
+    },
+    'suppliers': {
+        'columns': ['name', 'contact_person', 'phone', 'email', 'address', 'payment_terms'],
+        'action': 'تحديث موردين',
+    },
+}
+
+
+def diff_frames(original, edited, columns, key='id'):
+    """Changed cells between two frames aligned on ``key``.
+
+    Returns ``(changed, values)``: a boolean frame marking the changed
+    cells and the edited values, both indexed by key and limited to rows
+    with at least one change. Rows missing from ``original`` (added in the
+    editor) and columns missing from ``edited`` are ignored; two missing
+    values count as equal.
+    """
+    columns = [c for c in columns if c in original.columns and c in edited.columns]
+    before = original.dropna(subset=[key]).set_index(key)[columns]
+    after = edited.dropna(subset=[key]).set_index(key)[columns]
+    after = after[after.index.isin(before.index)]
+    before = before.reindex(after.index)
+
+    changed = (before != after) & ~(before.isna() & after.isna())
+    rows = changed.any(axis=1)
+    return changed[rows], after[rows]
+
+
+def grid_updates(table, original, edited, key='id'):
+    """Batched UPDATE statements for the rows changed in ``edited``.
+
+    Rows are grouped by the set of columns they changed, so each group is
+    one ``(sql, params)`` pair for ``executemany`` that only writes the
+    changed columns. Derived columns are recomputed from their source in
+    the rows where the source changed. Returns the statements and the
+    changed ids.
+    """
+    if table not in GRID_TABLES:
+        raise ValueError(f"جدول غير مدعوم: {table}")
+
+    spec = GRID_TABLES[table]
+    changed, values = diff_frames(original, edited, spec['columns'], key)
+    if changed.empty:
+        return [], []
+
+    for column, (source, derive) in spec.get('derived', {}).items():
+        if source in changed.columns:
+            changed[column] = changed[source]
+            values[column] = derive(values[source])
+
+    # قيم بايثون عادية (None بدلاً من NaN) لتمريرها إلى sqlite
+    values = values.astype(object).where(values.notna(), None)
+    signatures = changed.apply(lambda row: tuple(row.index[row]), axis=1)
+
+    statements = []
+    for columns, ids in signatures.groupby(signatures).groups.items():
+        assignments = ', '.join(f"{column} = ?" for column in columns)
+        params = [
+            (*row, int(record_id))
+            for record_id, row in zip(ids, values.loc[ids, list(columns)].itertuples(index=False))
+        ]
+        statements.append((f"UPDATE {table} SET {assignments} WHERE {key} = ?", params))
+
+    return statements, [int(record_id) for record_id in changed.index]
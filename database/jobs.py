@@ -0,0 +1,473 @@
+"""
+Background Jobs for Cura Clinic App
+Long reports and exports run in a bounded pool, with their results kept on disk for reuse
+"""
+
+import hashlib
+import io
+import json
+import os
+import pickle
+import shutil
+import tempfile
+import threading
+import uuid
+import zipfile
+from collections import namedtuple
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta
+
+import pandas as pd
+
+from .models import db
+from .versions import table_versions
+
+# حالات المهمة
+QUEUED, RUNNING, DONE, FAILED, CANCELLED = 'queued', 'running', 'done', 'failed', 'cancelled'
+ACTIVE_STATUSES = (QUEUED, RUNNING)
+
+# نتيجة قابلة للتنزيل (ملف Excel أو ZIP)
+JobFile = namedtuple('JobFile', 'file_name mime data')
+
+# الجداول التي يشملها التصدير الكامل
+EXPORT_TABLES = ('patients', 'doctors', 'treatments', 'appointments', 'payments',
+                 'expenses', 'inventory', 'suppliers')
+
+# نوع المهمة -> الدالة والعنوان ومدة صلاحية النتيجة (None = لا تُعاد استخدامها) وجداول المصدر
+JOB_TYPES = {}
+
+
+class JobCancelled(Exception):
+    """Raised from the progress callback of a job that was cancelled"""
+
+
+def job_type(kind, title, ttl=None, tables=()):
+    """Register ``func(params, progress)`` as the job ``kind``.
+
+    ``ttl`` is how long (seconds) a finished result is reused for a new
+    request with the same parameters; side-effecting jobs leave it ``None``.
+    ``tables`` are the tables the result is built from: a write to any of
+    them (``table_versions``) ends the reuse before the TTL does.
+    """
+    def register(func):
+        JOB_TYPES[kind] = {'func': func, 'title': title, 'ttl': ttl, 'tables': tuple(tables)}
+        return func
+    return register
+
+
+def _now():
+    return datetime.now().isoformat(sep=' ', timespec='seconds')
+
+
+def _process_alive(pid):
+    """Whether a process with ``pid`` is still running on this machine"""
+    if pid == os.getpid():
+        return True
+    if os.name == 'nt':
+        # os.kill على ويندوز ينهي العملية، فيُسأل النظام عن حالتها بدلاً من ذلك
+        import ctypes
+        kernel32 = ctypes.windll.kernel32
+        handle = kernel32.OpenProcess(0x1000, False, pid)   # PROCESS_QUERY_LIMITED_INFORMATION
+        if not handle:
+            return False
+        try:
+            code = ctypes.c_ulong()
+            return bool(kernel32.GetExitCodeProcess(handle, ctypes.byref(code))) and code.value == 259   # STILL_ACTIVE
+        finally:
+            kernel32.CloseHandle(handle)
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        return True
+    return True
+
+
+def _holder_alive(holder):
+    """Whether the runner ``holder`` ("pid:token") can still finish its jobs"""
+    try:
+        return _process_alive(int(holder.split(':', 1)[0]))
+    except (AttributeError, ValueError):
+        return False   # سجل من قبل تسجيل المالك
+
+
+class JobRunner:
+    """In-process runner for long reports, exports and maintenance.
+
+    ``submit()`` records the job in the ``jobs`` table and hands it to a
+    small thread pool, so a Streamlit rerun only inserts a row and returns.
+    Jobs report ``progress(fraction, message)``; the callback writes at
+    most every ``THROTTLE_SECONDS`` and raises ``JobCancelled`` once
+    ``cancel()`` is called. Results are pickled to ``<db>_jobs/<id>.pkl``
+    and, for job types with a TTL, reused by later requests with the same
+    parameters and source table versions until they expire.
+
+    Several processes can share the ``jobs`` table, so every job records
+    the runner that owns it (``holder``, like the scheduler lease). Jobs
+    left queued or running are only failed once their holder's process is
+    gone.
+    """
+
+    MAX_WORKERS = 2
+    THROTTLE_SECONDS = 0.5
+    # المهام المنتهية بلا صلاحية تُحذف من السجل بعد هذه المدة
+    HISTORY_DAYS = 7
+
+    def __init__(self, database=None, directory=None, max_workers=None):
+        self.db = database or db
+        self._directory = directory
+        self.max_workers = max_workers or self.MAX_WORKERS
+        self._lock = threading.Lock()
+        self._executor = None
+        self._futures = {}   # job id -> Future
+        self._cancel = {}    # job id -> Event
+        self._recovered = False
+        self.holder = f"{os.getpid()}:{uuid.uuid4().hex[:8]}"
+
+    @property
+    def directory(self):
+        if self._directory:
+            return self._directory
+        # بجوار ملف قاعدة البيانات: clinic.db -> clinic_jobs/
+        return os.environ.get('CURA_JOBS_DIR') or os.path.splitext(os.path.abspath(self.db.db_path))[0] + '_jobs'
+
+    # ========== الإرسال ==========
+    def submit(self, kind, params=None, owner=None, use_cache=True):
+        """Queue a job; returns its id (an existing one when the result can be reused)"""
+        if kind not in JOB_TYPES:
+            raise ValueError(f"نوع مهمة غير معروف: {kind}")
+        spec = JOB_TYPES[kind]
+        params = params or {}
+        params_json = json.dumps(params, sort_keys=True, default=str)
+        versions = table_versions.current(*spec['tables']) if spec['tables'] else ()
+        cache_key = hashlib.sha1(f"{kind}:{params_json}:{versions}".encode('utf-8')).hexdigest()
+
+        self._start()
+        conn = self.db.get_connection()
+        try:
+            # نفس الطلب قيد التنفيذ: لا يُعاد تشغيله (مثلاً عند إعادة تشغيل الصفحة)
+            row = conn.execute(
+                "SELECT id FROM jobs WHERE cache_key = ? AND status IN (?, ?) ORDER BY created_at DESC LIMIT 1",
+                (cache_key, *ACTIVE_STATUSES)
+            ).fetchone()
+            if row is not None:
+                return row[0]
+
+            job_id = uuid.uuid4().hex
+            cached = None
+            if use_cache and spec['ttl']:
+                cached = conn.execute('''
+                    SELECT result_path, result_name, expires_at FROM jobs
+                    WHERE cache_key = ? AND status = ? AND expires_at > ?
+                    ORDER BY finished_at DESC LIMIT 1
+                ''', (cache_key, DONE, _now())).fetchone()
+                if cached is not None and not os.path.exists(cached[0]):
+                    cached = None
+
+            now = _now()
+            if cached is not None:
+                # نتيجة صالحة: سجل جديد لصاحب الطلب يشير إلى نفس الملف
+                conn.execute('''
+                    INSERT INTO jobs (id, kind, owner, params, cache_key, status, progress, message,
+                                      result_path, result_name, created_at, started_at, finished_at, expires_at, holder)
+                    VALUES (?, ?, ?, ?, ?, ?, 1, 'من النتائج المحفوظة', ?, ?, ?, ?, ?, ?, ?)
+                ''', (job_id, kind, owner, params_json, cache_key, DONE, *cached[:2], now, now, now, cached[2],
+                      self.holder))
+            else:
+                conn.execute('''
+                    INSERT INTO jobs (id, kind, owner, params, cache_key, status, created_at, holder)
+                    VALUES (?, ?, ?, ?, ?, ?, ?, ?)
+                ''', (job_id, kind, owner, params_json, cache_key, QUEUED, now, self.holder))
+            conn.commit()
+        finally:
+            conn.close()
+
+        if cached is None:
+            event = threading.Event()
+            with self._lock:
+                self._cancel[job_id] = event
+                self._futures[job_id] = self._executor.submit(self._run, job_id, kind, params, event)
+        return job_id
+
+    def cancel(self, job_id):
+        """Cancel a queued or running job; returns False if it already finished"""
+        with self._lock:
+            event = self._cancel.get(job_id)
+            future = self._futures.get(job_id)
+        if event is None:
+            return False
+        event.set()
+        if future is not None and future.cancel():
+            # لم تبدأ بعد: لن تعمل أبداً
+            self._finish(job_id, CANCELLED, message='تم الإلغاء')
+            self._forget(job_id)
+        else:
+            self._update(job_id, message='جاري الإلغاء...')
+        return True
+
+    def wait(self, job_id, timeout=None):
+        """Block until the job finishes (for scripts and tests); returns its status row"""
+        with self._lock:
+            future = self._futures.get(job_id)
+        if future is not None:
+            try:
+                future.result(timeout)
+            except Exception:
+                pass   # الخطأ مسجل في جدول المهام
+        return self.status(job_id)
+
+    def shutdown(self, wait=True):
+        with self._lock:
+            executor, self._executor = self._executor, None
+        if executor is not None:
+            executor.shutdown(wait=wait)
+
+    # ========== القراءة ==========
+    def status(self, job_id):
+        """The job's row as a dict (None if unknown)"""
+        rows = self._select("SELECT * FROM jobs WHERE id = ?", (job_id,))
+        return rows[0] if rows else None
+
+    def jobs_for(self, owner, limit=10):
+        """The owner's most recent jobs, newest first"""
+        return self._select(
+            "SELECT * FROM jobs WHERE owner = ? ORDER BY created_at DESC, rowid DESC LIMIT ?",
+            (owner, limit)
+        )
+
+    def has_active(self, owner):
+        """Whether the owner has queued or running jobs (cheap check for polling)"""
+        conn = self.db.get_connection()
+        try:
+            return conn.execute(
+                "SELECT 1 FROM jobs WHERE owner = ? AND status IN (?, ?) LIMIT 1", (owner, *ACTIVE_STATUSES)
+            ).fetchone() is not None
+        finally:
+            conn.close()
+
+    def result(self, job_id):
+        """The stored result of a finished job (None if not done or expired)"""
+        job = self.status(job_id)
+        if job is None or job['status'] != DONE or not job['result_path']:
+            return None
+        try:
+            with open(job['result_path'], 'rb') as f:
+                return pickle.load(f)
+        except FileNotFoundError:
+            return None
+
+    def purge_expired(self):
+        """Delete expired results and old finished jobs; returns the number of jobs removed"""
+        now = datetime.now()
+        history = (now - timedelta(days=self.HISTORY_DAYS)).isoformat(sep=' ', timespec='seconds')
+        conn = self.db.get_connection()
+        try:
+            paths = {row[0] for row in conn.execute(
+                "SELECT result_path FROM jobs WHERE expires_at <= ? AND result_path IS NOT NULL", (_now(),)
+            )}
+            cursor = conn.execute('''
+                DELETE FROM jobs
+                WHERE expires_at <= ?
+                   OR (expires_at IS NULL AND status NOT IN (?, ?) AND created_at < ?)
+            ''', (_now(), *ACTIVE_STATUSES, history))
+            removed = cursor.rowcount
+            # لا يُحذف ملف ما زال سجل آخر يشير إليه
+            kept = {row[0] for row in conn.execute("SELECT DISTINCT result_path FROM jobs WHERE result_path IS NOT NULL")}
+            conn.commit()
+        finally:
+            conn.close()
+
+        for path in paths - kept:
+            if path and os.path.exists(path):
+                os.remove(path)
+        return removed
+
+    # ========== التنفيذ ==========
+    def _start(self):
+        with self._lock:
+            if self._executor is None:
+                self._executor = ThreadPoolExecutor(max_workers=self.max_workers, thread_name_prefix='cura-job')
+            if self._recovered:
+                return
+            self._recovered = True
+        self.recover_orphaned()
+        self.purge_expired()
+
+    def recover_orphaned(self):
+        """Fail the queued/running jobs whose runner process is gone; returns their number"""
+        conn = self.db.get_connection()
+        try:
+            holders = {row[0] for row in conn.execute(
+                "SELECT DISTINCT holder FROM jobs WHERE status IN (?, ?)", ACTIVE_STATUSES
+            )}
+            # مهام عمليات أخرى ما زالت تعمل تبقى كما هي
+            orphaned = [holder for holder in holders if not _holder_alive(holder)]
+            recovered = 0
+            for holder in orphaned:
+                cursor = conn.execute(
+                    "UPDATE jobs SET status = ?, error = ?, finished_at = ? WHERE status IN (?, ?) AND holder IS ?",
+                    (FAILED, 'توقف التطبيق قبل انتهاء المهمة', _now(), *ACTIVE_STATUSES, holder)
+                )
+                recovered += cursor.rowcount
+            conn.commit()
+        finally:
+            conn.close()
+        return recovered
+
+    def _run(self, job_id, kind, params, event):
+        spec = JOB_TYPES[kind]
+        try:
+            if event.is_set():
+                raise JobCancelled()
+            self._update(job_id, status=RUNNING, started_at=_now(), message='بدأت المهمة')
+            result = spec['func'](params, _Progress(self, job_id, event))
+
+            os.makedirs(self.directory, exist_ok=True)
+            path = os.path.join(self.directory, f"{job_id}.pkl")
+            with open(path + '.tmp', 'wb') as f:
+                pickle.dump(result, f, protocol=pickle.HIGHEST_PROTOCOL)
+            os.replace(path + '.tmp', path)
+
+            expires_at = None
+            if spec['ttl']:
+                expires_at = (datetime.now() + timedelta(seconds=spec['ttl'])).isoformat(sep=' ', timespec='seconds')
+            # اسم الملف القابل للتنزيل يُحفظ في السجل حتى لا تُقرأ النتيجة قبل طلبها
+            result_name = result.file_name if isinstance(result, JobFile) else None
+            self._finish(job_id, DONE, progress=1, message='اكتملت', result_path=path,
+                         result_name=result_name, expires_at=expires_at)
+        except JobCancelled:
+            self._finish(job_id, CANCELLED, message='تم الإلغاء')
+        except Exception as e:
+            self._finish(job_id, FAILED, error=str(e))
+        finally:
+            self._forget(job_id)
+
+    def _finish(self, job_id, status, **fields):
+        # مهمة انتهت بالفعل (مثلاً عُلّمت فاشلة) لا تُعاد كتابة حالتها
+        self._update(job_id, active_only=True, status=status, finished_at=_now(), **fields)
+
+    def _forget(self, job_id):
+        with self._lock:
+            self._futures.pop(job_id, None)
+            self._cancel.pop(job_id, None)
+
+    def _update(self, job_id, active_only=False, **fields):
+        assignments = ', '.join(f"{column} = ?" for column in fields)
+        condition = f" AND status IN ('{QUEUED}', '{RUNNING}')" if active_only else ''
+        conn = self.db.get_connection()
+        try:
+            conn.execute(f"UPDATE jobs SET {assignments} WHERE id = ?{condition}", (*fields.values(), job_id))
+            conn.commit()
+        finally:
+            conn.close()
+
+    def _select(self, sql, params):
+        conn = self.db.get_connection()
+        try:
+            cursor = conn.execute(sql, params)
+            columns = [d[0] for d in cursor.description]
+            return [dict(zip(columns, row)) for row in cursor.fetchall()]
+        finally:
+            conn.close()
+
+
+class _Progress:
+    """``progress(fraction, message=None)`` handed to a running job"""
+
+    def __init__(self, runner, job_id, event):
+        self.runner = runner
+        self.job_id = job_id
+        self.event = event
+        self._last = 0.0
+
+    def __call__(self, fraction, message=None):
+        if self.event.is_set():
+            raise JobCancelled()
+        now = datetime.now().timestamp()
+        if now - self._last < self.runner.THROTTLE_SECONDS:
+            return
+        self._last = now
+        fields = {'progress': round(min(max(float(fraction), 0.0), 1.0), 4)}
+        if message:
+            fields['message'] = message
+        self.runner._update(self.job_id, **fields)
+
+    def steps(self, step, done, total):
+        """Adapter for the ``progress(step, done, total)`` callbacks of the validator and migration"""
+        self(done / total if total else 0, step)
+
+
+# ========== أنواع المهام ==========
+@job_type('financial_report', 'التقرير المالي الشامل', ttl=300,
+          tables=('payments', 'expenses', 'appointments', 'patients', 'doctors', 'treatments'))
+def _financial_report(params, progress):
+    from .crud import crud
+    progress(0.1, 'حساب الأرباح والتدفق النقدي')
+    return crud.get_comprehensive_financial_report(params['start_date'], params['end_date'])
+
+
+# المدقق يكتب علامته في settings عند كل تشغيل، فلا تُحسب ضمن جداول المصدر
+@job_type('validation_report', 'تقرير سلامة البيانات', ttl=600,
+          tables=tuple(table for table in db.VERSIONED_TABLES if table != 'settings'))
+def _validation_report(params, progress):
+    from .validation import validator
+    return validator.get_validation_report(mode=params.get('mode', 'full'), progress=progress.steps)
+
+
+@job_type('full_migration', 'الترقية الكاملة لقاعدة البيانات')
+def _full_migration(params, progress):
+    from .migration import migration
+    return migration.run_full_migration(progress=progress.steps)
+
+
+@job_type('analytics_snapshot', 'تحديث لقطة التحليلات')
+def _analytics_snapshot(params, progress):
+    from .crud import crud
+    progress(0.1, 'تصدير البيانات')
+    return crud.export_analytics_snapshot()
+
+
+@job_type('patient_reports', 'تقارير المرضى', ttl=3600,
+          tables=('patients', 'appointments', 'payments', 'doctors', 'treatments'))
+def _patient_reports(params, progress):
+    from report_generator import render_batch
+    from .crud import crud
+    if params.get('doctor_id'):
+        patient_ids = crud.get_doctor_patient_ids(params['doctor_id'], params.get('month'))
+    else:
+        patient_ids = crud.get_all_patients()['id'].tolist()
+
+    directory = tempfile.mkdtemp(prefix='cura_reports_')
+    try:
+        result = render_batch(
+            patient_ids, directory, fmt=params.get('fmt', 'html'), workers=params.get('workers'),
+            progress=lambda done, total: progress(0.9 * done / total if total else 0, f"{done}/{total} تقرير")
+        )
+        progress(0.95, 'ضغط الملفات')
+        buffer = io.BytesIO()
+        with zipfile.ZipFile(buffer, 'w', zipfile.ZIP_DEFLATED) as archive:
+            for path in result['paths']:
+                archive.write(path, os.path.basename(path))
+    finally:
+        shutil.rmtree(directory, ignore_errors=True)
+    return JobFile('patient_reports.zip', 'application/zip', buffer.getvalue())
+
+
+@job_type('full_export', 'تصدير كامل إلى Excel', ttl=600, tables=EXPORT_TABLES)
+def _full_export(params, progress):
+    buffer = io.BytesIO()
+    conn = db.get_connection()
+    try:
+        with pd.ExcelWriter(buffer, engine='openpyxl') as writer:
+            for i, table in enumerate(EXPORT_TABLES):
+                progress(i / len(EXPORT_TABLES), table)
+                pd.read_sql_query(f"SELECT * FROM {table}", conn).to_excel(writer, sheet_name=table, index=False)
+    finally:
+        conn.close()
+    return JobFile(f"cura_export_{datetime.now():%Y%m%d_%H%M}.xlsx",
+                   'application/vnd.openxmlformats-officedocument.spreadsheetml.sheet', buffer.getvalue())
+
+
+# منفذ مشترك لكل الجلسات
+job_runner = JobRunner()
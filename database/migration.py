@@ -9,6 +9,38 @@ from datetime import datetime, date
 from .models import db
 from .validation import validator
 
+# Set-based fix per validator check; each statement touches the ids in temp.fix_ids
+FIXES = {
+    # مواعيد مرضى أو أطباء غير موجودين تُلغى
+    'appointment_patient': """
+        UPDATE appointments
+        SET status = 'ملغي', notes = COALESCE(notes, '') || ' - تم الإلغاء بسبب مريض غير موجود'
+        WHERE id IN (SELECT id FROM temp.fix_ids)
+    """,
+    'appointment_doctor': """
+        UPDATE appointments
+        SET status = 'ملغي', notes = COALESCE(notes, '') || ' - تم الإلغاء بسبب طبيب غير موجود'
+        WHERE id IN (SELECT id FROM temp.fix_ids)
+    """,
+    'appointment_treatment': """
+        UPDATE appointments
+        SET treatment_id = NULL, notes = COALESCE(notes, '') || ' - تم إزالة العلاج غير الموجود'
+        WHERE id IN (SELECT id FROM temp.fix_ids)
+    """,
+    'payment_patient': "DELETE FROM payments WHERE id IN (SELECT id FROM temp.fix_ids)",
+    'payment_appointment': """
+        UPDATE payments
+        SET appointment_id = NULL, notes = COALESCE(notes, '') || ' - تم إلغاء ربط الموعد'
+        WHERE id IN (SELECT id FROM temp.fix_ids)
+    """,
+    'inventory_supplier': "UPDATE inventory SET supplier_id = NULL WHERE id IN (SELECT id FROM temp.fix_ids)",
+    'usage_inventory': "DELETE FROM inventory_usage WHERE id IN (SELECT id FROM temp.fix_ids)",
+    'usage_appointment': "UPDATE inventory_usage SET appointment_id = NULL WHERE id IN (SELECT id FROM temp.fix_ids)",
+    'inventory_quantity': "UPDATE inventory SET quantity = 0 WHERE id IN (SELECT id FROM temp.fix_ids)",
+    'appointment_past_scheduled': "UPDATE appointments SET status = 'مكتمل' WHERE id IN (SELECT id FROM temp.fix_ids)",
+    'doctor_commission': "UPDATE doctors SET commission_rate = 50.0 WHERE id IN (SELECT id FROM temp.fix_ids)",
+}
+
 class DatabaseMigration:
     """Database migration and data validation class"""
 
@@ -16,13 +48,14 @@ class DatabaseMigration:
         self.db = db
         self.validator = validator
 
-    def run_full_validation(self):
+    def run_full_validation(self, mode='full'):
         """Run complete validation and generate report"""
         print("🔍 بدء عملية التحقق من سلامة قاعدة البيانات...")
 
-        report = self.validator.get_validation_report()
+        report = self.validator.get_validation_report(mode=mode, progress=self._print_progress)
 
-        print("📊 تقرير التحقق:"        print(f"   إجمالي المشاكل: {report['summary']['total_issues']}")
+        print("📊 تقرير التحقق:")
+        print(f"   إجمالي المشاكل: {report['summary']['total_issues']}")
         print(f"   مشاكل عالية الأولوية: {report['summary']['high_severity']}")
         print(f"   مشاكل متوسطة الأولوية: {report['summary']['medium_severity']}")
         print(f"   مشاكل منخفضة الأولوية: {report['summary']['low_severity']}")
@@ -34,221 +67,77 @@ class DatabaseMigration:
 
         return report
 
-    def fix_foreign_key_issues(self, report=None):
+    def _print_progress(self, step, done, total):
+        print(f"   [{done}/{total}] {step}")
+
+    def fix_foreign_key_issues(self, report=None, progress=None):
         """Fix foreign key integrity issues"""
         if report is None:
             report = self.validator.get_validation_report()
 
         print("\n🔧 بدء إصلاح مشاكل المفاتيح الأجنبية...")
 
-        fixed_count = 0
-        failed_count = 0
-
-        for issue in report['foreign_key_issues']:
-            try:
-                if self._fix_single_issue(issue):
-                    fixed_count += 1
-                    print(f"✅ تم إصلاح: {issue['issue']}")
-                else:
-                    failed_count += 1
-                    print(f"❌ فشل في إصلاح: {issue['issue']}")
-            except Exception as e:
-                failed_count += 1
-                print(f"❌ خطأ في إصلاح {issue['issue']}: {str(e)}")
+        fixed_count, failed_count = self.apply_fixes(report['foreign_key_issues'], progress=progress)
 
         print(f"\n📈 تم إصلاح {fixed_count} مشكلة، فشل {failed_count} مشكلة")
         return fixed_count, failed_count
 
-    def _fix_single_issue(self, issue):
-        """Fix a single data integrity issue"""
-        table = issue['table']
-        record_id = issue['record_id']
-
-        if table == 'appointments':
-            return self._fix_appointment_issue(issue)
-        elif table == 'payments':
-            return self._fix_payment_issue(issue)
-        elif table == 'inventory':
-            return self._fix_inventory_issue(issue)
-        elif table == 'inventory_usage':
-            return self._fix_inventory_usage_issue(issue)
-
-        return False
-
-    def _fix_appointment_issue(self, issue):
-        """Fix appointment-related issues"""
-        issue_text = issue['issue']
-
-        if "Invalid patient_id" in issue_text:
-            # Option 1: Delete orphaned appointment
-            # Option 2: Set patient_id to NULL if possible
-            # For now, we'll mark as cancelled
-            conn = self.db.get_connection()
-            cursor = conn.cursor()
-            cursor.execute(
-                "UPDATE appointments SET status = 'ملغي', notes = notes || ' - تم الإلغاء بسبب مريض غير موجود' WHERE id = ?",
-                (issue['record_id'],)
-            )
-            conn.commit()
-            conn.close()
-            return True
-
-        elif "Invalid doctor_id" in issue_text:
-            # Mark appointment as cancelled
-            conn = self.db.get_connection()
-            cursor = conn.cursor()
-            cursor.execute(
-                "UPDATE appointments SET status = 'ملغي', notes = notes || ' - تم الإلغاء بسبب طبيب غير موجود' WHERE id = ?",
-                (issue['record_id'],)
-            )
-            conn.commit()
-            conn.close()
-            return True
-
-        elif "Invalid treatment_id" in issue_text:
-            # Set treatment_id to NULL
-            conn = self.db.get_connection()
-            cursor = conn.cursor()
-            cursor.execute(
-                "UPDATE appointments SET treatment_id = NULL, notes = notes || ' - تم إزالة العلاج غير الموجود' WHERE id = ?",
-                (issue['record_id'],)
-            )
-            conn.commit()
-            conn.close()
-            return True
-
-        return False
-
-    def _fix_payment_issue(self, issue):
-        """Fix payment-related issues"""
-        issue_text = issue['issue']
-
-        if "Invalid patient_id" in issue_text:
-            # Delete orphaned payment
-            conn = self.db.get_connection()
-            cursor = conn.cursor()
-            cursor.execute("DELETE FROM payments WHERE id = ?", (issue['record_id'],))
-            conn.commit()
-            conn.close()
-            return True
-
-        elif "Invalid appointment_id" in issue_text:
-            # Set appointment_id to NULL
-            conn = self.db.get_connection()
-            cursor = conn.cursor()
-            cursor.execute(
-                "UPDATE payments SET appointment_id = NULL, notes = notes || ' - تم إلغاء ربط الموعد' WHERE id = ?",
-                (issue['record_id'],)
-            )
-            conn.commit()
-            conn.close()
-            return True
-
-        return False
-
-    def _fix_inventory_issue(self, issue):
-        """Fix inventory-related issues"""
-        issue_text = issue['issue']
-
-        if "Invalid supplier_id" in issue_text:
-            # Set supplier_id to NULL
-            conn = self.db.get_connection()
-            cursor = conn.cursor()
-            cursor.execute(
-                "UPDATE inventory SET supplier_id = NULL WHERE id = ?",
-                (issue['record_id'],)
-            )
-            conn.commit()
-            conn.close()
-            return True
-
-        return False
-
-    def _fix_inventory_usage_issue(self, issue):
-        """Fix inventory usage-related issues"""
-        issue_text = issue['issue']
-
-        if "Invalid inventory_id" in issue_text:
-            # Delete orphaned usage record
-            conn = self.db.get_connection()
-            cursor = conn.cursor()
-            cursor.execute("DELETE FROM inventory_usage WHERE id = ?", (issue['record_id'],))
-            conn.commit()
-            conn.close()
-            return True
-
-        elif "Invalid appointment_id" in issue_text:
-            # Set appointment_id to NULL
-            conn = self.db.get_connection()
-            cursor = conn.cursor()
-            cursor.execute(
-                "UPDATE inventory_usage SET appointment_id = NULL WHERE id = ?",
-                (issue['record_id'],)
-            )
-            conn.commit()
-            conn.close()
-            return True
-
-        return False
-
-    def fix_data_consistency_issues(self, report=None):
+    def fix_data_consistency_issues(self, report=None, progress=None):
         """Fix data consistency issues"""
         if report is None:
             report = self.validator.get_validation_report()
 
         print("\n🔧 بدء إصلاح مشاكل اتساق البيانات...")
 
-        fixed_count = 0
-        failed_count = 0
-
-        for issue in report['data_consistency_issues']:
-            try:
-                if self._fix_consistency_issue(issue):
-                    fixed_count += 1
-                    print(f"✅ تم إصلاح: {issue['issue']}")
-                else:
-                    failed_count += 1
-                    print(f"❌ فشل في إصلاح: {issue['issue']}")
-            except Exception as e:
-                failed_count += 1
-                print(f"❌ خطأ في إصلاح {issue['issue']}: {str(e)}")
+        fixed_count, failed_count = self.apply_fixes(report['data_consistency_issues'], progress=progress)
 
         print(f"\n📈 تم إصلاح {fixed_count} مشكلة اتساق، فشل {failed_count} مشكلة")
         return fixed_count, failed_count
 
-    def _fix_consistency_issue(self, issue):
-        """Fix a single data consistency issue"""
-        table = issue['table']
-        record_id = issue['record_id']
+    def apply_fixes(self, issues, progress=None):
+        """Apply one set-based statement per issue type, all in a single transaction.
 
-        if table == 'inventory' and "Negative quantity" in issue['issue']:
-            # Set negative quantity to 0
-            conn = self.db.get_connection()
-            cursor = conn.cursor()
-            cursor.execute("UPDATE inventory SET quantity = 0 WHERE id = ?", (record_id,))
-            conn.commit()
-            conn.close()
-            return True
+        ``issues`` is the columnar output of the validator. Returns
+        (fixed, failed); issues of a type without a fix count as failed.
+        ``progress(check, done, total)`` is called after each group.
+        """
+        if issues.empty:
+            return 0, 0
 
-        elif table == 'appointments' and "Past appointment date" in issue['issue']:
-            # Update status to completed
-            conn = self.db.get_connection()
-            cursor = conn.cursor()
-            cursor.execute("UPDATE appointments SET status = 'مكتمل' WHERE id = ?", (record_id,))
-            conn.commit()
-            conn.close()
-            return True
+        groups = issues.groupby('check', sort=False)['record_id']
+        fixable = [(check, ids) for check, ids in groups if check in FIXES]
+        failed_count = len(issues) - sum(len(ids) for _, ids in fixable)
 
-        elif table == 'doctors' and "Invalid commission rate" in issue['issue']:
-            # Set commission rate to reasonable value (50%)
-            conn = self.db.get_connection()
+        conn = self.db.get_connection()
+        try:
             cursor = conn.cursor()
-            cursor.execute("UPDATE doctors SET commission_rate = 50.0 WHERE id = ?", (record_id,))
+            cursor.execute("CREATE TEMP TABLE IF NOT EXISTS fix_ids (id INTEGER PRIMARY KEY)")
+
+            fixed_count = 0
+            for done, (check, ids) in enumerate(fixable, start=1):
+                cursor.execute("DELETE FROM temp.fix_ids")
+                cursor.executemany(
+                    "INSERT OR IGNORE INTO temp.fix_ids (id) VALUES (?)",
+                    ((int(record_id),) for record_id in ids.unique())
+                )
+                cursor.execute(FIXES[check])
+                fixed_count += len(ids)
+                print(f"✅ {check}: تم إصلاح {len(ids)} سجل")
+                if progress:
+                    progress(check, done, len(fixable))
+
             conn.commit()
+        except Exception as e:
+            conn.rollback()
+            print(f"❌ خطأ في تطبيق الإصلاحات، تم التراجع عن جميع التعديلات: {str(e)}")
+            return 0, len(issues)
+        finally:
             conn.close()
-            return True
 
-        return False
+        for check in sorted(set(issues['check']) - set(FIXES)):
+            print(f"❌ لا يوجد إصلاح تلقائي لـ {check}")
+
+        return fixed_count, failed_count
 
     def clean_orphaned_records(self):
         """Clean up orphaned records that don't have proper foreign key relationships"""
@@ -266,7 +155,7 @@ class DatabaseMigration:
             # Clean any other orphaned records based on our validation
             report = self.validator.get_validation_report()
 
-            for issue in report['foreign_key_issues']:
+            for issue in report['foreign_key_issues'].to_dict('records'):
                 if issue['severity'] == 'high':
                     # For high severity issues, we might want to delete the records
                     # But this is dangerous, so we'll just report them
@@ -316,17 +205,23 @@ class DatabaseMigration:
             print("❌ فشل في إنشاء النسخة الاحتياطية")
             return None
 
-    def run_full_migration(self):
-        """Run complete migration process"""
+    def run_full_migration(self, progress=None):
+        """Run complete migration process
+
+        ``progress(step, done, total)`` is called before each of the six steps.
+        """
         print("🚀 بدء عملية الترقية الكاملة لقاعدة البيانات...")
+        step = _StepCounter(progress, total=6)
 
         # Step 1: Create backup
+        step("نسخة احتياطية")
         backup_path = self.create_backup_before_migration()
         if not backup_path:
             print("❌ إيقاف الترقية بسبب فشل إنشاء النسخة الاحتياطية")
             return False
 
         # Step 2: Run validation
+        step("التحقق")
         report = self.run_full_validation()
 
         if report['summary']['total_issues'] == 0:
@@ -334,26 +229,30 @@ class DatabaseMigration:
             return True
 
         # Step 3: Fix issues
+        step("الإصلاح")
         print(f"\n🔧 بدء إصلاح {report['summary']['total_issues']} مشكلة...")
 
-        fk_fixed, fk_failed = self.fix_foreign_key_issues(report)
-        dc_fixed, dc_failed = self.fix_data_consistency_issues(report)
+        fk_fixed, fk_failed = self.fix_foreign_key_issues(report, progress=self._print_progress)
+        dc_fixed, dc_failed = self.fix_data_consistency_issues(report, progress=self._print_progress)
 
         total_fixed = fk_fixed + dc_fixed
         total_failed = fk_failed + dc_failed
 
         # Step 4: Clean up
+        step("تنظيف السجلات اليتيمة")
         cleaned = self.clean_orphaned_records()
 
         # Step 5: Rebuild indexes
+        step("إعادة بناء الفهارس")
         self.rebuild_indexes()
 
-        # Step 6: Final validation
+        # Step 6: Final validation - الإصلاحات مسجلة في change_log فيكفي التحقق التزايدي
+        step("التحقق النهائي")
         print("\n🔍 التحقق النهائي...")
-        final_report = self.run_full_validation()
+        final_report = self.run_full_validation(mode='incremental')
 
-        print("
-📊 تقرير الترقية النهائي:"        print(f"   المشاكل قبل الترقية: {report['summary']['total_issues']}")
+        print("\n📊 تقرير الترقية النهائي:")
+        print(f"   المشاكل قبل الترقية: {report['summary']['total_issues']}")
         print(f"   المشاكل بعد الترقية: {final_report['summary']['total_issues']}")
         print(f"   تم إصلاح: {total_fixed}")
         print(f"   فشل في الإصلاح: {total_failed}")
@@ -366,6 +265,19 @@ class DatabaseMigration:
             print("⚠️ تمت الترقية جزئياً، يرجى مراجعة المشاكل المتبقية")
             return False
 
+class _StepCounter:
+    """Calls ``progress(step, done, total)`` for each step started"""
+
+    def __init__(self, progress, total):
+        self.progress = progress
+        self.total = total
+        self.done = 0
+
+    def __call__(self, name):
+        if self.progress:
+            self.progress(name, self.done, self.total)
+        self.done += 1
+
 # Create migration instance
 migration = DatabaseMigration()
 
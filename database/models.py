@@ -1,14 +1,53 @@
 import sqlite3
 from datetime import datetime, date, timedelta
 import os
+from .profiler import profiler
 
 class Database:
     _instance = None
     
-    def __new__(cls, db_path="clinic.db"):
+    # إعدادات أضيفت بعد الإصدار الأول - تُضاف لقواعد البيانات القائمة عند الترقية
+    OPTIONAL_SETTINGS = [
+        ("query_profiling", "1", "تفعيل مراقبة أداء الاستعلامات"),
+        ("slow_query_threshold_ms", "200", "حد الاستعلام البطيء (ملي ثانية)"),
+        ("theme_primary_color", "#667eea", "اللون الأساسي للواجهة"),
+        ("theme_primary_dark", "#764ba2", "اللون الأساسي الداكن"),
+        ("theme_sidebar_start", "#4facfe", "بداية تدرج الشريط الجانبي"),
+        ("theme_sidebar_end", "#00f2fe", "نهاية تدرج الشريط الجانبي"),
+        ("theme_font_family", "'Cairo', 'Inter', sans-serif", "خط الواجهة"),
+        ("theme_font_size", "16px", "حجم الخط الأساسي"),
+        ("theme_css_delivery", "static", "طريقة تحميل الأنماط: static أو inline"),
+        ("validation_change_watermark", "", "آخر تغيير تم التحقق منه"),
+        ("notification_interval_minutes", "60", "الفاصل بين دورات توليد الإشعارات (دقيقة)"),
+        ("inventory_consumption_policy", "fefo", "ترتيب صرف الدفعات: fefo (الأقرب انتهاءً) أو fifo (الأقدم استلاماً)"),
+        ("reorder_lead_time_days", "7", "مدة توريد الطلبيات (يوم)"),
+        ("reorder_cover_days", "30", "عدد الأيام التي تغطيها كل طلبية"),
+        ("scheduler_enabled", "1", "تشغيل المهام المجدولة"),
+        ("schedule_analytics_refresh", "01:30", "موعد تحديث لقطة التحليلات وتجميعاتها (HH:MM، فارغ للتعطيل)"),
+        ("schedule_backup", "02:00", "موعد النسخ الاحتياطي اليومي (HH:MM، فارغ للتعطيل)"),
+        ("schedule_rebuild_indexes", "03:00", "موعد تحديث إحصائيات الفهارس (HH:MM، فارغ للتعطيل)"),
+        ("schedule_validation", "03:30", "موعد تقرير سلامة البيانات (HH:MM، فارغ للتعطيل)"),
+        ("schedule_notifications", "06:00", "موعد توليد إشعارات اليوم (HH:MM، فارغ للتعطيل)"),
+        ("scheduled_backups_keep", "7", "عدد النسخ الاحتياطية المجدولة المحفوظة"),
+    ]
+    
+    # الجداول التي تُسجل تغييراتها في change_log (للتحقق التزايدي)
+    TRACKED_TABLES = [
+        "appointments", "payments", "patients", "doctors", "treatments",
+        "suppliers", "inventory", "inventory_usage",
+    ]
+    
+    # الجداول التي يُحدَّث عدّاد إصدارها في table_versions (تماسك الذاكرة المؤقتة بين العمليات)
+    VERSIONED_TABLES = TRACKED_TABLES + ["expenses", "settings", "inventory_on_hand", "inventory_lots"]
+    
+    # مدة الاحتفاظ بسجل التغييرات حتى يلحق به كل من يتابعه (التحقق، فهرس التقويم)
+    CHANGE_LOG_RETENTION_DAYS = 7
+    
+    def __new__(cls, db_path=None):
         if cls._instance is None:
             cls._instance = super(Database, cls).__new__(cls)
-            cls._instance.db_path = db_path
+            # يمكن توجيه التطبيق لقاعدة بيانات أخرى (مثل بيانات القياس) عبر CURA_DB_PATH
+            cls._instance.db_path = db_path or os.environ.get("CURA_DB_PATH", "clinic.db")
             cls._instance._initialized = False
         return cls._instance
     
@@ -101,10 +140,12 @@ class Database:
                             notes TEXT,
                             total_cost REAL,
                             reminder_sent BOOLEAN DEFAULT 0,
+                            series_id INTEGER,
                             created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
                             FOREIGN KEY (patient_id) REFERENCES patients (id),
                             FOREIGN KEY (doctor_id) REFERENCES doctors (id),
-                            FOREIGN KEY (treatment_id) REFERENCES treatments (id)
+                            FOREIGN KEY (treatment_id) REFERENCES treatments (id),
+                            FOREIGN KEY (series_id) REFERENCES appointment_series (id)
                         )
                     ''')
                     
@@ -174,6 +215,7 @@ class Database:
                             quantity_used INTEGER NOT NULL,
                             usage_date DATE NOT NULL,
                             notes TEXT,
+                            source TEXT DEFAULT 'manual',
                             created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
                             FOREIGN KEY (inventory_id) REFERENCES inventory (id),
                             FOREIGN KEY (appointment_id) REFERENCES appointments (id)
@@ -204,9 +246,36 @@ class Database:
                         )
                     ''')
                     
+                    # جدول الاستعلامات البطيئة
+                    cursor.execute('''
+                        CREATE TABLE IF NOT EXISTS query_stats (
+                            id INTEGER PRIMARY KEY AUTOINCREMENT,
+                            operation TEXT,
+                            sql TEXT NOT NULL,
+                            params TEXT,
+                            total_ms REAL NOT NULL,
+                            exec_ms REAL,
+                            fetch_ms REAL,
+                            rows INTEGER,
+                            query_plan TEXT,
+                            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+                        )
+                    ''')
+                    cursor.execute("CREATE INDEX IF NOT EXISTS idx_query_stats_created ON query_stats(created_at)")
+                    
+                    self.create_change_tracking(cursor)
+                    self.create_appointment_series(cursor)
+                    self.create_notifications(cursor)
+                    self.create_inventory_lots(cursor)
+                    self.create_treatment_materials(cursor)
+                    self.create_jobs(cursor)
+                    self.create_scheduler(cursor)
+                    self.create_table_versions(cursor)
+                    
                     # إضافة بيانات تجريبية
                     self.add_sample_data(conn, cursor)
                     self.add_default_settings(conn, cursor)
+                    profiler.configure_from_settings(cursor)
                     self._initialized = True
                     
             except sqlite3.Error as e:
@@ -374,7 +443,7 @@ class Database:
                     ("reminder_days", "1", "عدد أيام التذكير قبل الموعد"),
                     ("low_stock_alert", "1", "تفعيل تنبيهات المخزون المنخفض"),
                     ("backup_enabled", "1", "تفعيل النسخ الاحتياطي التلقائي")
-                ]
+                ] + self.OPTIONAL_SETTINGS
                 cursor.executemany('''
                     INSERT INTO settings (key, value, description) 
                     VALUES (?, ?, ?)
@@ -408,8 +477,11 @@ class Database:
                     ("inventory", "is_active", "ALTER TABLE inventory ADD COLUMN is_active BOOLEAN DEFAULT 1"),
                     ("suppliers", "is_active", "ALTER TABLE suppliers ADD COLUMN is_active BOOLEAN DEFAULT 1"),
                     ("appointments", "reminder_sent", "ALTER TABLE appointments ADD COLUMN reminder_sent BOOLEAN DEFAULT 0"),
+                    ("appointments", "series_id", "ALTER TABLE appointments ADD COLUMN series_id INTEGER REFERENCES appointment_series (id)"),
+                    ("inventory_usage", "source", "ALTER TABLE inventory_usage ADD COLUMN source TEXT DEFAULT 'manual'"),
                     ("expenses", "approved_by", "ALTER TABLE expenses ADD COLUMN approved_by TEXT"),
                     ("expenses", "is_recurring", "ALTER TABLE expenses ADD COLUMN is_recurring BOOLEAN DEFAULT 0"),
+                    ("jobs", "holder", "ALTER TABLE jobs ADD COLUMN holder TEXT"),
                 ]
                 
                 for table_name, column_name, sql in alterations:
@@ -419,15 +491,310 @@ class Database:
                     except sqlite3.OperationalError:
                         pass  # العمود موجود مسبقاً
                 
+                self.create_change_tracking(cursor)
+                self.create_appointment_series(cursor)
+                self.create_notifications(cursor)
+                self.create_inventory_lots(cursor)
+                self.backfill_inventory_lots(cursor)
+                self.create_treatment_materials(cursor)
+                self.create_jobs(cursor)
+                self.create_scheduler(cursor)
+                self.create_table_versions(cursor)
+                self.create_query_indexes(cursor)
+                
+                # الإعدادات الجديدة
+                cursor.executemany('''
+                    INSERT OR IGNORE INTO settings (key, value, description) 
+                    VALUES (?, ?, ?)
+                ''', self.OPTIONAL_SETTINGS)
+                
                 conn.commit()
                 print("✅ تمت ترقية قاعدة البيانات بنجاح!")
                 
         except sqlite3.Error as e:
             print(f"❌ خطأ في ترقية قاعدة البيانات: {e}")
     
+    def create_change_tracking(self, cursor):
+        """جدول سجل التغييرات ومشغلاته، وجدول نتائج التحقق"""
+        cursor.execute('''
+            CREATE TABLE IF NOT EXISTS change_log (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                table_name TEXT NOT NULL,
+                record_id INTEGER NOT NULL,
+                operation TEXT NOT NULL,
+                changed_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+            )
+        ''')
+        
+        cursor.execute('''
+            CREATE TABLE IF NOT EXISTS validation_issues (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                check_name TEXT NOT NULL,
+                table_name TEXT NOT NULL,
+                record_id INTEGER,
+                issue TEXT,
+                severity TEXT,
+                created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+            )
+        ''')
+        cursor.execute("CREATE INDEX IF NOT EXISTS idx_validation_issues_check ON validation_issues(check_name, record_id)")
+        
+        for table in self.TRACKED_TABLES:
+            for operation, row in (("INSERT", "NEW"), ("UPDATE", "NEW"), ("DELETE", "OLD")):
+                cursor.execute(f'''
+                    CREATE TRIGGER IF NOT EXISTS trg_{table}_{operation.lower()}_log
+                    AFTER {operation} ON {table}
+                    BEGIN
+                        INSERT INTO change_log (table_name, record_id, operation)
+                        VALUES ('{table}', {row}.id, '{operation}');
+                    END
+                ''')
+    
+    def create_appointment_series(self, cursor):
+        """جدول سلاسل المواعيد المتكررة (قاعدة التكرار)"""
+        cursor.execute('''
+            CREATE TABLE IF NOT EXISTS appointment_series (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                patient_id INTEGER NOT NULL,
+                doctor_id INTEGER NOT NULL,
+                treatment_id INTEGER,
+                start_date DATE NOT NULL,
+                appointment_time TIME NOT NULL,
+                frequency TEXT NOT NULL DEFAULT 'weekly',
+                interval INTEGER NOT NULL DEFAULT 1,
+                occurrences INTEGER,
+                until_date DATE,
+                total_cost REAL,
+                notes TEXT,
+                status TEXT DEFAULT 'نشط',
+                created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+                FOREIGN KEY (patient_id) REFERENCES patients (id),
+                FOREIGN KEY (doctor_id) REFERENCES doctors (id),
+                FOREIGN KEY (treatment_id) REFERENCES treatments (id)
+            )
+        ''')
+    
+    def create_notifications(self, cursor):
+        """جدول الإشعارات مع منع التكرار وفهرس غير المقروء"""
+        cursor.execute('''
+            CREATE TABLE IF NOT EXISTS notifications (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                type TEXT NOT NULL,
+                title TEXT NOT NULL,
+                message TEXT,
+                priority TEXT DEFAULT 'normal',
+                target_date DATE,
+                related_id INTEGER,
+                action_link TEXT,
+                is_read BOOLEAN DEFAULT 0,
+                created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+            )
+        ''')
+        # إشعار واحد فقط لكل (نوع، سجل، تاريخ) - القيم الفارغة تُعامل كقيمة واحدة
+        cursor.execute('''
+            CREATE UNIQUE INDEX IF NOT EXISTS idx_notifications_dedup
+            ON notifications(type, COALESCE(related_id, 0), COALESCE(target_date, ''))
+        ''')
+        cursor.execute("CREATE INDEX IF NOT EXISTS idx_notifications_unread ON notifications(priority, created_at) WHERE is_read = 0")
+    
+    def create_inventory_lots(self, cursor):
+        """دفعات المخزون، وتوزيع الاستخدام على الدفعات، والرصيد المحسوب مسبقاً"""
+        cursor.execute('''
+            CREATE TABLE IF NOT EXISTS inventory_lots (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                inventory_id INTEGER NOT NULL,
+                lot_number TEXT,
+                quantity_received INTEGER NOT NULL,
+                quantity_remaining INTEGER NOT NULL,
+                unit_cost REAL DEFAULT 0.0,
+                expiry_date DATE,
+                received_date DATE DEFAULT CURRENT_DATE,
+                supplier_id INTEGER,
+                created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+                FOREIGN KEY (inventory_id) REFERENCES inventory (id),
+                FOREIGN KEY (supplier_id) REFERENCES suppliers (id)
+            )
+        ''')
+        cursor.execute("CREATE INDEX IF NOT EXISTS idx_inventory_lots_item ON inventory_lots(inventory_id, expiry_date)")
+        # الدفعات المتبقية فقط، مرتبة بتاريخ الانتهاء
+        cursor.execute("CREATE INDEX IF NOT EXISTS idx_inventory_lots_expiry ON inventory_lots(expiry_date) WHERE quantity_remaining > 0")
+        
+        cursor.execute('''
+            CREATE TABLE IF NOT EXISTS inventory_usage_lots (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                usage_id INTEGER,
+                lot_id INTEGER NOT NULL,
+                quantity INTEGER NOT NULL,
+                unit_cost REAL,
+                FOREIGN KEY (usage_id) REFERENCES inventory_usage (id),
+                FOREIGN KEY (lot_id) REFERENCES inventory_lots (id)
+            )
+        ''')
+        cursor.execute("CREATE INDEX IF NOT EXISTS idx_inventory_usage_lots_usage ON inventory_usage_lots(usage_id)")
+        
+        cursor.execute('''
+            CREATE TABLE IF NOT EXISTS inventory_on_hand (
+                inventory_id INTEGER PRIMARY KEY,
+                quantity INTEGER NOT NULL DEFAULT 0,
+                stock_value REAL NOT NULL DEFAULT 0.0,
+                next_expiry DATE,
+                lot_count INTEGER NOT NULL DEFAULT 0,
+                updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+                FOREIGN KEY (inventory_id) REFERENCES inventory (id)
+            )
+        ''')
+        
+        # كل تغيير في دفعة يعيد حساب رصيد صنفها، وينسخ الكمية وأقرب انتهاء إلى inventory
+        for operation, row in (("INSERT", "NEW"), ("UPDATE", "NEW"), ("DELETE", "OLD")):
+            cursor.execute(f'''
+                CREATE TRIGGER IF NOT EXISTS trg_inventory_lots_{operation.lower()}_on_hand
+                AFTER {operation} ON inventory_lots
+                BEGIN
+                    INSERT OR REPLACE INTO inventory_on_hand (inventory_id, quantity, stock_value, next_expiry, lot_count, updated_at)
+                    SELECT {row}.inventory_id,
+                           COALESCE(SUM(quantity_remaining), 0),
+                           COALESCE(SUM(quantity_remaining * COALESCE(unit_cost, 0)), 0),
+                           MIN(expiry_date),
+                           COUNT(*),
+                           CURRENT_TIMESTAMP
+                    FROM inventory_lots
+                    WHERE inventory_id = {row}.inventory_id AND quantity_remaining > 0;
+                    
+                    UPDATE inventory
+                    SET quantity = (SELECT quantity FROM inventory_on_hand WHERE inventory_id = {row}.inventory_id),
+                        expiry_date = (SELECT next_expiry FROM inventory_on_hand WHERE inventory_id = {row}.inventory_id)
+                    WHERE id = {row}.inventory_id;
+                END
+            ''')
+    
+    def backfill_inventory_lots(self, cursor):
+        """دفعة افتتاحية لكل صنف له كمية بدون دفعات (قواعد البيانات السابقة للدفعات)"""
+        cursor.execute('''
+            INSERT INTO inventory_lots (inventory_id, lot_number, quantity_received, quantity_remaining,
+                                        unit_cost, expiry_date, received_date, supplier_id)
+            SELECT id, 'افتتاحي', quantity, quantity, unit_price, expiry_date, date(created_at), supplier_id
+            FROM inventory
+            WHERE quantity > 0
+            AND id NOT IN (SELECT inventory_id FROM inventory_lots)
+        ''')
+        if cursor.rowcount > 0:
+            print(f"✅ تم إنشاء {cursor.rowcount} دفعة افتتاحية للمخزون")
+        cursor.execute('''
+            INSERT OR IGNORE INTO inventory_on_hand (inventory_id, quantity)
+            SELECT id, 0 FROM inventory WHERE id NOT IN (SELECT inventory_id FROM inventory_on_hand)
+        ''')
+    
+    def create_treatment_materials(self, cursor):
+        """مكونات كل علاج من أصناف المخزون (تُصرف تلقائياً عند اكتمال الموعد)"""
+        cursor.execute('''
+            CREATE TABLE IF NOT EXISTS treatment_materials (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                treatment_id INTEGER NOT NULL,
+                inventory_id INTEGER NOT NULL,
+                quantity INTEGER NOT NULL,
+                created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+                UNIQUE (treatment_id, inventory_id),
+                FOREIGN KEY (treatment_id) REFERENCES treatments (id),
+                FOREIGN KEY (inventory_id) REFERENCES inventory (id)
+            )
+        ''')
+    
+    def create_jobs(self, cursor):
+        """المهام الخلفية (تقارير وتصديرات طويلة) وحالتها ومسار نتيجتها"""
+        cursor.execute('''
+            CREATE TABLE IF NOT EXISTS jobs (
+                id TEXT PRIMARY KEY,
+                kind TEXT NOT NULL,
+                owner TEXT,
+                params TEXT,
+                cache_key TEXT,
+                status TEXT NOT NULL DEFAULT 'queued',
+                progress REAL DEFAULT 0,
+                message TEXT,
+                result_path TEXT,
+                result_name TEXT,
+                error TEXT,
+                created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+                started_at TIMESTAMP,
+                finished_at TIMESTAMP,
+                expires_at TIMESTAMP,
+                holder TEXT
+            )
+        ''')
+        cursor.execute("CREATE INDEX IF NOT EXISTS idx_jobs_owner ON jobs(owner, created_at)")
+        cursor.execute("CREATE INDEX IF NOT EXISTS idx_jobs_cache ON jobs(cache_key, status)")
+    
+    def create_scheduler(self, cursor):
+        """سجل تشغيل المهام المجدولة، وقفل المشغّل الواحد بين العمليات"""
+        cursor.execute('''
+            CREATE TABLE IF NOT EXISTS task_runs (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                task TEXT NOT NULL,
+                status TEXT NOT NULL DEFAULT 'running',
+                message TEXT,
+                holder TEXT,
+                started_at TIMESTAMP NOT NULL,
+                finished_at TIMESTAMP,
+                duration_ms REAL
+            )
+        ''')
+        cursor.execute("CREATE INDEX IF NOT EXISTS idx_task_runs_task ON task_runs(task, started_at)")
+        cursor.execute('''
+            CREATE TABLE IF NOT EXISTS scheduler_lock (
+                name TEXT PRIMARY KEY,
+                holder TEXT,
+                expires_at TIMESTAMP
+            )
+        ''')
+        cursor.execute("INSERT OR IGNORE INTO scheduler_lock (name) VALUES ('scheduler')")
+    
+    def create_table_versions(self, cursor):
+        """عدّاد إصدار لكل جدول تزيده المشغلات مع كل كتابة من أي عملية"""
+        cursor.execute('''
+            CREATE TABLE IF NOT EXISTS table_versions (
+                table_name TEXT PRIMARY KEY,
+                version INTEGER NOT NULL DEFAULT 0
+            )
+        ''')
+        cursor.executemany(
+            "INSERT OR IGNORE INTO table_versions (table_name) VALUES (?)",
+            [(table,) for table in self.VERSIONED_TABLES]
+        )
+        for table in self.VERSIONED_TABLES:
+            for operation in ("INSERT", "UPDATE", "DELETE"):
+                cursor.execute(f'''
+                    CREATE TRIGGER IF NOT EXISTS trg_{table}_{operation.lower()}_version
+                    AFTER {operation} ON {table}
+                    BEGIN
+                        UPDATE table_versions SET version = version + 1 WHERE table_name = '{table}';
+                    END
+                ''')
+    
+    def create_query_indexes(self, cursor):
+        """فهارس استعلامات الجدول اليومي والتقويم والتقارير"""
+        cursor.execute("CREATE INDEX IF NOT EXISTS idx_appointments_doctor_date ON appointments(doctor_id, appointment_date)")
+        cursor.execute("CREATE INDEX IF NOT EXISTS idx_appointments_date ON appointments(appointment_date)")
+        cursor.execute("CREATE INDEX IF NOT EXISTS idx_appointments_series ON appointments(series_id)")
+        # نطاقات التاريخ في التقارير والجزء الحي من مكعب التحليلات
+        cursor.execute("CREATE INDEX IF NOT EXISTS idx_payments_date ON payments(payment_date)")
+        cursor.execute("CREATE INDEX IF NOT EXISTS idx_expenses_date ON expenses(expense_date)")
+        # تقرير المريض الشامل، وقراءة سجل التغييرات لكل جدول
+        cursor.execute("CREATE INDEX IF NOT EXISTS idx_appointments_patient ON appointments(patient_id, appointment_date)")
+        cursor.execute("CREATE INDEX IF NOT EXISTS idx_payments_patient ON payments(patient_id, payment_date)")
+        cursor.execute("CREATE INDEX IF NOT EXISTS idx_change_log_table ON change_log(table_name, id)")
+        # البحث عن المرضى في النماذج (LIKE 'بداية%' يستخدم فهرس NOCASE) ومواعيد الدفعات
+        cursor.execute("CREATE INDEX IF NOT EXISTS idx_patients_name ON patients(name COLLATE NOCASE)")
+        cursor.execute("CREATE INDEX IF NOT EXISTS idx_patients_phone ON patients(phone COLLATE NOCASE)")
+        cursor.execute("CREATE INDEX IF NOT EXISTS idx_payments_appointment ON payments(appointment_id)")
+        # صرف مكونات العلاج مرة واحدة لكل موعد وصنف
+        cursor.execute('''
+            CREATE UNIQUE INDEX IF NOT EXISTS idx_inventory_usage_bom
+            ON inventory_usage(appointment_id, inventory_id) WHERE source = 'bom'
+        ''')
+    
     def get_connection(self):
         """الحصول على اتصال بقاعدة البيانات"""
-        return sqlite3.connect(self.db_path)
+        return profiler.connect(self.db_path)
     
     def backup_database(self, backup_path=None):
         """إنشاء نسخة احتياطية من قاعدة البيانات"""
@@ -0,0 +1,138 @@
+"""
+Notification Engine for Cura Clinic App
+Builds alerts with set-based SQL and inserts them in one deduplicated batch
+"""
+
+import threading
+from datetime import date
+
+from .models import db
+
+# كل قاعدة تختار المرشحين بأعمدة الإدراج بالترتيب. التكرار يُمنع بالفهرس
+# الفريد على (type, related_id, target_date)، فتشغيل المحرك مرتين آمن.
+NOTIFICATION_RULES = [
+    {
+        # ملخص واحد لمواعيد اليوم
+        'type': 'appointments_today',
+        'sql': """
+            SELECT 'appointments_today', 'مواعيد اليوم',
+                   'لديك ' || COUNT(*) || ' موعد اليوم',
+                   'high', :today, NULL, 'appointments'
+            FROM appointments
+            WHERE appointment_date = :today AND status IN ('مجدول', 'مؤكد')
+            HAVING COUNT(*) > 0
+        """,
+    },
+    {
+        # تنبيه يومي لكل صنف تحت الحد الأدنى
+        'type': 'low_stock',
+        'sql': """
+            SELECT 'low_stock', 'تنبيه مخزون منخفض',
+                   'الصنف ''' || i.item_name || ''' وصل للحد الأدنى (الكمية: ' || oh.quantity || ')',
+                   'urgent', :today, i.id, 'inventory'
+            FROM inventory_on_hand oh
+            JOIN inventory i ON oh.inventory_id = i.id
+            WHERE oh.quantity <= i.min_stock_level AND i.is_active = 1
+        """,
+    },
+    {
+        # تنبيه واحد لكل صنف وتاريخ انتهاء دفعة
+        'type': 'expiring',
+        'sql': """
+            SELECT 'expiring', 'تنبيه انتهاء صلاحية',
+                   'الصنف ''' || i.item_name || ''' (' || SUM(l.quantity_remaining) || ' وحدة) ينتهي خلال '
+                       || CAST(julianday(l.expiry_date) - julianday(:today) AS INTEGER) || ' يوم',
+                   'high', l.expiry_date, i.id, 'inventory'
+            FROM inventory_lots l
+            JOIN inventory i ON l.inventory_id = i.id
+            WHERE l.quantity_remaining > 0 AND l.expiry_date IS NOT NULL
+            AND l.expiry_date <= date(:today, '+' || :expiry_days || ' days')
+            AND i.is_active = 1
+            GROUP BY i.id, l.expiry_date
+        """,
+    },
+]
+
+INSERT_SQL = """
+    INSERT OR IGNORE INTO notifications (type, title, message, priority, target_date, related_id, action_link)
+"""
+
+
+class NotificationEngine:
+    """Generates notifications on a background thread.
+
+    ``run()`` evaluates every rule inside one transaction; ``start()`` repeats
+    it every ``interval_seconds`` until ``stop()``. Only one background thread
+    runs per process.
+    """
+
+    EXPIRY_DAYS = 30
+
+    def __init__(self, database=None):
+        self.db = database or db
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread = None
+        self.last_run = None
+        self.last_created = 0
+        self.last_error = None
+
+    def run(self, today=None):
+        """Evaluate all rules once; returns the number of new notifications"""
+        params = {
+            'today': (today or date.today()).isoformat(),
+            'expiry_days': self.EXPIRY_DAYS,
+        }
+        with self._lock:
+            conn = self.db.get_connection()
+            try:
+                cursor = conn.cursor()
+                before = conn.total_changes
+                for rule in NOTIFICATION_RULES:
+                    cursor.execute(INSERT_SQL + rule['sql'], params)
+                created = conn.total_changes - before
+                conn.commit()
+            except Exception:
+                conn.rollback()
+                raise
+            finally:
+                conn.close()
+            self.last_run = params['today']
+            self.last_created = created
+        return created
+
+    def start(self, interval_seconds=3600):
+        """Start the background loop (no-op if already running)"""
+        if self._thread is not None and self._thread.is_alive():
+            return False
+        self._stop.clear()
+        self._thread = threading.Thread(
+            target=self._loop, args=(interval_seconds,), name='cura-notifications', daemon=True
+        )
+        self._thread.start()
+        return True
+
+    def stop(self, timeout=5):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join(timeout)
+            self._thread = None
+
+    @property
+    def running(self):
+        return self._thread is not None and self._thread.is_alive()
+
+    def _loop(self, interval_seconds):
+        while not self._stop.is_set():
+            try:
+                self.run()
+                self.last_error = None
+            except Exception as e:
+                # لا يتوقف المحرك بسبب خطأ عابر (مثل قفل قاعدة البيانات)
+                self.last_error = str(e)
+                print(f"❌ خطأ في توليد الإشعارات: {e}")
+            self._stop.wait(interval_seconds)
+
+
+# محرك مشترك لكل الجلسات
+notification_engine = NotificationEngine()
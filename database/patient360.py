@@ -0,0 +1,181 @@
+"""
+Patient 360 for Cura Clinic App
+One patient's profile, visits, payments, treatments and doctors, cached per table versions
+"""
+
+import threading
+from collections import OrderedDict
+
+import pandas as pd
+
+from .models import db
+from .versions import table_versions
+
+COMPLETED_STATUS = 'مكتمل'
+CANCELLED_STATUS = 'ملغي'
+# الحالات التي تُحتسب تكلفتها على المريض
+BILLABLE_STATUSES = ('مكتمل', 'مؤكد')
+
+APPOINTMENT_COLUMNS = ['appointment_date', 'appointment_time', 'doctor_name', 'treatment_name',
+                       'status', 'total_cost', 'notes']
+PAYMENT_COLUMNS = ['payment_date', 'amount', 'payment_method', 'status', 'notes']
+
+# الجداول التي يعتمد عليها التقرير؛ أي تغيير فيها يبطل التقارير المخزنة
+SOURCE_TABLES = ('patients', 'appointments', 'payments', 'doctors', 'treatments')
+
+
+class Patient360:
+    """Assembled report for one patient.
+
+    Everything comes from one connection: the patient row, its appointments
+    (joined with doctors and treatments) and its payments, read through the
+    patient_id indexes. Visit statistics, the financial summary and the
+    per-treatment and per-doctor summaries are aggregated from those rows
+    instead of separate queries.
+
+    Reports are kept in an LRU cache keyed by patient id and stamped with
+    the source tables' versions (``table_versions``), so going back to a
+    patient already viewed costs no query unless another write happened.
+    """
+
+    CACHE_SIZE = 64
+
+    APPOINTMENTS_SQL = """
+        SELECT a.id, a.appointment_date, a.appointment_time,
+               a.doctor_id, d.name as doctor_name, d.specialization,
+               a.treatment_id, t.name as treatment_name, t.category,
+               a.status, a.total_cost, a.notes
+        FROM appointments a
+        LEFT JOIN doctors d ON a.doctor_id = d.id
+        LEFT JOIN treatments t ON a.treatment_id = t.id
+        WHERE a.patient_id = ?
+        ORDER BY a.appointment_date DESC, a.appointment_time DESC
+    """
+
+    PAYMENTS_SQL = """
+        SELECT payment_date, amount, payment_method, status, notes
+        FROM payments
+        WHERE patient_id = ?
+        ORDER BY payment_date DESC
+    """
+
+    FILES_SQL = """
+        SELECT file_name, file_type, category, upload_date, notes
+        FROM patient_files
+        WHERE patient_id = ?
+        ORDER BY upload_date DESC
+    """
+
+    def __init__(self, database=None):
+        self.db = database or db
+        self._lock = threading.Lock()
+        self._cache = OrderedDict()   # patient id -> (versions, report)
+        self._has_files = None
+        self.hits = 0
+        self.misses = 0
+
+    def invalidate(self):
+        """Drop all cached reports"""
+        with self._lock:
+            self._cache.clear()
+            self._has_files = None
+
+    def report(self, patient_id):
+        """The full report for ``patient_id`` (empty ``patient`` dict if not found)"""
+        patient_id = int(patient_id)
+        versions = table_versions.current(*SOURCE_TABLES)
+        with self._lock:
+            cached = self._cache.get(patient_id)
+            if cached is not None and cached[0] == versions:
+                self._cache.move_to_end(patient_id)
+                self.hits += 1
+                return cached[1]
+
+        conn = self.db.get_connection()
+        try:
+            report = self._build(conn, patient_id)
+        finally:
+            conn.close()
+
+        with self._lock:
+            self.misses += 1
+            self._cache[patient_id] = (versions, report)
+            self._cache.move_to_end(patient_id)
+            while len(self._cache) > self.CACHE_SIZE:
+                self._cache.popitem(last=False)
+        return report
+
+    # ========== القراءة ==========
+    def _build(self, conn, patient_id):
+        patient = _fetch(conn, "SELECT * FROM patients WHERE id = ?", patient_id)
+        patient = patient[0] if patient else {}
+        visits = _fetch(conn, self.APPOINTMENTS_SQL, patient_id)
+        payments = _fetch(conn, self.PAYMENTS_SQL, patient_id)
+
+        if self._has_files is None:
+            self._has_files = conn.execute(
+                "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'patient_files'"
+            ).fetchone() is not None
+        files = pd.read_sql_query(self.FILES_SQL, conn, params=(patient_id,)) if self._has_files else pd.DataFrame()
+
+        # المريض له عشرات المواعيد على الأكثر، فالحلقات العادية أرخص من عمليات pandas
+        total_cost = sum(v['total_cost'] or 0 for v in visits if v['status'] in BILLABLE_STATUSES)
+        total_paid = sum(p['amount'] or 0 for p in payments if p['status'] == COMPLETED_STATUS)
+        outstanding = total_cost - total_paid
+        dates = [v['appointment_date'] for v in visits if v['appointment_date']]
+
+        return {
+            'patient': patient,
+            'visits_stats': {
+                'total_visits': len(visits),
+                'completed_visits': sum(v['status'] == COMPLETED_STATUS for v in visits),
+                'cancelled_visits': sum(v['status'] == CANCELLED_STATUS for v in visits),
+                'first_visit': min(dates, default=None),
+                'last_visit': max(dates, default=None),
+            },
+            'appointments': pd.DataFrame(visits, columns=APPOINTMENT_COLUMNS),
+            'payments': pd.DataFrame(payments, columns=PAYMENT_COLUMNS),
+            'financial_stats': {
+                'total_treatments_cost': total_cost,
+                'total_paid': total_paid,
+                'outstanding_balance': outstanding,
+                'payment_status': 'مدفوع بالكامل' if outstanding <= 0 else f'متبقي {outstanding:.2f} ج.م',
+            },
+            'treatments': _summarize(
+                visits, ('treatment_id', 'treatment_name', 'category'), 'usage_count', 'last_used', with_cost=True
+            ),
+            'doctors': _summarize(
+                visits, ('doctor_id', 'doctor_name', 'specialization'), 'visit_count', 'last_visit'
+            ),
+            'files': files,
+            'total_cost': total_cost,
+            'total_paid': total_paid,
+            'outstanding': outstanding,
+        }
+
+
+def _fetch(conn, sql, patient_id):
+    cursor = conn.execute(sql, (patient_id,))
+    columns = [d[0] for d in cursor.description]
+    return [dict(zip(columns, row)) for row in cursor.fetchall()]
+
+
+def _summarize(visits, keys, count_column, last_column, with_cost=False):
+    """Visits grouped by ``keys`` (an id first, dropped), most used first"""
+    groups = {}
+    for visit in visits:
+        key = tuple(visit[k] for k in keys)
+        group = groups.setdefault(key, [0, 0.0, visit['appointment_date']])
+        group[0] += 1
+        group[1] += visit['total_cost'] or 0
+        group[2] = max(group[2] or '', visit['appointment_date'] or '') or None
+
+    columns = list(keys[1:]) + [count_column] + (['total_cost'] if with_cost else []) + [last_column]
+    rows = [
+        list(key[1:]) + [count] + ([cost] if with_cost else []) + [last]
+        for key, (count, cost, last) in sorted(groups.items(), key=lambda item: -item[1][0])
+    ]
+    return pd.DataFrame(rows, columns=columns)
+
+
+patient_360 = Patient360()
@@ -0,0 +1,427 @@
+"""
+Query Profiler for Cura Clinic App
+Records per-query timings for the CRUD layer and keeps a slow-query log
+"""
+
+import contextvars
+import functools
+import logging
+import logging.handlers
+import os
+import queue
+import re
+import sqlite3
+import threading
+import time
+from collections import deque
+
+_WHITESPACE = re.compile(r"\s+")
+
+
+def normalize_sql(sql):
+    """Collapse whitespace so the same statement always maps to one key"""
+    return _WHITESPACE.sub(" ", sql).strip()
+
+
+def percentile(sorted_values, q):
+    """Nearest-rank percentile of an already sorted list"""
+    if not sorted_values:
+        return 0.0
+    index = min(len(sorted_values) - 1, max(0, int(round(q / 100.0 * (len(sorted_values) - 1)))))
+    return sorted_values[index]
+
+
+class _Stat:
+    """Running aggregate for one query or one CRUD operation"""
+
+    __slots__ = ('calls', 'total_ms', 'max_ms', 'rows', 'db_ms', 'samples')
+
+    def __init__(self, max_samples):
+        self.calls = 0
+        self.total_ms = 0.0
+        self.max_ms = 0.0
+        self.rows = 0
+        self.db_ms = 0.0
+        self.samples = deque(maxlen=max_samples)
+
+    def add(self, elapsed_ms, rows=0, db_ms=0.0):
+        self.calls += 1
+        self.total_ms += elapsed_ms
+        self.max_ms = max(self.max_ms, elapsed_ms)
+        self.rows += rows
+        self.db_ms += db_ms
+        self.samples.append(elapsed_ms)
+
+    def summary(self):
+        ordered = sorted(self.samples)
+        return {
+            'calls': self.calls,
+            'total_ms': round(self.total_ms, 3),
+            'avg_ms': round(self.total_ms / self.calls, 3) if self.calls else 0.0,
+            'p50_ms': round(percentile(ordered, 50), 3),
+            'p95_ms': round(percentile(ordered, 95), 3),
+            'p99_ms': round(percentile(ordered, 99), 3),
+            'max_ms': round(self.max_ms, 3),
+            'rows': self.rows,
+        }
+
+
+class ProfiledCursor(sqlite3.Cursor):
+    """Cursor that times execute + fetch and reports the statement on completion"""
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self._pending = None
+
+    def _begin(self, sql, params):
+        self._flush()
+        self._pending = {'sql': sql, 'params': params, 'exec_ms': 0.0, 'fetch_ms': 0.0, 'rows': 0}
+
+    def _flush(self):
+        pending, self._pending = self._pending, None
+        if pending is not None:
+            profiler.record_query(self.connection, pending)
+
+    def execute(self, sql, parameters=()):
+        self._begin(sql, parameters)
+        started = time.perf_counter()
+        try:
+            return super().execute(sql, parameters)
+        finally:
+            self._pending['exec_ms'] += (time.perf_counter() - started) * 1000
+
+    def executemany(self, sql, seq_of_parameters):
+        self._begin(sql, ())
+        started = time.perf_counter()
+        try:
+            return super().executemany(sql, seq_of_parameters)
+        finally:
+            self._pending['exec_ms'] += (time.perf_counter() - started) * 1000
+            self._pending['rows'] = max(self.rowcount, 0)
+
+    def _timed_fetch(self, fetch, *args):
+        started = time.perf_counter()
+        result = fetch(*args)
+        if self._pending is not None:
+            self._pending['fetch_ms'] += (time.perf_counter() - started) * 1000
+            if isinstance(result, list):
+                self._pending['rows'] += len(result)
+            elif result is not None:
+                self._pending['rows'] += 1
+        return result
+
+    def fetchone(self):
+        return self._timed_fetch(super().fetchone)
+
+    def fetchmany(self, size=None):
+        return self._timed_fetch(super().fetchmany, size if size is not None else self.arraysize)
+
+    def fetchall(self):
+        return self._timed_fetch(super().fetchall)
+
+    def close(self):
+        self._flush()
+        super().close()
+
+
+class ProfiledConnection(sqlite3.Connection):
+    """Connection whose cursors are profiled; pending statements are flushed on close"""
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.db_path = args[0] if args else kwargs.get('database')
+        self._cursors = []
+
+    def cursor(self, factory=ProfiledCursor):
+        cur = super().cursor(factory)
+        if isinstance(cur, ProfiledCursor):
+            self._cursors.append(cur)
+        return cur
+
+    def close(self):
+        for cur in self._cursors:
+            cur._flush()
+        self._cursors = []
+        super().close()
+
+
+class QueryProfiler:
+    """Collects per-query and per-operation timings.
+
+    Every statement executed through a ProfiledConnection is attributed to the
+    CRUD operation that is currently running (see ``instrument``). Statements
+    slower than ``slow_query_ms`` get an EXPLAIN QUERY PLAN and are written to
+    the ``query_stats`` table and to a rotating log file. The table insert is
+    queued for a background writer so it never waits on the caller's own
+    write transaction.
+    """
+
+    def __init__(self):
+        self.enabled = True
+        self.slow_query_ms = 200.0
+        self.persist_slow_queries = True
+        self.log_path = os.path.join('logs', 'slow_queries.log')
+        self.max_samples = 1000
+        self._lock = threading.Lock()
+        self._queries = {}
+        self._operations = {}
+        self._listeners = []
+        self._logger = None
+        self._operation = contextvars.ContextVar('cura_operation', default=None)
+        self._slow_queue = queue.Queue()
+        self._writer = None
+
+    # ========== الإعدادات ==========
+    def configure(self, enabled=None, slow_query_ms=None, log_path=None, persist_slow_queries=None):
+        if enabled is not None:
+            self.enabled = bool(enabled)
+        if slow_query_ms is not None:
+            self.slow_query_ms = float(slow_query_ms)
+        if log_path is not None and log_path != self.log_path:
+            self.log_path = log_path
+            self._logger = None
+        if persist_slow_queries is not None:
+            self.persist_slow_queries = bool(persist_slow_queries)
+
+    def configure_from_settings(self, cursor):
+        """Read ``query_profiling`` and ``slow_query_threshold_ms`` from the settings table"""
+        try:
+            cursor.execute(
+                "SELECT key, value FROM settings WHERE key IN ('query_profiling', 'slow_query_threshold_ms')"
+            )
+            values = dict(cursor.fetchall())
+        except sqlite3.Error:
+            return
+        if 'query_profiling' in values:
+            self.configure(enabled=values['query_profiling'] == '1')
+        if values.get('slow_query_threshold_ms'):
+            try:
+                self.configure(slow_query_ms=float(values['slow_query_threshold_ms']))
+            except ValueError:
+                pass
+
+    def connect(self, db_path, **kwargs):
+        """Open a connection, profiled when the profiler is enabled"""
+        if self.enabled:
+            return sqlite3.connect(db_path, factory=ProfiledConnection, **kwargs)
+        return sqlite3.connect(db_path, **kwargs)
+
+    def add_listener(self, callback):
+        """Register callback(event) called for every query and operation event"""
+        if callback not in self._listeners:
+            self._listeners.append(callback)
+
+    def remove_listener(self, callback):
+        if callback in self._listeners:
+            self._listeners.remove(callback)
+
+    def _notify(self, event):
+        for callback in list(self._listeners):
+            try:
+                callback(event)
+            except Exception:
+                pass
+
+    # ========== تسجيل الاستعلامات ==========
+    def current_operation(self):
+        return self._operation.get()
+
+    def record_query(self, connection, pending):
+        sql = normalize_sql(pending['sql'])
+        total_ms = pending['exec_ms'] + pending['fetch_ms']
+        operation = self._operation.get()
+        event = {
+            'type': 'query',
+            'operation': operation['name'] if operation else None,
+            'sql': sql,
+            'exec_ms': pending['exec_ms'],
+            'fetch_ms': pending['fetch_ms'],
+            'total_ms': total_ms,
+            'rows': pending['rows'],
+            'ended_at': time.perf_counter(),
+        }
+
+        with self._lock:
+            stat = self._queries.get(sql)
+            if stat is None:
+                stat = self._queries[sql] = _Stat(self.max_samples)
+            stat.add(total_ms, pending['rows'])
+        if operation is not None:
+            operation['db_ms'] += total_ms
+            operation['queries'] += 1
+            operation['rows'] += pending['rows']
+
+        self._notify(event)
+
+        if total_ms >= self.slow_query_ms and not sql.upper().startswith(('EXPLAIN', 'INSERT INTO QUERY_STATS')):
+            self._record_slow_query(connection, event, pending['params'])
+
+    def _record_slow_query(self, connection, event, params):
+        plan = ""
+        try:
+            # Connection.execute يعطي مؤشراً عادياً غير مراقب على اتصال المستدعي نفسه:
+            # لا يُسجل EXPLAIN ولا ينتظر قفل الكتابة الذي يحمله المستدعي
+            rows = connection.execute("EXPLAIN QUERY PLAN " + event['sql'], params or ()).fetchall()
+            plan = "\n".join(row[-1] for row in rows)
+        except (sqlite3.Error, AttributeError):
+            pass
+
+        db_path = getattr(connection, 'db_path', None)
+        if db_path and self.persist_slow_queries:
+            self._slow_queue.put((db_path, (
+                event['operation'], event['sql'], repr(params)[:500], event['total_ms'],
+                event['exec_ms'], event['fetch_ms'], event['rows'], plan
+            )))
+            self._start_writer()
+
+        logger = self._get_logger()
+        if logger:
+            logger.warning(
+                "%.1f ms | %s | rows=%d | %s | plan: %s",
+                event['total_ms'], event['operation'] or '-', event['rows'], event['sql'], plan.replace("\n", "; ")
+            )
+
+    def _start_writer(self):
+        with self._lock:
+            if self._writer is None or not self._writer.is_alive():
+                self._writer = threading.Thread(target=self._write_slow_queries, name='cura-slow-queries', daemon=True)
+                self._writer.start()
+
+    def _write_slow_queries(self):
+        """Background writer: inserts queued slow queries once the caller's transaction is done"""
+        while True:
+            db_path, row = self._slow_queue.get()
+            try:
+                conn = sqlite3.connect(db_path, timeout=30)
+                try:
+                    conn.execute('''
+                        INSERT INTO query_stats (operation, sql, params, total_ms, exec_ms, fetch_ms, rows, query_plan)
+                        VALUES (?, ?, ?, ?, ?, ?, ?, ?)
+                    ''', row)
+                    conn.commit()
+                finally:
+                    conn.close()
+            except sqlite3.Error:
+                pass
+            finally:
+                self._slow_queue.task_done()
+
+    def flush_slow_queries(self, timeout=5.0):
+        """Wait (up to ``timeout`` seconds) until queued slow queries are in ``query_stats``"""
+        deadline = time.monotonic() + timeout
+        while self._slow_queue.unfinished_tasks and time.monotonic() < deadline:
+            time.sleep(0.01)
+        return not self._slow_queue.unfinished_tasks
+
+    def _get_logger(self):
+        if self._logger is None and self.log_path:
+            try:
+                os.makedirs(os.path.dirname(os.path.abspath(self.log_path)), exist_ok=True)
+                logger = logging.getLogger('cura.slow_queries')
+                logger.propagate = False
+                for handler in list(logger.handlers):
+                    logger.removeHandler(handler)
+                handler = logging.handlers.RotatingFileHandler(
+                    self.log_path, maxBytes=1_000_000, backupCount=5, encoding='utf-8'
+                )
+                handler.setFormatter(logging.Formatter('%(asctime)s %(message)s'))
+                logger.addHandler(handler)
+                self._logger = logger
+            except OSError:
+                self.log_path = None
+        return self._logger
+
+    # ========== مراقبة عمليات CRUD ==========
+    def operation(self, name):
+        """Context manager attributing the queries run inside it to ``name``"""
+        return _OperationScope(self, name)
+
+    def record_operation(self, state, elapsed_ms):
+        frame_ms = max(elapsed_ms - state['db_ms'], 0.0)
+        with self._lock:
+            stat = self._operations.get(state['name'])
+            if stat is None:
+                stat = self._operations[state['name']] = _Stat(self.max_samples)
+            stat.add(elapsed_ms, state['rows'], state['db_ms'])
+        self._notify({
+            'type': 'operation',
+            'operation': state['name'],
+            'total_ms': elapsed_ms,
+            'db_ms': state['db_ms'],
+            'frame_ms': frame_ms,
+            'queries': state['queries'],
+            'rows': state['rows'],
+            'started_at': state['started_at'],
+        })
+
+    def instrument(self, cls):
+        """Wrap every public method of ``cls`` in an operation scope"""
+        for name, member in list(vars(cls).items()):
+            if name.startswith('_') or not callable(member) or getattr(member, '_profiled', False):
+                continue
+            setattr(cls, name, self._wrap(name, member))
+        return cls
+
+    def _wrap(self, name, func):
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            if not self.enabled or self._operation.get() is not None:
+                return func(*args, **kwargs)
+            with self.operation(name):
+                return func(*args, **kwargs)
+        wrapper._profiled = True
+        return wrapper
+
+    # ========== التقارير ==========
+    def top_operations(self, limit=20, sort_by='total_ms'):
+        """Per-operation summary (calls, total/p50/p95/p99, DB vs DataFrame time)"""
+        with self._lock:
+            rows = []
+            for name, stat in self._operations.items():
+                summary = stat.summary()
+                summary['operation'] = name
+                summary['db_ms'] = round(stat.db_ms, 3)
+                summary['frame_ms'] = round(max(stat.total_ms - stat.db_ms, 0.0), 3)
+                rows.append(summary)
+        rows.sort(key=lambda r: r[sort_by], reverse=True)
+        return rows[:limit]
+
+    def top_queries(self, limit=20, sort_by='total_ms'):
+        """Per-statement summary sorted by total time"""
+        with self._lock:
+            rows = []
+            for sql, stat in self._queries.items():
+                summary = stat.summary()
+                summary['sql'] = sql
+                rows.append(summary)
+        rows.sort(key=lambda r: r[sort_by], reverse=True)
+        return rows[:limit]
+
+    def reset(self):
+        with self._lock:
+            self._queries.clear()
+            self._operations.clear()
+
+
+class _OperationScope:
+    __slots__ = ('profiler', 'state', 'token')
+
+    def __init__(self, profiler, name):
+        self.profiler = profiler
+        self.state = {'name': name, 'db_ms': 0.0, 'queries': 0, 'rows': 0, 'started_at': 0.0}
+        self.token = None
+
+    def __enter__(self):
+        self.state['started_at'] = time.perf_counter()
+        self.token = self.profiler._operation.set(self.state)
+        return self.state
+
+    def __exit__(self, exc_type, exc, tb):
+        elapsed_ms = (time.perf_counter() - self.state['started_at']) * 1000
+        self.profiler._operation.reset(self.token)
+        self.profiler.record_operation(self.state, elapsed_ms)
+        return False
+
+
+# Create profiler instance
+profiler = QueryProfiler()
@@ -0,0 +1,181 @@
+"""
+Records for Cura Clinic App
+Typed rows and pandas-free fetch helpers for scalars, single rows and small result sets
+"""
+
+import functools
+from dataclasses import dataclass, fields
+from typing import ClassVar, Optional
+
+
+# ========== السجلات ==========
+@dataclass(slots=True)
+class Doctor:
+    TABLE: ClassVar[str] = 'doctors'
+
+    id: int
+    name: str
+    specialization: Optional[str]
+    phone: Optional[str]
+    email: Optional[str]
+    address: Optional[str]
+    hire_date: Optional[str]
+    salary: Optional[float]
+    commission_rate: Optional[float]
+    is_active: int
+    created_at: Optional[str]
+
+
+@dataclass(slots=True)
+class Patient:
+    TABLE: ClassVar[str] = 'patients'
+
+    id: int
+    name: str
+    phone: Optional[str]
+    email: Optional[str]
+    address: Optional[str]
+    date_of_birth: Optional[str]
+    gender: Optional[str]
+    medical_history: Optional[str]
+    emergency_contact: Optional[str]
+    blood_type: Optional[str]
+    allergies: Optional[str]
+    notes: Optional[str]
+    is_active: int
+    created_at: Optional[str]
+
+
+@dataclass(slots=True)
+class Treatment:
+    TABLE: ClassVar[str] = 'treatments'
+
+    id: int
+    name: str
+    description: Optional[str]
+    base_price: Optional[float]
+    duration_minutes: Optional[int]
+    category: Optional[str]
+    doctor_percentage: Optional[float]
+    clinic_percentage: Optional[float]
+    is_active: int
+    created_at: Optional[str]
+
+
+@dataclass(slots=True)
+class Appointment:
+    TABLE: ClassVar[str] = 'appointments'
+
+    id: int
+    patient_id: int
+    doctor_id: int
+    treatment_id: Optional[int]
+    appointment_date: str
+    appointment_time: str
+    status: str
+    notes: Optional[str]
+    total_cost: Optional[float]
+    reminder_sent: Optional[int]
+    created_at: Optional[str]
+    series_id: Optional[int]
+
+
+@dataclass(slots=True)
+class Payment:
+    TABLE: ClassVar[str] = 'payments'
+
+    id: int
+    appointment_id: Optional[int]
+    patient_id: int
+    amount: float
+    payment_method: Optional[str]
+    payment_date: str
+    status: Optional[str]
+    doctor_share: Optional[float]
+    clinic_share: Optional[float]
+    doctor_percentage: Optional[float]
+    clinic_percentage: Optional[float]
+    notes: Optional[str]
+    created_at: Optional[str]
+
+
+@dataclass(slots=True)
+class Supplier:
+    TABLE: ClassVar[str] = 'suppliers'
+
+    id: int
+    name: str
+    contact_person: Optional[str]
+    phone: Optional[str]
+    email: Optional[str]
+    address: Optional[str]
+    payment_terms: Optional[str]
+    is_active: int
+    created_at: Optional[str]
+
+
+@dataclass(slots=True)
+class Expense:
+    TABLE: ClassVar[str] = 'expenses'
+
+    id: int
+    category: str
+    description: Optional[str]
+    amount: float
+    expense_date: str
+    payment_method: Optional[str]
+    receipt_number: Optional[str]
+    notes: Optional[str]
+    approved_by: Optional[str]
+    is_recurring: Optional[int]
+    created_at: Optional[str]
+
+
+@functools.cache
+def columns(record):
+    """Field names of a record class, in table order"""
+    return tuple(field.name for field in fields(record))
+
+
+# ========== القراءة ==========
+# عبر conn.cursor() لا conn.execute: مؤشر الاتصال المراقَب يسجل زمن الاستعلام
+def fetch_scalar(conn, sql, params=(), default=None):
+    """First column of the first row (``default`` when there is no row or it is NULL)"""
+    row = conn.cursor().execute(sql, params).fetchone()
+    return default if row is None or row[0] is None else row[0]
+
+
+def fetch_one(conn, sql, params=(), record=None):
+    """First row as a ``record`` instance, or a dict keyed by column when no record is given"""
+    cursor = conn.cursor().execute(sql, params)
+    row = cursor.fetchone()
+    if row is None:
+        return None
+    return _builder(cursor, record)(row)
+
+
+def fetch_many(conn, sql, params=(), record=None):
+    """All rows as ``record`` instances (or dicts) - for small result sets; bulk reads stay in pandas"""
+    cursor = conn.cursor().execute(sql, params)
+    rows = cursor.fetchall()
+    if not rows:
+        return []
+    build = _builder(cursor, record)
+    return [build(row) for row in rows]
+
+
+def fetch_record(conn, record, record_id):
+    """One row of ``record.TABLE`` by id (None if not found)"""
+    return fetch_one(
+        conn, f"SELECT {', '.join(columns(record))} FROM {record.TABLE} WHERE id = ?", (record_id,), record
+    )
+
+
+def _builder(cursor, record):
+    names = tuple(description[0] for description in cursor.description)
+    if record is None:
+        return lambda row: dict(zip(names, row))
+    if names == columns(record):
+        # الأعمدة بنفس ترتيب الحقول: بناء بالموضع دون قاموس وسيط
+        return lambda row: record(*row)
+    return lambda row: record(**dict(zip(names, row)))
@@ -0,0 +1,50 @@
+"""
+Recurrence rules for appointment series
+Expands a (frequency, interval, count/until) rule into occurrence dates
+"""
+
+import calendar
+from datetime import date, timedelta
+
+FREQUENCIES = {
+    'daily': 'يومي',
+    'weekly': 'أسبوعي',
+    'monthly': 'شهري',
+}
+
+# حد أقصى لطول السلسلة الواحدة (سنتان من الزيارات الأسبوعية)
+MAX_OCCURRENCES = 104
+
+
+def _add_months(start, months):
+    month_index = start.month - 1 + months
+    year, month = start.year + month_index // 12, month_index % 12 + 1
+    return date(year, month, min(start.day, calendar.monthrange(year, month)[1]))
+
+
+def occurrence_dates(start_date, frequency='weekly', interval=1, occurrences=None, until_date=None):
+    """Dates of a recurrence rule, starting with ``start_date``.
+
+    The series ends after ``occurrences`` dates or on ``until_date``
+    (inclusive), whichever comes first, and never exceeds MAX_OCCURRENCES.
+    Monthly series keep the day of month, clamped to short months.
+    """
+    if frequency not in FREQUENCIES:
+        raise ValueError(f"تكرار غير معروف: {frequency}")
+    if interval < 1:
+        raise ValueError("فترة التكرار يجب أن تكون 1 على الأقل")
+    if occurrences is None and until_date is None:
+        raise ValueError("يجب تحديد عدد المرات أو تاريخ الانتهاء")
+
+    limit = min(occurrences or MAX_OCCURRENCES, MAX_OCCURRENCES)
+    dates = []
+    while len(dates) < limit:
+        step = len(dates) * interval
+        if frequency == 'monthly':
+            current = _add_months(start_date, step)
+        else:
+            current = start_date + timedelta(days=step * (7 if frequency == 'weekly' else 1))
+        if until_date is not None and current > until_date:
+            break
+        dates.append(current)
+    return dates
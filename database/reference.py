@@ -0,0 +1,109 @@
+"""
+Reference Data for Cura Clinic App
+Compact lookups for form selectors, and an indexed patient search instead of loading every patient
+"""
+
+import re
+
+from .models import db
+from .versions import versioned
+
+# أرقام فقط: بحث بالرقم التعريفي أو بداية رقم الهاتف
+DIGITS = re.compile(r'^\+?\d+$')
+
+
+class ReferenceData:
+    """Lookups behind the appointment and payment forms.
+
+    Doctors and treatments are small and read on every rerun, so they are
+    kept as ``{id: ...}`` dicts until their table changes (in any process,
+    see ``versions.py``). Patients are too many to list: ``search_patients``
+    answers a typeahead from the ``patients(name COLLATE NOCASE)`` and
+    ``patients(phone)`` indexes and returns at most ``limit`` matches.
+
+    The returned dicts are shared between sessions and must not be modified.
+    """
+
+    SEARCH_LIMIT = 20
+    # أقل طول للبحث داخل الاسم (يتطلب مسحاً كاملاً) بعد نفاد نتائج البداية
+    CONTAINS_MIN_LENGTH = 2
+
+    def __init__(self, database=None):
+        self.db = database or db
+
+    @versioned('doctors')
+    def doctors(self):
+        """{id: name} of active doctors, by name"""
+        return dict(self._rows("SELECT id, name FROM doctors WHERE is_active = 1 ORDER BY name"))
+
+    @versioned('treatments')
+    def treatments(self):
+        """{id: {name, base_price, doctor_percentage, clinic_percentage}} of active treatments, by name"""
+        rows = self._rows('''
+            SELECT id, name, base_price, doctor_percentage, clinic_percentage
+            FROM treatments WHERE is_active = 1 ORDER BY name
+        ''')
+        return {
+            row[0]: {'name': row[1], 'base_price': row[2] or 0.0,
+                     'doctor_percentage': row[3], 'clinic_percentage': row[4]}
+            for row in rows
+        }
+
+    @versioned('patients', maxsize=128)
+    def search_patients(self, query='', limit=None):
+        """{id: label} of active patients matching ``query`` (latest added when empty)"""
+        limit = limit or self.SEARCH_LIMIT
+        query = (query or '').strip()
+        label = "name || COALESCE(' - ' || phone, '')"
+
+        if not query:
+            return dict(self._rows(
+                f"SELECT id, {label} FROM patients WHERE is_active = 1 ORDER BY id DESC LIMIT ?", (limit,)
+            ))
+
+        matches = {}
+        if DIGITS.match(query):
+            matches.update(self._rows(
+                f"SELECT id, {label} FROM patients WHERE id = ? AND is_active = 1", (int(query.lstrip('+')),)
+            ))
+            matches.update(self._rows(
+                f"SELECT id, {label} FROM patients WHERE phone LIKE ? ESCAPE '\\' AND is_active = 1 "
+                "ORDER BY phone COLLATE NOCASE LIMIT ?",
+                (_escape(query) + '%', limit)
+            ))
+        else:
+            # بداية الاسم تستخدم الفهرس؛ البحث داخل الاسم يكمل النتائج عند الحاجة فقط
+            matches.update(self._rows(
+                f"SELECT id, {label} FROM patients WHERE name LIKE ? ESCAPE '\\' AND is_active = 1 "
+                "ORDER BY name COLLATE NOCASE LIMIT ?",
+                (_escape(query) + '%', limit)
+            ))
+            if len(matches) < limit and len(query) >= self.CONTAINS_MIN_LENGTH:
+                matches.update(self._rows(
+                    f"SELECT id, {label} FROM patients WHERE name LIKE ? ESCAPE '\\' AND is_active = 1 ORDER BY name LIMIT ?",
+                    (f"%{_escape(query)}%", limit)
+                ))
+        return dict(list(matches.items())[:limit])
+
+    @versioned('patients', maxsize=128)
+    def patient_label(self, patient_id):
+        """Label of one patient (None if not found)"""
+        rows = self._rows(
+            "SELECT id, name || COALESCE(' - ' || phone, '') FROM patients WHERE id = ?", (int(patient_id),)
+        )
+        return rows[0][1] if rows else None
+
+    def _rows(self, sql, params=()):
+        conn = self.db.get_connection()
+        try:
+            return conn.execute(sql, params).fetchall()
+        finally:
+            conn.close()
+
+
+def _escape(text):
+    # حروف LIKE الخاصة تُطابق حرفياً
+    return text.replace('\\', '\\\\').replace('%', '\\%').replace('_', '\\_')
+
+
+reference_data = ReferenceData()
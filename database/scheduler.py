@@ -0,0 +1,306 @@
+"""
+Task Scheduler for Cura Clinic App
+Runs nightly maintenance at the times set in the settings table, once across all processes
+"""
+
+import glob
+import os
+import threading
+import time
+import uuid
+from datetime import datetime, timedelta
+
+import pandas as pd
+
+from .models import db
+from .jobs import job_type
+
+
+def _stamp(moment):
+    return moment.isoformat(sep=' ', timespec='seconds')
+
+
+# ========== المهام ==========
+def _refresh_analytics(settings, database):
+    from .crud import crud
+    manifest = crud.export_analytics_snapshot()
+    rows = sum(manifest['rows'].values())
+    return f"{rows:,} صف في {manifest['seconds']:.1f} ثانية"
+
+
+def _backup(settings, database):
+    # نسخ بتاريخها بجوار قاعدة البيانات، ويُحتفظ بآخر N منها فقط
+    directory = os.path.splitext(os.path.abspath(database.db_path))[0] + '_backups'
+    os.makedirs(directory, exist_ok=True)
+    path = database.backup_database(os.path.join(directory, f"backup_{datetime.now():%Y%m%d_%H%M%S}.db"))
+    if path is None:
+        raise RuntimeError("فشل إنشاء النسخة الاحتياطية")
+
+    keep = int(settings.get('scheduled_backups_keep') or 7)
+    for old in sorted(glob.glob(os.path.join(directory, 'backup_*.db')))[:-keep]:
+        os.remove(old)
+    return path
+
+
+def _rebuild_indexes(settings, database):
+    from .migration import migration
+    if not migration.rebuild_indexes():
+        raise RuntimeError("فشل تحديث إحصائيات الفهارس")
+    return "تم تحديث إحصائيات الفهارس"
+
+
+def _validation(settings, database):
+    from .crud import crud
+    from .validation import validator
+    summary = validator.get_validation_report(mode='full')['summary']
+    if summary['total_issues']:
+        crud.create_notification(
+            'data_validation', 'مشاكل في سلامة البيانات',
+            f"تقرير الليلة وجد {summary['total_issues']} مشكلة ({summary['high_severity']} عالية الأولوية)",
+            priority='high' if summary['high_severity'] else 'normal',
+            target_date=datetime.now().date().isoformat(), action_link='settings'
+        )
+    return f"{summary['total_issues']} مشكلة"
+
+
+def _notifications(settings, database):
+    from .notifications import notification_engine
+    return f"{notification_engine.run()} إشعار جديد"
+
+
+# المهمة -> عنوانها والإعداد الذي يحدد موعدها اليومي (HH:MM، فارغ للتعطيل)
+# كل دالة تستقبل (الإعدادات، قاعدة البيانات) وتعيد رسالة تُحفظ في السجل
+TASKS = {
+    'analytics_refresh': {'title': 'تحديث لقطة التحليلات', 'setting': 'schedule_analytics_refresh',
+                          'func': _refresh_analytics},
+    'backup': {'title': 'نسخة احتياطية', 'setting': 'schedule_backup', 'func': _backup},
+    'rebuild_indexes': {'title': 'تحديث إحصائيات الفهارس', 'setting': 'schedule_rebuild_indexes',
+                        'func': _rebuild_indexes},
+    'validation': {'title': 'تقرير سلامة البيانات', 'setting': 'schedule_validation', 'func': _validation},
+    'notifications': {'title': 'إشعارات اليوم', 'setting': 'schedule_notifications', 'func': _notifications},
+}
+
+
+class Scheduler:
+    """Daily maintenance tasks driven by the ``settings`` table.
+
+    ``tick()`` runs every task whose time (``schedule_<task>``) has passed
+    today, unless it already started since then or more than
+    ``CATCH_UP_HOURS`` have gone by (a task missed overnight waits for the
+    next night rather than running during clinic hours). ``start()`` calls
+    it every ``interval_seconds`` on a background thread.
+
+    Several Streamlit processes can share one database, so only the holder
+    of the ``scheduler_lock`` lease runs tasks; a ``task_runs`` row is
+    written when a task starts and completed with its status and duration,
+    which also keeps a task from running twice if the lease moves.
+    """
+
+    LEASE_SECONDS = 15 * 60
+    CATCH_UP_HOURS = 6
+    HISTORY_DAYS = 90
+
+    def __init__(self, database=None):
+        self.db = database or db
+        self.holder = f"{os.getpid()}:{uuid.uuid4().hex[:8]}"
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread = None
+        self.last_tick = None
+        self.last_error = None
+
+    # ========== الجدولة ==========
+    def settings(self):
+        conn = self.db.get_connection()
+        try:
+            rows = conn.execute(
+                "SELECT key, value FROM settings WHERE key LIKE 'schedule%' OR key IN ('scheduler_enabled', 'backup_enabled')"
+            ).fetchall()
+        finally:
+            conn.close()
+        return dict(rows)
+
+    def due_tasks(self, now=None, settings=None):
+        """Names of the tasks due at ``now``"""
+        now = now or datetime.now()
+        settings = self.settings() if settings is None else settings
+        if settings.get('scheduler_enabled', '1') != '1':
+            return []
+
+        scheduled = {}
+        for name, task in TASKS.items():
+            if name == 'backup' and settings.get('backup_enabled', '1') != '1':
+                continue
+            at = _scheduled_time(settings.get(task['setting']), now)
+            if at is not None and at <= now < at + timedelta(hours=self.CATCH_UP_HOURS):
+                scheduled[name] = at
+        if not scheduled:
+            return []
+
+        last = self._last_starts(scheduled)
+        return [name for name, at in scheduled.items() if last.get(name) is None or last[name] < _stamp(at)]
+
+    def tick(self, now=None):
+        """Run the due tasks if this process holds the lock; returns the tasks run"""
+        with self._lock:
+            self.last_tick = datetime.now()
+            settings = self.settings()
+            ran = []
+            for name in self.due_tasks(now, settings):
+                # يُجدد القفل قبل كل مهمة؛ إن أخذته عملية أخرى تتوقف هذه
+                if not self.acquire():
+                    break
+                if name in self.due_tasks(now, settings):
+                    self._execute(name, settings)
+                    ran.append(name)
+            if ran:
+                self._prune_history()
+            return ran
+
+    def run_task(self, name):
+        """Run one task now (from the settings page); returns its history row"""
+        if name not in TASKS:
+            raise ValueError(f"مهمة غير معروفة: {name}")
+        with self._lock:
+            return self._execute(name, self.settings())
+
+    # ========== القفل ==========
+    def acquire(self):
+        """Take or renew the single-runner lease"""
+        now = datetime.now()
+        conn = self.db.get_connection()
+        try:
+            cursor = conn.execute('''
+                UPDATE scheduler_lock SET holder = ?, expires_at = ?
+                WHERE name = 'scheduler' AND (holder IS NULL OR holder = ? OR expires_at < ?)
+            ''', (self.holder, _stamp(now + timedelta(seconds=self.LEASE_SECONDS)), self.holder, _stamp(now)))
+            conn.commit()
+            return cursor.rowcount == 1
+        finally:
+            conn.close()
+
+    def release(self):
+        conn = self.db.get_connection()
+        try:
+            conn.execute(
+                "UPDATE scheduler_lock SET holder = NULL, expires_at = NULL WHERE name = 'scheduler' AND holder = ?",
+                (self.holder,)
+            )
+            conn.commit()
+        finally:
+            conn.close()
+
+    # ========== السجل ==========
+    def history(self, limit=50):
+        """Latest task runs, newest first"""
+        conn = self.db.get_connection()
+        try:
+            return pd.read_sql_query(
+                "SELECT * FROM task_runs ORDER BY started_at DESC, id DESC LIMIT ?", conn, params=(limit,)
+            )
+        finally:
+            conn.close()
+
+    def _last_starts(self, names):
+        placeholders = ', '.join('?' * len(names))
+        conn = self.db.get_connection()
+        try:
+            return dict(conn.execute(
+                f"SELECT task, MAX(started_at) FROM task_runs WHERE task IN ({placeholders}) GROUP BY task",
+                list(names)
+            ).fetchall())
+        finally:
+            conn.close()
+
+    def _execute(self, name, settings):
+        started = datetime.now()
+        conn = self.db.get_connection()
+        try:
+            run_id = conn.execute(
+                "INSERT INTO task_runs (task, status, holder, started_at) VALUES (?, 'running', ?, ?)",
+                (name, self.holder, _stamp(started))
+            ).lastrowid
+            conn.commit()
+        finally:
+            conn.close()
+
+        clock = time.perf_counter()
+        try:
+            status, message = 'done', TASKS[name]['func'](settings, self.db)
+        except Exception as e:
+            status, message = 'failed', str(e)
+            print(f"❌ فشلت المهمة المجدولة {name}: {e}")
+        duration_ms = round((time.perf_counter() - clock) * 1000, 1)
+
+        conn = self.db.get_connection()
+        try:
+            conn.execute(
+                "UPDATE task_runs SET status = ?, message = ?, finished_at = ?, duration_ms = ? WHERE id = ?",
+                (status, str(message), _stamp(datetime.now()), duration_ms, run_id)
+            )
+            conn.commit()
+        finally:
+            conn.close()
+        return {'id': run_id, 'task': name, 'status': status, 'message': str(message), 'duration_ms': duration_ms}
+
+    def _prune_history(self):
+        cutoff = _stamp(datetime.now() - timedelta(days=self.HISTORY_DAYS))
+        conn = self.db.get_connection()
+        try:
+            conn.execute("DELETE FROM task_runs WHERE started_at < ?", (cutoff,))
+            conn.commit()
+        finally:
+            conn.close()
+
+    # ========== الخيط الخلفي ==========
+    def start(self, interval_seconds=60):
+        """Start the background loop (no-op if already running)"""
+        if self._thread is not None and self._thread.is_alive():
+            return False
+        self._stop.clear()
+        self._thread = threading.Thread(
+            target=self._loop, args=(interval_seconds,), name='cura-scheduler', daemon=True
+        )
+        self._thread.start()
+        return True
+
+    def stop(self, timeout=5):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join(timeout)
+            self._thread = None
+        self.release()
+
+    @property
+    def running(self):
+        return self._thread is not None and self._thread.is_alive()
+
+    def _loop(self, interval_seconds):
+        while not self._stop.is_set():
+            try:
+                self.tick()
+                self.last_error = None
+            except Exception as e:
+                # لا يتوقف المجدول بسبب خطأ عابر (مثل قفل قاعدة البيانات)
+                self.last_error = str(e)
+                print(f"❌ خطأ في المجدول: {e}")
+            self._stop.wait(interval_seconds)
+
+
+def _scheduled_time(value, now):
+    """Today's run time for an ``HH:MM`` setting (None when empty or invalid)"""
+    try:
+        at = datetime.strptime((value or '').strip(), '%H:%M').time()
+    except ValueError:
+        return None
+    return datetime.combine(now.date(), at)
+
+
+@job_type('scheduled_task', 'مهمة مجدولة')
+def _scheduled_task_job(params, progress):
+    progress(0.1, TASKS[params['task']]['title'])
+    return scheduler.run_task(params['task'])
+
+
+# مجدول مشترك لكل الجلسات
+scheduler = Scheduler()
@@ -0,0 +1,51 @@
+"""
+Result Schemas for Cura Clinic App
+Column dtypes of the CRUD result frames, applied once when a frame is fetched
+"""
+
+import pandas as pd
+
+CATEGORY = 'category'   # نص قليل التكرار: رموز صحيحة بدلاً من تكرار النص في كل صف
+DATE = 'date'           # datetime64 (نص ISO في قاعدة البيانات)
+INTEGER = 'integer'     # أصغر نوع صحيح يسع القيم (يبقى كما هو إذا وُجدت قيم فارغة)
+
+# النتيجة -> {العمود: النوع}. المبالغ تبقى float64 حتى لا تفقد المجاميع دقتها،
+# والأعمدة غير المذكورة (الأسماء والملاحظات) تبقى كما تقرأها pandas
+SCHEMAS = {
+    'appointments': {
+        'id': INTEGER, 'patient_id': INTEGER, 'doctor_id': INTEGER, 'treatment_id': INTEGER,
+        'doctor_name': CATEGORY, 'treatment_name': CATEGORY, 'status': CATEGORY,
+        'appointment_date': DATE, 'reminder_sent': INTEGER,
+    },
+    'payments': {
+        'id': INTEGER, 'appointment_id': INTEGER,
+        'payment_method': CATEGORY, 'status': CATEGORY,
+        'payment_date': DATE,
+    },
+    'expenses': {
+        'id': INTEGER, 'category': CATEGORY, 'payment_method': CATEGORY,
+        'expense_date': DATE, 'is_recurring': INTEGER,
+    },
+    'patients': {
+        'id': INTEGER, 'gender': CATEGORY, 'blood_type': CATEGORY, 'is_active': INTEGER,
+    },
+}
+
+
+def apply_schema(df, name):
+    """Convert the columns of ``df`` declared in ``SCHEMAS[name]`` in place; returns ``df``"""
+    for column, kind in SCHEMAS[name].items():
+        if column not in df.columns:
+            continue
+        if kind == DATE:
+            df[column] = pd.to_datetime(df[column], format='ISO8601', errors='coerce')
+        elif kind == INTEGER:
+            df[column] = pd.to_numeric(df[column], downcast='integer')
+        else:
+            df[column] = df[column].astype(kind)
+    return df
+
+
+def in_period(dates, start_date, end_date):
+    """Mask of the rows of a datetime64 column between two dates (inclusive)"""
+    return dates.between(pd.Timestamp(start_date), pd.Timestamp(end_date))
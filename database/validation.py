@@ -3,318 +3,239 @@ Database Validation Module for Cura Clinic App
 Provides comprehensive data validation and integrity checks
 """
 
+import os
 import sqlite3
 import pandas as pd
+from concurrent.futures import ThreadPoolExecutor, as_completed
 from datetime import datetime, date
 from .models import db
 
-class DataValidator:
-    """Data validation and integrity checking class"""
-
-    def __init__(self):
-        self.db = db
-
-    def validate_foreign_keys(self):
-        """Validate all foreign key relationships in the database"""
-        issues = []
-
-        try:
-            conn = self.db.get_connection()
-
-            # Check appointments foreign keys
-            issues.extend(self._check_appointments_references(conn))
-
-            # Check payments foreign keys
-            issues.extend(self._check_payments_references(conn))
-
-            # Check inventory foreign keys
-            issues.extend(self._check_inventory_references(conn))
-
-            # Check inventory_usage foreign keys
-            issues.extend(self._check_inventory_usage_references(conn))
-
-            conn.close()
-
-        except Exception as e:
-            issues.append(f"Error during foreign key validation: {str(e)}")
-
-        return issues
-
-    def _check_appointments_references(self, conn):
-        """Check appointments table foreign key references"""
-        issues = []
-
-        # Check patient_id references
-        query = """
-            SELECT a.id, a.patient_id, p.name
+ISSUE_COLUMNS = ['check', 'table', 'record_id', 'issue', 'severity']
+
+# Row ids of ``table`` changed in the (low, high] window of change_log
+CHANGED_IDS = "SELECT record_id FROM change_log WHERE table_name = '{table}' AND id > :low AND id <= :high"
+
+# Every check selects the offending rows of its base table. ``key`` is the
+# base table id column used to scope incremental runs; ``dependents`` maps a
+# changed table to the base-table ids whose result it can affect.
+CHECKS = [
+    {
+        'check': 'appointment_patient', 'group': 'foreign_key', 'table': 'appointments', 'severity': 'high',
+        'key': 'a.id',
+        'sql': """
+            SELECT a.id AS record_id,
+                   'Invalid patient_id ' || a.patient_id || ' - patient not found or inactive' AS issue
             FROM appointments a
             LEFT JOIN patients p ON a.patient_id = p.id
-            WHERE p.id IS NULL OR p.is_active = 0
-        """
-        orphaned = pd.read_sql_query(query, conn)
-        if not orphaned.empty:
-            for _, row in orphaned.iterrows():
-                issues.append({
-                    'table': 'appointments',
-                    'record_id': row['id'],
-                    'issue': f"Invalid patient_id {row['patient_id']} - patient not found or inactive",
-                    'severity': 'high'
-                })
-
-        # Check doctor_id references
-        query = """
-            SELECT a.id, a.doctor_id, d.name
+            WHERE (p.id IS NULL OR p.is_active = 0)
+        """,
+        'dependents': {
+            'appointments': "{changed}",
+            'patients': "SELECT id FROM appointments WHERE patient_id IN ({changed})",
+        },
+    },
+    {
+        'check': 'appointment_doctor', 'group': 'foreign_key', 'table': 'appointments', 'severity': 'high',
+        'key': 'a.id',
+        'sql': """
+            SELECT a.id AS record_id,
+                   'Invalid doctor_id ' || a.doctor_id || ' - doctor not found or inactive' AS issue
             FROM appointments a
             LEFT JOIN doctors d ON a.doctor_id = d.id
-            WHERE d.id IS NULL OR d.is_active = 0
-        """
-        orphaned = pd.read_sql_query(query, conn)
-        if not orphaned.empty:
-            for _, row in orphaned.iterrows():
-                issues.append({
-                    'table': 'appointments',
-                    'record_id': row['id'],
-                    'issue': f"Invalid doctor_id {row['doctor_id']} - doctor not found or inactive",
-                    'severity': 'high'
-                })
-
-        # Check treatment_id references (nullable)
-        query = """
-            SELECT a.id, a.treatment_id, t.name
+            WHERE (d.id IS NULL OR d.is_active = 0)
+        """,
+        'dependents': {
+            'appointments': "{changed}",
+            'doctors': "SELECT id FROM appointments WHERE doctor_id IN ({changed})",
+        },
+    },
+    {
+        'check': 'appointment_treatment', 'group': 'foreign_key', 'table': 'appointments', 'severity': 'medium',
+        'key': 'a.id',
+        'sql': """
+            SELECT a.id AS record_id,
+                   'Invalid treatment_id ' || a.treatment_id || ' - treatment not found or inactive' AS issue
             FROM appointments a
             LEFT JOIN treatments t ON a.treatment_id = t.id
             WHERE a.treatment_id IS NOT NULL AND (t.id IS NULL OR t.is_active = 0)
-        """
-        orphaned = pd.read_sql_query(query, conn)
-        if not orphaned.empty:
-            for _, row in orphaned.iterrows():
-                issues.append({
-                    'table': 'appointments',
-                    'record_id': row['id'],
-                    'issue': f"Invalid treatment_id {row['treatment_id']} - treatment not found or inactive",
-                    'severity': 'medium'
-                })
-
-        return issues
-
-    def _check_payments_references(self, conn):
-        """Check payments table foreign key references"""
-        issues = []
-
-        # Check appointment_id references (nullable)
-        query = """
-            SELECT p.id, p.appointment_id
+        """,
+        'dependents': {
+            'appointments': "{changed}",
+            'treatments': "SELECT id FROM appointments WHERE treatment_id IN ({changed})",
+        },
+    },
+    {
+        'check': 'payment_appointment', 'group': 'foreign_key', 'table': 'payments', 'severity': 'medium',
+        'key': 'p.id',
+        'sql': """
+            SELECT p.id AS record_id,
+                   'Invalid appointment_id ' || p.appointment_id || ' - appointment not found' AS issue
             FROM payments p
             LEFT JOIN appointments a ON p.appointment_id = a.id
             WHERE p.appointment_id IS NOT NULL AND a.id IS NULL
-        """
-        orphaned = pd.read_sql_query(query, conn)
-        if not orphaned.empty:
-            for _, row in orphaned.iterrows():
-                issues.append({
-                    'table': 'payments',
-                    'record_id': row['id'],
-                    'issue': f"Invalid appointment_id {row['appointment_id']} - appointment not found",
-                    'severity': 'medium'
-                })
-
-        # Check patient_id references
-        query = """
-            SELECT p.id, p.patient_id, pat.name
+        """,
+        'dependents': {
+            'payments': "{changed}",
+            'appointments': "SELECT id FROM payments WHERE appointment_id IN ({changed})",
+        },
+    },
+    {
+        'check': 'payment_patient', 'group': 'foreign_key', 'table': 'payments', 'severity': 'high',
+        'key': 'p.id',
+        'sql': """
+            SELECT p.id AS record_id,
+                   'Invalid patient_id ' || p.patient_id || ' - patient not found or inactive' AS issue
             FROM payments p
             LEFT JOIN patients pat ON p.patient_id = pat.id
-            WHERE pat.id IS NULL OR pat.is_active = 0
-        """
-        orphaned = pd.read_sql_query(query, conn)
-        if not orphaned.empty:
-            for _, row in orphaned.iterrows():
-                issues.append({
-                    'table': 'payments',
-                    'record_id': row['id'],
-                    'issue': f"Invalid patient_id {row['patient_id']} - patient not found or inactive",
-                    'severity': 'high'
-                })
-
-        return issues
-
-    def _check_inventory_references(self, conn):
-        """Check inventory table foreign key references"""
-        issues = []
-
-        # Check supplier_id references (nullable)
-        query = """
-            SELECT i.id, i.supplier_id, s.name
+            WHERE (pat.id IS NULL OR pat.is_active = 0)
+        """,
+        'dependents': {
+            'payments': "{changed}",
+            'patients': "SELECT id FROM payments WHERE patient_id IN ({changed})",
+        },
+    },
+    {
+        'check': 'inventory_supplier', 'group': 'foreign_key', 'table': 'inventory', 'severity': 'medium',
+        'key': 'i.id',
+        'sql': """
+            SELECT i.id AS record_id,
+                   'Invalid supplier_id ' || i.supplier_id || ' - supplier not found or inactive' AS issue
             FROM inventory i
             LEFT JOIN suppliers s ON i.supplier_id = s.id
             WHERE i.supplier_id IS NOT NULL AND (s.id IS NULL OR s.is_active = 0)
-        """
-        orphaned = pd.read_sql_query(query, conn)
-        if not orphaned.empty:
-            for _, row in orphaned.iterrows():
-                issues.append({
-                    'table': 'inventory',
-                    'record_id': row['id'],
-                    'issue': f"Invalid supplier_id {row['supplier_id']} - supplier not found or inactive",
-                    'severity': 'medium'
-                })
-
-        return issues
-
-    def _check_inventory_usage_references(self, conn):
-        """Check inventory_usage table foreign key references"""
-        issues = []
-
-        # Check inventory_id references
-        query = """
-            SELECT iu.id, iu.inventory_id, i.item_name
+        """,
+        'dependents': {
+            'inventory': "{changed}",
+            'suppliers': "SELECT id FROM inventory WHERE supplier_id IN ({changed})",
+        },
+    },
+    {
+        'check': 'usage_inventory', 'group': 'foreign_key', 'table': 'inventory_usage', 'severity': 'high',
+        'key': 'iu.id',
+        'sql': """
+            SELECT iu.id AS record_id,
+                   'Invalid inventory_id ' || iu.inventory_id || ' - inventory item not found or inactive' AS issue
             FROM inventory_usage iu
             LEFT JOIN inventory i ON iu.inventory_id = i.id
-            WHERE i.id IS NULL OR i.is_active = 0
-        """
-        orphaned = pd.read_sql_query(query, conn)
-        if not orphaned.empty:
-            for _, row in orphaned.iterrows():
-                issues.append({
-                    'table': 'inventory_usage',
-                    'record_id': row['id'],
-                    'issue': f"Invalid inventory_id {row['inventory_id']} - inventory item not found or inactive",
-                    'severity': 'high'
-                })
-
-        # Check appointment_id references (nullable)
-        query = """
-            SELECT iu.id, iu.appointment_id
+            WHERE (i.id IS NULL OR i.is_active = 0)
+        """,
+        'dependents': {
+            'inventory_usage': "{changed}",
+            'inventory': "SELECT id FROM inventory_usage WHERE inventory_id IN ({changed})",
+        },
+    },
+    {
+        'check': 'usage_appointment', 'group': 'foreign_key', 'table': 'inventory_usage', 'severity': 'medium',
+        'key': 'iu.id',
+        'sql': """
+            SELECT iu.id AS record_id,
+                   'Invalid appointment_id ' || iu.appointment_id || ' - appointment not found' AS issue
             FROM inventory_usage iu
             LEFT JOIN appointments a ON iu.appointment_id = a.id
             WHERE iu.appointment_id IS NOT NULL AND a.id IS NULL
-        """
-        orphaned = pd.read_sql_query(query, conn)
-        if not orphaned.empty:
-            for _, row in orphaned.iterrows():
-                issues.append({
-                    'table': 'inventory_usage',
-                    'record_id': row['id'],
-                    'issue': f"Invalid appointment_id {row['appointment_id']} - appointment not found",
-                    'severity': 'medium'
-                })
-
-        return issues
-
-    def validate_data_consistency(self):
-        """Validate data consistency across tables"""
-        issues = []
-
-        try:
-            conn = self.db.get_connection()
-
-            # Check payment amounts match appointment costs
-            issues.extend(self._check_payment_appointment_consistency(conn))
-
-            # Check inventory quantities are not negative
-            issues.extend(self._check_inventory_quantities(conn))
-
-            # Check appointment dates are not in the past (for future appointments)
-            issues.extend(self._check_appointment_dates(conn))
-
-            # Check doctor commission rates are reasonable
-            issues.extend(self._check_doctor_commissions(conn))
-
-            conn.close()
-
-        except Exception as e:
-            issues.append(f"Error during data consistency validation: {str(e)}")
-
-        return issues
-
-    def _check_payment_appointment_consistency(self, conn):
-        """Check that payments match appointment costs"""
-        issues = []
-
-        query = """
-            SELECT
-                p.id as payment_id,
-                p.amount,
-                p.appointment_id,
-                a.total_cost,
-                a.patient_id
+        """,
+        'dependents': {
+            'inventory_usage': "{changed}",
+            'appointments': "SELECT id FROM inventory_usage WHERE appointment_id IN ({changed})",
+        },
+    },
+    {
+        'check': 'payment_amount', 'group': 'consistency', 'table': 'payments', 'severity': 'low',
+        'key': 'p.id',
+        'sql': """
+            SELECT p.id AS record_id,
+                   'Payment amount ' || p.amount || ' doesn''t match appointment cost ' || a.total_cost AS issue
             FROM payments p
-            LEFT JOIN appointments a ON p.appointment_id = a.id
-            WHERE p.appointment_id IS NOT NULL
-        """
-        data = pd.read_sql_query(query, conn)
-
-        for _, row in data.iterrows():
-            if abs(row['amount'] - row['total_cost']) > 0.01:  # Allow small rounding differences
-                issues.append({
-                    'table': 'payments',
-                    'record_id': row['payment_id'],
-                    'issue': f"Payment amount {row['amount']} doesn't match appointment cost {row['total_cost']}",
-                    'severity': 'low'
-                })
-
-        return issues
-
-    def _check_inventory_quantities(self, conn):
-        """Check inventory quantities are valid"""
-        issues = []
-
-        query = "SELECT id, item_name, quantity FROM inventory WHERE quantity < 0"
-        negative_qty = pd.read_sql_query(query, conn)
-
-        if not negative_qty.empty:
-            for _, row in negative_qty.iterrows():
-                issues.append({
-                    'table': 'inventory',
-                    'record_id': row['id'],
-                    'issue': f"Negative quantity {row['quantity']} for item '{row['item_name']}'",
-                    'severity': 'high'
-                })
-
-        return issues
-
-    def _check_appointment_dates(self, conn):
-        """Check appointment dates are reasonable"""
-        issues = []
-
-        today = date.today().isoformat()
-
-        # Find appointments with past dates that are still scheduled
-        query = f"""
-            SELECT id, appointment_date, status
+            JOIN appointments a ON p.appointment_id = a.id
+            WHERE ABS(p.amount - a.total_cost) > 0.01
+        """,
+        'dependents': {
+            'payments': "{changed}",
+            'appointments': "SELECT id FROM payments WHERE appointment_id IN ({changed})",
+        },
+    },
+    {
+        'check': 'inventory_quantity', 'group': 'consistency', 'table': 'inventory', 'severity': 'high',
+        'key': 'id',
+        'sql': """
+            SELECT id AS record_id,
+                   'Negative quantity ' || quantity || ' for item ''' || item_name || '''' AS issue
+            FROM inventory
+            WHERE quantity < 0
+        """,
+        'dependents': {'inventory': "{changed}"},
+    },
+    {
+        # يعتمد على تاريخ اليوم فيُعاد فحصه كاملاً في كل تشغيل
+        'check': 'appointment_past_scheduled', 'group': 'consistency', 'table': 'appointments', 'severity': 'medium',
+        'key': 'id', 'time_based': True,
+        'sql': """
+            SELECT id AS record_id,
+                   'Past appointment date ' || appointment_date || ' still has status ''' || status || '''' AS issue
             FROM appointments
-            WHERE appointment_date < '{today}'
+            WHERE appointment_date < :today
             AND status IN ('مجدول', 'مؤكد')
-        """
-        past_scheduled = pd.read_sql_query(query, conn)
+        """,
+        'dependents': {'appointments': "{changed}"},
+    },
+    {
+        'check': 'doctor_commission', 'group': 'consistency', 'table': 'doctors', 'severity': 'medium',
+        'key': 'id',
+        'sql': """
+            SELECT id AS record_id,
+                   'Invalid commission rate ' || commission_rate || '% for doctor ''' || name || '''' AS issue
+            FROM doctors
+            WHERE commission_rate < 0 OR commission_rate > 100
+        """,
+        'dependents': {'doctors': "{changed}"},
+    },
+]
+
+CHECK_GROUPS = {spec['check']: spec['group'] for spec in CHECKS}
+
+
+def _concat_issues(frames):
+    frames = [frame for frame in frames if not frame.empty]
+    if not frames:
+        return pd.DataFrame(columns=ISSUE_COLUMNS)
+    return pd.concat(frames, ignore_index=True)
 
-        if not past_scheduled.empty:
-            for _, row in past_scheduled.iterrows():
-                issues.append({
-                    'table': 'appointments',
-                    'record_id': row['id'],
-                    'issue': f"Past appointment date {row['appointment_date']} still has status '{row['status']}'",
-                    'severity': 'medium'
-                })
 
-        return issues
+class DataValidator:
+    """Data validation and integrity checking class"""
 
-    def _check_doctor_commissions(self, conn):
-        """Check doctor commission rates are reasonable"""
-        issues = []
+    def __init__(self):
+        self.db = db
 
-        query = "SELECT id, name, commission_rate FROM doctors WHERE commission_rate < 0 OR commission_rate > 100"
-        invalid_rates = pd.read_sql_query(query, conn)
+    def validate_foreign_keys(self, conn=None):
+        """Full scan of all foreign key relationships (columnar issues)"""
+        return self._run_group('foreign_key', conn)
 
-        if not invalid_rates.empty:
-            for _, row in invalid_rates.iterrows():
-                issues.append({
-                    'table': 'doctors',
-                    'record_id': row['id'],
-                    'issue': f"Invalid commission rate {row['commission_rate']}% for doctor '{row['name']}'",
-                    'severity': 'medium'
-                })
+    def validate_data_consistency(self, conn=None):
+        """Full scan of data consistency across tables (columnar issues)"""
+        return self._run_group('consistency', conn)
 
-        return issues
+    def _run_group(self, group, conn=None):
+        own_conn = conn is None
+        if own_conn:
+            conn = self.db.get_connection()
+        try:
+            frames = [self._run_check(conn, spec) for spec in CHECKS if spec['group'] == group]
+        finally:
+            if own_conn:
+                conn.close()
+        return _concat_issues(frames)
+
+    def _run_check(self, conn, spec, scoped=False):
+        """Run one check; ``scoped`` limits it to the ids in temp.validation_scope"""
+        query = spec['sql']
+        if scoped:
+            query += f" AND {spec['key']} IN (SELECT id FROM temp.validation_scope)"
+        issues = pd.read_sql_query(query, conn, params={'today': date.today().isoformat()})
+        issues.insert(0, 'check', spec['check'])
+        issues.insert(1, 'table', spec['table'])
+        issues['severity'] = spec['severity']
+        return issues[ISSUE_COLUMNS]
 
     def validate_before_operation(self, operation_type, table_name, data):
         """Validate data before database operations"""
@@ -536,30 +457,166 @@ class DataValidator:
 
         return issues
 
-    def get_validation_report(self):
-        """Generate a comprehensive validation report"""
-        report = {
-            'foreign_key_issues': self.validate_foreign_keys(),
-            'data_consistency_issues': self.validate_data_consistency(),
-            'summary': {}
-        }
+    # ========== Incremental validation ==========
+    def run_checks_parallel(self, checks=None, max_workers=4, progress=None):
+        """Run independent checks concurrently, each on its own read-only connection.
 
-        # Generate summary
-        all_issues = report['foreign_key_issues'] + report['data_consistency_issues']
-        report['summary'] = {
-            'total_issues': len(all_issues),
-            'high_severity': len([i for i in all_issues if i.get('severity') == 'high']),
-            'medium_severity': len([i for i in all_issues if i.get('severity') == 'medium']),
-            'low_severity': len([i for i in all_issues if i.get('severity') == 'low']),
-            'issues_by_table': {}
-        }
+        ``progress(check, done, total)`` is called as each check finishes.
+        """
+        checks = checks or CHECKS
+        uri = f"file:{os.path.abspath(self.db.db_path)}?mode=ro"
+
+        def run(spec):
+            conn = sqlite3.connect(uri, uri=True)
+            try:
+                return self._run_check(conn, spec)
+            finally:
+                conn.close()
+
+        results = {}
+        with ThreadPoolExecutor(max_workers=max_workers) as executor:
+            futures = {executor.submit(run, spec): spec['check'] for spec in checks}
+            for done, future in enumerate(as_completed(futures), start=1):
+                results[futures[future]] = future.result()
+                if progress:
+                    progress(futures[future], done, len(checks))
+        # ترتيب ثابت بغض النظر عن ترتيب انتهاء الفحوص
+        return _concat_issues([results[spec['check']] for spec in checks])
+
+    def run_full_validation(self, max_workers=4, progress=None):
+        """Full scan of every check (nightly mode); rebuilds the stored issues"""
+        conn = self.db.get_connection()
+        try:
+            cursor = conn.cursor()
+            high_water = cursor.execute("SELECT COALESCE(MAX(id), 0) FROM change_log").fetchone()[0]
+            issues = self.run_checks_parallel(max_workers=max_workers, progress=progress)
+            cursor.execute("DELETE FROM validation_issues")
+            self._store_issues(cursor, issues)
+            self._advance_watermark(cursor, high_water)
+            conn.commit()
+        finally:
+            conn.close()
+        return issues
+
+    def run_incremental_validation(self):
+        """Re-validate only the rows changed since the last run and their dependents.
+
+        Changes come from the ``change_log`` table, which triggers on the
+        tracked tables fill. Falls back to a full scan when no full run has
+        been recorded yet.
+        """
+        conn = self.db.get_connection()
+        try:
+            cursor = conn.cursor()
+            watermark = self._get_watermark(cursor)
+            if watermark is None:
+                conn.close()
+                return self.run_full_validation()
+
+            window = {
+                'low': watermark,
+                'high': cursor.execute("SELECT COALESCE(MAX(id), 0) FROM change_log").fetchone()[0],
+            }
+            changed_tables = {
+                row[0] for row in cursor.execute(
+                    "SELECT DISTINCT table_name FROM change_log WHERE id > :low AND id <= :high", window
+                )
+            }
+
+            cursor.execute("CREATE TEMP TABLE IF NOT EXISTS validation_scope (id INTEGER PRIMARY KEY)")
+            for spec in CHECKS:
+                if spec.get('time_based'):
+                    cursor.execute("DELETE FROM validation_issues WHERE check_name = ?", (spec['check'],))
+                    self._store_issues(cursor, self._run_check(conn, spec))
+                    continue
+
+                sources = [
+                    sql.format(changed=CHANGED_IDS.format(table=table))
+                    for table, sql in spec['dependents'].items() if table in changed_tables
+                ]
+                if not sources:
+                    continue
+
+                # الصفوف المتغيرة والصفوف المعتمدة عليها فقط
+                cursor.execute("DELETE FROM temp.validation_scope")
+                cursor.execute("INSERT OR IGNORE INTO temp.validation_scope (id) " + " UNION ".join(sources), window)
+                cursor.execute(
+                    "DELETE FROM validation_issues WHERE check_name = ? AND record_id IN (SELECT id FROM temp.validation_scope)",
+                    (spec['check'],)
+                )
+                self._store_issues(cursor, self._run_check(conn, spec, scoped=True))
+
+            self._advance_watermark(cursor, window['high'])
+            conn.commit()
+            return self.get_stored_issues(conn)
+        finally:
+            conn.close()
 
-        # Count issues by table
-        for issue in all_issues:
-            table = issue.get('table', 'unknown')
-            if table not in report['summary']['issues_by_table']:
-                report['summary']['issues_by_table'][table] = 0
-            report['summary']['issues_by_table'][table] += 1
+    def get_stored_issues(self, conn=None):
+        """Issues recorded by the last full or incremental run"""
+        own_conn = conn is None
+        if own_conn:
+            conn = self.db.get_connection()
+        try:
+            return pd.read_sql_query("""
+                SELECT check_name AS "check", table_name AS "table", record_id, issue, severity
+                FROM validation_issues
+                ORDER BY id
+            """, conn)
+        finally:
+            if own_conn:
+                conn.close()
+
+    def _store_issues(self, cursor, issues):
+        if issues.empty:
+            return
+        cursor.executemany(
+            "INSERT INTO validation_issues (check_name, table_name, record_id, issue, severity) VALUES (?, ?, ?, ?, ?)",
+            issues[ISSUE_COLUMNS].itertuples(index=False, name=None)
+        )
+
+    def _get_watermark(self, cursor):
+        row = cursor.execute("SELECT value FROM settings WHERE key = 'validation_change_watermark'").fetchone()
+        if not row or not row[0]:
+            return None
+        return int(row[0])
+
+    def _advance_watermark(self, cursor, high_water):
+        cursor.execute(
+            "UPDATE settings SET value = ?, updated_at = CURRENT_TIMESTAMP WHERE key = 'validation_change_watermark'",
+            (str(high_water),)
+        )
+        # التغييرات المعالجة تُحذف بعد مدة الاحتفاظ فقط، فقد يتابعها غيرنا (فهرس التقويم)
+        cursor.execute(
+            "DELETE FROM change_log WHERE id <= ? AND changed_at < datetime('now', ?)",
+            (high_water, f"-{self.db.CHANGE_LOG_RETENTION_DAYS} days")
+        )
+
+    def get_validation_report(self, mode='incremental', progress=None):
+        """Generate a validation report.
+
+        ``mode='incremental'`` re-checks only changed rows (the default for
+        interactive use); ``mode='full'`` rescans every table. Issue lists are
+        DataFrames with the columns in ``ISSUE_COLUMNS``.
+        """
+        if mode == 'full':
+            issues = self.run_full_validation(progress=progress)
+        else:
+            issues = self.run_incremental_validation()
+
+        groups = issues['check'].map(CHECK_GROUPS)
+        severity = issues['severity'].value_counts()
+        report = {
+            'foreign_key_issues': issues[groups == 'foreign_key'].reset_index(drop=True),
+            'data_consistency_issues': issues[groups == 'consistency'].reset_index(drop=True),
+            'summary': {
+                'total_issues': len(issues),
+                'high_severity': int(severity.get('high', 0)),
+                'medium_severity': int(severity.get('medium', 0)),
+                'low_severity': int(severity.get('low', 0)),
+                'issues_by_table': {table: int(count) for table, count in issues['table'].value_counts().items()},
+            }
+        }
 
         return report
 
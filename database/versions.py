@@ -0,0 +1,107 @@
+"""
+Table Versions for Cura Clinic App
+Detects writes from any process cheaply, so in-process caches stay coherent
+"""
+
+import functools
+import sqlite3
+import threading
+from collections import OrderedDict
+
+import pandas as pd
+
+from .models import db
+
+
+class TableVersions:
+    """Per-table write counters shared by every process.
+
+    Triggers bump ``table_versions.version`` on every insert, update and
+    delete in ``Database.VERSIONED_TABLES``, so a cache stamped with the
+    versions of the tables it read is stale exactly when one of them
+    changed, whichever process wrote it.
+
+    Reading the counters is a query of its own, so one long-lived connection
+    polls ``PRAGMA data_version`` first. It only changes when another
+    connection commits, so between writes ``current()`` costs one pragma
+    and the counters are served from memory.
+    """
+
+    def __init__(self, database=None):
+        self.db = database or db
+        self._lock = threading.Lock()
+        self._conn = None
+        self._path = None
+        self._data_version = None
+        self._versions = {}
+        self.reads = 0
+
+    def current(self, *tables):
+        """Versions of ``tables`` (all versioned tables when none given) as a tuple"""
+        with self._lock:
+            self._refresh()
+            if not tables:
+                return tuple(sorted(self._versions.items()))
+            return tuple(self._versions.get(table, 0) for table in tables)
+
+    def close(self):
+        with self._lock:
+            if self._conn is not None:
+                self._conn.close()
+            self._conn = None
+            self._data_version = None
+
+    def _refresh(self):
+        if self._conn is None or self._path != self.db.db_path:
+            if self._conn is not None:
+                self._conn.close()
+            # اتصال دائم خارج مراقب الأداء: data_version يُقارن على نفس الاتصال
+            self._path = self.db.db_path
+            self._conn = sqlite3.connect(self._path, check_same_thread=False)
+            self._data_version = None
+
+        data_version = self._conn.execute("PRAGMA data_version").fetchone()[0]
+        if data_version != self._data_version:
+            self._versions = dict(self._conn.execute("SELECT table_name, version FROM table_versions").fetchall())
+            self._data_version = data_version
+            self.reads += 1
+
+
+def versioned(*tables, maxsize=32):
+    """Cache a CRUD read until one of ``tables`` changes in any process.
+
+    Results are keyed by the call arguments; DataFrames are returned as
+    copies so callers can add columns without touching the cached frame.
+    """
+    def decorate(func):
+        cache = OrderedDict()   # arguments -> (versions, result)
+        lock = threading.Lock()
+
+        @functools.wraps(func)
+        def wrapper(self, *args, **kwargs):
+            versions = table_versions.current(*tables)
+            key = (args, tuple(sorted(kwargs.items())))
+            with lock:
+                cached = cache.get(key)
+                if cached is not None and cached[0] == versions:
+                    cache.move_to_end(key)
+                    result = cached[1]
+                else:
+                    cached = None
+            if cached is None:
+                # الإصدارات تُقرأ قبل الاستعلام: كتابة متزامنة تبطل النتيجة في الطلب التالي
+                result = func(self, *args, **kwargs)
+                with lock:
+                    cache[key] = (versions, result)
+                    cache.move_to_end(key)
+                    while len(cache) > maxsize:
+                        cache.popitem(last=False)
+            return result.copy() if isinstance(result, pd.DataFrame) else result
+
+        wrapper.cache_clear = cache.clear
+        return wrapper
+    return decorate
+
+
+# عدّادات مشتركة لكل الجلسات
+table_versions = TableVersions()
@@ -2,6 +2,7 @@ import streamlit as st
 import pandas as pd
 from datetime import date, datetime
 from database.crud import crud
+from database.schema import in_period
 from utils.helpers import (
     validate_phone_number, validate_email, format_currency,
     show_success_message, show_error_message, format_date_arabic
@@ -208,11 +209,9 @@ def doctors_performance():
         with col2:
             end_date = st.date_input("إلى تاريخ", value=date.today())
         
-        # فلترة البيانات
-        appointments_df['appointment_date'] = pd.to_datetime(appointments_df['appointment_date']).dt.date
+        # فلترة البيانات (التاريخ datetime64 من crud فلا حاجة لإعادة التحويل)
         filtered_appointments = appointments_df[
-            (appointments_df['appointment_date'] >= start_date) & 
-            (appointments_df['appointment_date'] <= end_date)
+            in_period(appointments_df['appointment_date'], start_date, end_date)
         ]
         
         if filtered_appointments.empty:
@@ -220,7 +219,7 @@ def doctors_performance():
             return
         
         # حساب إحصائيات الأداء لكل طبيب
-        performance_stats = filtered_appointments.groupby('doctor_name').agg({
+        performance_stats = filtered_appointments.groupby('doctor_name', observed=True).agg({
             'id': 'count',  # عدد المواعيد
             'total_cost': ['sum', 'mean']  # إجمالي ومتوسط التكلفة
         }).round(2)
@@ -349,6 +348,14 @@ def doctors_salaries():
         # حساب الرواتب مع العمولات
         appointments_df = crud.get_all_appointments()
         
+        # إيرادات الشهر المحدد لكل الأطباء في تجميع واحد
+        appointment_dates = appointments_df['appointment_date']
+        monthly_appointments = appointments_df[
+            (appointment_dates.dt.month == selected_month) &
+            (appointment_dates.dt.year == selected_year)
+        ]
+        monthly_revenues = monthly_appointments.groupby('doctor_name', observed=True)['total_cost'].sum()
+        
         salary_data = []
         
         for _, doctor in doctors_df.iterrows():
@@ -356,23 +363,8 @@ def doctors_salaries():
             base_salary = doctor['salary']
             
             # حساب العمولة من المواعيد في الشهر المحدد
-            if not appointments_df.empty:
-                doctor_appointments = appointments_df[
-                    appointments_df['doctor_name'] == doctor['name']
-                ]
-                
-                # فلترة حسب الشهر والسنة
-                doctor_appointments['appointment_date'] = pd.to_datetime(doctor_appointments['appointment_date'])
-                monthly_appointments = doctor_appointments[
-                    (doctor_appointments['appointment_date'].dt.month == selected_month) &
-                    (doctor_appointments['appointment_date'].dt.year == selected_year)
-                ]
-                
-                monthly_revenue = monthly_appointments['total_cost'].sum()
-                commission = monthly_revenue * (doctor['commission_rate'] / 100)
-            else:
-                monthly_revenue = 0
-                commission = 0
+            monthly_revenue = monthly_revenues.get(doctor['name'], 0)
+            commission = monthly_revenue * (doctor['commission_rate'] / 100)
             
             total_salary = base_salary + commission
             
@@ -489,31 +481,11 @@ def show_doctor_details(doctors_df):
             """)
 
 def save_doctors_changes(edited_df, original_df):
-    """حفظ تعديلات الأطباء"""
+    """حفظ تعديلات الأطباء (الخلايا المتغيرة فقط في معاملة واحدة)"""
     try:
-        for idx, row in edited_df.iterrows():
-            original_row = original_df[original_df['id'] == row['id']].iloc[0]
-            
-            # التحقق من وجود تغييرات
-            if (row['name'] != original_row['name'] or 
-                row['specialization'] != original_row['specialization'] or
-                row['phone'] != original_row['phone'] or
-                row['email'] != original_row['email'] or
-                row['salary'] != original_row['salary'] or
-                row['commission_rate'] != original_row['commission_rate']):
-                
-                crud.update_doctor(
-                    doctor_id=row['id'],
-                    name=row['name'],
-                    specialization=row['specialization'],
-                    phone=row['phone'],
-                    email=row['email'],
-                    address=original_row['address'],
-                    salary=row['salary'],
-                    commission_rate=row['commission_rate']
-                )
+        updated = crud.save_grid_changes('doctors', original_df, edited_df)
         
-        show_success_message("تم حفظ التعديلات بنجاح")
+        show_success_message(f"تم حفظ التعديلات بنجاح ({updated} سجل)")
         st.rerun()
         
     except Exception as e:
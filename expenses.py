@@ -1,6 +1,7 @@
 import streamlit as st
 from datetime import date
 from database.crud import crud
+from utils.helpers import date_column_config
 
 def render():
     """صفحة إدارة المصروفات"""
@@ -28,6 +29,7 @@ def render_all_expenses():
         st.dataframe(
             expenses[['id', 'category', 'description', 'amount', 'expense_date', 
                      'payment_method', 'receipt_number']],
+            column_config=date_column_config(expenses),
             use_container_width=True,
             hide_index=True
         )
@@ -4,7 +4,8 @@ import plotly.express as px
 import plotly.graph_objects as go
 from datetime import date, datetime, timedelta
 from database.crud import crud
-from utils.helpers import format_currency, show_success_message, show_error_message
+from database.schema import in_period
+from utils.helpers import format_currency, show_success_message, show_error_message, date_column_config
 
 def show_financial_dashboard():
     st.title("📊 لوحة التحكم المالية")
@@ -45,21 +46,10 @@ def show_financial_overview(start_date, end_date):
         expenses_df = crud.get_all_expenses()
         appointments_df = crud.get_all_appointments()
         
-        # فلترة البيانات حسب التاريخ
-        if not payments_df.empty:
-            payments_df['payment_date'] = pd.to_datetime(payments_df['payment_date']).dt.date
-            payments_df = payments_df[(payments_df['payment_date'] >= start_date) & 
-                                    (payments_df['payment_date'] <= end_date)]
-        
-        if not expenses_df.empty:
-            expenses_df['expense_date'] = pd.to_datetime(expenses_df['expense_date']).dt.date
-            expenses_df = expenses_df[(expenses_df['expense_date'] >= start_date) & 
-                                    (expenses_df['expense_date'] <= end_date)]
-        
-        if not appointments_df.empty:
-            appointments_df['appointment_date'] = pd.to_datetime(appointments_df['appointment_date']).dt.date
-            appointments_df = appointments_df[(appointments_df['appointment_date'] >= start_date) & 
-                                            (appointments_df['appointment_date'] <= end_date)]
+        # فلترة البيانات حسب التاريخ (أعمدة التاريخ datetime64 من crud)
+        payments_df = payments_df[in_period(payments_df['payment_date'], start_date, end_date)]
+        expenses_df = expenses_df[in_period(expenses_df['expense_date'], start_date, end_date)]
+        appointments_df = appointments_df[in_period(appointments_df['appointment_date'], start_date, end_date)]
         
         # عرض الإحصائيات الرئيسية
         col1, col2, col3, col4 = st.columns(4)
@@ -109,14 +99,12 @@ def show_doctors_reports(start_date, end_date):
             return
         
         # فلترة البيانات
-        appointments_df['appointment_date'] = pd.to_datetime(appointments_df['appointment_date']).dt.date
         filtered_appointments = appointments_df[
-            (appointments_df['appointment_date'] >= start_date) & 
-            (appointments_df['appointment_date'] <= end_date)
+            in_period(appointments_df['appointment_date'], start_date, end_date)
         ]
         
         # إحصائيات الأطباء
-        doctor_stats = filtered_appointments.groupby('doctor_name').agg({
+        doctor_stats = filtered_appointments.groupby('doctor_name', observed=True).agg({
             'id': 'count',
             'total_cost': ['sum', 'mean']
         }).round(2)
@@ -214,17 +202,15 @@ def show_patients_reports(start_date, end_date):
             return
         
         # فلترة البيانات
-        appointments_df['appointment_date'] = pd.to_datetime(appointments_df['appointment_date']).dt.date
         filtered_appointments = appointments_df[
-            (appointments_df['appointment_date'] >= start_date) & 
-            (appointments_df['appointment_date'] <= end_date)
+            in_period(appointments_df['appointment_date'], start_date, end_date)
         ]
         
         # إحصائيات المرضى
         patient_stats = filtered_appointments.groupby('patient_name').agg({
             'id': 'count',
             'total_cost': 'sum',
-            'doctor_name': lambda x: ', '.join(x.unique())
+            'doctor_name': lambda x: ', '.join(x.dropna().unique())
         }).round(2)
         
         if not patient_stats.empty:
@@ -273,14 +259,11 @@ def show_top_patients(patient_stats):
 def show_patients_payments_status(payments_df, start_date, end_date):
     """عرض حالة مدفوعات المرضى"""
     if not payments_df.empty:
-        payments_df['payment_date'] = pd.to_datetime(payments_df['payment_date']).dt.date
-        filtered_payments = payments_df[
-            (payments_df['payment_date'] >= start_date) & 
-            (payments_df['payment_date'] <= end_date)
-        ]
+        filtered_payments = payments_df[in_period(payments_df['payment_date'], start_date, end_date)]
         
-        # توزيع طرق الدفع
+        # توزيع طرق الدفع (بدون الطرق غير المستخدمة في الفترة)
         payment_methods = filtered_payments['payment_method'].value_counts()
+        payment_methods = payment_methods[payment_methods > 0]
         
         col1, col2 = st.columns(2)
         
@@ -351,15 +334,11 @@ def show_inventory_status(inventory_df):
 def show_expenses_analysis(expenses_df, start_date, end_date):
     """تحليل المصروفات"""
     if not expenses_df.empty:
-        expenses_df['expense_date'] = pd.to_datetime(expenses_df['expense_date']).dt.date
-        filtered_expenses = expenses_df[
-            (expenses_df['expense_date'] >= start_date) & 
-            (expenses_df['expense_date'] <= end_date)
-        ]
+        filtered_expenses = expenses_df[in_period(expenses_df['expense_date'], start_date, end_date)]
         
         if not filtered_expenses.empty:
             # توزيع المصروفات حسب الفئة
-            category_expenses = filtered_expenses.groupby('category')['amount'].sum().reset_index()
+            category_expenses = filtered_expenses.groupby('category', observed=True)['amount'].sum().reset_index()
             
             fig = px.bar(category_expenses, x='category', y='amount',
                         title="توزيع المصروفات حسب الفئة")
@@ -368,7 +347,7 @@ def show_expenses_analysis(expenses_df, start_date, end_date):
             # أعلى المصروفات
             st.subheader("🔝 أعلى المصروفات")
             top_expenses = filtered_expenses.nlargest(5, 'amount')[['description', 'amount', 'expense_date']]
-            st.dataframe(top_expenses, use_container_width=True)
+            st.dataframe(top_expenses, column_config=date_column_config(top_expenses), use_container_width=True)
 
 def show_expired_items(inventory_df):
     """عرض المواد المنتهية الصلاحية"""
@@ -378,99 +357,48 @@ def show_expired_items(inventory_df):
         expired_items = inventory_df[inventory_df['expiry_date'] < today]
         expiring_soon = inventory_df[
             (inventory_df['expiry_date'] >= today) & 
-            (inventory_df['expiry_date']_date'] <= <= today today + timedelta + timedelta(days=30))
+            (inventory_df['expiry_date'] <= today + timedelta(days=30))
         ]
         
-(days=30))
-        ]
+        if not expired_items.empty:
+            st.error(f"❌ يوجد {len(expired_items)} عنصر منتهي الصلاحية")
+            for _, item in expired_items.iterrows():
+                st.error(f"**{item['item_name']}** - انتهى في: {item['expiry_date']}")
         
-        if        if not not expired_items.empty:
-            st expired_items.empty:
-            st.error(f.error(f"❌ يوجد"❌ يوجد {len(expired {len(expired_items)} عنصر منتهي_items)} عنصر منتهي الصل الصلاحية")
-            forاحية")
-            for _, item _, item in expired_items in expired_items.iter.iterrows():
-                strows():
-                st.error(f.error(f"**{item"**{item['item['item_name']}_name']}** -** - انتهى انتهى في: في: {item['exp {item['expiry_dateiry_date']}")
-        
-']}")
-        
-        if        if not expiring not expiring_soon_soon.empty:
-            st.empty:
-            st.warning(f"⚠️ يوجد.warning(f"⚠️ {len(expiring يوجد {len(expiring_soon)} عن_soon)} عنصر سصر سينتهينتهي خلال 30 يوم")
-ي خلال 30 يوم")
-            for            for _, item in _, item in expiring_ expiring_soon.iterrows():
-soon.iterrows():
-                               st.warning(f st.warning(f""**{**{itemitem['item_name']}['item_name']}** - ينتهي في** - ينتهي في: {item['expiry: {item['expiry_date']}")
-
-def show_detailed_reports(start_date, end_date):
-_date']}")
+        if not expiring_soon.empty:
+            st.warning(f"⚠️ يوجد {len(expiring_soon)} عنصر سينتهي خلال 30 يوم")
+            for _, item in expiring_soon.iterrows():
+                st.warning(f"**{item['item_name']}** - ينتهي في: {item['expiry_date']}")
 
 def show_detailed_reports(start_date, end_date):
-    """تقارير مفصلة    """تقارير مفص"""
-    st.subheaderلة"""
-    st.subheader("📋("📋 تقارير مفصلة")
-    
- تقارير مفصلة")
-    
-       tab1, tab tab1, tab22, tab3, tab, tab3, tab4 = st.tabs(["4 = st.tabs(["الإيراداتالإيرادات",", "المصروفات "المصروفات", "المخزون", "المخزون", "التصد", "التصدير"])
+    """تقارير مفصلة"""
+    st.subheader("📋 تقارير مفصلة")
     
-    with tabير"])
+    tab1, tab2, tab3, tab4 = st.tabs(["الإيرادات", "المصروفات", "المخزون", "التصدير"])
     
     with tab1:
-        show1:
-        show_detailed_revenue_detailed_revenue_report_report(start_date, end(start_date, end_date_date)
-    
-    with tab)
+        show_detailed_revenue_report(start_date, end_date)
     
     with tab2:
-       2:
-        show_d show_detetailed_expailed_expenses_report(start_date, end_date)
-    
-enses_report(start_date, end_date)
+        show_detailed_expenses_report(start_date, end_date)
     
-    with tab3    with tab3:
-        show_detailed_inventory_report:
+    with tab3:
         show_detailed_inventory_report()
     
-   ()
-    
-    with tab4 with tab4:
-        show_export_options(start_date:
-        show_export_options(start_date, end_date, end_date)
+    with tab4:
+        show_export_options(start_date, end_date)
 
-def)
-
-def show_detailed show_detailed_revenue_report(start_date, end_revenue_report(start_date, end_date):
-    """_date):
-    """تقرتقرير الإيراداتير الإيرادات المفصل"""
-    payments_df المفصل"""
-    payments_df = crud.get = crud.get_all_payments()
-    appointments_df =_all_payments()
-    appointments_df = cr crud.get_all_appud.get_all_appointmentsointments()
-    
-    if()
-    
-    if not payments not payments_df.empty:
-       _df.empty:
-        payments_df['payment_date'] payments_df['payment_date'] = pd.to_datetime(p = pd.to_datetime(payments_dfayments_df['payment_date['payment_date']).dt']).dt.date
-.date
-               filtered_payments filtered_payments = payments_df[
-            (pay = payments_df[
-            (paymentsments_df['payment_date_df['payment_date'] >= start_date'] >= start_date) &) & 
- 
-            (payments_df            (payments_df['payment['payment_date']_date'] <= end_date)
- <= end_date)
-        ]
-        ]
-        
-        st.dataframe(filtered_payments, use_container_width=True)
+def show_detailed_revenue_report(start_date, end_date):
+    """تقرير الإيرادات المفصل"""
+    payments_df = crud.get_all_payments()
+    
+    if not payments_df.empty:
+        filtered_payments = payments_df[in_period(payments_df['payment_date'], start_date, end_date)]
         
-        # إح        
-        st.dataframe(filtered_payments, use_container_width=True)
+        st.dataframe(filtered_payments, column_config=date_column_config(filtered_payments), use_container_width=True)
         
-        # إحصائياتصائيات الإير الإيرادات
-ادات
-        revenue_stats        revenue_stats = filtered_payments.groupby('payment_method').agg({
+        # إحصائيات الإيرادات
+        revenue_stats = filtered_payments.groupby('payment_method', observed=True).agg({
             'amount': ['sum', 'count', 'mean']
         }).round(2)
         
@@ -483,40 +411,13 @@ def show_detailed_expenses_report(start_date, end_date):
     expenses_df = crud.get_all_expenses()
     
     if not expenses_df.empty:
-        expenses_df['expense_date'] = pd.to_datetime(expenses_df['expense_date']).dt.date
-        filtered_expenses = expenses_df = filtered_payments.groupby('payment_method').agg({
-            'amount': ['sum', 'count', 'mean']
-        }).round(2)
+        filtered_expenses = expenses_df[in_period(expenses_df['expense_date'], start_date, end_date)]
         
-        if not revenue_stats.empty:
-            st.subheader("إحصائيات الإيرادات حسب طريقة الدفع")
-            st.dataframe(revenue_stats, use_container_width=True)
+        st.dataframe(filtered_expenses, column_config=date_column_config(filtered_expenses), use_container_width=True)
 
-def show_detailed_expenses_report(start_date, end_date):
-    """تقرير المصروفات المفصل"""
-    expenses_df = crud.get_all_expenses()
-    
-    if not expenses_df.empty:
-        expenses_df['expense_date'] = pd.to_datetime(expenses_df['expense_date']).dt.date
-        filtered_expenses = expenses_df[
-           [
-            (expenses_df (expenses_df['exp['expense_date'] >=ense_date'] >= start start_date) &_date) & 
-            
-            (expenses_df (expenses_df['exp['expense_date'] <= end_date)
-        ]
-        
-        st.dataframe(filtered_expenses, useense_date'] <= end_date)
-        ]
-        
-        st.dataframe(filtered_expenses_container_width=True)
-
-, use_container_width=True)
-
-def show_detailed_indef show_detailed_inventory_report():
-    """تventory_report():
-    """قرير المخزتقرير المخزون المفصل"""
-    inventoryون المفصل"""
-    inventory_df = crud.get_df = crud.get_all_inventory()
+def show_detailed_inventory_report():
+    """تقرير المخزون المفصل"""
+    inventory_df = crud.get_all_inventory()
     
     if not inventory_df.empty:
         st.dataframe(inventory_df, use_container_width=True)
@@ -535,233 +436,126 @@ def show_export_options(start_date, end_date):
         if st.button("📥 تصدير تقرير المصروفات"):
             export_expenses_report(start_date, end_date)
     
-   _all_inventory()
-    
-    if not inventory_df.empty:
-        st.dataframe(inventory_df, use_container_width=True)
-
-def show_export_options(start_date, end_date):
-    """خيارات تصدير التقارير"""
-    st.subheader("📤 تصدير التقارير")
-    
-    col1, col2, col3 = st.columns(3)
-    
-    with col1:
-        if st.button("📥 تصدير تقرير الإيرادات"):
-            export_revenue_report(start_date, end_date)
-    
-    with col2:
-        if st.button("📥 تصدير تقرير المصروفات"):
-            export_expenses_report with col3:
-        if(start_date, end_date)
-    
     with col3:
-        if st.button("📥 تص st.button("دير تقرير📥 تصدير تقرير المخزون"):
-            المخزون"):
+        if st.button("📥 تصدير تقرير المخزون"):
             export_inventory_report()
 
- export_inventory_report()
-
-defdef export_revenue_report export_revenue_report(start_date(start_date, end_date):
-, end_date):
-    """تصدير    """تصدير تق تقرير الإيررير الإيرادات"""
-ادات"""
-    payments_df = crud.get_all    payments_df = crud.get_all_payments()
+def export_revenue_report(start_date, end_date):
+    """تصدير تقرير الإيرادات"""
+    payments_df = crud.get_all_payments()
     
     if not payments_df.empty:
-       _payments()
-    
-    if not payments_df.empty:
-        payments payments_df['payment_df['payment_date']_date'] = pd.to_datetime(payments_df['payment_date']).dt.date
-        filtered_payments = payments_df[
-            ( = pd.to_datetime(payments_df['payment_date']).dt.date
-        filtered_payments = payments_df[
-            (payments_df['paymentpayments_df['payment_date'] >=_date'] >= start_date start_date) &) & 
-            (pay 
-            (payments_dfments_df['payment['payment_date'] <=_date'] <= end_date)
- end_date)
-        ]
-        ]
+        filtered_payments = payments_df[in_period(payments_df['payment_date'], start_date, end_date)]
         
-        csv =        
-        csv = filtered_p filtered_payments.to_csvayments.to_csv(index=False,(index=False, encoding=' encoding='utf-utf-8-s8-sig')
-        stig')
+        csv = filtered_payments.to_csv(index=False, encoding='utf-8-sig', date_format='%Y-%m-%d')
         st.download_button(
-.download_button(
-            label            label="="📥 تحميل📥 تحميل تقر تقرير الإير الإيرادات",
-يرادات",
-            data=c            data=csv,
-sv,
-            file_name            file_name=f"=f"revenue_reportrevenue_report_{date.t_{date.today()}.oday()}.csv",
-csv",
-            mime="            mime="texttext/csv"
-       /csv"
+            label="📥 تحميل تقرير الإيرادات",
+            data=csv,
+            file_name=f"revenue_report_{date.today()}.csv",
+            mime="text/csv"
         )
 
-def )
-
-def export_exp export_expenses_reportenses_report(start_date, end(start_date, end_date):
-    """تصدير_date):
-    """تصد تقرير المصروفير تقرير المصروفات"""
-    expenses_dfات"""
-    expenses_df = = crud.get_all_expenses()
-    
-    if crud.get_all_expenses()
+def export_expenses_report(start_date, end_date):
+    """تصدير تقرير المصروفات"""
+    expenses_df = crud.get_all_expenses()
     
     if not expenses_df.empty:
-        not expenses_df.empty:
-        expenses_df['exp expenses_df['expense_date'] = pd.toense_date'] = pd.to_datetime_datetime(expenses_df['expense(expenses_df['expense_date_date']).dt.date
-       ']).dt.date
-        filtered_expenses = filtered_expenses = expenses_df expenses_df[
-            (expenses[
-            (expenses_df['expense_date_df['expense_date'] >= start_date) &'] >= start_date) & 
-            (expenses 
-            (expenses_df_df['expense_date['expense_date'] <= end_date)
-       '] <= end_date)
-        ]
-        
-        csv ]
+        filtered_expenses = expenses_df[in_period(expenses_df['expense_date'], start_date, end_date)]
         
-        csv = filtered_expenses = filtered_expenses.to_csv.to_csv(index=False, encoding='utf(index=False, encoding='utf-8-sig-8-sig')
-       ')
-        st.download_button st.download_button(
-            label="📥(
-            label="📥 تحميل تق تحميل تقررير المصروفات",
-ير المصروفات",
+        csv = filtered_expenses.to_csv(index=False, encoding='utf-8-sig', date_format='%Y-%m-%d')
+        st.download_button(
+            label="📥 تحميل تقرير المصروفات",
             data=csv,
-                       data=csv,
-            file_name=f"exp file_name=f"expensesenses_report_{date.t_report_{date.today()}.csv",
-           oday() mime="text}.csv",
+            file_name=f"expenses_report_{date.today()}.csv",
             mime="text/csv"
         )
 
-def/csv"
-        )
-
 def export_inventory_report():
-    export_inventory_report():
-    """تصدير """تصدير تقرير المخزون تقرير المخزون"""
-    inventory_df"""
-    inventory_df = = crud.get_all_in crud.get_all_inventory()
-    
-   ventory()
+    """تصدير تقرير المخزون"""
+    inventory_df = crud.get_all_inventory()
     
     if not inventory_df.empty:
- if not inventory_df.empty:
-        csv = inventory_df.to        csv = inventory_df.to_csv(index=False, encoding_csv(index=False,='utf-8-s encoding='utf-8-sig')
-        st.dig')
-        st.downloadownload_button(
-            label_button(
-            label="📥 تحميل="📥 تحميل تقرير المخ تقرير المخزونزون",
-            data=c",
+        csv = inventory_df.to_csv(index=False, encoding='utf-8-sig')
+        st.download_button(
+            label="📥 تحميل تقرير المخزون",
             data=csv,
-            file_name=f"inventory_report_{date.today()}.csvsv,
             file_name=f"inventory_report_{date.today()}.csv",
-",
-            mime="            mime="text/ctext/csv"
+            mime="text/csv"
         )
 
-sv"
+def show_top_doctors_performance(appointments_df, payments_df):
+    """عرض أفضل الأطباء أداءً"""
+    if not appointments_df.empty:
+        top_doctors = (
+            appointments_df.groupby('doctor_name', observed=True)['total_cost'].sum()
+            .nlargest(5).reset_index()
         )
+        
+        fig = px.bar(top_doctors, x='doctor_name', y='total_cost',
+                    title="أعلى 5 أطباء من حيث الإيرادات")
+        st.plotly_chart(fig, use_container_width=True)
+    else:
+        st.info("لا توجد جلسات في هذه الفترة")
 
-defdef show_revenue show_revenue_vs_vs_expenses_chart_expenses_chart(payments(payments_df, expenses_df_df, expenses_df, start, start_date,_date, end_date end_date):
-    """ع):
-    """عرض مخططرض مخطط الإيرادات vs الإيرادات vs المص المصروفاتروفات"""
-   """
-    # تجميع البيانات يوم # تجميع البيانات يومياًياً
-    if not payments_df.empty:
-        daily_revenue
+def show_expenses_breakdown(expenses_df):
+    """عرض توزيع المصروفات حسب الفئة"""
+    if not expenses_df.empty:
+        category_expenses = expenses_df.groupby('category', observed=True)['amount'].sum().reset_index()
+        
+        fig = px.pie(category_expenses, values='amount', names='category',
+                    title="توزيع المصروفات حسب الفئة")
+        st.plotly_chart(fig, use_container_width=True)
+    else:
+        st.info("لا توجد مصروفات في هذه الفترة")
+
+def show_revenue_vs_expenses_chart(payments_df, expenses_df, start_date, end_date):
+    """عرض مخطط الإيرادات vs المصروفات"""
+    # تجميع البيانات يومياً
     if not payments_df.empty:
         daily_revenue = payments_df.groupby('payment_date')['amount'].sum().reset_index()
         daily_revenue.columns = ['date', 'revenue']
     else:
-        daily_revenue = pd.DataFrame(columns=['date', = payments_df.groupby('payment_date')['amount'].sum().reset_index()
-        daily_revenue.columns = ['date', 'revenue']
-    else:
-        daily_revenue = pd.DataFrame(columns=['date', 'revenue'])
-    
-    'revenue'])
+        daily_revenue = pd.DataFrame({'date': pd.Series(dtype='datetime64[ns]'), 'revenue': pd.Series(dtype=float)})
     
- if not expenses_df.empty:
     if not expenses_df.empty:
-        daily_exp        daily_expenses =enses = expenses_df.groupby(' expenses_df.groupby('expense_date')['amountexpense_date')['amount'].sum().reset'].sum().reset_index()
-        daily_expenses.columns_index()
-        daily_expenses.columns = ['date', ' = ['date', 'expenses']
-    elseexpenses']
+        daily_expenses = expenses_df.groupby('expense_date')['amount'].sum().reset_index()
+        daily_expenses.columns = ['date', 'expenses']
     else:
-:
-        daily_expenses        daily_expenses = pd = pd.DataFrame(columns=['.DataFrame(columns=['date',date', 'exp 'expenses'])
-enses'])
-    
-    # د    
-    # دمج البياناتمج البيانات
-    dates
-    dates = pd = pd.date_range.date_range(start=start(start=start_date, end_date, end=end=end_date, freq='_date, freq='D')
-D')
-    comparison    comparison_df = pd_df = pd.DataFrame({'date.DataFrame({'date': dates': dates})
+        daily_expenses = pd.DataFrame({'date': pd.Series(dtype='datetime64[ns]'), 'expenses': pd.Series(dtype=float)})
     
-    comparison})
+    # دمج البيانات (التواريخ datetime64 في الجهتين)
+    dates = pd.date_range(start=start_date, end=end_date, freq='D')
+    comparison_df = pd.DataFrame({'date': dates})
     
-    comparison_df =_df = comparison_df comparison_df.merge(daily.merge(daily_revenue_revenue, on, on='date', how='date', how='left='left')
-    comparison_df')
-    comparison_df = comparison = comparison_df.merge_df.merge(daily(daily_expenses,_expenses, on=' on='date', how='date', how='left')
-left')
-    comparison    comparison_df_df = comparison_df.fill = comparison_df.fillna(na(0)
+    comparison_df = comparison_df.merge(daily_revenue, on='date', how='left')
+    comparison_df = comparison_df.merge(daily_expenses, on='date', how='left')
+    comparison_df = comparison_df.fillna(0)
     
-   0)
-    
-    # إن # إنشاء المخططشاء المخطط
-    fig = go.Figure
+    # إنشاء المخطط
     fig = go.Figure()
     
-    fig.add_t()
-    
-    fig.add_trace(go.Scatterrace(go.Scatter(
-(
-        x=compar        x=comparisonison_df['date'],
-       _df['date'],
-        y=comparison y=comparison_df['_df['revenue'],
-       revenue'],
-        name=' name='الإالإيرادات',
-        lineيرادات',
-        line=dict(color='#2E8B57=dict(color='#2E8B57', width=3', width=3)
-    ))
-    
-    fig)
+    fig.add_trace(go.Scatter(
+        x=comparison_df['date'],
+        y=comparison_df['revenue'],
+        name='الإيرادات',
+        line=dict(color='#2E8B57', width=3)
     ))
     
-    fig.add_trace(go.Sc.add_trace(goatter(
-        x=.Scatter(
-        xcomparison_df['date=comparison_df['date'],
-        y=comparison'],
-        y=compar_df['expenses'],
-ison_df['expenses        name='المص'],
+    fig.add_trace(go.Scatter(
+        x=comparison_df['date'],
+        y=comparison_df['expenses'],
         name='المصروفات',
-        lineروفات',
-        line=dict(color='#DC=dict(color='#143C', width=DC143C', width=3)
+        line=dict(color='#DC143C', width=3)
     ))
-3)
-    ))
-    
-    fig.update_layout(
     
     fig.update_layout(
-        title="الإيرادات        title="الإيرادات vs المصروفات",
-        vs المصروفات",
-        xaxis_title=" xaxis_title="التاريخ",
-        yaxisالتاريخ",
-        yaxis_title="_title="المبلغ (جالمبلغ (ج.م.م)",
-        hovermode)",
+        title="الإيرادات vs المصروفات",
+        xaxis_title="التاريخ",
+        yaxis_title="المبلغ (ج.م)",
         hovermode='x unified'
-='x unified'
-    )
     )
     
-    st.plot    
-    st.plotly_chly_chart(figart(fig,, use_container use_container_width=True)
-
-if __name__ ==_width=True)
+    st.plotly_chart(fig, use_container_width=True)
 
-if __name__ == "__main "__main____":
-":
-    show_fin    show_financial_dancialashboard()
+if __name__ == "__main__":
+    show_financial_dashboard()
@@ -143,7 +143,7 @@ def render_patient_report():
     if generate_report:
         with st.spinner("جاري إنشاء التقرير..."):
             # جلب جميع بيانات المريض
-            report_data = crud.get_patient_full_report(patient_id)
+            report_data = crud.get_patient_detailed_report(patient_id)
             
             if not report_data['patient']:
                 st.error("لم يتم العثور على المريض")
@@ -1,8 +1,9 @@
 import streamlit as st
-import pandas as pd
 from datetime import date, timedelta
 import plotly.express as px
 from database.crud import crud
+from components.patient_selector import PatientSelector
+from utils.helpers import date_column_config
 
 def render():
     """صفحة إدارة المدفوعات"""
@@ -37,7 +38,7 @@ def render_all_payments():
             'طريقة الدفع', 'التاريخ', 'الحالة'
         ]
         
-        st.dataframe(display_df, use_container_width=True, hide_index=True)
+        st.dataframe(display_df, column_config=date_column_config(display_df), use_container_width=True, hide_index=True)
         
         # الإحصائيات
         col1, col2, col3 = st.columns(3)
@@ -59,41 +60,31 @@ def render_add_payment():
     """نموذج إضافة دفعة جديدة"""
     st.markdown("#### إضافة دفعة جديدة")
     
-    patients = crud.get_all_patients()
-    appointments = crud.get_all_appointments()
+    patient_id = PatientSelector.render(key="payment_patient")
     
-    if not patients.empty:
+    if patient_id is not None:
+        # مواعيد المريض المختار غير المسددة فقط، بدلاً من كل مواعيد العيادة
+        appointments = crud.get_open_appointments(patient_id)
+        open_appointments = appointments.set_index('id')
         appointment_id = st.selectbox(
             "الموعد (اختياري)",
-            [None] + appointments['id'].tolist() if not appointments.empty else [None],
-            format_func=lambda x: "دفعة بدون موعد" if x is None else 
-                f"موعد #{x} - {appointments[appointments['id']==x]['patient_name'].iloc[0]} - {appointments[appointments['id']==x]['treatment_name'].iloc[0]}"
+            [None] + appointments['id'].tolist(),
+            format_func=lambda x: "دفعة بدون موعد" if x is None else
+                f"موعد #{x} - {open_appointments.at[x, 'appointment_date']} - {open_appointments.at[x, 'treatment_name']} "
+                f"(المتبقي {open_appointments.at[x, 'remaining']:,.2f} ج.م)"
         )
         
         col1, col2 = st.columns(2)
         
         with col1:
             if appointment_id:
-                appointment_data = appointments[appointments['id'] == appointment_id].iloc[0]
-                patient_name = appointment_data['patient_name']
-                amount = st.number_input("المبلغ (ج.م)*", value=float(appointment_data['total_cost']), min_value=0.0, step=10.0)
+                appointment_data = open_appointments.loc[appointment_id]
+                amount = st.number_input("المبلغ (ج.م)*", value=float(appointment_data['remaining']), min_value=0.0, step=10.0)
                 
-                st.info(f"المريض: {patient_name}")
+                st.info(f"الطبيب: {appointment_data['doctor_name']} - مدفوع {appointment_data['paid']:,.2f} من {appointment_data['total_cost']:,.2f} ج.م")
                 
-                treatments = crud.get_all_treatments()
-                if not treatments.empty:
-                    treatment_name = appointment_data['treatment_name']
-                    treatment_info = treatments[treatments['name'] == treatment_name]
-                    
-                    if not treatment_info.empty:
-                        doctor_pct = treatment_info['doctor_percentage'].iloc[0]
-                        clinic_pct = treatment_info['clinic_percentage'].iloc[0]
-                    else:
-                        doctor_pct = 50.0
-                        clinic_pct = 50.0
-                else:
-                    doctor_pct = 50.0
-                    clinic_pct = 50.0
+                doctor_pct = appointment_data['doctor_percentage']
+                clinic_pct = appointment_data['clinic_percentage']
                 
                 st.markdown("---")
                 st.markdown("##### 💰 توزيع المبلغ التلقائي:")
@@ -105,14 +96,7 @@ def render_add_payment():
                 with col_b:
                     clinic_share = (amount * clinic_pct) / 100
                     st.info(f"🏥 العيادة ({clinic_pct}%): **{clinic_share:,.2f} ج.م**")
-                
-                patient_id = patients[patients['name'] == patient_name]['id'].iloc[0]
             else:
-                patient_id = st.selectbox(
-                    "المريض*",
-                    patients['id'].tolist(),
-                    format_func=lambda x: patients[patients['id'] == x]['name'].iloc[0]
-                )
                 amount = st.number_input("المبلغ (ج.م)*", min_value=0.0, step=10.0)
                 
                 st.warning("⚠️ دفعة بدون موعد - ستذهب 100% للعيادة")
@@ -137,8 +121,6 @@ def render_add_payment():
                     st.error(f"حدث خطأ: {str(e)}")
             else:
                 st.warning("الرجاء إدخال مبلغ صحيح")
-    else:
-        st.warning("يجب إضافة مرضى أولاً")
 
 def render_doctor_earnings():
     """عرض أرباح الأطباء"""
@@ -150,39 +132,41 @@ def render_doctor_earnings():
     with col2:
         end_date = st.date_input("إلى تاريخ", value=date.today(), key="doc_earnings_end")
     
-    doctors = crud.get_all_doctors()
+    breakdowns = {"بدون تفصيل": (), "حسب العلاج": ('treatment',), "حسب الشهر": ('month',)}
+    breakdown = st.radio("التفصيل", list(breakdowns), horizontal=True, key="doc_earnings_breakdown")
+    
+    # كل الأطباء في تجميع واحد
+    earnings = crud.get_doctors_earnings(start_date.isoformat(), end_date.isoformat(), breakdowns[breakdown])
     
-    if not doctors.empty:
-        earnings_data = []
+    if earnings.empty:
+        st.info("لا توجد بيانات للفترة المحددة")
+        return
+    
+    if breakdowns[breakdown]:
+        detail = breakdowns[breakdown][0]
+        label = earnings['treatment_name'].fillna('بدون علاج') if detail == 'treatment' else earnings['month']
+        earnings_df = earnings.assign(detail=label)[['doctor_name', 'detail', 'payment_count', 'total_earnings', 'avg_percentage']]
+        earnings_df.columns = ['الطبيب', 'العلاج' if detail == 'treatment' else 'الشهر', 'عدد المدفوعات', 'إجمالي الأرباح', 'متوسط النسبة']
+        st.dataframe(earnings_df, use_container_width=True, hide_index=True)
         
-        for _, doctor in doctors.iterrows():
-            earnings = crud.get_doctor_earnings(
-                doctor['id'], 
-                start_date.isoformat(), 
-                end_date.isoformat()
-            )
-            
-            if not earnings.empty and earnings.iloc[0]['total_earnings'] is not None:
-                earnings_data.append({
-                    'الطبيب': doctor['name'],
-                    'التخصص': doctor['specialization'],
-                    'عدد المدفوعات': int(earnings.iloc[0]['payment_count'] or 0),
-                    'إجمالي الأرباح': float(earnings.iloc[0]['total_earnings'] or 0),
-                    'متوسط النسبة': float(earnings.iloc[0]['avg_percentage'] or 0)
-                })
+        fig = px.bar(
+            earnings_df,
+            x='الطبيب',
+            y='إجمالي الأرباح',
+            color=earnings_df.columns[1],
+            title='أرباح الأطباء'
+        )
+    else:
+        earnings_df = earnings[['doctor_name', 'specialization', 'payment_count', 'total_earnings', 'avg_percentage']].copy()
+        earnings_df.columns = ['الطبيب', 'التخصص', 'عدد المدفوعات', 'إجمالي الأرباح', 'متوسط النسبة']
+        st.dataframe(earnings_df, use_container_width=True, hide_index=True)
         
-        if earnings_data:
-            earnings_df = pd.DataFrame(earnings_data)
-            st.dataframe(earnings_df, use_container_width=True, hide_index=True)
-            
-            # رسم بياني
-            fig = px.bar(
-                earnings_df,
-                x='الطبيب',
-                y='إجمالي الأرباح',
-                color='التخصص',
-                title='أرباح الأطباء'
-            )
-            st.plotly_chart(fig, use_container_width=True)
-        else:
-            st.info("لا توجد بيانات للفترة المحددة")
+        # رسم بياني
+        fig = px.bar(
+            earnings_df,
+            x='الطبيب',
+            y='إجمالي الأرباح',
+            color='التخصص',
+            title='أرباح الأطباء'
+        )
+    st.plotly_chart(fig, use_container_width=True)
@@ -0,0 +1,111 @@
+import streamlit as st
+import pandas as pd
+import plotly.express as px
+from database.crud import crud
+from database.profiler import profiler
+
+def render():
+    """صفحة مراقبة أداء الاستعلامات"""
+    st.markdown("### ⏱️ أداء الاستعلامات")
+
+    tab1, tab2, tab3, tab4 = st.tabs(["🏆 أبطأ العمليات", "🧾 الاستعلامات", "🐢 سجل الاستعلامات البطيئة", "⚙️ الإعدادات"])
+
+    with tab1:
+        render_top_operations()
+
+    with tab2:
+        render_top_queries()
+
+    with tab3:
+        render_slow_query_log()
+
+    with tab4:
+        render_profiler_settings()
+
+def render_top_operations():
+    """أكثر عمليات CRUD استهلاكاً للوقت"""
+    limit = st.slider("عدد العمليات", 5, 50, 15, key="qs_ops_limit")
+    operations = pd.DataFrame(profiler.top_operations(limit=limit))
+
+    if operations.empty:
+        st.info("لا توجد بيانات بعد - تصفح صفحات النظام ثم عد إلى هنا")
+        return
+
+    display_df = operations[[
+        'operation', 'calls', 'total_ms', 'p50_ms', 'p95_ms', 'p99_ms',
+        'max_ms', 'db_ms', 'frame_ms', 'rows'
+    ]].copy()
+    display_df.columns = [
+        'العملية', 'عدد الاستدعاءات', 'إجمالي الوقت (ms)', 'p50', 'p95', 'p99',
+        'الأقصى', 'وقت قاعدة البيانات', 'وقت بناء DataFrame', 'الصفوف'
+    ]
+    st.dataframe(display_df, use_container_width=True, hide_index=True)
+
+    fig = px.bar(
+        operations.head(10),
+        x='operation',
+        y=['db_ms', 'frame_ms'],
+        title='توزيع الوقت: قاعدة البيانات مقابل بناء DataFrame',
+        labels={'value': 'ms', 'operation': 'العملية'}
+    )
+    st.plotly_chart(fig, use_container_width=True)
+
+    if st.button("🔄 تصفير الإحصائيات", key="qs_reset"):
+        profiler.reset()
+        st.rerun()
+
+def render_top_queries():
+    """الاستعلامات مرتبة حسب إجمالي الوقت"""
+    limit = st.slider("عدد الاستعلامات", 5, 50, 15, key="qs_queries_limit")
+    queries = pd.DataFrame(profiler.top_queries(limit=limit))
+
+    if queries.empty:
+        st.info("لا توجد استعلامات مسجلة")
+        return
+
+    st.dataframe(
+        queries[['sql', 'calls', 'total_ms', 'p50_ms', 'p95_ms', 'p99_ms', 'max_ms', 'rows']],
+        use_container_width=True,
+        hide_index=True
+    )
+
+def render_slow_query_log():
+    """الاستعلامات التي تجاوزت الحد المسموح"""
+    st.caption(f"الحد الحالي: {profiler.slow_query_ms:.0f} ms - السجل الدوري: {profiler.log_path or 'معطل'}")
+
+    summary = crud.get_slow_query_summary(limit=20)
+    if summary.empty:
+        st.success("✅ لا توجد استعلامات بطيئة مسجلة")
+        return
+
+    st.dataframe(summary, use_container_width=True, hide_index=True)
+
+    st.markdown("#### آخر الاستعلامات البطيئة")
+    slow = crud.get_slow_queries(limit=20)
+    for _, row in slow.iterrows():
+        with st.expander(f"{row['total_ms']:.1f} ms - {row['operation'] or '-'} - {row['created_at']}"):
+            st.code(row['sql'], language='sql')
+            st.markdown("**خطة التنفيذ (EXPLAIN QUERY PLAN):**")
+            st.code(row['query_plan'] or '-', language='text')
+            st.caption(f"الصفوف: {row['rows']} - التنفيذ: {row['exec_ms']:.1f} ms - الجلب: {row['fetch_ms']:.1f} ms")
+
+    if st.button("🗑️ مسح السجل", key="qs_clear"):
+        crud.clear_slow_queries()
+        st.rerun()
+
+def render_profiler_settings():
+    """إعدادات المراقبة"""
+    enabled = st.checkbox("تفعيل مراقبة الاستعلامات", value=profiler.enabled, key="qs_enabled")
+    threshold = st.number_input(
+        "حد الاستعلام البطيء (ms)",
+        min_value=1.0,
+        value=float(profiler.slow_query_ms),
+        step=10.0,
+        key="qs_threshold"
+    )
+
+    if st.button("💾 حفظ", type="primary", key="qs_save"):
+        crud.update_setting('query_profiling', '1' if enabled else '0')
+        crud.update_setting('slow_query_threshold_ms', str(threshold))
+        profiler.configure(enabled=enabled, slow_query_ms=threshold)
+        st.success("✅ تم حفظ إعدادات المراقبة")
@@ -1,181 +1,369 @@
+"""
+Patient report rendering for Cura Clinic App
+Precompiled templates, column-at-a-time table rows and a process-pool batch mode
+"""
+
+import argparse
+import html
+import os
+import sqlite3
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
 from datetime import datetime
+from string import Template
+
 import pandas as pd
 
+MISSING = 'غير محدد'
+COMPLETED_STATUS = 'مكتمل'
+
+# ========== القوالب (تُجهز مرة واحدة عند الاستيراد) ==========
+REPORT_TEMPLATE = Template("""
+<div class='patient-report'>
+    <div class='report-header'>
+        <h2>📋 تقرير شامل للمريض</h2>
+        <h3>$name</h3>
+        <p>تاريخ التقرير: $generated_at</p>
+    </div>
+    <div class='report-section'>
+        <h3>👤 المعلومات الشخصية</h3>
+        <table class='report-table'>
+            <tr><th>الاسم</th><td>$name</td></tr>
+            <tr><th>رقم الهاتف</th><td>$phone</td></tr>
+            <tr><th>البريد الإلكتروني</th><td>$email</td></tr>
+            <tr><th>العنوان</th><td>$address</td></tr>
+            <tr><th>تاريخ الميلاد</th><td>$date_of_birth</td></tr>
+            <tr><th>النوع</th><td>$gender</td></tr>
+            <tr><th>فصيلة الدم</th><td>$blood_type</td></tr>
+            <tr><th>الحساسية</th><td>$allergies</td></tr>
+            <tr><th>جهة الاتصال للطوارئ</th><td>$emergency_contact</td></tr>
+        </table>
+    </div>
+    <div class='report-section'>
+        <h3>📊 الإحصائيات العامة</h3>
+        <table class='report-table'>
+            <tr><th>إجمالي الزيارات</th><td>$total_visits زيارة</td></tr>
+            <tr><th>الزيارات المكتملة</th><td>$completed_visits زيارة</td></tr>
+            <tr><th>إجمالي التكاليف</th><td>$total_spent ج.م</td></tr>
+            <tr><th>المبلغ المدفوع</th><td>$total_paid ج.م</td></tr>
+            <tr><th>المبلغ المتبقي</th><td style='color: $pending_color;'>$total_pending ج.م</td></tr>
+        </table>
+    </div>
+$sections
+</div>
+""")
+
+SECTION_TEMPLATE = Template("""
+    <div class='report-section'>
+        <h3>$title</h3>
+        $body
+    </div>
+""")
+
+TABLE_TEMPLATE = Template(
+    "<table class='report-table'><thead><tr>$head</tr></thead><tbody>$rows</tbody></table>"
+)
+
+# صفحة مستقلة لملفات الدفعات (خارج ستريمليت)
+DOCUMENT_TEMPLATE = Template("""<!DOCTYPE html>
+<html lang='ar' dir='rtl'>
+<head>
+<meta charset='utf-8'>
+<title>$title</title>
+<style>
+body { font-family: 'Cairo', 'Segoe UI', Tahoma, sans-serif; margin: 24px; color: #1f2937; }
+.report-header { border-bottom: 2px solid #2563eb; margin-bottom: 16px; }
+.report-section { margin-bottom: 20px; page-break-inside: avoid; }
+.report-table { width: 100%; border-collapse: collapse; }
+.report-table th, .report-table td { border: 1px solid #e5e7eb; padding: 6px 10px; text-align: right; }
+.report-table th { background: #f3f4f6; }
+</style>
+</head>
+<body>$body</body>
+</html>
+""")
+
+# أعمدة الجداول: (العمود، العنوان، النوع)
+APPOINTMENT_COLUMNS = [
+    ('appointment_date', 'التاريخ', 'text'),
+    ('appointment_time', 'الوقت', 'text'),
+    ('doctor_name', 'الطبيب', 'text'),
+    ('treatment_name', 'العلاج', 'text'),
+    ('status', 'الحالة', 'text'),
+    ('total_cost', 'التكلفة', 'money'),
+]
+PAYMENT_COLUMNS = [
+    ('payment_date', 'التاريخ', 'text'),
+    ('amount', 'المبلغ', 'money'),
+    ('payment_method', 'طريقة الدفع', 'text'),
+    ('status', 'الحالة', 'text'),
+    ('notes', 'ملاحظات', 'text'),
+]
+TREATMENT_COLUMNS = [
+    ('treatment_name', 'العلاج', 'text'),
+    ('usage_count', 'عدد المرات', 'text'),
+]
+
+PATIENT_FIELDS = {
+    'phone': MISSING, 'email': MISSING, 'address': MISSING, 'date_of_birth': MISSING,
+    'gender': MISSING, 'blood_type': MISSING, 'allergies': 'لا يوجد', 'emergency_contact': MISSING,
+}
+
+
+# ========== تنسيق الصفوف ==========
+def _format_column(values, kind):
+    if kind == 'money':
+        return [f"{0 if v is None or v != v else v:,.2f} ج.م" for v in values]
+    # الأسماء والحالات تتكرر كثيراً، فيُهرب كل قيمة مختلفة مرة واحدة
+    escaped = {v: '' if v is None or v != v else html.escape(str(v)) for v in set(values)}
+    return [escaped[v] for v in values]
+
+
+def render_rows(frame, columns):
+    """One ``<tr>`` string per row of ``frame``.
+
+    Each column is formatted in one pass over its values and the cells are
+    then zipped into rows, so there is no per-row pandas access.
+    """
+    cells = [_format_column(frame[column].tolist(), kind) for column, _, kind in columns]
+    return ['<tr><td>' + '</td><td>'.join(row) + '</td></tr>' for row in zip(*cells)]
+
+
+def _table(title, columns, rows):
+    head = ''.join(f'<th>{label}</th>' for _, label, _ in columns)
+    return SECTION_TEMPLATE.substitute(title=title, body=TABLE_TEMPLATE.substitute(head=head, rows=rows))
+
+
+def _text(value, default):
+    if value is None or value == '' or (isinstance(value, float) and value != value):
+        return default
+    return html.escape(str(value))
+
+
+def _render_report(patient, stats, appointment_rows, payment_rows, treatment_rows, generated_at):
+    """Fill the report template; ``*_rows`` are joined ``<tr>`` strings ('' hides the section)"""
+    sections = []
+    if patient.get('medical_history'):
+        sections.append(SECTION_TEMPLATE.substitute(
+            title='📝 التاريخ الطبي', body=f"<p>{_text(patient['medical_history'], '')}</p>"))
+    if patient.get('notes'):
+        sections.append(SECTION_TEMPLATE.substitute(
+            title='📌 ملاحظات', body=f"<p>{_text(patient['notes'], '')}</p>"))
+    if appointment_rows:
+        sections.append(_table('📅 سجل المواعيد', APPOINTMENT_COLUMNS, appointment_rows))
+    if payment_rows:
+        sections.append(_table('💰 سجل المدفوعات', PAYMENT_COLUMNS, payment_rows))
+    if treatment_rows:
+        sections.append(_table('💉 ملخص العلاجات', TREATMENT_COLUMNS, treatment_rows))
+
+    pending = stats['total_spent'] - stats['total_paid']
+    return REPORT_TEMPLATE.substitute(
+        name=_text(patient.get('name'), MISSING),
+        generated_at=generated_at,
+        **{field: _text(patient.get(field), default) for field, default in PATIENT_FIELDS.items()},
+        total_visits=stats['total_visits'],
+        completed_visits=stats['completed_visits'],
+        total_spent=f"{stats['total_spent']:,.2f}",
+        total_paid=f"{stats['total_paid']:,.2f}",
+        total_pending=f"{pending:,.2f}",
+        pending_color='red' if pending > 0 else 'green',
+        sections=''.join(sections),
+    )
+
+
+def _treatment_counts(treatments_data):
+    """Treatment usage counts, from raw appointment rows or an existing summary"""
+    if 'usage_count' in treatments_data.columns:
+        # المواعيد بلا علاج لا تظهر في الملخص
+        return treatments_data[treatments_data['treatment_name'].notna()]
+    return treatments_data.groupby('treatment_name').size().reset_index(name='usage_count')
+
+
 class PatientReportGenerator:
     """مولد تقارير المرضى"""
-    
+
     @staticmethod
     def generate_html_report(patient_data, appointments_data, payments_data, treatments_data):
         """توليد تقرير HTML شامل للمريض"""
-        
-        # حساب الإحصائيات
-        total_visits = len(appointments_data)
-        completed_visits = len(appointments_data[appointments_data['status'] == 'مكتمل']) if not appointments_data.empty else 0
-        total_spent = appointments_data['total_cost'].sum() if not appointments_data.empty else 0
-        total_paid = payments_data['amount'].sum() if not payments_data.empty else 0
-        total_pending = total_spent - total_paid
-        
-        # معلومات المريض
-        patient_info = f"""
-        <div class='patient-report'>
-            <div class='report-header'>
-                <h2>📋 تقرير شامل للمريض</h2>
-                <h3>{patient_data['name']}</h3>
-                <p>تاريخ التقرير: {datetime.now().strftime('%Y-%m-%d %H:%M')}</p>
-            </div>
-            
-            <div class='report-section'>
-                <h3>👤 المعلومات الشخصية</h3>
-                <table class='report-table'>
-                    <tr><th>الاسم</th><td>{patient_data['name']}</td></tr>
-                    <tr><th>رقم الهاتف</th><td>{patient_data['phone']}</td></tr>
-                    <tr><th>البريد الإلكتروني</th><td>{patient_data.get('email', 'غير محدد')}</td></tr>
-                    <tr><th>العنوان</th><td>{patient_data.get('address', 'غير محدد')}</td></tr>
-                    <tr><th>تاريخ الميلاد</th><td>{patient_data.get('date_of_birth', 'غير محدد')}</td></tr>
-                    <tr><th>النوع</th><td>{patient_data.get('gender', 'غير محدد')}</td></tr>
-                    <tr><th>فصيلة الدم</th><td>{patient_data.get('blood_type', 'غير محدد')}</td></tr>
-                    <tr><th>الحساسية</th><td>{patient_data.get('allergies', 'لا يوجد')}</td></tr>
-                    <tr><th>جهة الاتصال للطوارئ</th><td>{patient_data.get('emergency_contact', 'غير محدد')}</td></tr>
-                </table>
-            </div>
-            
-            <div class='report-section'>
-                <h3>📊 الإحصائيات العامة</h3>
-                <table class='report-table'>
-                    <tr><th>إجمالي الزيارات</th><td>{total_visits} زيارة</td></tr>
-                    <tr><th>الزيارات المكتملة</th><td>{completed_visits} زيارة</td></tr>
-                    <tr><th>إجمالي التكاليف</th><td>{total_spent:,.2f} ج.م</td></tr>
-                    <tr><th>المبلغ المدفوع</th><td>{total_paid:,.2f} ج.م</td></tr>
-                    <tr><th>المبلغ المتبقي</th><td style='color: {"red" if total_pending > 0 else "green"};'>{total_pending:,.2f} ج.م</td></tr>
-                </table>
-            </div>
-        """
-        
-        # التاريخ الطبي
-        if patient_data.get('medical_history'):
-            patient_info += f"""
-            <div class='report-section'>
-                <h3>📝 التاريخ الطبي</h3>
-                <p>{patient_data['medical_history']}</p>
-            </div>
-            """
-        
-        # ملاحظات إضافية
-        if patient_data.get('notes'):
-            patient_info += f"""
-            <div class='report-section'>
-                <h3>📌 ملاحظات</h3>
-                <p>{patient_data['notes']}</p>
-            </div>
-            """
-        
-        # سجل المواعيد
-        if not appointments_data.empty:
-            appointments_html = """
-            <div class='report-section'>
-                <h3>📅 سجل المواعيد</h3>
-                <table class='report-table'>
-                    <thead>
-                        <tr>
-                            <th>التاريخ</th>
-                            <th>الوقت</th>
-                            <th>الطبيب</th>
-                            <th>العلاج</th>
-                            <th>الحالة</th>
-                            <th>التكلفة</th>
-                        </tr>
-                    </thead>
-                    <tbody>
-            """
-            
-            for _, apt in appointments_data.iterrows():
-                appointments_html += f"""
-                    <tr>
-                        <td>{apt['appointment_date']}</td>
-                        <td>{apt['appointment_time']}</td>
-                        <td>{apt['doctor_name']}</td>
-                        <td>{apt['treatment_name']}</td>
-                        <td>{apt['status']}</td>
-                        <td>{apt['total_cost']:,.2f} ج.م</td>
-                    </tr>
-                """
-            
-            appointments_html += """
-                    </tbody>
-                </table>
-            </div>
-            """
-            patient_info += appointments_html
-        
-        # سجل المدفوعات
-        if not payments_data.empty:
-            payments_html = """
-            <div class='report-section'>
-                <h3>💰 سجل المدفوعات</h3>
-                <table class='report-table'>
-                    <thead>
-                        <tr>
-                            <th>التاريخ</th>
-                            <th>المبلغ</th>
-                            <th>طريقة الدفع</th>
-                            <th>الحالة</th>
-                            <th>ملاحظات</th>
-                        </tr>
-                    </thead>
-                    <tbody>
-            """
-            
-            for _, pay in payments_data.iterrows():
-                payments_html += f"""
-                    <tr>
-                        <td>{pay['payment_date']}</td>
-                        <td>{pay['amount']:,.2f} ج.م</td>
-                        <td>{pay['payment_method']}</td>
-                        <td>{pay['status']}</td>
-                        <td>{pay.get('notes', '')}</td>
-                    </tr>
-                """
-            
-            payments_html += """
-                    </tbody>
-                </table>
-            </div>
-            """
-            patient_info += payments_html
-        
-        # العلاجات المستخدمة
-        if not treatments_data.empty:
-            treatments_summary = treatments_data.groupby('treatment_name').size().reset_index(name='count')
-            treatments_summary.columns = ['العلاج', 'عدد المرات']
-            
-            treatments_html = """
-            <div class='report-section'>
-                <h3>💉 ملخص العلاجات</h3>
-                <table class='report-table'>
-                    <thead>
-                        <tr>
-                            <th>العلاج</th>
-                            <th>عدد المرات</th>
-                        </tr>
-                    </thead>
-                    <tbody>
-            """
-            
-            for _, treat in treatments_summary.iterrows():
-                treatments_html += f"""
-                    <tr>
-                        <td>{treat['العلاج']}</td>
-                        <td>{treat['عدد المرات']}</td>
-                    </tr>
-                """
-            
-            treatments_html += """
-                    </tbody>
-                </table>
-            </div>
-            """
-            patient_info += treatments_html
-        
-        patient_info += "</div>"
-        
-        return patient_info
+        stats = {
+            'total_visits': len(appointments_data),
+            'completed_visits': int((appointments_data['status'] == COMPLETED_STATUS).sum()) if not appointments_data.empty else 0,
+            'total_spent': float(appointments_data['total_cost'].sum()) if not appointments_data.empty else 0.0,
+            'total_paid': float(payments_data['amount'].sum()) if not payments_data.empty else 0.0,
+        }
+        treatments = _treatment_counts(treatments_data) if not treatments_data.empty else treatments_data
+
+        return _render_report(
+            patient_data,
+            stats,
+            ''.join(render_rows(appointments_data, APPOINTMENT_COLUMNS)) if not appointments_data.empty else '',
+            ''.join(render_rows(payments_data, PAYMENT_COLUMNS)) if not payments_data.empty else '',
+            ''.join(render_rows(treatments, TREATMENT_COLUMNS)) if not treatments.empty else '',
+            datetime.now().strftime('%Y-%m-%d %H:%M'),
+        )
+
+
+# ========== الدفعات ==========
+CHUNK_PATIENTS_SQL = "SELECT * FROM patients WHERE id IN ({ids})"
+CHUNK_APPOINTMENTS_SQL = """
+    SELECT a.patient_id, a.appointment_date, a.appointment_time, d.name as doctor_name,
+           t.name as treatment_name, a.status, a.total_cost
+    FROM appointments a
+    LEFT JOIN doctors d ON a.doctor_id = d.id
+    LEFT JOIN treatments t ON a.treatment_id = t.id
+    WHERE a.patient_id IN ({ids})
+    ORDER BY a.patient_id, a.appointment_date DESC, a.appointment_time DESC
+"""
+CHUNK_PAYMENTS_SQL = """
+    SELECT patient_id, payment_date, amount, payment_method, status, notes
+    FROM payments
+    WHERE patient_id IN ({ids})
+    ORDER BY patient_id, payment_date DESC
+"""
+
+
+def _joined_rows(frame, columns):
+    """Rows of a multi-patient frame rendered at once, then joined per patient"""
+    joined = {}
+    for patient_id, row in zip(frame['patient_id'].tolist(), render_rows(frame, columns)):
+        joined.setdefault(patient_id, []).append(row)
+    return {patient_id: ''.join(rows) for patient_id, rows in joined.items()}
+
+
+def _render_chunk(patient_ids, db_path, output_dir, fmt):
+    """Render one chunk of patients in a worker process; returns the written paths"""
+    conn = sqlite3.connect(f"file:{os.path.abspath(db_path)}?mode=ro", uri=True)
+    try:
+        ids = ','.join(str(int(patient_id)) for patient_id in patient_ids)
+        patients = pd.read_sql_query(CHUNK_PATIENTS_SQL.format(ids=ids), conn)
+        appointments = pd.read_sql_query(CHUNK_APPOINTMENTS_SQL.format(ids=ids), conn)
+        payments = pd.read_sql_query(CHUNK_PAYMENTS_SQL.format(ids=ids), conn)
+    finally:
+        conn.close()
+
+    # إحصائيات كل المرضى دفعة واحدة
+    by_patient = appointments.groupby('patient_id')
+    visits = by_patient.size()
+    completed = (appointments['status'] == COMPLETED_STATUS).groupby(appointments['patient_id']).sum()
+    spent = by_patient['total_cost'].sum()
+    paid = payments.groupby('patient_id')['amount'].sum()
+    treatments = (
+        appointments.groupby(['patient_id', 'treatment_name'], sort=False).size()
+        .reset_index(name='usage_count')
+        .sort_values(['patient_id', 'usage_count'], ascending=[True, False], kind='stable')
+    )
+
+    appointment_rows = _joined_rows(appointments, APPOINTMENT_COLUMNS)
+    payment_rows = _joined_rows(payments, PAYMENT_COLUMNS)
+    treatment_rows = _joined_rows(treatments, TREATMENT_COLUMNS)
+    generated_at = datetime.now().strftime('%Y-%m-%d %H:%M')
+    write = _pdf_writer() if fmt == 'pdf' else _write_html
+
+    paths = []
+    for patient in patients.to_dict('records'):
+        patient_id = patient['id']
+        stats = {
+            'total_visits': int(visits.get(patient_id, 0)),
+            'completed_visits': int(completed.get(patient_id, 0)),
+            'total_spent': float(spent.get(patient_id, 0.0)),
+            'total_paid': float(paid.get(patient_id, 0.0)),
+        }
+        body = _render_report(
+            patient, stats,
+            appointment_rows.get(patient_id, ''), payment_rows.get(patient_id, ''),
+            treatment_rows.get(patient_id, ''), generated_at,
+        )
+        document = DOCUMENT_TEMPLATE.substitute(title=_text(patient.get('name'), MISSING), body=body)
+        path = os.path.join(output_dir, f"patient_{patient_id}.{fmt}")
+        write(document, path)
+        paths.append(path)
+    return paths
+
+
+def _write_html(document, path):
+    with open(path, 'w', encoding='utf-8') as f:
+        f.write(document)
+
+
+def _pdf_writer():
+    """HTML to PDF through weasyprint, which is only needed for PDF output"""
+    try:
+        from weasyprint import HTML
+    except ImportError as e:
+        raise RuntimeError("تصدير PDF يتطلب تثبيت weasyprint") from e
+    return lambda document, path: HTML(string=document).write_pdf(path)
+
+
+def render_batch(patient_ids, output_dir, fmt='html', workers=None, chunk_size=200,
+                 progress=None, db_path=None):
+    """Render one report file per patient into ``output_dir``.
+
+    Patients are split into chunks of ``chunk_size``; each chunk is read
+    with three queries and rendered in a worker process (``workers=1``
+    renders in this process). ``progress(done, total)`` is called as chunks
+    finish. Returns the written paths and the throughput.
+    """
+    if fmt not in ('html', 'pdf'):
+        raise ValueError(f"صيغة غير مدعومة: {fmt}")
+    if fmt == 'pdf':
+        _pdf_writer()
+    if db_path is None:
+        from database.models import db
+        db_path = db.db_path
+
+    patient_ids = list(dict.fromkeys(int(patient_id) for patient_id in patient_ids))
+    chunks = [patient_ids[i:i + chunk_size] for i in range(0, len(patient_ids), chunk_size)]
+    os.makedirs(output_dir, exist_ok=True)
+    started = time.perf_counter()
+
+    paths = []
+    if workers == 1:
+        for chunk in chunks:
+            paths.extend(_render_chunk(chunk, db_path, output_dir, fmt))
+            if progress:
+                progress(len(paths), len(patient_ids))
+    else:
+        with ProcessPoolExecutor(max_workers=workers) as executor:
+            futures = [executor.submit(_render_chunk, chunk, db_path, output_dir, fmt) for chunk in chunks]
+            for future in as_completed(futures):
+                paths.extend(future.result())
+                if progress:
+                    progress(len(paths), len(patient_ids))
+
+    seconds = time.perf_counter() - started
+    return {
+        'paths': sorted(paths),
+        'reports': len(paths),
+        'seconds': round(seconds, 3),
+        'reports_per_second': round(len(paths) / seconds, 1) if seconds else None,
+    }
+
+
+def main(argv=None):
+    """python -m report_generator --doctor 3 --month 2026-09 --out reports/"""
+    parser = argparse.ArgumentParser(prog='python -m report_generator', description='Batch patient reports')
+    parser.add_argument('--doctor', type=int, help='only patients seen by this doctor')
+    parser.add_argument('--month', help='YYYY-MM; with --doctor, only that month\'s patients')
+    parser.add_argument('--out', default='patient_reports')
+    parser.add_argument('--format', default='html', choices=['html', 'pdf'])
+    parser.add_argument('--workers', type=int)
+    parser.add_argument('--chunk-size', type=int, default=200)
+    args = parser.parse_args(argv)
+
+    from database.crud import crud
+    if args.doctor:
+        patient_ids = crud.get_doctor_patient_ids(args.doctor, args.month)
+    else:
+        patient_ids = crud.get_all_patients()['id'].tolist()
+
+    result = render_batch(
+        patient_ids, args.out, args.format, args.workers, args.chunk_size,
+        progress=lambda done, total: print(f"  {done}/{total}", flush=True),
+    )
+    print(f"✅ {result['reports']} تقرير في {result['seconds']} ث ({result['reports_per_second']} تقرير/ث)")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -4,6 +4,20 @@ from datetime import date, timedelta
 import plotly.express as px
 import plotly.graph_objects as go
 from database.crud import crud
+from database.versions import table_versions
+from components.jobs_panel import JobsPanel
+from utils.tracing import tracer
+
+# st.fragment يعيد تشغيل القسم وحده عند تغيير عناصره (Streamlit >= 1.37)
+fragment = getattr(st, 'fragment', None) or getattr(st, 'experimental_fragment', None) or (lambda func: func)
+
+# مدة صلاحية بيانات التقارير المخزنة مؤقتاً (ثواني)
+REPORT_CACHE_TTL = 300
+
+# الجداول التي تُقرأ منها التقارير؛ أي كتابة فيها (من أي عملية) تمسح البيانات المخزنة
+REPORT_TABLES = ('appointments', 'payments', 'patients', 'doctors', 'treatments',
+                 'suppliers', 'inventory', 'inventory_usage', 'expenses', 'inventory_on_hand')
+_report_versions = None
 
 def render():
     """صفحة التقارير والتحليلات المتقدمة"""
@@ -33,52 +47,152 @@ def render():
     
     with col3:
         st.markdown("<br>", unsafe_allow_html=True)
-        period_type = st.selectbox(
-            "التجميع",
-            ["يومي", "شهري", "سنوي"],
-            key="period_type"
-        )
-    
-    # تحويل نوع الفترة
-    group_by_map = {"يومي": "day", "شهري": "month", "سنوي": "year"}
-    group_by = group_by_map[period_type]
-    
-    # التبويبات
-    tab1, tab2, tab3, tab4, tab5, tab6 = st.tabs([
-        "📈 التقرير المالي",
-        "👨‍⚕️ أداء الأطباء", 
-        "💉 العلاجات",
-        "👥 المرضى",
-        "📦 المخزون",
-        "📊 مؤشرات الأداء"
-    ])
-    
-    with tab1:
-        render_financial_report(start_date, end_date, group_by, period_type)
-    
-    with tab2:
-        render_doctor_performance(start_date, end_date)
-    
-    with tab3:
-        render_treatments_report(start_date, end_date)
+        if st.button("🔄 تحديث البيانات", key="report_refresh", use_container_width=True):
+            clear_report_cache()
+
+    sync_report_cache()
+    render_snapshot_status()
+
+    # الأقسام - يُحسب القسم المعروض فقط
+    sections = {
+        "📈 التقرير المالي": render_financial_report,
+        "👨‍⚕️ أداء الأطباء": render_doctor_performance,
+        "💉 العلاجات": render_treatments_report,
+        "👥 المرضى": render_patients_report,
+        "📦 المخزون": render_inventory_report,
+        "🔮 إعادة الطلب": render_reorder_report,
+        "📊 مؤشرات الأداء": render_kpi_report
+    }
+    
+    section = st.radio(
+        "القسم",
+        list(sections.keys()),
+        horizontal=True,
+        label_visibility="collapsed",
+        key="report_section"
+    )
     
-    with tab4:
-        render_patients_report(start_date, end_date)
+    with tracer.span(section, 'section'):
+        sections[section](start_date, end_date)
+
+def render_snapshot_status():
+    """حالة لقطة التحليلات (Parquet) التي تقرأ منها التقارير الطويلة"""
+    info = crud.get_analytics_snapshot_info()
+    with st.expander("📦 لقطة التحليلات", expanded=False):
+        if info is None:
+            st.caption("لا توجد لقطة بعد - التقارير تُقرأ من قاعدة البيانات مباشرة.")
+        else:
+            rows = info['rows']
+            source = (f"البيانات من {info['as_of']} فصاعداً تُقرأ من قاعدة البيانات" if info['current']
+                      else "تغيّرت البيانات بعد اللقطة - التقارير تُقرأ من قاعدة البيانات حتى التحديث التالي")
+            st.caption(
+                f"آخر لقطة: {info['created_at']} • "
+                f"{rows['appointments']:,} موعد • {rows['payments']:,} دفعة • {rows['expenses']:,} مصروف • "
+                f"{source}"
+            )
+        if st.button("📤 تحديث اللقطة", key="report_snapshot_export"):
+            JobsPanel.submit('analytics_snapshot', key='snapshot_job')
+        
+        # التصدير يعمل في الخلفية؛ تُمسح البيانات المخزنة مرة واحدة عند اكتماله
+        manifest = JobsPanel.track('snapshot_job')
+        if manifest is not None:
+            st.session_state.pop('snapshot_job', None)
+            clear_report_cache()
+            st.success(f"✅ تم تصدير اللقطة في {manifest['seconds']:.1f} ثانية")
+
+def sync_report_cache():
+    """مسح البيانات المخزنة إذا تغيرت جداول التقارير منذ آخر عرض"""
+    global _report_versions
+    versions = table_versions.current(*REPORT_TABLES)
+    if versions != _report_versions:
+        if _report_versions is not None:
+            clear_report_cache()
+        _report_versions = versions
+
+def clear_report_cache():
+    """مسح البيانات المخزنة مؤقتاً لجميع الأقسام"""
+    for loader in (
+        load_financial_summary, load_revenue_by_period, load_doctor_performance,
+        load_treatment_popularity, load_patients_data, load_inventory_data, load_reorder_data, load_kpi_data
+    ):
+        loader.clear()
+
+# ========== تحميل البيانات (مخزنة مؤقتاً لكل قسم) ==========
+@st.cache_data(ttl=REPORT_CACHE_TTL, show_spinner=False)
+def load_financial_summary(start_date, end_date):
+    """الملخص المالي وطرق الدفع وتوزيع الأرباح"""
+    return {
+        'summary': crud.get_financial_summary(start_date, end_date),
+        'expenses': crud.get_expenses_by_category(start_date, end_date),
+        'payment_methods': crud.get_payment_methods_stats(start_date, end_date),
+        'clinic_earnings': crud.get_clinic_earnings(start_date, end_date)
+    }
+
+@st.cache_data(ttl=REPORT_CACHE_TTL, show_spinner=False)
+def load_revenue_by_period(start_date, end_date, group_by):
+    return crud.get_revenue_by_period(start_date, end_date, group_by)
+
+@st.cache_data(ttl=REPORT_CACHE_TTL, show_spinner=False)
+def load_doctor_performance(start_date, end_date):
+    return crud.get_doctor_performance(start_date, end_date)
+
+@st.cache_data(ttl=REPORT_CACHE_TTL, show_spinner=False)
+def load_treatment_popularity(start_date, end_date):
+    return crud.get_treatment_popularity(start_date, end_date)
+
+@st.cache_data(ttl=REPORT_CACHE_TTL, show_spinner=False)
+def load_patients_data(start_date, end_date):
+    return {
+        'stats': crud.get_patient_statistics(),
+        'top_patients': crud.get_top_patients(start_date, end_date, limit=10),
+        'appointment_status': crud.get_appointment_status_stats(start_date, end_date)
+    }
+
+@st.cache_data(ttl=REPORT_CACHE_TTL, show_spinner=False)
+def load_inventory_data():
+    return {
+        'value': crud.get_inventory_value(),
+        'low_stock': crud.get_low_stock_items(),
+        'expiring': crud.get_expiring_inventory(days=60)
+    }
+
+@st.cache_data(ttl=REPORT_CACHE_TTL, show_spinner=False)
+def load_reorder_data():
+    """التوقعات تُحسب مرة يومياً في forecasting.py"""
+    return {
+        'forecast': crud.get_inventory_forecast(),
+        'suggestions': crud.get_reorder_suggestions(),
+        'by_supplier': crud.get_reorder_by_supplier()
+    }
+
+@st.cache_data(ttl=REPORT_CACHE_TTL, show_spinner=False)
+def load_kpi_data(start_date):
+    """مؤشرات الأداء - تُحسب الأرقام هنا بدلاً من تخزين جداول المواعيد والمرضى كاملة"""
+    appointments = crud.get_all_appointments()
+    patients = crud.get_all_patients()
     
-    with tab5:
-        render_inventory_report()
+    kpis = {'total_apps': len(appointments), 'completed_apps': 0, 'avg_appointment_value': None, 'recent_patients': None}
+    if not appointments.empty:
+        kpis['completed_apps'] = int((appointments['status'] == 'مكتمل').sum())
+        if appointments['total_cost'].sum() > 0:
+            kpis['avg_appointment_value'] = appointments['total_cost'].mean()
+    if not patients.empty:
+        kpis['recent_patients'] = int((pd.to_datetime(patients['created_at']) >= pd.to_datetime(start_date)).sum())
     
-    with tab6:
-        render_kpi_report(start_date, end_date)
+    return {
+        'daily_revenue': crud.get_daily_revenue_comparison(days=30),
+        'monthly_comparison': crud.get_monthly_comparison(months=6),
+        'kpis': kpis
+    }
 
-def render_financial_report(start_date, end_date, group_by, period_type):
+# ========== الأقسام ==========
+@fragment
+def render_financial_report(start_date, end_date):
     """التقرير المالي"""
     st.markdown("### 💰 الملخص المالي الشامل")
     
-    financial_summary = crud.get_financial_summary(
-        start_date.isoformat(),
-        end_date.isoformat()
-    )
+    data = load_financial_summary(start_date.isoformat(), end_date.isoformat())
+    financial_summary = data['summary']
     
     col1, col2, col3, col4 = st.columns(4)
     
@@ -130,11 +244,19 @@ def render_financial_report(start_date, end_date, group_by, period_type):
     col1, col2 = st.columns(2)
     
     with col1:
+        # تغيير التجميع يعيد تشغيل هذا القسم فقط
+        period_type = st.selectbox(
+            "التجميع",
+            ["يومي", "شهري", "سنوي"],
+            key="period_type"
+        )
+        group_by_map = {"يومي": "day", "شهري": "month", "سنوي": "year"}
+        
         st.markdown(f"#### 📊 الإيرادات ({period_type})")
-        revenue_data = crud.get_revenue_by_period(
+        revenue_data = load_revenue_by_period(
             start_date.isoformat(),
             end_date.isoformat(),
-            group_by
+            group_by_map[period_type]
         )
         
         if not revenue_data.empty:
@@ -153,10 +275,7 @@ def render_financial_report(start_date, end_date, group_by, period_type):
     
     with col2:
         st.markdown("#### 💸 المصروفات حسب الفئة")
-        expenses_data = crud.get_expenses_by_category(
-            start_date.isoformat(),
-            end_date.isoformat()
-        )
+        expenses_data = data['expenses']
         
         if not expenses_data.empty:
             fig = px.pie(
@@ -173,10 +292,7 @@ def render_financial_report(start_date, end_date, group_by, period_type):
     
     # طرق الدفع
     st.markdown("#### 💳 طرق الدفع")
-    payment_methods = crud.get_payment_methods_stats(
-        start_date.isoformat(),
-        end_date.isoformat()
-    )
+    payment_methods = data['payment_methods']
     
     if not payment_methods.empty:
         col1, col2 = st.columns(2)
@@ -205,10 +321,7 @@ def render_financial_report(start_date, end_date, group_by, period_type):
     
     # أرباح العيادة مقابل الأطباء
     st.markdown("#### 💰 توزيع الأرباح بين العيادة والأطباء")
-    clinic_earnings = crud.get_clinic_earnings(
-        start_date.isoformat(),
-        end_date.isoformat()
-    )
+    clinic_earnings = data['clinic_earnings']
     
     if not clinic_earnings.empty:
         earnings_data = clinic_earnings.iloc[0]
@@ -237,11 +350,12 @@ def render_financial_report(start_date, end_date, group_by, period_type):
         )
         st.plotly_chart(fig, use_container_width=True)
 
+@fragment
 def render_doctor_performance(start_date, end_date):
     """تقرير أداء الأطباء"""
     st.markdown("### 👨‍⚕️ تقرير أداء الأطباء")
     
-    doctor_performance = crud.get_doctor_performance(
+    doctor_performance = load_doctor_performance(
         start_date.isoformat(),
         end_date.isoformat()
     )
@@ -297,11 +411,12 @@ def render_doctor_performance(start_date, end_date):
     else:
         st.info("لا توجد بيانات للفترة المحددة")
 
+@fragment
 def render_treatments_report(start_date, end_date):
     """تقرير العلاجات"""
     st.markdown("### 💉 تقرير العلاجات الأكثر طلباً")
     
-    treatment_stats = crud.get_treatment_popularity(
+    treatment_stats = load_treatment_popularity(
         start_date.isoformat(),
         end_date.isoformat()
     )
@@ -346,11 +461,13 @@ def render_treatments_report(start_date, end_date):
     else:
         st.info("لا توجد بيانات للفترة المحددة")
 
+@fragment
 def render_patients_report(start_date, end_date):
     """تقرير المرضى"""
     st.markdown("### 👥 تحليلات المرضى")
     
-    patient_stats = crud.get_patient_statistics()
+    data = load_patients_data(start_date.isoformat(), end_date.isoformat())
+    patient_stats = data['stats']
     
     col1, col2 = st.columns(2)
     
@@ -380,11 +497,7 @@ def render_patients_report(start_date, end_date):
     
     # أكثر المرضى زيارة
     st.markdown("#### 🏆 أكثر المرضى زيارة")
-    top_patients = crud.get_top_patients(
-        start_date.isoformat(),
-        end_date.isoformat(),
-        limit=10
-    )
+    top_patients = data['top_patients']
     
     if not top_patients.empty:
         st.dataframe(
@@ -403,10 +516,7 @@ def render_patients_report(start_date, end_date):
     
     # حالة المواعيد
     st.markdown("#### 📅 توزيع حالات المواعيد")
-    appointment_status = crud.get_appointment_status_stats(
-        start_date.isoformat(),
-        end_date.isoformat()
-    )
+    appointment_status = data['appointment_status']
     
     if not appointment_status.empty:
         col1, col2 = st.columns(2)
@@ -431,11 +541,13 @@ def render_patients_report(start_date, end_date):
                 hide_index=True
             )
 
-def render_inventory_report():
-    """تقرير المخزون"""
+@fragment
+def render_inventory_report(start_date=None, end_date=None):
+    """تقرير المخزون - لا يعتمد على الفترة المحددة"""
     st.markdown("### 📦 تقرير المخزون")
     
-    inventory_value = crud.get_inventory_value()
+    data = load_inventory_data()
+    inventory_value = data['value']
     
     if not inventory_value.empty:
         col1, col2 = st.columns(2)
@@ -479,7 +591,7 @@ def render_inventory_report():
     
     # المخزون المنخفض
     st.markdown("#### ⚠️ تنبيهات المخزون المنخفض")
-    low_stock = crud.get_low_stock_items()
+    low_stock = data['low_stock']
     
     if not low_stock.empty:
         st.warning(f"يوجد {len(low_stock)} عنصر بمخزون منخفض")
@@ -498,7 +610,7 @@ def render_inventory_report():
     
     # المخزون قريب الانتهاء
     st.markdown("#### 📅 أصناف قريبة من انتهاء الصلاحية")
-    expiring = crud.get_expiring_inventory(days=60)
+    expiring = data['expiring']
     
     if not expiring.empty:
         st.warning(f"يوجد {len(expiring)} صنف ينتهي خلال 60 يوم")
@@ -517,13 +629,85 @@ def render_inventory_report():
     else:
         st.success("✅ لا توجد أصناف قريبة من الانتهاء")
 
+@fragment
+def render_reorder_report(start_date=None, end_date=None):
+    """اقتراحات إعادة الطلب حسب الاستهلاك المتوقع - لا يعتمد على الفترة المحددة"""
+    st.markdown("### 🔮 اقتراحات إعادة الطلب")
+    st.caption("الاستهلاك المتوقع من سجل الاستخدام (90 يوماً) والمواعيد المحجوزة (30 يوماً) حسب العلاج")
+    
+    data = load_reorder_data()
+    forecast = data['forecast']
+    suggestions = data['suggestions']
+    by_supplier = data['by_supplier']
+    
+    if forecast.empty:
+        st.info("لا توجد أصناف في المخزون")
+        return
+    
+    col1, col2, col3 = st.columns(3)
+    with col1:
+        st.metric("أصناف تحتاج طلب", len(suggestions))
+    with col2:
+        st.metric("الموردون", len(by_supplier))
+    with col3:
+        st.metric("التكلفة التقديرية", f"{suggestions['reorder_cost'].sum():,.0f} ج.م")
+    
+    # أقل الأصناف تغطية
+    covered = forecast.dropna(subset=['days_of_cover']).nsmallest(15, 'days_of_cover')
+    if not covered.empty:
+        st.markdown("#### ⏳ أيام التغطية المتبقية")
+        fig = px.bar(
+            covered,
+            x='days_of_cover',
+            y='item_name',
+            orientation='h',
+            color='needs_reorder',
+            color_discrete_map={True: '#e74c3c', False: '#2ecc71'},
+            labels={'days_of_cover': 'أيام التغطية', 'item_name': 'الصنف', 'needs_reorder': 'يحتاج طلب'}
+        )
+        fig.update_layout(height=400, yaxis={'categoryorder': 'total descending'})
+        st.plotly_chart(fig, use_container_width=True)
+    
+    if suggestions.empty:
+        st.success("✅ لا توجد أصناف تحتاج إعادة طلب حالياً")
+        return
+    
+    st.markdown("#### 🏭 الطلبيات المقترحة حسب المورد")
+    for _, supplier in by_supplier.iterrows():
+        supplier_name = supplier['supplier_name'] if pd.notna(supplier['supplier_name']) else "بدون مورد"
+        items = suggestions[
+            suggestions['supplier_name'].isna() if pd.isna(supplier['supplier_name'])
+            else suggestions['supplier_name'] == supplier['supplier_name']
+        ]
+        with st.expander(f"{supplier_name} - {supplier['items']} صنف - {supplier['reorder_cost']:,.0f} ج.م"):
+            st.dataframe(
+                items[['item_name', 'on_hand', 'daily_demand', 'days_of_cover', 'stockout_date',
+                       'reorder_point', 'reorder_qty', 'unit_cost', 'reorder_cost']].rename(columns={
+                    'item_name': 'الصنف',
+                    'on_hand': 'الرصيد',
+                    'daily_demand': 'الاستهلاك اليومي',
+                    'days_of_cover': 'أيام التغطية',
+                    'stockout_date': 'تاريخ النفاد المتوقع',
+                    'reorder_point': 'نقطة إعادة الطلب',
+                    'reorder_qty': 'الكمية المقترحة',
+                    'unit_cost': 'تكلفة الوحدة',
+                    'reorder_cost': 'التكلفة'
+                }),
+                use_container_width=True,
+                hide_index=True
+            )
+
+@fragment
 def render_kpi_report(start_date, end_date):
     """مؤشرات الأداء"""
     st.markdown("### 📊 مؤشرات الأداء الرئيسية (KPIs)")
     
+    data = load_kpi_data(start_date.isoformat())
+    kpis = data['kpis']
+    
     # الإيرادات اليومية
     st.markdown("#### 📈 مقارنة الإيرادات اليومية (آخر 30 يوم)")
-    daily_revenue = crud.get_daily_revenue_comparison(days=30)
+    daily_revenue = data['daily_revenue']
     
     if not daily_revenue.empty:
         fig = go.Figure()
@@ -568,7 +752,7 @@ def render_kpi_report(start_date, end_date):
     
     # المقارنة الشهرية
     st.markdown("#### 📅 المقارنة الشهرية (آخر 6 شهور)")
-    monthly_comparison = crud.get_monthly_comparison(months=6)
+    monthly_comparison = data['monthly_comparison']
     
     if not monthly_comparison.empty:
         fig = go.Figure()
@@ -612,11 +796,10 @@ def render_kpi_report(start_date, end_date):
     col1, col2, col3 = st.columns(3)
     
     # معدل إشغال المواعيد
-    all_appointments = crud.get_all_appointments()
-    if not all_appointments.empty:
-        total_apps = len(all_appointments)
-        completed_apps = len(all_appointments[all_appointments['status'] == 'مكتمل'])
-        completion_rate = (completed_apps / total_apps * 100) if total_apps > 0 else 0
+    if kpis['total_apps'] > 0:
+        total_apps = kpis['total_apps']
+        completed_apps = kpis['completed_apps']
+        completion_rate = completed_apps / total_apps * 100
         
         with col1:
             st.metric(
@@ -626,26 +809,18 @@ def render_kpi_report(start_date, end_date):
             )
     
     # متوسط قيمة الموعد
-    if not all_appointments.empty and all_appointments['total_cost'].sum() > 0:
-        avg_appointment_value = all_appointments['total_cost'].mean()
-        
+    if kpis['avg_appointment_value'] is not None:
         with col2:
             st.metric(
                 "💰 متوسط قيمة الموعد",
-                f"{avg_appointment_value:,.0f} ج.م"
+                f"{kpis['avg_appointment_value']:,.0f} ج.م"
             )
     
     # عدد المرضى الجدد
-    patients = crud.get_all_patients()
-    if not patients.empty:
-        recent_patients = len(patients[
-            pd.to_datetime(patients['created_at']) >= 
-            pd.to_datetime(start_date)
-        ])
-        
+    if kpis['recent_patients'] is not None:
         with col3:
             st.metric(
                 "👥 مرضى جدد",
-                f"{recent_patients} مريض",
+                f"{kpis['recent_patients']} مريض",
                 delta="في الفترة المحددة"
             )
@@ -4,6 +4,7 @@ import streamlit as st
 import pandas as pd
 from datetime import date, timedelta
 from database.crud import crud
+from components.jobs_panel import JobsPanel
 import plotly.express as px
 
 def render():
@@ -41,53 +42,58 @@ def render_patient_report():
     if patients.empty:
         st.info("لا يوجد مرضى لعرض تقاريرهم.")
         return
+    patient_names = dict(zip(patients['id'], patients['name']))
     
     patient_id = st.selectbox(
         "اختر المريض",
         patients['id'].tolist(),
-        format_func=lambda x: f"{patients[patients['id'] == x]['name'].iloc[0]} (ID: {x})",
+        format_func=lambda x: f"{patient_names[x]} (ID: {x})",
         key="adv_report_patient_select"
     )
     
-    if st.button("📊 عرض تقرير المريض", key="show_patient_report_adv"):
-        with st.spinner("جاري تحميل التقرير..."):
-            report = crud.get_patient_detailed_report(patient_id)
-            
-            if not report or not report.get('patient'):
-                st.warning("لا توجد بيانات كافية لعرض تقرير هذا المريض.")
-                return
-
-            patient_info = report['patient']
-            st.markdown(f"#### 👤 {patient_info.get('name', 'بيانات المريض')}")
-            
-            col1, col2, col3, col4 = st.columns(4)
-            col1.metric("الهاتف", patient_info.get('phone', '-'))
-            col2.metric("الجنس", patient_info.get('gender', '-'))
-            col3.metric("فصيلة الدم", patient_info.get('blood_type', '-'))
-            col4.metric("تاريخ الميلاد", patient_info.get('date_of_birth', '-'))
-            
-            st.markdown("---")
-            
-            visits_stats = report.get('visits_stats', {})
-            st.markdown("#### 📅 إحصائيات الزيارات")
-            col1, col2, col3 = st.columns(3)
-            col1.metric("إجمالي الزيارات", visits_stats.get('total_visits', 0))
-            col2.metric("الزيارات المكتملة", visits_stats.get('completed_visits', 0))
-            col3.metric("الزيارات الملغية", visits_stats.get('cancelled_visits', 0))
-            
-            st.markdown("#### 💰 الملخص المالي")
-            col1, col2, col3 = st.columns(3)
-            col1.metric("التكلفة الإجمالية", f"{report.get('total_cost', 0):,.2f} ج.م")
-            col2.metric("إجمالي المدفوعات", f"{report.get('total_paid', 0):,.2f} ج.م")
-            col3.metric("المبلغ المتبقي", f"{report.get('outstanding', 0):,.2f} ج.م")
-            
-            if not report['appointments'].empty:
-                with st.expander("📅 عرض سجل المواعيد التفصيلي"):
-                    st.dataframe(report['appointments'], use_container_width=True, hide_index=True)
-            
-            if not report['payments'].empty:
-                with st.expander("💳 عرض سجل المدفوعات"):
-                    st.dataframe(report['payments'], use_container_width=True, hide_index=True)
+    # التقرير محفوظ لكل مريض حتى تتغير بياناته، فالتنقل بين المرضى فوري
+    report = crud.get_patient_detailed_report(patient_id)
+    
+    if not report or not report.get('patient'):
+        st.warning("لا توجد بيانات كافية لعرض تقرير هذا المريض.")
+        return
+    
+    patient_info = report['patient']
+    st.markdown(f"#### 👤 {patient_info.get('name', 'بيانات المريض')}")
+    
+    col1, col2, col3, col4 = st.columns(4)
+    col1.metric("الهاتف", patient_info.get('phone', '-'))
+    col2.metric("الجنس", patient_info.get('gender', '-'))
+    col3.metric("فصيلة الدم", patient_info.get('blood_type', '-'))
+    col4.metric("تاريخ الميلاد", patient_info.get('date_of_birth', '-'))
+    
+    st.markdown("---")
+    
+    visits_stats = report.get('visits_stats', {})
+    st.markdown("#### 📅 إحصائيات الزيارات")
+    col1, col2, col3 = st.columns(3)
+    col1.metric("إجمالي الزيارات", visits_stats.get('total_visits', 0))
+    col2.metric("الزيارات المكتملة", visits_stats.get('completed_visits', 0))
+    col3.metric("الزيارات الملغية", visits_stats.get('cancelled_visits', 0))
+    
+    st.markdown("#### 💰 الملخص المالي")
+    col1, col2, col3 = st.columns(3)
+    col1.metric("التكلفة الإجمالية", f"{report.get('total_cost', 0):,.2f} ج.م")
+    col2.metric("إجمالي المدفوعات", f"{report.get('total_paid', 0):,.2f} ج.م")
+    col3.metric("المبلغ المتبقي", f"{report.get('outstanding', 0):,.2f} ج.م")
+    
+    if not report['appointments'].empty:
+        with st.expander("📅 عرض سجل المواعيد التفصيلي"):
+            st.dataframe(report['appointments'], use_container_width=True, hide_index=True)
+    
+    if not report['payments'].empty:
+        with st.expander("💳 عرض سجل المدفوعات"):
+            st.dataframe(report['payments'], use_container_width=True, hide_index=True)
+    
+    if not report['treatments'].empty:
+        with st.expander("💉 العلاجات والأطباء"):
+            st.dataframe(report['treatments'], use_container_width=True, hide_index=True)
+            st.dataframe(report['doctors'], use_container_width=True, hide_index=True)
 
 def render_doctor_report():
     """تقرير طبيب مفصل"""
@@ -111,6 +117,11 @@ def render_doctor_report():
     with col3:
         end_date = st.date_input("حتى تاريخ", value=date.today(), key="dr_end_adv")
     
+    # تقارير HTML لكل مرضى الطبيب في ملف مضغوط - تُولد في الخلفية
+    if st.button("📦 تقارير مرضى الطبيب (ZIP)", key="doctor_patient_reports_adv"):
+        JobsPanel.submit('patient_reports', {'doctor_id': int(doctor_id)})
+        st.success("✅ بدأ توليد التقارير - الملف يظهر في لوحة مهامي عند اكتماله")
+    
     if st.button("📊 عرض تقرير الطبيب", key="show_doctor_report_adv"):
         with st.spinner("جاري تحميل التقرير..."):
             report = crud.get_doctor_detailed_report(doctor_id, start_date.isoformat(), end_date.isoformat())
@@ -218,21 +229,29 @@ def render_comprehensive_financial_report():
     with col2:
         end_date = st.date_input("حتى تاريخ", value=date.today(), key="fin_end_adv")
     
+    # التقرير يُحسب في الخلفية؛ إعادة تشغيل الصفحة تعرض نتيجته دون إعادة حسابه
     if st.button("📊 إنشاء التقرير المالي", key="create_financial_report_adv"):
-        with st.spinner("جاري تحميل التقرير..."):
-            report = crud.get_comprehensive_financial_report(start_date.isoformat(), end_date.isoformat())
-            
-            if not report:
-                st.warning("لا توجد بيانات مالية في هذه الفترة.")
-                return
-            
-            earnings = report['clinic_earnings']
-            col1, col2, col3 = st.columns(3)
-            col1.metric("إجمالي الإيرادات", f"{earnings.get('total_revenue', 0):,.2f} ج.م")
-            col2.metric("حصة العيادة", f"{earnings.get('total_clinic_earnings', 0):,.2f} ج.م")
-            col3.metric("حصة الأطباء", f"{earnings.get('total_doctor_earnings', 0):,.2f} ج.م")
-            
-            if not report['cash_flow'].empty:
-                st.markdown("##### التدفق النقدي")
-                fig = px.line(report['cash_flow'], x='date', y='cumulative', title="التدفق النقدي التراكمي")
-                st.plotly_chart(fig, use_container_width=True)
\ No newline at end of file
+        JobsPanel.submit(
+            'financial_report',
+            {'start_date': start_date.isoformat(), 'end_date': end_date.isoformat()},
+            key='financial_report_job'
+        )
+    
+    report = JobsPanel.track('financial_report_job')
+    if report is None:
+        return
+    
+    if report['cash_flow'].empty and not report['clinic_earnings'].get('payment_count'):
+        st.warning("لا توجد بيانات مالية في هذه الفترة.")
+        return
+    
+    earnings = report['clinic_earnings']
+    col1, col2, col3 = st.columns(3)
+    col1.metric("إجمالي الإيرادات", f"{earnings.get('total_revenue', 0):,.2f} ج.م")
+    col2.metric("حصة العيادة", f"{earnings.get('total_clinic_earnings', 0):,.2f} ج.م")
+    col3.metric("حصة الأطباء", f"{earnings.get('total_doctor_earnings', 0):,.2f} ج.م")
+    
+    if not report['cash_flow'].empty:
+        st.markdown("##### التدفق النقدي")
+        fig = px.line(report['cash_flow'], x='date', y='cumulative', title="التدفق النقدي التراكمي")
+        st.plotly_chart(fig, use_container_width=True)
\ No newline at end of file
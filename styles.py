@@ -1,219 +1,569 @@
+import hashlib
+import os
+from functools import lru_cache
+
 import streamlit as st
 
+# مجلد الملفات الثابتة الذي يخدمه Streamlit على app/static (server.enableStaticServing)
+STATIC_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'static')
+STATIC_URL = 'app/static'
+
+# متغيرات المظهر: (مفتاح الإعداد، متغير CSS، القيمة الافتراضية)
+THEME_VARIABLES = [
+    ('theme_primary_color', '--primary-color', '#667eea'),
+    ('theme_primary_dark', '--primary-dark', '#764ba2'),
+    ('theme_sidebar_start', '--sidebar-start', '#4facfe'),
+    ('theme_sidebar_end', '--sidebar-end', '#00f2fe'),
+    ('theme_font_family', '--font-family', "'Cairo', 'Inter', sans-serif"),
+    ('theme_font_size', '--font-size', '16px'),
+]
+
+# ألوان دلالية ثابتة لا تتغير مع المظهر
+SEMANTIC_VARIABLES = [
+    ('--success-color', '#28a745'),
+    ('--warning-color', '#ffc107'),
+    ('--danger-color', '#dc3545'),
+    ('--info-color', '#17a2b8'),
+    ('--secondary-color', '#6c757d'),
+    ('--light-bg', '#f8f9fa'),
+    ('--dark-text', '#212529'),
+]
+
+BASE_CSS = """
+    /* تحسين الخط العربي والإنجليزي */
+    @import url('https://fonts.googleapis.com/css2?family=Cairo:wght@300;400;500;600;700;800;900&display=swap');
+    @import url('https://fonts.googleapis.com/css2?family=Inter:wght@300;400;500;600;700&display=swap');
+
+    html, body, [class*="css"] {
+        font-family: var(--font-family);
+        font-size: var(--font-size);
+        font-weight: 400;
+        line-height: 1.7;
+    }
+
+    /* تحسين حجم الخط للعناوين */
+    h1 {
+        font-size: 2.5rem !important;
+        font-weight: 700 !important;
+        letter-spacing: 0.5px;
+        margin-bottom: 1rem !important;
+    }
+
+    h2 {
+        font-size: 2rem !important;
+        font-weight: 600 !important;
+        letter-spacing: 0.3px;
+        margin-bottom: 0.8rem !important;
+    }
+
+    h3 {
+        font-size: 1.5rem !important;
+        font-weight: 600 !important;
+        margin-bottom: 0.6rem !important;
+    }
+
+    h4, h5, h6 {
+        font-weight: 500 !important;
+        margin-bottom: 0.5rem !important;
+    }
+
+    /* تحسين النصوص */
+    p, span, div {
+        font-weight: 400;
+        line-height: 1.7;
+    }
+
+    /* ألوان دلالية محسنة - تُولد من إعدادات المظهر */
+    __THEME_VARIABLES__
+    
+    /* البطاقات المحسنة */
+    .metric-card {
+        background: linear-gradient(135deg, var(--primary-color) 0%, var(--primary-dark) 100%);
+        padding: 25px;
+        border-radius: 16px;
+        color: white;
+        box-shadow: 0 8px 25px rgba(0,0,0,0.15);
+        text-align: center;
+        margin: 15px 0;
+        transition: all 0.3s ease;
+        border: 1px solid rgba(255,255,255,0.1);
+        backdrop-filter: blur(10px);
+    }
+
+    .metric-card:hover {
+        transform: translateY(-8px) scale(1.02);
+        box-shadow: 0 12px 35px rgba(0,0,0,0.2);
+    }
+
+    .metric-card.success {
+        background: linear-gradient(135deg, var(--success-color) 0%, #20c997 100%);
+    }
+
+    .metric-card.warning {
+        background: linear-gradient(135deg, var(--warning-color) 0%, #fd7e14 100%);
+    }
+
+    .metric-card.info {
+        background: linear-gradient(135deg, var(--info-color) 0%, #0dcaf0 100%);
+    }
+
+    .metric-card.danger {
+        background: linear-gradient(135deg, var(--danger-color) 0%, #fd7e14 100%);
+    }
+    
+    .metric-value {
+        font-size: 2.5rem;
+        font-weight: 700;
+        margin: 10px 0;
+    }
+    
+    .metric-label {
+        font-size: 1rem;
+        opacity: 0.9;
+    }
+    
+    /* الشريط الجانبي - تصميم طبي حديث */
+    [data-testid="stSidebar"] {
+        background: linear-gradient(180deg, var(--sidebar-start) 0%, var(--sidebar-end) 100%);
+        box-shadow: 0 8px 32px rgba(79, 172, 254, 0.3);
+        border-radius: 0 20px 20px 0;
+        border-right: 3px solid rgba(255, 255, 255, 0.2);
+    }
+
+    [data-testid="stSidebar"] * {
+        color: white;
+    }
+
+    /* أزرار القائمة الجانبية - تصميم حديث */
+    [data-testid="stSidebar"] button {
+        color: white !important;
+        background: rgba(255, 255, 255, 0.1) !important;
+        border: 1px solid rgba(255, 255, 255, 0.2) !important;
+        border-radius: 12px !important;
+        margin: 4px 8px !important;
+        padding: 12px 16px !important;
+        font-weight: 600 !important;
+        font-size: 14px !important;
+        transition: all 0.3s ease !important;
+        backdrop-filter: blur(10px) !important;
+        box-shadow: 0 4px 15px rgba(0, 0, 0, 0.1) !important;
+    }
+
+    [data-testid="stSidebar"] button:hover {
+        background: rgba(255, 255, 255, 0.2) !important;
+        transform: translateY(-2px) !important;
+        box-shadow: 0 6px 20px rgba(0, 0, 0, 0.15) !important;
+        border-color: rgba(255, 255, 255, 0.4) !important;
+    }
+
+    [data-testid="stSidebar"] button:active,
+    [data-testid="stSidebar"] button:focus {
+        background: rgba(255, 255, 255, 0.3) !important;
+        transform: translateY(0px) !important;
+        box-shadow: 0 2px 10px rgba(0, 0, 0, 0.2) !important;
+    }
+
+    /* تحسين النص في الأزرار */
+    [data-testid="stSidebar"] button span {
+        color: white !important;
+        font-weight: 600 !important;
+    }
+
+    /* عنوان الشريط الجانبي */
+    [data-testid="stSidebar"] h1 {
+        color: white !important;
+        text-shadow: 0 2px 4px rgba(0, 0, 0, 0.3) !important;
+        font-weight: 700 !important;
+    }
+
+    /* النصوص الجانبية */
+    [data-testid="stSidebar"] p {
+        color: rgba(255, 255, 255, 0.9) !important;
+        font-weight: 500 !important;
+    }
+
+    /* عناوين الأقسام */
+    [data-testid="stSidebar"] h3 {
+        color: white !important;
+        border-bottom: 2px solid rgba(255, 255, 255, 0.3) !important;
+        padding-bottom: 8px !important;
+        margin-bottom: 16px !important;
+        font-weight: 600 !important;
+    }
+
+    /* خطوط الفصل */
+    [data-testid="stSidebar"] hr {
+        border-color: rgba(255, 255, 255, 0.3) !important;
+        margin: 20px 0 !important;
+    }
+    
+    /* الأزرار المحسنة */
+    .stButton>button {
+        border-radius: 12px;
+        font-weight: 600;
+        transition: all 0.3s ease;
+        border: none;
+        padding: 12px 24px;
+        font-size: 14px;
+        letter-spacing: 0.5px;
+    }
+
+    .stButton>button:hover {
+        transform: translateY(-3px);
+        box-shadow: 0 8px 20px rgba(0,0,0,0.25);
+    }
+
+    .stButton>button:active {
+        transform: translateY(-1px);
+    }
+
+    /* الجداول المحسنة */
+    .dataframe {
+        border-radius: 12px;
+        overflow: hidden;
+        box-shadow: 0 4px 15px rgba(0,0,0,0.08);
+        border: 1px solid #e9ecef;
+    }
+
+    .dataframe th {
+        background: linear-gradient(135deg, #f8f9fa 0%, #e9ecef 100%);
+        font-weight: 600;
+        color: var(--dark-text);
+        padding: 15px;
+        border-bottom: 2px solid #dee2e6;
+    }
+
+    .dataframe td {
+        padding: 12px 15px;
+        border-bottom: 1px solid #f1f3f4;
+    }
+
+    .dataframe tr:nth-child(even) {
+        background-color: #f8f9fa;
+    }
+
+    .dataframe tr:hover {
+        background-color: #e3f2fd;
+        transition: background-color 0.2s ease;
+    }
+
+    /* العنوان الرئيسي المحسن */
+    .main-header {
+        background: linear-gradient(135deg, var(--primary-color) 0%, var(--primary-dark) 100%);
+        padding: 40px 30px;
+        border-radius: 20px;
+        color: white;
+        text-align: center;
+        margin-bottom: 40px;
+        box-shadow: 0 10px 30px rgba(0,0,0,0.15);
+        position: relative;
+        overflow: hidden;
+    }
+
+    .main-header::before {
+        content: '';
+        position: absolute;
+        top: 0;
+        left: 0;
+        right: 0;
+        bottom: 0;
+        background: url('data:image/svg+xml,<svg xmlns="http://www.w3.org/2000/svg" viewBox="0 0 100 100"><defs><pattern id="grain" width="100" height="100" patternUnits="userSpaceOnUse"><circle cx="25" cy="25" r="1" fill="rgba(255,255,255,0.1)"/><circle cx="75" cy="75" r="1" fill="rgba(255,255,255,0.1)"/><circle cx="50" cy="10" r="0.5" fill="rgba(255,255,255,0.1)"/></pattern></defs><rect width="100" height="100" fill="url(%23grain)"/></svg>');
+        opacity: 0.1;
+    }
+
+    .main-header h1 {
+        position: relative;
+        z-index: 1;
+        margin: 0;
+    }
+
+    /* بطاقة إحصائية محسنة */
+    .stat-box {
+        background: white;
+        padding: 25px;
+        border-radius: 16px;
+        box-shadow: 0 6px 20px rgba(0,0,0,0.08);
+        border-right: 5px solid var(--primary-color);
+        transition: all 0.3s ease;
+        border: 1px solid #f1f3f4;
+    }
+
+    .stat-box:hover {
+        transform: translateY(-3px);
+        box-shadow: 0 10px 30px rgba(0,0,0,0.12);
+    }
+    
+    /* دعم RTL للعربية */
+    .rtl {
+        direction: rtl;
+        text-align: right;
+    }
+    
+    /* التنبيهات المحسنة */
+    .alert-box {
+        padding: 20px;
+        border-radius: 12px;
+        margin: 15px 0;
+        border-left: 5px solid;
+        box-shadow: 0 4px 12px rgba(0,0,0,0.08);
+        transition: all 0.3s ease;
+        position: relative;
+        overflow: hidden;
+    }
+
+    .alert-box::before {
+        content: '';
+        position: absolute;
+        top: 0;
+        left: 0;
+        width: 4px;
+        height: 100%;
+        background: inherit;
+    }
+
+    .alert-box:hover {
+        transform: translateY(-2px);
+        box-shadow: 0 6px 18px rgba(0,0,0,0.12);
+    }
+
+    .alert-success {
+        background: linear-gradient(135deg, #d4edda 0%, #c3e6cb 100%);
+        border-color: var(--success-color);
+        color: #155724;
+    }
+
+    .alert-warning {
+        background: linear-gradient(135deg, #fff3cd 0%, #ffeaa7 100%);
+        border-color: var(--warning-color);
+        color: #856404;
+    }
+
+    .alert-danger {
+        background: linear-gradient(135deg, #f8d7da 0%, #f5c6cb 100%);
+        border-color: var(--danger-color);
+        color: #721c24;
+    }
+
+    .alert-info {
+        background: linear-gradient(135deg, #d1ecf1 0%, #bee5eb 100%);
+        border-color: var(--info-color);
+        color: #0c5460;
+    }
+    
+    /* تحسين المدخلات والنماذج */
+    .stTextInput>div>div>input,
+    .stSelectbox>div>div>select,
+    .stTextArea>div>div>textarea,
+    .stNumberInput>div>div>input {
+        border-radius: 10px;
+        border: 2px solid #e0e0e0;
+        padding: 12px 16px;
+        font-size: 14px;
+        transition: all 0.3s ease;
+        background: white;
+        box-shadow: 0 2px 4px rgba(0,0,0,0.04);
+    }
+
+    .stTextInput>div>div>input:focus,
+    .stSelectbox>div>div>select:focus,
+    .stTextArea>div>div>textarea:focus,
+    .stNumberInput>div>div>input:focus {
+        border-color: var(--primary-color);
+        box-shadow: 0 0 0 0.2rem rgba(102, 126, 234, 0.25), 0 4px 12px rgba(102, 126, 234, 0.15);
+        transform: translateY(-1px);
+    }
+
+    /* تحسين التخطيط باستخدام CSS Grid */
+    .grid-container {
+        display: grid;
+        grid-template-columns: repeat(auto-fit, minmax(300px, 1fr));
+        gap: 20px;
+        margin: 20px 0;
+    }
+
+    .grid-item {
+        background: white;
+        padding: 20px;
+        border-radius: 12px;
+        box-shadow: 0 4px 15px rgba(0,0,0,0.08);
+        border: 1px solid #f1f3f4;
+        transition: all 0.3s ease;
+    }
+
+    .grid-item:hover {
+        transform: translateY(-3px);
+        box-shadow: 0 8px 25px rgba(0,0,0,0.12);
+    }
+
+    /* تحسين الرسوم البيانية */
+    .plotly-graph-div {
+        border-radius: 12px;
+        box-shadow: 0 4px 15px rgba(0,0,0,0.08);
+        border: 1px solid #f1f3f4;
+        overflow: hidden;
+    }
+
+    /* أزرار الإجراءات في الجداول */
+    .action-buttons {
+        display: flex;
+        gap: 8px;
+        justify-content: center;
+    }
+
+    .action-btn {
+        padding: 6px 12px;
+        border-radius: 6px;
+        font-size: 12px;
+        font-weight: 500;
+        text-decoration: none;
+        border: none;
+        cursor: pointer;
+        transition: all 0.2s ease;
+    }
+
+    .action-btn.edit {
+        background: #28a745;
+        color: white;
+    }
+
+    .action-btn.edit:hover {
+        background: #218838;
+        transform: translateY(-1px);
+    }
+
+    .action-btn.delete {
+        background: #dc3545;
+        color: white;
+    }
+
+    .action-btn.delete:hover {
+        background: #c82333;
+        transform: translateY(-1px);
+    }
+
+    /* رسائل التأكيد */
+    .confirmation-dialog {
+        background: white;
+        padding: 25px;
+        border-radius: 12px;
+        box-shadow: 0 10px 30px rgba(0,0,0,0.2);
+        border: 1px solid #dee2e6;
+        max-width: 400px;
+        margin: 20px auto;
+    }
+
+    .confirmation-dialog h3 {
+        color: var(--dark-text);
+        margin-bottom: 15px;
+    }
+
+    .confirmation-dialog p {
+        color: var(--secondary-color);
+        margin-bottom: 20px;
+    }
+
+    /* تحسين التنقل */
+    .nav-tabs {
+        display: flex;
+        border-bottom: 2px solid #e9ecef;
+        margin-bottom: 20px;
+    }
+
+    .nav-tab {
+        padding: 12px 24px;
+        background: transparent;
+        border: none;
+        border-bottom: 3px solid transparent;
+        font-weight: 500;
+        color: var(--secondary-color);
+        cursor: pointer;
+        transition: all 0.3s ease;
+    }
+
+    .nav-tab.active,
+    .nav-tab:hover {
+        color: var(--primary-color);
+        border-bottom-color: var(--primary-color);
+    }
+"""
+
+_theme = None
+_theme_version = None
+
+def load_theme():
+    """قيم المظهر من جدول الإعدادات - تُقرأ من جديد فقط عند تغيير الإعدادات (من أي عملية)"""
+    global _theme, _theme_version
+    from database.versions import table_versions
+    version = table_versions.current('settings')
+    if _theme is None or version != _theme_version:
+        from database.crud import crud
+        _theme_version = version
+        theme = {key: default for key, _, default in THEME_VARIABLES}
+        theme['theme_css_delivery'] = 'static'
+        try:
+            settings = crud.get_all_settings()
+            for key, value in zip(settings['key'], settings['value']):
+                if key in theme and value:
+                    theme[key] = value
+        except Exception:
+            pass
+        _theme = theme
+    return _theme
+
+def reload_theme():
+    """إعادة قراءة المظهر بعد تعديل الإعدادات"""
+    global _theme
+    _theme = None
+
+@lru_cache(maxsize=8)
+def build_css(theme_items):
+    """بناء CSS كاملاً من قيم المظهر، يُرجع (css, البصمة)"""
+    theme = dict(theme_items)
+    lines = [f"{name}: {theme.get(key, default)};" for key, name, default in THEME_VARIABLES]
+    lines += [f"{name}: {value};" for name, value in SEMANTIC_VARIABLES]
+    variables = ":root {\n" + "\n".join(f"        {line}" for line in lines) + "\n    }"
+    css = BASE_CSS.replace("__THEME_VARIABLES__", variables)
+    return css, hashlib.sha1(css.encode('utf-8')).hexdigest()[:12]
+
+def get_theme_css():
+    theme = load_theme()
+    return build_css(tuple(sorted((k, v) for k, v in theme.items() if k != 'theme_css_delivery')))
+
+def publish_css(css, digest):
+    """كتابة CSS كملف ثابت باسم يحتوي البصمة (يُخزن في المتصفح) وحذف النسخ القديمة"""
+    filename = f"cura-{digest}.css"
+    path = os.path.join(STATIC_DIR, filename)
+    if os.path.exists(path):
+        return filename
+    try:
+        os.makedirs(STATIC_DIR, exist_ok=True)
+        with open(path + '.tmp', 'w', encoding='utf-8') as f:
+            f.write(css)
+        os.replace(path + '.tmp', path)
+        for name in os.listdir(STATIC_DIR):
+            if name.startswith('cura-') and name.endswith('.css') and name != filename:
+                os.remove(os.path.join(STATIC_DIR, name))
+    except OSError:
+        return None
+    return filename
+
+def static_serving_enabled():
+    try:
+        return bool(st.get_option('server.enableStaticServing'))
+    except Exception:
+        return False
+
+def css_markup(delivery=None):
+    """الوسم الذي يُرسل في كل إعادة تشغيل: <link> للملف الثابت أو <style> مضمن"""
+    css, digest = get_theme_css()
+    delivery = delivery or load_theme().get('theme_css_delivery', 'static')
+    if delivery == 'static' and static_serving_enabled():
+        filename = publish_css(css, digest)
+        if filename:
+            return f'<link rel="stylesheet" href="{STATIC_URL}/{filename}">'
+    # نص ثابت لكل بصمة: يستفيد من ذاكرة الرسائل في Streamlit بدلاً من إعادة الإرسال
+    return f'<style id="cura-theme-{digest}">{css}</style>'
+
 def load_custom_css():
     """تحميل الأنماط المخصصة"""
-    st.markdown("""
-    <style>
-        /* تحسين الخط العربي */
-        @import url('https://fonts.googleapis.com/css2?family=Cairo:wght@300;400;600;700&display=swap');
-        
-        html, body, [class*="css"] {
-            font-family: 'Cairo', sans-serif;
-        }
-        
-        /* البطاقات */
-        .metric-card {
-            background: linear-gradient(135deg, #667eea 0%, #764ba2 100%);
-            padding: 20px;
-            border-radius: 15px;
-            color: white;
-            box-shadow: 0 4px 15px rgba(0,0,0,0.1);
-            text-align: center;
-            margin: 10px 0;
-            transition: transform 0.3s ease;
-        }
-        
-        .metric-card:hover {
-            transform: translateY(-5px);
-            box-shadow: 0 6px 20px rgba(0,0,0,0.15);
-        }
-        
-        .metric-card.success {
-            background: linear-gradient(135deg, #11998e 0%, #38ef7d 100%);
-        }
-        
-        .metric-card.warning {
-            background: linear-gradient(135deg, #f093fb 0%, #f5576c 100%);
-        }
-        
-        .metric-card.info {
-            background: linear-gradient(135deg, #4facfe 0%, #00f2fe 100%);
-        }
-        
-        .metric-card.danger {
-            background: linear-gradient(135deg, #fa709a 0%, #fee140 100%);
-        }
-        
-        .metric-value {
-            font-size: 2.5rem;
-            font-weight: 700;
-            margin: 10px 0;
-        }
-        
-        .metric-label {
-            font-size: 1rem;
-            opacity: 0.9;
-        }
-        
-        /* ========== الشريط الجانبي ========== */
-        [data-testid="stSidebar"] {
-            background: linear-gradient(180deg, #1a1a2e 0%, #16213e 100%);
-        }
-        
-        [data-testid="stSidebar"] h1,
-        [data-testid="stSidebar"] h2,
-        [data-testid="stSidebar"] h3,
-        [data-testid="stSidebar"] p {
-            color: white !important;
-        }
-        
-        /* أزرار القائمة الجانبية */
-        [data-testid="stSidebar"] .stButton > button {
-            width: 100%;
-            background-color: rgba(255, 255, 255, 0.1);
-            color: #000000 !important;
-            border: 1px solid rgba(255, 255, 255, 0.2);
-            border-radius: 8px;
-            padding: 12px 16px;
-            font-size: 15px;
-            font-weight: 500;
-            text-align: right;
-            direction: rtl;
-            transition: all 0.3s ease;
-            margin: 5px 0;
-        }
-
-        [data-testid="stSidebar"] .stButton > button:hover {
-            background-color: rgba(102, 126, 234, 0.8);
-            border-color: rgba(102, 126, 234, 1);
-            color: #000000 !important;
-            transform: translateX(-5px);
-            box-shadow: 0 4px 12px rgba(102, 126, 234, 0.4);
-        }
-
-        [data-testid="stSidebar"] .stButton > button:active,
-        [data-testid="stSidebar"] .stButton > button:focus {
-            background-color: rgba(102, 126, 234, 1);
-            border-color: rgba(102, 126, 234, 1);
-            color: #000000 !important;
-            box-shadow: 0 0 0 3px rgba(102, 126, 234, 0.3);
-        }
-        
-        [data-testid="stSidebar"] .element-container div[data-testid="stMarkdownContainer"] p {
-            color: white !important;
-        }
-        
-        [data-testid="stSidebar"] .stAlert {
-            background-color: rgba(255, 255, 255, 0.1) !important;
-            color: white !important;
-            border: 1px solid rgba(255, 255, 255, 0.2);
-        }
-        
-        [data-testid="stSidebar"] .stSuccess {
-            background-color: rgba(56, 239, 125, 0.2) !important;
-            color: #38ef7d !important;
-            border: 1px solid rgba(56, 239, 125, 0.4);
-        }
-        
-        [data-testid="stSidebar"] .stWarning {
-            background-color: rgba(255, 193, 7, 0.2) !important;
-            color: #ffc107 !important;
-            border: 1px solid rgba(255, 193, 7, 0.4);
-        }
-        
-        [data-testid="stSidebar"] .stError {
-            background-color: rgba(220, 53, 69, 0.2) !important;
-            color: #ff6b6b !important;
-            border: 1px solid rgba(220, 53, 69, 0.4);
-        }
-        
-        [data-testid="stSidebar"] hr {
-            border-color: rgba(255, 255, 255, 0.2);
-        }
-        
-        [data-testid="stSidebar"] * {
-            color: #ffffff;
-        }
-        
-        [data-testid="stSidebar"] button span {
-            color: #000000 !important;
-        }
-        
-        /* الأزرار العادية */
-        .stButton>button {
-            border-radius: 10px;
-            font-weight: 600;
-            transition: all 0.3s ease;
-            border: none;
-        }
-        
-        .stButton>button:hover {
-            transform: translateY(-2px);
-            box-shadow: 0 5px 15px rgba(0,0,0,0.2);
-        }
-        
-        /* العنوان الرئيسي */
-        .main-header {
-            background: linear-gradient(135deg, #667eea 0%, #764ba2 100%);
-            padding: 30px;
-            border-radius: 15px;
-            color: white;
-            text-align: center;
-            margin-bottom: 30px;
-            box-shadow: 0 5px 20px rgba(0,0,0,0.1);
-        }
-        
-        /* تقرير المريض */
-        .patient-report {
-            background: white;
-            padding: 30px;
-            border-radius: 15px;
-            box-shadow: 0 2px 10px rgba(0,0,0,0.1);
-            margin: 20px 0;
-        }
-        
-        .report-header {
-            background: linear-gradient(135deg, #667eea 0%, #764ba2 100%);
-            color: white;
-            padding: 20px;
-            border-radius: 10px;
-            margin-bottom: 20px;
-        }
-        
-        .report-section {
-            border-left: 4px solid #667eea;
-            padding-left: 15px;
-            margin: 20px 0;
-        }
-        
-        .report-table {
-            width: 100%;
-            border-collapse: collapse;
-            margin: 10px 0;
-        }
-        
-        .report-table th {
-            background-color: #f8f9fa;
-            padding: 10px;
-            text-align: right;
-            border-bottom: 2px solid #dee2e6;
-        }
-        
-        .report-table td {
-            padding: 10px;
-            border-bottom: 1px solid #dee2e6;
-        }
-        
-        /* تحسين المدخلات */
-        .stTextInput>div>div>input, .stSelectbox>div>div>select {
-            border-radius: 8px;
-            border: 2px solid #e0e0e0;
-            padding: 10px;
-        }
-        
-        .stTextInput>div>div>input:focus, .stSelectbox>div>div>select:focus {
-            border-color: #667eea;
-            box-shadow: 0 0 0 0.2rem rgba(102, 126, 234, 0.25);
-        }
-    </style>
-    """, unsafe_allow_html=True)
+    st.markdown(css_markup(), unsafe_allow_html=True)
@@ -21,6 +21,77 @@ def test_validation_functions():
         print(f'Error testing validation: {e}')
         return False
 
+def test_incremental_validation():
+    """Test that incremental validation picks up changed rows and their fixes"""
+    print('Testing incremental validation...')
+    try:
+        validator.get_validation_report(mode='full')
+
+        conn = crud.db.get_connection()
+        cursor = conn.cursor()
+        cursor.execute("INSERT INTO doctors (name, specialization, commission_rate) VALUES ('Test Doctor', 'General', 150)")
+        doctor_id = cursor.lastrowid
+        conn.commit()
+
+        flagged = validator.get_validation_report()['data_consistency_issues']
+        cursor.execute("UPDATE doctors SET commission_rate = 10 WHERE id = ?", (doctor_id,))
+        conn.commit()
+        cleared = validator.get_validation_report()['data_consistency_issues']
+
+        cursor.execute("DELETE FROM doctors WHERE id = ?", (doctor_id,))
+        conn.commit()
+        conn.close()
+
+        def has_issue(issues):
+            return ((issues['check'] == 'doctor_commission') & (issues['record_id'] == doctor_id)).any()
+
+        if has_issue(flagged) and not has_issue(cleared):
+            print('✅ Incremental validation working correctly')
+            return True
+        else:
+            print('❌ Incremental validation missed the changed row')
+            return False
+
+    except Exception as e:
+        print(f'Error testing incremental validation: {e}')
+        return False
+
+def test_migration_fixes():
+    """Test that grouped set-based fixes are applied in one pass"""
+    print('Testing migration fixes...')
+    try:
+        from database.migration import migration
+
+        conn = crud.db.get_connection()
+        cursor = conn.cursor()
+        cursor.executemany(
+            "INSERT INTO doctors (name, specialization, commission_rate) VALUES (?, 'General', ?)",
+            [('Test Doctor A', 150), ('Test Doctor B', -5)]
+        )
+        conn.commit()
+
+        issues = validator.get_validation_report()['data_consistency_issues']
+        commission_issues = issues[issues['check'] == 'doctor_commission']
+        fixed, failed = migration.apply_fixes(commission_issues)
+
+        rates = [row[0] for row in cursor.execute(
+            "SELECT commission_rate FROM doctors WHERE name IN ('Test Doctor A', 'Test Doctor B')"
+        )]
+        cursor.execute("DELETE FROM doctors WHERE name IN ('Test Doctor A', 'Test Doctor B')")
+        conn.commit()
+        conn.close()
+
+        if fixed == len(commission_issues) >= 2 and failed == 0 and rates == [50.0, 50.0]:
+            print('✅ Migration fixes working correctly')
+            return True
+        else:
+            print(f'❌ Migration fixes not applied: fixed={fixed}, failed={failed}, rates={rates}')
+            return False
+
+    except Exception as e:
+        print(f'Error testing migration fixes: {e}')
+        return False
+
 def test_crud_operations():
     """Test CRUD operations with validation"""
     print('Testing CRUD operations with validation...')
@@ -83,6 +154,985 @@ def test_cascade_delete():
         print(f'Error testing cascade logic: {e}')
         return False
 
+def test_query_profiler():
+    """Test that CRUD operations and their queries are profiled"""
+    print('Testing query profiler...')
+    try:
+        from database.profiler import profiler
+
+        profiler.reset()
+        crud.get_all_doctors()
+        crud.get_dashboard_stats()
+
+        operations = {op['operation']: op for op in profiler.top_operations(limit=50)}
+        queries = profiler.top_queries(limit=50)
+
+        # استعلام بطيء داخل معاملة كتابة مفتوحة: لا ينتظر قفل المستدعي ويُحفظ بعد الالتزام
+        import time
+        threshold = profiler.slow_query_ms
+        marker = f"profiler-test-{time.time()}"
+        profiler.configure(slow_query_ms=0)
+        try:
+            conn = crud.db.get_connection()
+            cursor = conn.cursor()
+            started = time.perf_counter()
+            cursor.execute("UPDATE settings SET value = value WHERE key = ?", (marker,))
+            cursor.execute("SELECT COUNT(*) FROM settings WHERE key = ?", (marker,)).fetchone()
+            conn.commit()
+            conn.close()
+            elapsed_ms = (time.perf_counter() - started) * 1000
+        finally:
+            profiler.configure(slow_query_ms=threshold)
+        slow = crud.get_slow_queries()
+        recorded = slow[slow['params'].str.contains(marker, regex=False)]
+        conn = crud.db.get_connection()
+        conn.execute("DELETE FROM query_stats WHERE params LIKE ?", (f"%{marker}%",))
+        conn.commit()
+        conn.close()
+
+        print(f'Profiled {len(operations)} operations and {len(queries)} queries, '
+              f'slow write in {elapsed_ms:.1f} ms, {len(recorded)} slow rows')
+
+        if (operations.get('get_dashboard_stats', {}).get('calls') == 1 and len(queries) >= 7
+                and elapsed_ms < 500 and len(recorded) == 2):
+            print('✅ Query profiler working correctly')
+            return True
+        else:
+            print('❌ Query profiler did not record the expected operations')
+            return False
+
+    except Exception as e:
+        print(f'Error testing query profiler: {e}')
+        return False
+
+def test_rerun_tracing():
+    """Test that spans and DB round-trips are attributed within a traced rerun"""
+    print('Testing rerun tracing...')
+    try:
+        import json
+        from utils.tracing import tracer, export_chrome_trace
+
+        tracer.begin_rerun('dashboard')
+        with tracer.span('dashboard', 'page'):
+            with tracer.span('stats'):
+                crud.get_dashboard_stats()
+        trace = tracer.end_rerun()
+
+        rows = {row['path']: row for row in trace.summary()}
+        events = json.loads(export_chrome_trace([trace]))['traceEvents']
+
+        print(f'Traced {trace.db_roundtrips} round-trips in {len(trace.spans)} spans')
+
+        if (rows.get('dashboard › stats', {}).get('db_roundtrips') == trace.db_roundtrips > 0
+                and any(e.get('cat') == 'crud' for e in events)):
+            print('✅ Rerun tracing working correctly')
+            return True
+        else:
+            print('❌ Rerun tracing did not attribute the queries')
+            return False
+
+    except Exception as e:
+        print(f'Error testing rerun tracing: {e}')
+        return False
+
+def test_calendar_index():
+    """Test that the calendar index follows bookings and cancellations incrementally"""
+    print('Testing calendar index...')
+    try:
+        from datetime import date, timedelta
+        from database.calendar_index import parse_working_hours
+
+        hours = parse_working_hours('السبت - الخميس: 9 صباحاً - 9 مساءً')
+        doctors = crud.get_all_doctors()
+        patients = crud.get_all_patients()
+        doctor_id = int(doctors['id'].iloc[0])
+        day = date.today() + timedelta(days=3)
+
+        before = crud.get_doctor_day_load(doctor_id, day)['booked_minutes']
+        appointment_id = crud.create_appointment(int(patients['id'].iloc[0]), doctor_id, None, day.isoformat(), '10:00')
+        booked = crud.get_doctor_day_load(doctor_id, day)['booked_minutes']
+        matrix = crud.get_doctors_occupancy(day, 7, value='booked_minutes')
+        crud.update_appointment_status(appointment_id, 'ملغي')
+        cancelled = crud.get_doctor_day_load(doctor_id, day)['booked_minutes']
+        crud.delete_appointment(appointment_id)
+
+        # يوم قبل النافذة المفهرسة وبتواريخ نصية كبقية دوال crud
+        past = (date.today() - timedelta(days=40)).isoformat()
+        past_before = crud.get_doctor_day_load(doctor_id, past)['booked_minutes']
+        past_id = crud.create_appointment(int(patients['id'].iloc[0]), doctor_id, None, past, '10:00')
+        past_booked = crud.get_doctor_day_load(doctor_id, past)['booked_minutes']
+        past_matrix = crud.get_doctors_occupancy(past, 7, value='booked_minutes')
+        crud.delete_appointment(past_id)
+
+        doctor_name = doctors['name'].iloc[0]
+        print(f'Booked minutes {before} -> {booked} -> {cancelled}, matrix {matrix.shape}, '
+              f'past day {past_before} -> {past_booked}')
+
+        if (hours.weekdays == frozenset({5, 6, 0, 1, 2, 3}) and (hours.open_minute, hours.close_minute) == (540, 1260)
+                and booked == before + 30 and cancelled == before
+                and matrix.loc[matrix.index == doctor_name, day.isoformat()].max() == booked
+                and past_booked == past_before + 30
+                and past_matrix.loc[past_matrix.index == doctor_name, past].max() == past_booked):
+            print('✅ Calendar index working correctly')
+            return True
+        else:
+            print('❌ Calendar index out of date')
+            return False
+
+    except Exception as e:
+        print(f'Error testing calendar index: {e}')
+        return False
+
+def test_appointment_series():
+    """Test bulk series booking with conflicts, then set-based reschedule and cancel"""
+    print('Testing appointment series...')
+    try:
+        from datetime import date, timedelta
+
+        doctor_id = int(crud.get_all_doctors()['id'].iloc[0])
+        patient_id = int(crud.get_all_patients()['id'].iloc[0])
+        start = date.today() + timedelta(days=7)
+        while start.weekday() in (3, 4):  # الأسبوع التالي يجب أن يبقى يوم عمل
+            start += timedelta(days=1)
+
+        blocker = crud.create_appointment(patient_id, doctor_id, None, (start + timedelta(days=7)).isoformat(), '07:15')
+        result = crud.create_appointment_series(patient_id, doctor_id, None, start, '07:00', occurrences=4)
+        moved = crud.reschedule_series(result['series_id'], '07:30', shift_days=1)
+        cancelled = crud.cancel_series(result['series_id'])
+
+        conn = crud.db.get_connection()
+        cursor = conn.cursor()
+        times = {row[0] for row in cursor.execute(
+            "SELECT appointment_time FROM appointments WHERE series_id = ?", (result['series_id'],))}
+        cursor.execute("DELETE FROM appointments WHERE series_id = ? OR id = ?", (result['series_id'], blocker))
+        cursor.execute("DELETE FROM appointment_series WHERE id = ?", (result['series_id'],))
+        conn.commit()
+        conn.close()
+
+        print(f"Created {result['created']} with {len(result['conflicts'])} conflict, moved {moved}, cancelled {cancelled}")
+
+        if (result['created'] == 3 and result['conflicts'][0][1] == 'الطبيب مشغول'
+                and moved == 3 and cancelled == 3 and times == {'07:30'}):
+            print('✅ Appointment series working correctly')
+            return True
+        else:
+            print('❌ Appointment series did not book or update as expected')
+            return False
+
+    except Exception as e:
+        print(f'Error testing appointment series: {e}')
+        return False
+
+def test_notification_engine():
+    """Test that the notification engine batches alerts and never duplicates them"""
+    print('Testing notification engine...')
+    try:
+        from database.notifications import NOTIFICATION_RULES, notification_engine
+
+        # تنبيهات المحرك من تشغيلات سابقة (واختبار المجدول) تمنع الإدراج الأول
+        rule_types = [rule['type'] for rule in NOTIFICATION_RULES]
+        placeholders = ', '.join('?' * len(rule_types))
+
+        def clear_engine_notifications():
+            conn = crud.db.get_connection()
+            conn.execute(f"DELETE FROM notifications WHERE type IN ({placeholders})", rule_types)
+            conn.commit()
+            conn.close()
+
+        clear_engine_notifications()
+        unread_before = crud.get_unread_notifications_count()
+        first = notification_engine.run()
+        second = notification_engine.run()
+        notifications = crud.get_all_notifications(limit=1000)
+        notifications = notifications[notifications['type'].isin(rule_types)]
+        low_stock = notifications[notifications['type'] == 'low_stock']
+        unread = crud.get_unread_notifications_count() - unread_before
+        clear_engine_notifications()
+
+        print(f'First run created {first}, second run {second}, {unread} unread')
+
+        if (first == len(notifications) and second == 0 and unread == first
+                and len(low_stock) == len(crud.get_low_stock_items())):
+            print('✅ Notification engine working correctly')
+            return True
+        else:
+            print('❌ Notification engine created duplicate or missing alerts')
+            return False
+
+    except Exception as e:
+        print(f'Error testing notification engine: {e}')
+        return False
+
+def test_inventory_lots():
+    """Test FEFO consumption across lots and the precomputed on-hand balance"""
+    print('Testing inventory lots...')
+    try:
+        from datetime import date, timedelta
+
+        far = (date.today() + timedelta(days=300)).isoformat()
+        near = (date.today() + timedelta(days=20)).isoformat()
+        item_id = crud.create_inventory_item('Test Lot Item', 'أخرى', 5, 10.0, 4, expiry_date=far)
+        crud.receive_inventory_lot(item_id, 5, 12.0, expiry_date=near)
+        usage_id = crud.add_inventory_usage(item_id, None, 7, date.today().isoformat())
+
+        try:
+            crud.add_inventory_usage(item_id, None, 10, date.today().isoformat())
+            over_consumed = True
+        except ValueError:
+            over_consumed = False
+
+        stock = crud.get_stock_on_hand().set_index('id').loc[item_id]
+        item = crud.get_all_inventory().set_index('id').loc[item_id]
+        lots = crud.get_inventory_lots(item_id)
+        low_stock = item_id in crud.get_low_stock_items()['id'].values
+
+        conn = crud.db.get_connection()
+        cursor = conn.cursor()
+        cursor.execute("DELETE FROM inventory_usage_lots WHERE lot_id IN (SELECT id FROM inventory_lots WHERE inventory_id = ?)", (item_id,))
+        cursor.execute("DELETE FROM inventory_usage WHERE inventory_id = ?", (item_id,))
+        cursor.execute("DELETE FROM inventory_lots WHERE inventory_id = ?", (item_id,))
+        cursor.execute("DELETE FROM inventory_on_hand WHERE inventory_id = ?", (item_id,))
+        cursor.execute("DELETE FROM inventory WHERE id = ?", (item_id,))
+        conn.commit()
+        conn.close()
+
+        print(f"On hand {stock['quantity']} worth {stock['stock_value']}, {len(lots)} lot left, usage {usage_id}")
+
+        if (stock['quantity'] == 3 and stock['stock_value'] == 30.0 and item['quantity'] == 3
+                and item['expiry_date'] == far and len(lots) == 1 and low_stock and not over_consumed):
+            print('✅ Inventory lots working correctly')
+            return True
+        else:
+            print('❌ Inventory lots consumed or valued incorrectly')
+            return False
+
+    except Exception as e:
+        print(f'Error testing inventory lots: {e}')
+        return False
+
+def test_inventory_forecast():
+    """Test projected demand, days of cover and reorder suggestions"""
+    print('Testing inventory forecast...')
+    try:
+        from datetime import date, timedelta
+
+        item_id = crud.create_inventory_item('Test Forecast Item', 'أخرى', 10, 5.0, 12)
+        conn = crud.db.get_connection()
+        cursor = conn.cursor()
+        cursor.executemany(
+            "INSERT INTO inventory_usage (inventory_id, quantity_used, usage_date) VALUES (?, 3, ?)",
+            [(item_id, (date.today() - timedelta(days=day)).isoformat()) for day in range(1, 31)]
+        )
+        conn.commit()
+
+        forecast = crud.get_inventory_forecast(refresh=True).set_index('id').loc[item_id]
+        suggested = item_id in crud.get_reorder_suggestions()['id'].values
+
+        # استلام دفعة يُبطل التوقع المخزن دون refresh
+        crud.receive_inventory_lot(item_id, 500, 1.0)
+        received = crud.get_inventory_forecast().set_index('id').loc[item_id]
+        still_suggested = item_id in crud.get_reorder_suggestions()['id'].values
+
+        cursor.execute("DELETE FROM inventory_usage WHERE inventory_id = ?", (item_id,))
+        cursor.execute("DELETE FROM inventory_lots WHERE inventory_id = ?", (item_id,))
+        cursor.execute("DELETE FROM inventory_on_hand WHERE inventory_id = ?", (item_id,))
+        cursor.execute("DELETE FROM inventory WHERE id = ?", (item_id,))
+        conn.commit()
+        conn.close()
+
+        print(f"Demand {forecast['daily_demand']}/day, {forecast['days_of_cover']} days of cover, reorder {forecast['reorder_qty']}, "
+              f"on hand after receiving {received['on_hand']}")
+
+        if (forecast['daily_demand'] == 1.0 and forecast['days_of_cover'] == 10.0
+                and forecast['needs_reorder'] and forecast['reorder_qty'] > 0 and suggested
+                and received['on_hand'] == 510 and not still_suggested):
+            print('✅ Inventory forecast working correctly')
+            return True
+        else:
+            print('❌ Inventory forecast projected the wrong demand')
+            return False
+
+    except Exception as e:
+        print(f'Error testing inventory forecast: {e}')
+        return False
+
+def test_treatment_materials():
+    """Test BOM deduction on completion (once only) and the historical back-fill"""
+    print('Testing treatment materials...')
+    try:
+        from datetime import date, timedelta
+
+        treatment_id = int(crud.get_all_treatments()['id'].iloc[0])
+        doctor_id = int(crud.get_all_doctors()['id'].iloc[0])
+        patient_id = int(crud.get_all_patients()['id'].iloc[0])
+        item_id = crud.create_inventory_item('Test BOM Item', 'أخرى', 5, 2.0, 1)
+        previous = crud.get_treatment_materials(treatment_id)
+        crud.set_treatment_materials(treatment_id, [(item_id, 2)])
+
+        appointment_id = crud.create_appointment(patient_id, doctor_id, treatment_id, date.today().isoformat(), '08:00')
+        crud.update_appointment_status(appointment_id, 'مكتمل')
+        crud.update_appointment_status(appointment_id, 'مكتمل')
+        on_hand = crud.get_stock_on_hand().set_index('id').loc[item_id, 'quantity']
+
+        past_id = crud.create_appointment(patient_id, doctor_id, treatment_id,
+                                          (date.today() - timedelta(days=10)).isoformat(), '08:00')
+        conn = crud.db.get_connection()
+        cursor = conn.cursor()
+        cursor.execute("UPDATE appointments SET status = 'مكتمل' WHERE id = ?", (past_id,))
+        conn.commit()
+        backfilled = crud.backfill_treatment_usage(date.today() - timedelta(days=30), date.today())
+        again = crud.backfill_treatment_usage(date.today() - timedelta(days=30), date.today())
+        after_backfill = crud.get_stock_on_hand().set_index('id').loc[item_id, 'quantity']
+
+        crud.set_treatment_materials(treatment_id, list(zip(previous['inventory_id'], previous['quantity'])))
+        cursor.execute("DELETE FROM inventory_usage_lots WHERE lot_id IN (SELECT id FROM inventory_lots WHERE inventory_id = ?)", (item_id,))
+        cursor.execute("DELETE FROM inventory_usage WHERE inventory_id = ?", (item_id,))
+        cursor.execute("DELETE FROM inventory_lots WHERE inventory_id = ?", (item_id,))
+        cursor.execute("DELETE FROM inventory_on_hand WHERE inventory_id = ?", (item_id,))
+        cursor.execute("DELETE FROM inventory WHERE id = ?", (item_id,))
+        cursor.execute("DELETE FROM appointments WHERE id IN (?, ?)", (appointment_id, past_id))
+        conn.commit()
+        conn.close()
+
+        print(f'On hand after completion {on_hand}, back-filled {backfilled} then {again}')
+
+        if on_hand == 3 and backfilled >= 1 and again == 0 and after_backfill == 3:
+            print('✅ Treatment materials working correctly')
+            return True
+        else:
+            print('❌ Treatment materials deducted incorrectly')
+            return False
+
+    except Exception as e:
+        print(f'Error testing treatment materials: {e}')
+        return False
+
+def test_analytics_snapshot():
+    """Test the Parquet snapshot export, the snapshot + live tail reads and the fallback after writes"""
+    print('Testing analytics snapshot...')
+    try:
+        import os
+        import shutil
+        import tempfile
+        from datetime import date
+        from database.analytics import AnalyticsSnapshot
+
+        directory = tempfile.mkdtemp()
+        snapshot = AnalyticsSnapshot(directory=directory)
+        today = date.today().isoformat()
+        conn = crud.db.get_connection()
+        cursor = conn.cursor()
+        insert = "INSERT INTO expenses (category, description, amount, expense_date) VALUES ('Test Snapshot', 'x', ?, ?)"
+        cursor.execute(insert, (100, '2020-01-15'))
+        conn.commit()
+
+        manifest = snapshot.export()
+        # بعد اللقطة: الماضي يُقرأ من Parquet واليوم من قاعدة البيانات
+        filters = [('category', '=', 'Test Snapshot')]
+        exported = snapshot.read('expenses', '2020-01-01', '2020-01-31', columns=['amount', 'month'], filters=filters)
+        was_current = snapshot.current(manifest)
+
+        # كتابة بتاريخ سابق بعد اللقطة: القراءة تعود إلى قاعدة البيانات
+        cursor.execute(insert, (200, '2020-01-20'))
+        cursor.execute(insert, (300, today))
+        conn.commit()
+        past = snapshot.read('expenses', '2020-01-01', '2020-01-31', columns=['amount', 'month'], filters=filters)
+        current = snapshot.read('expenses', today, today, columns=['amount'], filters=filters)
+        still_current = snapshot.current(manifest)
+        partitioned = os.path.isdir(os.path.join(directory, manifest['version'], 'expenses', 'month=2020-01'))
+
+        cursor.execute("DELETE FROM expenses WHERE category = 'Test Snapshot'")
+        conn.commit()
+        conn.close()
+        shutil.rmtree(directory)
+
+        print(f"Snapshot past {exported['amount'].tolist()}, after a backdated write {past['amount'].tolist()}, "
+              f"live tail {current['amount'].tolist()}, current {was_current}/{still_current}")
+
+        if (exported['amount'].tolist() == [100] and exported['month'].tolist() == ['2020-01']
+                and sorted(past['amount'].tolist()) == [100, 200] and past['month'].tolist() == ['2020-01'] * 2
+                and current['amount'].tolist() == [300] and was_current and not still_current and partitioned):
+            print('✅ Analytics snapshot working correctly')
+            return True
+        else:
+            print('❌ Analytics snapshot returned the wrong rows')
+            return False
+
+    except Exception as e:
+        print(f'Error testing analytics snapshot: {e}')
+        return False
+
+def test_analytics_cube():
+    """Test cube slices against plain SQL, from rollups and from live data, and after backdated writes"""
+    print('Testing analytics cube...')
+    try:
+        import shutil
+        import tempfile
+        from datetime import date, timedelta
+        import pandas as pd
+        from database.analytics import AnalyticsSnapshot
+        from database.cube import AnalyticsCube
+
+        directory = tempfile.mkdtemp()
+        cube = AnalyticsCube(AnalyticsSnapshot(directory=directory))
+        conn = crud.db.get_connection()
+        expected = pd.read_sql_query(
+            "SELECT payment_method, COUNT(*) as count, SUM(amount) as revenue FROM payments GROUP BY payment_method",
+            conn
+        ).set_index('payment_method').sort_index()
+        conn.close()
+
+        live = cube.query('payments', ['payment_method'], ['count', 'revenue']).set_index('payment_method').sort_index()
+        cube.snapshot.export()
+        cube.build_rollups()
+        from_rollup = cube.query('payments', ['payment_method'], ['count', 'revenue']).set_index('payment_method').sort_index()
+        cube.query('payments', ['payment_method'], ['count', 'revenue'])
+        hits = cube.hits
+
+        # دفعة بتاريخ الأمس وتغيير اسم طبيب بعد اللقطة: المجاميع والأسماء من البيانات الحية
+        yesterday = date.today() - timedelta(days=1)
+        conn = crud.db.get_connection()
+        appointment_id, patient_id, doctor_id = conn.execute(
+            "SELECT id, patient_id, doctor_id FROM appointments WHERE doctor_id IS NOT NULL ORDER BY id LIMIT 1"
+        ).fetchone()
+        name = conn.execute("SELECT name FROM doctors WHERE id = ?", (doctor_id,)).fetchone()[0]
+        conn.close()
+        before = cube.query('payments', measures=['revenue'], start_date=yesterday, end_date=yesterday)['revenue'].iloc[0]
+        payment_id = crud.create_payment(appointment_id, patient_id, 1234.0, 'نقدي', yesterday.isoformat())
+        after = cube.query('payments', measures=['revenue'], start_date=yesterday, end_date=yesterday)['revenue'].iloc[0]
+        conn = crud.db.get_connection()
+        conn.execute("UPDATE doctors SET name = ? WHERE id = ?", (name + ' (test)', doctor_id))
+        conn.commit()
+        renamed = cube.query('appointments', ['doctor'], ['count'])
+        renamed = renamed[renamed['doctor_id'] == doctor_id]
+        conn.execute("UPDATE doctors SET name = ? WHERE id = ?", (name, doctor_id))
+        conn.execute("DELETE FROM payments WHERE id = ?", (payment_id,))
+        conn.commit()
+        conn.close()
+        shutil.rmtree(directory)
+
+        print(f"{len(expected)} payment methods, {hits} cache hit(s), yesterday {before} -> {after}, "
+              f"renamed doctor rows {renamed['doctor_name'].tolist()}")
+
+        if (all(frame['count'].tolist() == expected['count'].tolist()
+                and (frame['revenue'] - expected['revenue']).abs().max() < 1e-6 for frame in (live, from_rollup))
+                and hits == 1 and abs(after - before - 1234.0) < 1e-6
+                and renamed['doctor_name'].tolist() == [name + ' (test)']):
+            print('✅ Analytics cube working correctly')
+            return True
+        else:
+            print('❌ Analytics cube returned the wrong totals')
+            return False
+
+    except Exception as e:
+        print(f'Error testing analytics cube: {e}')
+        return False
+
+def test_doctors_earnings():
+    """Test the grouped earnings query against the per-doctor one, also after a snapshot export"""
+    print('Testing doctors earnings...')
+    try:
+        import shutil
+        import tempfile
+        from database.analytics import AnalyticsSnapshot
+        from database.cube import analytics_cube
+
+        start_date, end_date = '2000-01-01', '2100-12-31'
+        conn = crud.db.get_connection()
+        appointment_id, patient_id, doctor_id = conn.execute(
+            "SELECT id, patient_id, doctor_id FROM appointments WHERE doctor_id IS NOT NULL ORDER BY id LIMIT 1"
+        ).fetchone()
+
+        # لقطة مؤقتة ثم دفعات بتاريخ سابق: يجب أن تدخل في الأرباح فوراً
+        directory = tempfile.mkdtemp()
+        snapshot, analytics_cube.snapshot = analytics_cube.snapshot, AnalyticsSnapshot(directory=directory)
+        analytics_cube.snapshot.export()
+        exported = crud.get_doctors_earnings(start_date, end_date).set_index('doctor_id')['total_earnings']
+        backdated_id = crud.create_payment(appointment_id, patient_id, 1000.0, 'نقدي', '2000-01-02')
+        share = conn.execute("SELECT doctor_share FROM payments WHERE id = ?", (backdated_id,)).fetchone()[0]
+
+        # دفعة بلا نسبة: AVG في SQL يتجاهلها فلا يجب أن تخفض متوسط النسبة
+        cursor = conn.cursor()
+        cursor.execute(
+            "INSERT INTO payments (appointment_id, patient_id, amount, payment_method, payment_date, doctor_percentage) "
+            "VALUES (?, ?, 10, 'نقدي', '2000-01-01', NULL)",
+            (appointment_id, patient_id)
+        )
+        payment_id = cursor.lastrowid
+        conn.commit()
+
+        earnings = crud.get_doctors_earnings(start_date, end_date)
+        by_treatment = crud.get_doctors_earnings(start_date, end_date, ('treatment',))
+        mismatched = []
+        for _, row in earnings.iterrows():
+            single = crud.get_doctor_earnings(int(row['doctor_id']), start_date, end_date)
+            total = single.iloc[0]['total_earnings'] or 0
+            percentage = single.iloc[0]['avg_percentage'] or 0
+            detail = by_treatment.loc[by_treatment['doctor_id'] == row['doctor_id'], 'total_earnings'].sum()
+            if (abs(total - row['total_earnings']) > 1e-6 or abs(detail - row['total_earnings']) > 1e-6
+                    or abs(percentage - row['avg_percentage']) > 1e-6):
+                mismatched.append(int(row['doctor_id']))
+
+        added = earnings.set_index('doctor_id')['total_earnings'][doctor_id] - exported[doctor_id]
+
+        analytics_cube.snapshot = snapshot
+        shutil.rmtree(directory)
+        conn.execute("DELETE FROM payments WHERE id IN (?, ?)", (payment_id, backdated_id))
+        conn.commit()
+        conn.close()
+
+        print(f"{len(earnings)} doctors, {len(by_treatment)} doctor/treatment rows, "
+              f"backdated share {share} -> earnings +{added}")
+
+        if not mismatched and share > 0 and abs(added - share) < 1e-6:
+            print('✅ Doctors earnings working correctly')
+            return True
+        else:
+            print(f'❌ Earnings differ for doctors {mismatched}')
+            return False
+
+    except Exception as e:
+        print(f'Error testing doctors earnings: {e}')
+        return False
+
+def test_grid_persistence():
+    """Test that grid saves write only the changed cells"""
+    print('Testing grid persistence...')
+    try:
+        from database.grid import grid_updates
+
+        ids = [crud.create_supplier(f'مورد شبكة {i}', 'أحمد', '0100000000', None, None, 'نقدي') for i in range(3)]
+        suppliers = crud.get_all_suppliers()
+        original = suppliers[suppliers['id'].isin(ids)][['id', 'name', 'contact_person', 'phone', 'email', 'payment_terms']]
+        edited = original.copy()
+        edited.loc[edited['id'] == ids[0], 'phone'] = '0111111111'
+        edited.loc[edited['id'] == ids[1], ['name', 'payment_terms']] = ['مورد معدل', 'آجل 30 يوم']
+
+        statements, changed_ids = grid_updates('suppliers', original, edited)
+        updated = crud.save_grid_changes('suppliers', original, edited)
+
+        # نسبة العيادة لا تُعدل من الجدول: تُشتق من نسبة الطبيب
+        import pandas as pd
+        treatments = pd.DataFrame({'id': [1, 2], 'doctor_percentage': [40.0, 50.0], 'clinic_percentage': [60.0, 50.0]})
+        edited_treatments = treatments.assign(doctor_percentage=[30.0, 50.0], clinic_percentage=[10.0, 20.0])
+        percentage_statements, percentage_ids = grid_updates('treatments', treatments, edited_treatments)
+        saved = crud.get_all_suppliers().set_index('id')
+
+        conn = crud.db.get_connection()
+        cursor = conn.cursor()
+        cursor.execute("SELECT COUNT(*) FROM activity_log WHERE action = 'تحديث موردين' AND details LIKE ?",
+                       (f"%{ids[0]}, {ids[1]}%",))
+        log_entries = cursor.fetchone()[0]
+        cursor.execute(f"DELETE FROM suppliers WHERE id IN ({','.join('?' * len(ids))})", ids)
+        conn.commit()
+        conn.close()
+
+        print(f"{updated} rows in {len(statements)} statement(s)")
+
+        if (updated == 2 and sorted(changed_ids) == sorted(ids[:2]) and len(statements) == 2
+                and saved.loc[ids[0], 'phone'] == '0111111111'
+                and saved.loc[ids[1], 'name'] == 'مورد معدل'
+                and saved.loc[ids[2], 'name'] == 'مورد شبكة 2'
+                and log_entries == 1
+                and percentage_ids == [1]
+                and percentage_statements == [(
+                    "UPDATE treatments SET doctor_percentage = ?, clinic_percentage = ? WHERE id = ?", [(30.0, 70.0, 1)]
+                )]):
+            print('✅ Grid persistence working correctly')
+            return True
+        else:
+            print('❌ Grid persistence saved the wrong rows')
+            return False
+
+    except Exception as e:
+        print(f'Error testing grid persistence: {e}')
+        return False
+
+def test_patient_360():
+    """Test the cached patient report and its invalidation on changes"""
+    print('Testing patient 360 report...')
+    try:
+        from database.patient360 import patient_360
+
+        doctor_id = crud.create_doctor('Report Test Doctor', 'Test', '0123456789', 'report@test.com', 'Test', '2024-01-01', 10000.0, 10.0)
+        patient_id = crud.create_patient('Report Test Patient', '0123456789', 'report@patient.com', 'Test', '1990-01-01', 'Male')
+        appointment_id = crud.create_appointment(patient_id, doctor_id, None, '2024-12-01', '10:00', 'Test', 300.0)
+        crud.update_appointment_status(appointment_id, 'مكتمل')
+        crud.create_payment(appointment_id, patient_id, 100.0, 'Cash', '2024-12-01', 'Test payment')
+
+        first = crud.get_patient_detailed_report(patient_id)
+        hits = patient_360.hits
+        cached = crud.get_patient_detailed_report(patient_id)
+        cache_hit = cached is first and patient_360.hits == hits + 1
+
+        crud.create_payment(appointment_id, patient_id, 200.0, 'Cash', '2024-12-02', 'Test payment')
+        updated = crud.get_patient_financial_summary(patient_id)
+
+        crud.delete_patient(patient_id)
+        conn = crud.db.get_connection()
+        conn.execute("DELETE FROM doctors WHERE id = ?", (doctor_id,))
+        conn.commit()
+        conn.close()
+
+        print(f"Outstanding {first['outstanding']:.2f} then {updated['outstanding_balance']:.2f}")
+
+        if (cache_hit and first['visits_stats']['completed_visits'] == 1
+                and first['outstanding'] == 200.0 and updated['outstanding_balance'] == 0.0
+                and first['doctors']['visit_count'].tolist() == [1]):
+            print('✅ Patient 360 report working correctly')
+            return True
+        else:
+            print('❌ Patient 360 report returned stale or wrong data')
+            return False
+
+    except Exception as e:
+        print(f'Error testing patient 360 report: {e}')
+        return False
+
+def test_report_batch():
+    """Test that batch report files match the single report renderer"""
+    print('Testing batch patient reports...')
+    try:
+        import os
+        import re
+        import shutil
+        import tempfile
+        from report_generator import PatientReportGenerator, render_batch
+
+        patient_ids = crud.get_all_patients()['id'].head(5).tolist()
+        directory = tempfile.mkdtemp()
+        result = render_batch(patient_ids, directory, workers=1, chunk_size=2)
+
+        def normalize(markup):
+            return re.sub(r'تاريخ التقرير: [^<]*|\s+', ' ', markup).strip()
+
+        matching = 0
+        for patient_id in patient_ids:
+            report = crud.get_patient_detailed_report(patient_id)
+            single = PatientReportGenerator.generate_html_report(
+                report['patient'], report['appointments'], report['payments'], report['treatments']
+            )
+            with open(os.path.join(directory, f'patient_{patient_id}.html'), encoding='utf-8') as f:
+                body = f.read().split('<body>')[1].split('</body>')[0]
+            matching += normalize(body) == normalize(single)
+        shutil.rmtree(directory)
+
+        print(f"{result['reports']} reports, {matching} identical to the single renderer")
+
+        if result['reports'] == len(patient_ids) and matching == len(patient_ids):
+            print('✅ Batch patient reports working correctly')
+            return True
+        else:
+            print('❌ Batch patient reports differ from the single renderer')
+            return False
+
+    except Exception as e:
+        print(f'Error testing batch patient reports: {e}')
+        return False
+
+def test_job_runner():
+    """Test background jobs: results, reuse of cached results, cancellation and orphan recovery"""
+    print('Testing background job runner...')
+    try:
+        import os
+        import shutil
+        import subprocess
+        import sys
+        import tempfile
+        import threading
+        from database.jobs import JobRunner, JOB_TYPES, job_type
+        from database.models import db
+
+        release = threading.Event()
+
+        @job_type('test_wait', 'Test job')
+        def _wait(params, progress):
+            while not release.wait(0.01):
+                progress(0.5, 'waiting')
+            return 'released'
+
+        directory = tempfile.mkdtemp()
+        runner = JobRunner(directory=directory, max_workers=1)
+        owner = 'test_job_runner'
+        params = {'start_date': '2000-01-01', 'end_date': '2100-12-31'}
+
+        # مهمة لعملية أخرى ما زالت تعمل ومهمة لعملية انتهت: تُسترجع الثانية فقط
+        finished = subprocess.Popen([sys.executable, '-c', 'pass'])
+        finished.wait()
+        conn = db.get_connection()
+        conn.executemany(
+            "INSERT INTO jobs (id, kind, owner, status, created_at, holder) "
+            "VALUES (?, 'test_wait', ?, 'running', CURRENT_TIMESTAMP, ?)",
+            [('test-job-alive', owner, f"{os.getpid()}:other"), ('test-job-orphan', owner, f"{finished.pid}:gone")]
+        )
+        conn.commit()
+        conn.close()
+
+        first = runner.wait(runner.submit('financial_report', params, owner=owner), timeout=30)
+        report = runner.result(first['id'])
+        cached = runner.wait(runner.submit('financial_report', params, owner=owner), timeout=30)
+        alive_status = runner.status('test-job-alive')['status']
+        orphan_status = runner.status('test-job-orphan')['status']
+
+        # أي كتابة في جداول التقرير تنهي إعادة استخدام النتيجة قبل انتهاء صلاحيتها
+        conn = db.get_connection()
+        conn.execute("INSERT INTO expenses (category, description, amount, expense_date) "
+                     "VALUES ('test', 'test_job_runner', 1, '2000-01-01')")
+        conn.execute("DELETE FROM expenses WHERE description = 'test_job_runner'")
+        conn.commit()
+        conn.close()
+        refreshed = runner.wait(runner.submit('financial_report', params, owner=owner), timeout=30)
+
+        # المدقق يكتب في settings عند كل تشغيل، ومع ذلك يُعاد استخدام تقريره
+        validated = runner.wait(runner.submit('validation_report', owner=owner), timeout=60)
+        revalidated = runner.wait(runner.submit('validation_report', owner=owner), timeout=60)
+
+        running = runner.submit('test_wait', owner=owner)
+        queued = runner.submit('test_wait', {'n': 2}, owner=owner)
+        cancelled_queued = runner.cancel(queued)
+        cancelled_running = runner.cancel(running)
+        running_status = runner.wait(running, timeout=30)['status']
+        queued_status = runner.status(queued)['status']
+        listed = len(runner.jobs_for(owner))
+
+        runner.shutdown()
+        del JOB_TYPES['test_wait']
+        conn = db.get_connection()
+        conn.execute("DELETE FROM jobs WHERE owner = ?", (owner,))
+        conn.commit()
+        conn.close()
+        shutil.rmtree(directory)
+
+        print(f"Report status {first['status']}, cached {cached['message']!r}, after a write "
+              f"{refreshed['message']!r}, cancelled {running_status}/{queued_status}, "
+              f"orphans {alive_status}/{orphan_status}, {listed} jobs listed")
+
+        if (first['status'] == 'done' and 'cash_flow' in report
+                and cached['status'] == 'done' and cached['result_path'] == first['result_path']
+                and refreshed['status'] == 'done' and refreshed['result_path'] != first['result_path']
+                and validated['status'] == 'done' and revalidated['result_path'] == validated['result_path']
+                and cancelled_queued and cancelled_running
+                and running_status == queued_status == 'cancelled'
+                and alive_status == 'running' and orphan_status == 'failed' and listed == 9):
+            print('✅ Background job runner working correctly')
+            return True
+        else:
+            print('❌ Background job runner failed')
+            return False
+
+    except Exception as e:
+        print(f'Error testing background job runner: {e}')
+        return False
+
+def test_task_scheduler():
+    """Test that scheduled tasks run once per day, by one lock holder, with history"""
+    print('Testing task scheduler...')
+    try:
+        from datetime import datetime, time
+        from database.scheduler import Scheduler, TASKS
+
+        saved = {task['setting']: crud.get_setting(task['setting']) for task in TASKS.values()}
+        for setting in saved:
+            crud.update_setting(setting, '06:00' if setting == 'schedule_notifications' else '')
+
+        first, second = Scheduler(), Scheduler()
+        today = datetime.now().date()
+        early = first.due_tasks(datetime.combine(today, time(5, 59)))
+        now = datetime.combine(today, time(6, 5))
+        ran = first.tick(now)
+        again = first.tick(now)
+        other = second.tick(now)
+        locked_out = not second.acquire()
+        runs = first.history(limit=5)
+        run = runs[runs['task'] == 'notifications'].iloc[0]
+
+        first.release()
+        for setting, value in saved.items():
+            crud.update_setting(setting, value)
+        from database.models import db
+        conn = db.get_connection()
+        conn.execute("DELETE FROM task_runs WHERE holder = ?", (first.holder,))
+        conn.commit()
+        conn.close()
+
+        print(f"Due early {early}, ran {ran}, again {again}, other process {other}, "
+              f"run {run['status']} in {run['duration_ms']} ms")
+
+        if (early == [] and ran == ['notifications'] and again == [] and other == []
+                and locked_out and run['status'] == 'done' and run['duration_ms'] is not None):
+            print('✅ Task scheduler working correctly')
+            return True
+        else:
+            print('❌ Task scheduler failed')
+            return False
+
+    except Exception as e:
+        print(f'Error testing task scheduler: {e}')
+        return False
+
+def test_table_versions():
+    """Test that cached reads see writes made by another process"""
+    print('Testing cross-process cache coherence...')
+    try:
+        import subprocess
+        from database.models import db
+        from database.versions import table_versions
+
+        doctor = crud.get_all_doctors().iloc[0]
+        crud.get_all_doctors()
+        reads = table_versions.reads
+        cached = crud.get_all_doctors()
+        served_from_memory = table_versions.reads == reads
+
+        def write_elsewhere(phone):
+            subprocess.run([sys.executable, '-c', (
+                "import sqlite3, sys; conn = sqlite3.connect(sys.argv[1]); "
+                "conn.execute('UPDATE doctors SET phone = ? WHERE id = ?', (sys.argv[2], int(sys.argv[3]))); "
+                "conn.commit()"
+            ), db.db_path, phone, str(doctor['id'])], check=True)
+
+        write_elsewhere('0100-versions')
+        updated = crud.get_all_doctors()
+        seen = updated.loc[updated['id'] == doctor['id'], 'phone'].iloc[0]
+        write_elsewhere(doctor['phone'])
+        restored = crud.get_all_doctors()
+        restored_phone = restored.loc[restored['id'] == doctor['id'], 'phone'].iloc[0]
+
+        print(f"Served from memory: {served_from_memory}, after external write: {seen!r}")
+
+        if served_from_memory and seen == '0100-versions' and restored_phone == doctor['phone'] and len(cached):
+            print('✅ Cross-process cache coherence working correctly')
+            return True
+        else:
+            print('❌ Cached reads missed an external write')
+            return False
+
+    except Exception as e:
+        print(f'Error testing cross-process cache coherence: {e}')
+        return False
+
+def test_reference_data():
+    """Test the indexed patient search and the open appointments of the payment form"""
+    print('Testing form reference data...')
+    try:
+        from database.versions import table_versions
+
+        doctor_id = crud.create_doctor('Lookup Test Doctor', 'Test', '0123456789', 'lookup@test.com', 'Test', '2024-01-01', 10000.0, 10.0)
+        patient_id = crud.create_patient('Zz_Lookup Patient', '0999_555_1234', 'lookup@patient.com', 'Test', '1990-01-01', 'Male')
+        paid_id = crud.create_appointment(patient_id, doctor_id, None, '2024-12-01', '10:00', 'Test', 300.0)
+        open_id = crud.create_appointment(patient_id, doctor_id, None, '2024-12-08', '10:00', 'Test', 500.0)
+        crud.create_payment(paid_id, patient_id, 300.0, 'Cash', '2024-12-01', 'Test payment')
+        crud.create_payment(open_id, patient_id, 200.0, 'Cash', '2024-12-08', 'Test payment')
+
+        by_prefix = crud.get_patient_options('zz_look')
+        by_contains = crud.get_patient_options('lookup pat')
+        by_phone = crud.get_patient_options('0999')
+        by_id = crud.get_patient_options(str(patient_id))
+        wildcard = crud.get_patient_options('zz%')
+        reads = table_versions.reads
+        cached = crud.get_patient_options('zz_look') == by_prefix and table_versions.reads == reads
+        doctors = crud.get_doctor_options()
+        open_appointments = crud.get_open_appointments(patient_id)
+
+        crud.delete_patient(patient_id)
+        removed = patient_id not in crud.get_patient_options('zz_look')
+        conn = crud.db.get_connection()
+        conn.execute("DELETE FROM doctors WHERE id = ?", (doctor_id,))
+        conn.commit()
+        conn.close()
+
+        print(f"Matches: prefix {len(by_prefix)}, phone {len(by_phone)}, open appointments {len(open_appointments)}")
+
+        if (patient_id in by_prefix and patient_id in by_contains and patient_id in by_phone
+                and patient_id in by_id and patient_id not in wildcard and cached and removed
+                and doctors.get(doctor_id) == 'Lookup Test Doctor'
+                and open_appointments['id'].tolist() == [open_id]
+                and open_appointments['remaining'].iloc[0] == 300.0):
+            print('✅ Form reference data working correctly')
+            return True
+        else:
+            print('❌ Form reference data returned wrong matches')
+            return False
+
+    except Exception as e:
+        print(f'Error testing form reference data: {e}')
+        return False
+
+def test_records():
+    """Test typed single-row getters and the pandas-free scalar helpers"""
+    print('Testing record helpers...')
+    try:
+        from database.records import Treatment, fetch_scalar, fetch_many
+
+        treatment_id = crud.create_treatment('Record Test Treatment', 'Test', 250.0, 30, 'Test', 40.0, 60.0)
+        treatment = crud.get_treatment_by_id(treatment_id)
+        missing = crud.get_treatment_by_id(-1)
+
+        conn = crud.db.get_connection()
+        count = fetch_scalar(conn, "SELECT COUNT(*) FROM treatments WHERE id = ?", (treatment_id,))
+        empty = fetch_scalar(conn, "SELECT SUM(amount) FROM payments WHERE id = -1", default=0)
+        rows = fetch_many(conn, "SELECT * FROM treatments WHERE id = ?", (treatment_id,), Treatment)
+        conn.execute("DELETE FROM treatments WHERE id = ?", (treatment_id,))
+        conn.commit()
+        conn.close()
+
+        stats = crud.get_dashboard_stats()
+        print(f"Treatment {treatment.name!r} at {treatment.base_price}, {count} row, stats {type(stats['total_patients']).__name__}")
+
+        if (isinstance(treatment, Treatment) and not hasattr(treatment, '__dict__')
+                and treatment.doctor_percentage == 40.0 and missing is None
+                and count == 1 and empty == 0 and rows == [treatment]
+                and all(type(value) is int for value in stats.values())):
+            print('✅ Record helpers working correctly')
+            return True
+        else:
+            print('❌ Record helpers returned wrong values')
+            return False
+
+    except Exception as e:
+        print(f'Error testing record helpers: {e}')
+        return False
+
+def test_schema():
+    """Test the typed columns of the analytic result frames"""
+    print('Testing result schemas...')
+    try:
+        import pandas as pd
+        from datetime import date
+        from database.schema import in_period
+
+        today = date.today()
+        before = crud.get_all_expenses()
+        expense_id = crud.create_expense('Schema Test Category', 'Schema test', 123.0, today.isoformat(), 'نقدي')
+        expenses = crud.get_all_expenses()
+        appointments = crud.get_all_appointments()
+        crud.delete_expense(expense_id)
+        after = crud.get_all_expenses()
+
+        in_today = expenses[in_period(expenses['expense_date'], today, today)]
+        counts = in_today['category'].value_counts()
+        counts = counts[counts > 0]
+        print(f"{len(before)} -> {len(expenses)} -> {len(after)} expenses, today's categories {list(counts.index)}")
+
+        if (isinstance(expenses['category'].dtype, pd.CategoricalDtype)
+                and pd.api.types.is_datetime64_any_dtype(expenses['expense_date'])
+                and pd.api.types.is_integer_dtype(expenses['id'])
+                and expenses['amount'].dtype == 'float64'
+                and isinstance(appointments['doctor_name'].dtype, pd.CategoricalDtype)
+                and pd.api.types.is_datetime64_any_dtype(appointments['appointment_date'])
+                and len(expenses) == len(before) + 1 and len(after) == len(before)
+                and expense_id in in_today['id'].tolist()
+                and 'Schema Test Category' in counts.index and (counts > 0).all()):
+            print('✅ Result schemas working correctly')
+            return True
+        else:
+            print('❌ Result schemas returned wrong types')
+            return False
+
+    except Exception as e:
+        print(f'Error testing result schemas: {e}')
+        return False
+
 def main():
     """Run all tests"""
     print("🧪 Starting CRUD and Validation Tests...\n")
@@ -93,6 +1143,14 @@ def main():
     results.append(test_validation_functions())
     print()
 
+    # Test incremental validation
+    results.append(test_incremental_validation())
+    print()
+
+    # Test migration fixes
+    results.append(test_migration_fixes())
+    print()
+
     # Test CRUD operations
     results.append(test_crud_operations())
     print()
@@ -101,6 +1159,86 @@ def main():
     results.append(test_cascade_delete())
     print()
 
+    # Test query profiler
+    results.append(test_query_profiler())
+    print()
+
+    # Test rerun tracing
+    results.append(test_rerun_tracing())
+    print()
+
+    # Test calendar index
+    results.append(test_calendar_index())
+    print()
+
+    # Test appointment series
+    results.append(test_appointment_series())
+    print()
+
+    # Test notification engine
+    results.append(test_notification_engine())
+    print()
+
+    # Test inventory lots
+    results.append(test_inventory_lots())
+    print()
+
+    # Test inventory forecast
+    results.append(test_inventory_forecast())
+    print()
+
+    # Test treatment materials
+    results.append(test_treatment_materials())
+    print()
+    
+    # Test analytics snapshot
+    results.append(test_analytics_snapshot())
+    print()
+    
+    # Test analytics cube
+    results.append(test_analytics_cube())
+    print()
+
+    # Test grouped doctor earnings
+    results.append(test_doctors_earnings())
+    print()
+
+    # Test grid persistence
+    results.append(test_grid_persistence())
+    print()
+
+    # Test patient 360 report
+    results.append(test_patient_360())
+    print()
+
+    # Test batch patient reports
+    results.append(test_report_batch())
+    print()
+
+    # Test background job runner
+    results.append(test_job_runner())
+    print()
+
+    # Test task scheduler
+    results.append(test_task_scheduler())
+    print()
+
+    # Test cross-process cache coherence
+    results.append(test_table_versions())
+    print()
+
+    # Test form reference data
+    results.append(test_reference_data())
+    print()
+
+    # Test record helpers
+    results.append(test_records())
+    print()
+
+    # Test result schemas
+    results.append(test_schema())
+    print()
+
     # Summary
     passed = sum(results)
     total = len(results)
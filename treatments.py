@@ -2,6 +2,7 @@ import streamlit as st
 import pandas as pd
 from datetime import date
 from database.crud import crud
+from database.schema import in_period
 from utils.helpers import (
     format_currency, show_success_message, 
     show_error_message, format_date_arabic
@@ -229,15 +230,15 @@ def treatments_analysis():
         # تحليل شعبية العلاجات
         if not appointments_df.empty:
             # فلترة المواعيد حسب التاريخ
-            appointments_df['appointment_date'] = pd.to_datetime(appointments_df['appointment_date']).dt.date
             filtered_appointments = appointments_df[
-                (appointments_df['appointment_date'] >= start_date) & 
-                (appointments_df['appointment_date'] <= end_date)
+                in_period(appointments_df['appointment_date'], start_date, end_date)
             ]
             
             if not filtered_appointments.empty:
                 # العلاجات الأكثر طلباً
+                # العمود فئوي: العلاجات التي لا مواعيد لها في الفترة تظهر بعدد صفر
                 treatment_popularity = filtered_appointments['treatment_name'].value_counts()
+                treatment_popularity = treatment_popularity[treatment_popularity > 0]
                 
                 col1, col2 = st.columns(2)
                 
@@ -261,7 +262,7 @@ def treatments_analysis():
                 with col2:
                     st.subheader("💰 الإيرادات حسب العلاج")
                     
-                    treatment_revenue = filtered_appointments.groupby('treatment_name')['total_cost'].sum().sort_values(ascending=False)
+                    treatment_revenue = filtered_appointments.groupby('treatment_name', observed=True)['total_cost'].sum().sort_values(ascending=False)
                     
                     fig2 = px.pie(
                         values=treatment_revenue.values[:8],
@@ -278,7 +279,7 @@ def treatments_analysis():
                 treatment_category_map = dict(zip(treatments_df['name'], treatments_df['category']))
                 filtered_appointments['category'] = filtered_appointments['treatment_name'].map(treatment_category_map)
                 
-                category_stats = filtered_appointments.groupby('category').agg({
+                category_stats = filtered_appointments.groupby('category', observed=True).agg({
                     'id': 'count',
                     'total_cost': 'sum'
                 }).round(2)
@@ -467,28 +468,11 @@ def show_treatments_stats(treatments_df):
         st.metric("📁 عدد الفئات", categories_count)
 
 def save_treatments_changes(edited_df, original_df):
-    """حفظ تعديلات العلاجات"""
+    """حفظ تعديلات العلاجات (الخلايا المتغيرة فقط في معاملة واحدة)"""
     try:
-        for idx, row in edited_df.iterrows():
-            original_row = original_df[original_df['id'] == row['id']].iloc[0]
-            
-            # التحقق من وجود تغييرات
-            if (row['name'] != original_row['name'] or 
-                row['description'] != original_row['description'] or
-                row['base_price'] != original_row['base_price'] or
-                row['duration_minutes'] != original_row['duration_minutes'] or
-                row['category'] != original_row['category']):
-                
-                crud.update_treatment(
-                    treatment_id=row['id'],
-                    name=row['name'],
-                    description=row['description'],
-                    base_price=row['base_price'],
-                    duration_minutes=row['duration_minutes'],
-                    category=row['category']
-                )
+        updated = crud.save_grid_changes('treatments', original_df, edited_df)
         
-        show_success_message("تم حفظ التعديلات بنجاح")
+        show_success_message(f"تم حفظ التعديلات بنجاح ({updated} سجل)")
         st.rerun()
         
     except Exception as e:
@@ -541,11 +525,13 @@ def update_treatment_price(treatment_id, new_price):
         
         crud.update_treatment(
             treatment_id=treatment_id,
-            name=treatment[1],  # name
-            description=treatment[2],  # description
+            name=treatment.name,
+            description=treatment.description,
             base_price=new_price,
-            duration_minutes=treatment[4],  # duration_minutes
-            category=treatment[5]  # category
+            duration_minutes=treatment.duration_minutes,
+            category=treatment.category,
+            doctor_percentage=treatment.doctor_percentage,
+            clinic_percentage=treatment.clinic_percentage
         )
         
         show_success_message(f"تم تحديث سعر العلاج إلى {format_currency(new_price)}")
@@ -619,11 +605,13 @@ def update_prices_bulk():
                     if treatment:
                         crud.update_treatment(
                             treatment_id=treatment_id,
-                            name=treatment[1],
-                            description=treatment[2],
+                            name=treatment.name,
+                            description=treatment.description,
                             base_price=new_price,
-                            duration_minutes=treatment[4],
-                            category=treatment[5]
+                            duration_minutes=treatment.duration_minutes,
+                            category=treatment.category,
+                            doctor_percentage=treatment.doctor_percentage,
+                            clinic_percentage=treatment.clinic_percentage
                         )
                         updated_count += 1
                 
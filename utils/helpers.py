@@ -23,6 +23,20 @@ def format_date(date_str):
     except Exception:
         return str(date_str)
 
+ARABIC_MONTHS = [
+    'يناير', 'فبراير', 'مارس', 'أبريل', 'مايو', 'يونيو',
+    'يوليو', 'أغسطس', 'سبتمبر', 'أكتوبر', 'نوفمبر', 'ديسمبر'
+]
+
+def format_date_arabic(date_str):
+    """تنسيق التاريخ بأسماء الشهور العربية (15 يناير 2024)"""
+    formatted = format_date(date_str)
+    try:
+        day = datetime.strptime(formatted, "%Y-%m-%d")
+    except ValueError:
+        return formatted
+    return f"{day.day} {ARABIC_MONTHS[day.month - 1]} {day.year}"
+
 def calculate_age(birth_date):
     """حساب العمر من تاريخ الميلاد"""
     if not birth_date:
@@ -80,4 +94,14 @@ validate_phone_number = validate_phone
 import streamlit as st
 
 def show_success_message(msg):
-    st.success(msg)
\ No newline at end of file
+    st.success(msg)
+
+def show_error_message(msg):
+    st.error(msg)
+
+def date_column_config(df):
+    """أعمدة التاريخ (datetime64) تُعرض كتاريخ فقط في st.dataframe بدلاً من تاريخ ووقت 00:00:00"""
+    return {
+        column: st.column_config.DateColumn(format="YYYY-MM-DD")
+        for column in df.columns if pd.api.types.is_datetime64_any_dtype(df[column])
+    }
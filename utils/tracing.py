@@ -0,0 +1,269 @@
+"""
+Rerun tracing for the Streamlit app
+تتبع زمن إعادة التشغيل لكل صفحة وتبويب وقسم
+"""
+
+import json
+import threading
+import time
+
+from database.profiler import profiler
+
+
+class Span:
+    """One timed region of a rerun (page, tab, section, crud call or query)"""
+
+    __slots__ = ('name', 'category', 'start', 'end', 'depth', 'path', 'args')
+
+    def __init__(self, name, category, start, depth, path, args=None):
+        self.name = name
+        self.category = category
+        self.start = start
+        self.end = None
+        self.depth = depth
+        self.path = path
+        self.args = args or {}
+
+    @property
+    def duration_ms(self):
+        return ((self.end or time.perf_counter()) - self.start) * 1000
+
+
+class RerunTrace:
+    """All spans recorded during a single script rerun"""
+
+    def __init__(self, page, trigger=None):
+        self.page = page
+        self.trigger = trigger or []
+        self.started = time.perf_counter()
+        self.wall_started = time.time()
+        self.ended = None
+        self.spans = []
+        self.stack = []
+        self.db_roundtrips = 0
+        self.db_ms = 0.0
+        self.crud_calls = 0
+
+    @property
+    def duration_ms(self):
+        return ((self.ended or time.perf_counter()) - self.started) * 1000
+
+    def current_path(self):
+        return self.stack[-1].path if self.stack else ()
+
+    def summary(self):
+        """Per-span totals: wall time, self time and DB round-trips, slowest first"""
+        rows = {}
+        for span in self.spans:
+            if span.category in ('query', 'crud'):
+                continue
+            key = " › ".join(span.path)
+            row = rows.setdefault(key, {
+                'path': key, 'category': span.category, 'total_ms': 0.0, 'self_ms': 0.0,
+                'db_roundtrips': 0, 'db_ms': 0.0,
+            })
+            row['total_ms'] += span.duration_ms
+            row['self_ms'] += span.duration_ms
+
+        for span in self.spans:
+            if len(span.path) < 2:
+                continue
+            parent = " › ".join(span.path[:-1])
+            if parent not in rows:
+                continue
+            if span.category == 'query':
+                rows[parent]['db_roundtrips'] += 1
+                rows[parent]['db_ms'] += span.duration_ms
+            elif span.category != 'crud':
+                rows[parent]['self_ms'] -= span.duration_ms
+
+        result = sorted(rows.values(), key=lambda r: r['total_ms'], reverse=True)
+        for row in result:
+            row['total_ms'] = round(row['total_ms'], 2)
+            row['self_ms'] = round(max(row['self_ms'], 0.0), 2)
+            row['db_ms'] = round(row['db_ms'], 2)
+        return result
+
+    def to_chrome_trace(self, pid=1, tid=1):
+        """Chrome trace event format (chrome://tracing, Perfetto)"""
+        events = [{
+            'name': 'rerun', 'cat': 'rerun', 'ph': 'X', 'pid': pid, 'tid': tid,
+            'ts': 0, 'dur': round(self.duration_ms * 1000),
+            'args': {'page': self.page, 'trigger': self.trigger, 'db_roundtrips': self.db_roundtrips},
+        }]
+        for span in self.spans:
+            events.append({
+                'name': span.name, 'cat': span.category, 'ph': 'X', 'pid': pid, 'tid': tid,
+                'ts': round((span.start - self.started) * 1_000_000),
+                'dur': round(span.duration_ms * 1000),
+                'args': {'path': " › ".join(span.path), **span.args},
+            })
+        return events
+
+
+class Tracer:
+    """Attributes rerun time to page, tab and section spans.
+
+    Each Streamlit session runs its script on its own thread, so the active
+    trace is thread-local. CRUD operations and individual queries are captured
+    through the query profiler's listener hook and nested under whichever
+    span is open when they run.
+    """
+
+    def __init__(self):
+        self._local = threading.local()
+        self._listening = False
+
+    # ========== دورة إعادة التشغيل ==========
+    def begin_rerun(self, page, trigger=None):
+        if not self._listening:
+            profiler.add_listener(self._on_profiler_event)
+            self._listening = True
+        trace = RerunTrace(page, trigger)
+        self._local.trace = trace
+        return trace
+
+    def end_rerun(self):
+        trace = getattr(self._local, 'trace', None)
+        if trace is None:
+            return None
+        while trace.stack:
+            trace.stack.pop().end = time.perf_counter()
+        trace.ended = time.perf_counter()
+        self._local.trace = None
+        return trace
+
+    @property
+    def active(self):
+        return getattr(self._local, 'trace', None)
+
+    # ========== الأقسام ==========
+    def span(self, name, category='section', **args):
+        """Context manager timing a region; a no-op when no rerun is traced"""
+        return _SpanScope(self, name, category, args)
+
+    def tabs(self, labels, **kwargs):
+        """st.tabs() whose containers also open a 'tab' span when entered"""
+        import streamlit as st
+        return [_TracedContainer(self, tab, label, 'tab') for tab, label in zip(st.tabs(labels, **kwargs), labels)]
+
+    def _open(self, name, category, args):
+        trace = self.active
+        if trace is None:
+            return None
+        path = trace.current_path() + (name,)
+        span = Span(name, category, time.perf_counter(), len(trace.stack), path, args)
+        trace.spans.append(span)
+        trace.stack.append(span)
+        return span
+
+    def _close(self, span):
+        trace = self.active
+        if trace is None or span is None:
+            return
+        span.end = time.perf_counter()
+        if trace.stack and trace.stack[-1] is span:
+            trace.stack.pop()
+        elif span in trace.stack:
+            trace.stack.remove(span)
+
+    def _on_profiler_event(self, event):
+        trace = self.active
+        if trace is None:
+            return
+        now = time.perf_counter()
+        if event['type'] == 'query':
+            trace.db_roundtrips += 1
+            trace.db_ms += event['total_ms']
+            start = event['ended_at'] - event['total_ms'] / 1000
+            name, category = event['sql'][:80], 'query'
+            args = {'rows': event['rows'], 'operation': event['operation']}
+        else:
+            trace.crud_calls += 1
+            start = event['started_at']
+            name, category = event['operation'], 'crud'
+            args = {'queries': event['queries'], 'rows': event['rows'],
+                    'db_ms': round(event['db_ms'], 3), 'frame_ms': round(event['frame_ms'], 3)}
+        span = Span(name, category, start, len(trace.stack), trace.current_path() + (name,), args)
+        span.end = start + event['total_ms'] / 1000 if category == 'query' else now
+        trace.spans.append(span)
+
+
+class _SpanScope:
+    __slots__ = ('tracer', 'name', 'category', 'args', 'span')
+
+    def __init__(self, tracer, name, category, args):
+        self.tracer = tracer
+        self.name = name
+        self.category = category
+        self.args = args
+        self.span = None
+
+    def __enter__(self):
+        self.span = self.tracer._open(self.name, self.category, self.args)
+        return self.span
+
+    def __exit__(self, exc_type, exc, tb):
+        self.tracer._close(self.span)
+        return False
+
+
+class _TracedContainer:
+    """Streamlit container proxy that opens a span while it is the active container"""
+
+    def __init__(self, tracer, container, name, category):
+        self._tracer = tracer
+        self._container = container
+        self._scope = None
+        self._name = name
+        self._category = category
+
+    def __enter__(self):
+        self._container.__enter__()
+        self._scope = self._tracer.span(self._name, self._category)
+        self._scope.__enter__()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self._scope.__exit__(exc_type, exc, tb)
+        return self._container.__exit__(exc_type, exc, tb)
+
+    def __getattr__(self, name):
+        return getattr(self._container, name)
+
+
+def widget_changes(previous, current):
+    """Keys of session_state whose value changed between two snapshots (rerun triggers)"""
+    return [key for key, value in current.items() if key in previous and previous[key] != value]
+
+
+def snapshot_state(session_state):
+    """Comparable snapshot of the simple (widget) values in session_state"""
+    snapshot = {}
+    for key, value in session_state.items():
+        if str(key).startswith('_'):
+            continue
+        if isinstance(value, (str, int, float, bool, type(None))):
+            snapshot[key] = value
+        elif hasattr(value, 'isoformat'):
+            snapshot[key] = value.isoformat()
+        elif isinstance(value, (list, tuple)) and all(isinstance(v, (str, int, float, bool)) for v in value):
+            snapshot[key] = tuple(value)
+    return snapshot
+
+
+def export_chrome_trace(traces):
+    """Chrome trace JSON for one or more reruns laid out on a shared timeline"""
+    traces = list(traces)
+    events = [{'name': 'thread_name', 'ph': 'M', 'pid': 1, 'tid': 1, 'args': {'name': 'Streamlit reruns'}}]
+    origin = traces[0].wall_started if traces else 0.0
+    for trace in traces:
+        shift = round((trace.wall_started - origin) * 1_000_000)
+        for event in trace.to_chrome_trace(pid=1, tid=1):
+            event['ts'] += shift
+            events.append(event)
+    return json.dumps({'traceEvents': events, 'displayTimeUnit': 'ms'}, ensure_ascii=False)
+
+
+# Create tracer instance
+tracer = Tracer()